@@ -0,0 +1,328 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Functions to import and export between a spine database and csv files.
+
+Each class gets its own csv file. Parameter values are pivoted like in the excel sheets,
+with one column per object class and parameter, and json values are stacked, one row per value.
+A json manifest tells what class each file holds and the type of each
+parameter column, so numbers read back as numbers. The files go in a folder named after
+the manifest, next to it, so exporting never replaces other files in the manifest's folder.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import csv
+import json
+import os
+import re
+from excel_import_export import SheetData, import_sheet_data, get_classes_and_parameters, pivot_rows, \
+    object_value_rows, relationship_value_rows, object_json_rows, relationship_json_rows
+
+MANIFEST_FORMAT = "spine csv"
+MANIFEST_VERSION = 1
+
+# how to read back the values in a column of each type
+PARSERS = {"int": int, "float": float, "str": str}
+
+
+def column_type(type_names):
+    """Returns the type that all values in a column can be read back as.
+
+    Args:
+        type_names (Set[str]): names of the types of the values in the column
+
+    Returns:
+        (str): "int", "float" or "str"
+    """
+    if type_names and type_names <= {"int"}:
+        return "int"
+    if type_names and type_names <= {"int", "float"}:
+        return "float"
+    return "str"
+
+
+def export_spine_database_to_csv(db, manifest_path, chunk_size=10000):
+    """Writes all data in a spine database into csv files, one per class and data type,
+    and a manifest listing them. Parameter values are queried class by class
+    and written as they are read.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database.
+        manifest_path (str): str with filepath to save the manifest to, the csv files go in a folder
+            next to it, named after the manifest without extension.
+        chunk_size (int): number of rows to fetch from the database at the time.
+    """
+    folder = os.path.splitext(os.path.basename(manifest_path))[0]
+    directory = os.path.join(os.path.dirname(manifest_path), folder)
+    os.makedirs(directory, exist_ok=True)
+    object_classes, relationship_classes, object_parameters, relationship_parameters = \
+        get_classes_and_parameters(db)
+    used_names = set()
+    files = []
+    for oc in object_classes:
+        parameters = object_parameters.get(oc.name, [])
+        lines = pivot_rows(object_value_rows(db, oc.id, chunk_size), parameters)
+        files.append(write_values_csv(directory, "obj_", oc.name, "object", [oc.name], parameters, lines,
+                                      used_names))
+    for rc in relationship_classes:
+        object_class_names = rc.object_class_name_list.split(',')
+        parameters = relationship_parameters.get(rc.name, [])
+        lines = pivot_rows(relationship_value_rows(db, rc.id, chunk_size), parameters, split_names=True)
+        files.append(write_values_csv(directory, "rel_", rc.name, "relationship", object_class_names, parameters,
+                                      lines, used_names))
+    for oc in object_classes:
+        files.append(write_json_csv(directory, oc.name, "object", [oc.name],
+                                    object_json_rows(db, oc.id, chunk_size), used_names))
+    for rc in relationship_classes:
+        files.append(write_json_csv(directory, rc.name, "relationship", rc.object_class_name_list.split(','),
+                                    relationship_json_rows(db, rc.id, chunk_size), used_names))
+    files = [f for f in files if f is not None]
+    # paths in the manifest are relative to it, with forward slashes on all platforms
+    for f in files:
+        f["file"] = folder + "/" + f["file"]
+    write_manifest(manifest_path, files)
+
+
+def csv_file_name(prefix, class_name, used_names):
+    """Returns a file name for a class that is safe on all platforms and not in used_names,
+    and adds it to used_names."""
+    name = prefix + re.sub(r"[^\w\-]", "_", class_name)
+    candidate = name
+    i = 1
+    # file names are not case sensitive on all platforms
+    while candidate.lower() in used_names:
+        candidate = "{}_{}".format(name, i)
+        i += 1
+    used_names.add(candidate.lower())
+    return candidate + ".csv"
+
+
+def write_values_csv(directory, prefix, class_name, class_type, object_classes, parameters, lines, used_names):
+    """Writes pivoted parameter values for one class into a new csv file.
+
+    Args:
+        directory (str): folder to write to
+        prefix (str): prefix of the file name
+        class_name (str): object or relationship class name
+        class_type (str): "object" or "relationship"
+        object_classes (List[str]): object class names of the class
+        parameters (List[str]): parameter names of the class
+        lines (Iterable[List]): object names followed by one value per parameter, see pivot_rows
+        used_names (Set[str]): file names already taken
+
+    Returns:
+        (Dict): manifest entry for the file
+    """
+    file_name = csv_file_name(prefix, class_name, used_names)
+    type_names = [set() for _ in parameters]
+    name_count = len(object_classes)
+    row_count = 0
+    with open(os.path.join(directory, file_name), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(object_classes + parameters)
+        for line in lines:
+            for names, value in zip(type_names, line[name_count:]):
+                if value is not None:
+                    names.add(type(value).__name__)
+            writer.writerow(line)
+            row_count += 1
+    return {"file": file_name,
+            "class_type": class_type,
+            "data_type": "parameter",
+            "class_name": class_name,
+            "object_classes": object_classes,
+            "parameters": parameters,
+            "types": [column_type(names) for names in type_names],
+            "row_count": row_count}
+
+
+def write_json_csv(directory, class_name, class_type, object_classes, rows, used_names):
+    """Writes json values for one class into a new csv file, one row per value.
+    Nothing is written if the class has no json values.
+
+    Args:
+        directory (str): folder to write to
+        class_name (str): object or relationship class name
+        class_type (str): "object" or "relationship"
+        object_classes (List[str]): object class names of the class
+        rows (Iterable): tuples of (name, parameter, json), where name is a
+            comma separated object name list for relationships
+        used_names (Set[str]): file names already taken
+
+    Returns:
+        (Dict): manifest entry for the file, or None if nothing was written
+    """
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
+        return None
+    file_name = csv_file_name("json_", class_name, used_names)
+    row_count = 0
+    with open(os.path.join(directory, file_name), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(object_classes + ["parameter", "json"])
+        for name, parameter, json_value in _chain_first(first_row, rows):
+            names = name.split(',') if class_type == "relationship" else [name]
+            writer.writerow(names + [parameter, json_value])
+            row_count += 1
+    return {"file": file_name,
+            "class_type": class_type,
+            "data_type": "json",
+            "class_name": class_name,
+            "object_classes": object_classes,
+            "row_count": row_count}
+
+
+def _chain_first(first, rest):
+    """Yields first and then the items in rest."""
+    yield first
+    yield from rest
+
+
+def write_manifest(manifest_path, files):
+    """Writes a manifest listing csv files.
+
+    Args:
+        manifest_path (str): str with filepath to save the manifest to
+        files (List[Dict]): one entry per file, as returned by write_values_csv and write_json_csv
+    """
+    manifest = {"format": MANIFEST_FORMAT, "version": MANIFEST_VERSION, "files": files}
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+
+def read_manifest(manifest_path):
+    """Reads the list of files in a manifest.
+
+    Args:
+        manifest_path (str): str with filepath to the manifest
+
+    Returns:
+        (List[Dict]): one entry per file
+    """
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if not isinstance(manifest, dict) or manifest.get("format") != MANIFEST_FORMAT:
+        raise ValueError("{} is not a manifest of spine csv files".format(manifest_path))
+    return manifest["files"]
+
+
+def read_csv_in_chunks(filepath, entry, chunk_size):
+    """Reads a csv file listed in a manifest into SheetData, 'chunk_size' rows at a time.
+    Values are converted to the types given in the manifest, and empty cells are skipped.
+
+    Args:
+        filepath (str): str with filepath to the csv file
+        entry (Dict): manifest entry for the file
+        chunk_size (int): number of rows in each chunk
+
+    Returns:
+        (Generator[(SheetData, Int)]): data of a chunk of rows, without parameters,
+        and the number of rows read so far
+    """
+    class_type = entry["class_type"]
+    object_classes = entry["object_classes"]
+    name_count = len(object_classes)
+    is_json = entry["data_type"] == "json"
+    if not is_json:
+        parameters = entry["parameters"]
+        parsers = [PARSERS[t] for t in entry["types"]]
+
+    def chunk(objects, values):
+        return SheetData(sheet_name=entry["file"],
+                         class_name=entry["class_name"],
+                         object_classes=object_classes,
+                         parameters=[],
+                         parameter_values=values,
+                         objects=list(objects.values()),
+                         class_type=class_type)
+
+    with open(filepath, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        if header[:name_count] != object_classes:
+            raise ValueError("the header of {} doesn't start with {}".format(entry["file"], object_classes))
+        row_count = 0
+        objects = {}
+        values = []
+        for row in reader:
+            row_count += 1
+            names = row[:name_count]
+            if len(names) == name_count and all(names):
+                key = tuple(names)
+                objects.setdefault(key, names[0] if class_type == "object" else names)
+                if is_json:
+                    parameter, json_value = row[name_count:name_count + 2]
+                    if parameter and json_value:
+                        values.append(("json",) + key + (parameter, json_value))
+                else:
+                    for parameter, parse, cell in zip(parameters, parsers, row[name_count:]):
+                        if cell:
+                            values.append(("value",) + key + (parameter, parse(cell)))
+            if row_count % chunk_size == 0:
+                yield chunk(objects, values), row_count
+                objects = {}
+                values = []
+        if row_count % chunk_size:
+            yield chunk(objects, values), row_count
+
+
+def import_csv_to_db(db, manifest_path, chunk_size=10000, progress_callback=None):
+    """Imports the csv files listed in the manifest in 'manifest_path' into the database in mapping 'db'.
+    Classes and parameters from all files are imported first, then objects, relationships
+    and parameter values file by file, in chunks of 'chunk_size' rows.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database to write to
+        manifest_path (str): str with filepath to the manifest
+        chunk_size (int): number of rows to import at a time
+        progress_callback (function): if given, called after each chunk with the
+            file name and the number of rows imported so far from that file
+
+    Returns:
+        (Int, List) Returns number of inserted items and a list of
+        error information on all failed writes
+    """
+    directory = os.path.dirname(manifest_path)
+    files = read_manifest(manifest_path)
+
+    # one SheetData for each class, with the parameters from all its files
+    classes = {}
+    for entry in files:
+        key = (entry["class_type"], entry["class_name"])
+        object_classes, parameters = classes.setdefault(key, (entry["object_classes"], {}))
+        parameters.update(dict.fromkeys(entry.get("parameters", [])))
+    obj_data = []
+    rel_data = []
+    for (class_type, class_name), (object_classes, parameters) in classes.items():
+        data = SheetData(sheet_name=None, class_name=class_name, object_classes=object_classes,
+                         parameters=list(parameters), parameter_values=[], objects=[], class_type=class_type)
+        (rel_data if class_type == "relationship" else obj_data).append(data)
+    num_imported, errors = import_sheet_data(db, obj_data, rel_data)
+    error_log = list(errors)
+
+    for entry in files:
+        try:
+            for data, row_count in read_csv_in_chunks(os.path.join(directory, entry["file"]), entry, chunk_size):
+                if data.class_type == "relationship":
+                    num, errors = import_sheet_data(db, [], [data], import_classes=False)
+                else:
+                    num, errors = import_sheet_data(db, [data], [], import_classes=False)
+                num_imported += num
+                error_log.extend(errors)
+                if progress_callback is not None:
+                    progress_callback(entry["file"], row_count)
+        except Exception as e:
+            error_log.append(["file", entry["file"], "Error reading file {}: {}".format(entry["file"], e)])
+    return num_imported, error_log
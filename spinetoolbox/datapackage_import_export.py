@@ -12,11 +12,17 @@
 """
 Functions to import/export between spine database and frictionless data's datapackage.
 
+Resources are imported row by row, in chunks, so that memory use doesn't depend on the size of the data.
+Object ids and reference keys are looked up in an ObjectIndex kept in a temporary file.
+
 :author: M. Marin (KTH)
 :date:   28.8.2018
 """
 
 import getpass
+import sqlite3
+from collections import namedtuple
+from itertools import islice
 from PySide2.QtCore import QRunnable, Signal, QObject
 from datapackage import Package
 from spinedatabase_api import SpineDBAPIError, SpineIntegrityError, DiffDatabaseMapping, \
@@ -31,283 +37,195 @@ class Signaler(QObject):
     progressed = Signal("int", "QString", name="progressed")
 
 
-class DatapackageToSpineConverter(QRunnable):
+# What the conversion needs to know about the fields of a resource, computed once per resource:
+# parameters is a list of (field index, parameter name) for fields outside the primary and foreign keys,
+# foreign_keys is a list of (field indexes, reference resource name, reference field names)
+ResourceFields = namedtuple("ResourceFields", [
+    "name", "field_names", "primary_key", "parameters", "foreign_keys", "relationship_class_name"])
 
-    def __init__(self, db_url, datapackage_descriptor, datapackage_base_path):
-        super().__init__()
-        self.db_url = db_url
-        create_new_spine_database(self.db_url)
-        self.db_map = DiffDatabaseMapping(db_url, getpass.getuser())
-        self.datapackage = Package(datapackage_descriptor, datapackage_base_path)
-        self.signaler = Signaler()
-        self.resource_data = dict()
-        self.object_class_count = None
-        self.object_count = None
-        self.relationship_class_count = None
-        self.relationship_count = None
-        self.parameter_count = None
-        self.parameter_value_count = None
-        for resource in self.datapackage.resources:
-            self.resource_data[resource.name] = resource.read(cast=False)
 
-    def number_of_steps(self):
-        self.object_class_count = len(self.datapackage.resources)
-        self.object_count = sum(len(self.resource_data[x.name]) for x in self.datapackage.resources)
-        self.relationship_class_count = len([x for x in self.datapackage.resources if x.schema.foreign_keys])
-        self.relationship_count = sum(
-            len(self.resource_data[x.name]) for x in self.datapackage.resources if x.schema.foreign_keys)
-        self.parameter_count = sum(
-            len(x.schema.fields) - len(x.schema.primary_key) \
-            - len([i for fk in x.schema.foreign_keys for i in fk["fields"]])
-            for x in self.datapackage.resources)
-        self.parameter_value_count = sum(
-            len(self.resource_data[x.name]) \
-                * (len(x.schema.fields) - len(x.schema.primary_key) \
-                - len([i for fk in x.schema.foreign_keys for i in fk["fields"]]))
-            for x in self.datapackage.resources)
-        return self.object_class_count \
-            + self.object_count \
-            + self.relationship_class_count \
-            + self.relationship_count \
-            + self.parameter_count \
-            + self.parameter_value_count
+def get_resource_fields(resource):
+    """Returns the ResourceFields of a datapackage resource."""
+    field_names = resource.schema.field_names
+    field_index = {name: i for i, name in enumerate(field_names)}
+    primary_key = [field_index[name] for name in resource.schema.primary_key]
+    foreign_keys = resource.schema.foreign_keys
+    skipped_fields = set(resource.schema.primary_key)
+    skipped_fields.update(x for fk in foreign_keys for x in fk["fields"])
+    parameters = [(i, resource.name + "_" + name) for i, name in enumerate(field_names) if name not in skipped_fields]
+    foreign_keys = [
+        ([field_index[x] for x in fk["fields"]], fk["reference"]["resource"], tuple(fk["reference"]["fields"]))
+        for fk in foreign_keys
+    ]
+    if foreign_keys:
+        relationship_class_name = "__".join([resource.name] + [fk[1] for fk in foreign_keys])
+    else:
+        relationship_class_name = None
+    return ResourceFields(resource.name, field_names, primary_key, parameters, foreign_keys, relationship_class_name)
 
-    def run(self):
-        try:
-            self._run()
-            self.signaler.finished.emit()
-        except (SpineDBAPIError, SpineIntegrityError) as e:
-            self.signaler.failed.emit(e.msg)
 
-    def _run(self):
-        step = 0
-        self.signaler.progressed.emit(step, "")
-        object_class_names = [x.name for x in self.db_map.object_class_list()]
-        parameter_names = [x.name for x in self.db_map.parameter_list()]
-        object_class_name_lists = [
-            x.object_class_name_list.split(",") for x in self.db_map.wide_relationship_class_list()]
-        object_classes = list()
-        pre_relationship_classes = list()
-        pre_parameters = list()
-        for resource in self.datapackage.resources:
-            if resource.name not in object_class_names:
-                object_classes.append(dict(name=resource.name))
-                object_class_names.append(resource.name)
-            primary_key = resource.schema.primary_key
-            foreign_keys = resource.schema.foreign_keys
-            reference_resource_names = [fk["reference"]["resource"] for fk in foreign_keys]
-            for reference_resource_name in reference_resource_names:
-                if reference_resource_name not in object_class_names:
-                    object_classes.append(dict(name=reference_resource_name))
-                    object_class_names.append(reference_resource_name)
-            if reference_resource_names:
-                object_class_name_list = [resource.name] + reference_resource_names
-                relationship_class_name = "__".join(object_class_name_list)
-                pre_relationship_classes.append(dict(
-                    object_class_name_list=object_class_name_list,
-                    name=relationship_class_name
-                ))
-                object_class_name_lists.append(object_class_name_list)
-            for field in resource.schema.fields:
-                # Skip fields in primary key
-                if field.name in primary_key:
-                    continue
-                # Skip fields in any foreign key
-                if field in [x for fk in foreign_keys for x in fk["fields"]]:
-                    continue
-                parameter_name = resource.name + "_" + field.name
-                if parameter_name not in parameter_names:
-                    pre_parameters.append(dict(object_class_name=resource.name, name=parameter_name))
-                    parameter_names.append(parameter_name)
-        self.signaler.progressed.emit(step, "Adding object classes...")
-        self.db_map.add_object_classes(*object_classes)
-        step += self.object_class_count
-        object_class_name_id = {x.name: x.id for x in self.db_map.object_class_list()}
-        relationship_classes = [
-            dict(
-                object_class_id_list=[object_class_name_id[n] for n in r['object_class_name_list']],
-                name=r['name']
-            ) for r in pre_relationship_classes
-        ]
-        self.signaler.progressed.emit(step, "Adding relationship classes...")
-        self.db_map.add_wide_relationship_classes(*relationship_classes)
-        step += self.relationship_class_count
-        parameters = [
-            dict(
-                object_class_id=object_class_name_id[p['object_class_name']],
-                name=p['name']
-            ) for p in pre_parameters
-        ]
-        self.signaler.progressed.emit(step, "Adding parameters...")
-        self.db_map.add_parameters(*parameters)
-        step += self.parameter_count
-        relationship_class_name_id = {x.name: x.id for x in self.db_map.wide_relationship_class_list()}
-        parameter_name_id = {x.name: x.id for x in self.db_map.parameter_list()}
-        object_names = [x.name for x in self.db_map.object_list()]
-        # Create list of object and preliminary parameter value dicts.
-        objects = list()
-        pre_parameter_values = list()
-        for resource in self.datapackage.resources:
-            object_class_id = object_class_name_id[resource.name]
-            primary_key = resource.schema.primary_key
-            foreign_keys = resource.schema.foreign_keys
-            foreign_keys_fields = [x for fk in foreign_keys for x in fk["fields"]]
-            for i, row in enumerate(self.resource_data[resource.name]):
-                row_dict = dict(zip(resource.schema.field_names, row))
-                if primary_key:
-                    object_name_suffix = "_".join(row_dict[field] for field in primary_key)
-                else:
-                    object_name_suffix = str(i)
-                object_name = resource.name + "_" + object_name_suffix
-                if not object_name in object_names:
-                    objects.append(dict(class_id=object_class_id, name=object_name))
-                    object_names.append(object_name)
-                for field_name, value in row_dict.items():
-                    if field_name in primary_key:
-                        continue
-                    if field_name in foreign_keys_fields:
-                        continue
-                    parameter_name = resource.name + "_" + field_name
-                    parameter_id = parameter_name_id[parameter_name]
-                    pre_parameter_values.append(dict(
-                        object_name=object_name,
-                        parameter_id=parameter_id,
-                        value=value
-                    ))
-        self.signaler.progressed.emit(step, "Adding objects...")
-        self.db_map.add_objects(*objects)
-        step += self.object_count
-        object_name_id = {x.name: x.id for x in self.db_map.object_list()}
-        parameter_values = [
-            dict(
-                object_id=object_name_id[p['object_name']],
-                parameter_id=p['parameter_id'],
-                value=p['value']
-            ) for p in pre_parameter_values
-        ]
-        self.signaler.progressed.emit(step, "Adding parameter values...")
-        self.db_map.add_parameter_values(*parameter_values)
-        step += self.parameter_value_count
-        # Create dictionary of reference resource names => list of reference fields names
-        reference_resource_dict = dict()
-        for resource in self.datapackage.resources:
-            foreign_keys = resource.schema.foreign_keys
-            for foreign_key in foreign_keys:
-                reference_resource_name = foreign_key["reference"]["resource"]
-                reference_fields_names = foreign_key["reference"]["fields"]
-                reference_resource_dict.setdefault(reference_resource_name, list()).\
-                    append(reference_fields_names)
-        # Create dictionary of reference resource name => reference fields names
-        # => reference key => object id
-        reference_object_id_dict = dict()
-        for reference_resource_name, reference_fields_names_list in reference_resource_dict.items():
-            reference_resource = self.datapackage.get_resource(reference_resource_name)
-            reference_primary_key = reference_resource.schema.primary_key
-            reference_object_id_dict[reference_resource_name] = d1 = dict()
-            for reference_fields_names in reference_fields_names_list:
-                d1[",".join(reference_fields_names)] = d2 = dict()
-                for i, row in enumerate(self.resource_data[reference_resource_name]):
-                    row_dict = dict(zip(reference_resource.schema.field_names, row))
-                    # Find object id
-                    if reference_primary_key:
-                        reference_object_name_suffix = "_".join(row_dict[field] for field in reference_primary_key)
-                    else:
-                        reference_object_name_suffix = str(i)
-                    reference_object_name = reference_resource_name + reference_object_name_suffix
-                    reference_object_id = object_name_id[reference_object_name]
-                    key = ",".join([row_dict[x] for x in reference_fields_names])
-                    d2[key] = (reference_object_id, reference_object_name)
-        # Create list of relationships
-        relationships = list()
-        for resource in self.datapackage.resources:
-            primary_key = resource.schema.primary_key
-            foreign_keys = resource.schema.foreign_keys
-            reference_resource_names = [fk['reference']['resource'] for fk in foreign_keys]
-            if not reference_resource_names:
-                continue
-            object_class_name_list = [resource.name] + reference_resource_names
-            relationship_class_name = "__".join(object_class_name_list)
-            relationship_class_id = relationship_class_name_id[relationship_class_name]
-            for i, row in enumerate(self.resource_data[resource.name]):
-                row_dict = dict(zip(resource.schema.field_names, row))
-                if primary_key:
-                    object_name_suffix = "_".join(row_dict[field] for field in primary_key)
-                else:
-                    object_name_suffix = str(i)
-                object_name = resource.name + object_name_suffix
-                object_id = object_name_id[object_name]
-                object_id_list = [object_id]
-                object_name_list = [object_name]
-                for fk in foreign_keys:
-                    fields_names = fk['fields']
-                    reference_resource_name = fk['reference']['resource']
-                    reference_fields_names = fk['reference']['fields']
-                    key = ",".join([row_dict[x] for x in fields_names])
-                    d1 = reference_object_id_dict[reference_resource_name]
-                    d2 = d1[",".join(reference_fields_names)]
-                    try:
-                        reference_object_id, reference_object_name = d2[key]
-                    except KeyError:
-                        break
-                    object_id_list.append(reference_object_id)
-                    object_name_list.append(reference_object_name)
-                else:
-                    relationship_name = relationship_class_name + "_" + "__".join(object_name_list)
-                    relationships.append(dict(
-                        class_id=relationship_class_id,
-                        object_id_list=object_id_list,
-                        name=relationship_name
-                    ))
-        self.signaler.progressed.emit(step, "Adding relationships...")
-        self.db_map.add_wide_relationships(*relationships)
-        step += self.relationship_count
-        self.db_map.commit_session("Automatically generated by Spine Toolbox.")
-        self.db_map.close()
-        self.signaler.progressed.emit(step, "")
+def new_classes_and_parameters(db_map, resource_fields):
+    """Returns the object classes, relationship classes and parameters in resources
+    that are not in the database yet.
 
+    Args:
+        db_map (DiffDatabaseMapping): database to import to
+        resource_fields (list(ResourceFields)): fields of each resource
 
-@busy_effect
-def datapackage_to_spine(db_map, datapackage_file_path):
-    """Convert datapackage from `datapackage_file_path` into Spine `db_map`."""
-    insert_log = []
-    error_log = []
-    datapackage = Package(datapackage_file_path)
-    object_class_names = [x.name for x in db_map.object_class_list()]
-    parameter_names = [x.name for x in db_map.parameter_list()]
-    object_class_name_lists = [x.object_class_name_list.split(",") for x in db_map.wide_relationship_class_list()]
+    Returns:
+        object_classes (list(dict)): object classes to add
+        pre_relationship_classes (list(dict)): relationship classes to add, with object class names
+        pre_parameters (list(dict)): parameters to add, with object class names
+    """
+    object_class_names = {x.name for x in db_map.object_class_list()}
+    parameter_names = {x.name for x in db_map.parameter_list()}
     object_classes = list()
     pre_relationship_classes = list()
     pre_parameters = list()
-    for resource in datapackage.resources:
-        if resource.name not in object_class_names:
-            object_classes.append(dict(name=resource.name))
-            object_class_names.append(resource.name)
-        primary_key = resource.schema.primary_key
-        foreign_keys = resource.schema.foreign_keys
-        reference_resource_names = [fk["reference"]["resource"] for fk in foreign_keys]
-        for reference_resource_name in reference_resource_names:
-            if reference_resource_name not in object_class_names:
-                object_classes.append(dict(name=reference_resource_name))
-                object_class_names.append(reference_resource_name)
-        if reference_resource_names:
-            object_class_name_list = [resource.name] + reference_resource_names
-            relationship_class_name = "__".join(object_class_name_list)
+    for fields in resource_fields:
+        reference_resource_names = [fk[1] for fk in fields.foreign_keys]
+        for object_class_name in [fields.name] + reference_resource_names:
+            if object_class_name not in object_class_names:
+                object_classes.append(dict(name=object_class_name))
+                object_class_names.add(object_class_name)
+        if fields.relationship_class_name:
             pre_relationship_classes.append(dict(
-                object_class_name_list=object_class_name_list,
-                name=relationship_class_name
+                object_class_name_list=[fields.name] + reference_resource_names,
+                name=fields.relationship_class_name
             ))
-            object_class_name_lists.append(object_class_name_list)
-        for field in resource.schema.fields:
-            # Skip fields in primary key
-            if field.name in primary_key:
-                continue
-            # Skip fields in any foreign key
-            if field in [x for fk in foreign_keys for x in fk["fields"]]:
-                continue
-            parameter_name = resource.name + "_" + field.name
+        for _, parameter_name in fields.parameters:
             if parameter_name not in parameter_names:
-                pre_parameters.append(dict(object_class_name=resource.name, name=parameter_name))
-                parameter_names.append(parameter_name)
+                pre_parameters.append(dict(object_class_name=fields.name, name=parameter_name))
+                parameter_names.add(parameter_name)
+    return object_classes, pre_relationship_classes, pre_parameters
+
+
+class ObjectIndex:
+    """Index of object ids by name, and of object names by reference key.
+    The index is a temporary sqlite database on disk, so it doesn't need to fit in memory.
+    """
+
+    # number of parameters in one select
+    batch_size = 500
+
+    def __init__(self):
+        # an empty path opens a temporary database that is deleted when closed
+        self._connection = sqlite3.connect("")
+        self._connection.execute("CREATE TABLE object (name TEXT PRIMARY KEY, id INTEGER)")
+        self._connection.execute(
+            "CREATE TABLE reference (reference_id INTEGER, key TEXT, object_name TEXT, "
+            "PRIMARY KEY (reference_id, key))")
+        self._reference_ids = dict()
+
+    def close(self):
+        self._connection.close()
+
+    @staticmethod
+    def _key(values):
+        return "\x1f".join(values)
+
+    def _select(self, sql, args, values):
+        """Runs sql for values in batches, with args before the values in each batch, and yields the result rows."""
+        values = list(values)
+        for start in range(0, len(values), self.batch_size):
+            batch = values[start:start + self.batch_size]
+            yield from self._connection.execute(sql.format(",".join("?" * len(batch))), args + batch)
+
+    def add_objects(self, object_name_id):
+        """Adds objects to the index.
+
+        Args:
+            object_name_id (iterable): tuples of (object name, object id)
+        """
+        self._connection.executemany("INSERT OR IGNORE INTO object (name, id) VALUES (?, ?)", object_name_id)
+
+    def object_ids(self, object_names):
+        """Returns a dictionary of object name => object id for the given names that are in the index."""
+        return dict(self._select("SELECT name, id FROM object WHERE name IN ({})", [], object_names))
+
+    def add_references(self, reference, keys):
+        """Adds reference keys to the index. A key added again replaces the previous one.
+
+        Args:
+            reference (tuple): reference resource name and reference fields names
+            keys (iterable): tuples of (reference key, object name), where the key is a tuple of field values
+        """
+        reference_id = self._reference_ids.setdefault(reference, len(self._reference_ids))
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO reference (reference_id, key, object_name) VALUES (?, ?, ?)",
+            ((reference_id, self._key(key), object_name) for key, object_name in keys))
+
+    def references(self, reference, keys):
+        """Returns a dictionary of reference key => (object id, object name) for the given keys that are in the index.
+
+        Args:
+            reference (tuple): reference resource name and reference fields names
+            keys (set): reference keys, tuples of field values
+        """
+        reference_id = self._reference_ids.get(reference)
+        if reference_id is None:
+            return dict()
+        key_dict = {self._key(key): key for key in keys}
+        rows = self._select(
+            "SELECT r.key, o.id, r.object_name FROM reference AS r JOIN object AS o ON o.name = r.object_name "
+            "WHERE r.reference_id = ? AND r.key IN ({})", [reference_id], key_dict)
+        return {key_dict[key]: (object_id, object_name) for key, object_id, object_name in rows}
+
+
+def iter_chunks(rows, chunk_size):
+    """Yields the number of the first row and a list of at most chunk_size rows, until rows run out."""
+    rows = iter(rows)
+    first_row = 0
+    chunk = list(islice(rows, chunk_size))
+    while chunk:
+        yield first_row, chunk
+        first_row += len(chunk)
+        chunk = list(islice(rows, chunk_size))
+
+
+def number_of_steps(resource_fields, row_counts):
+    """Returns the number of steps stream_datapackage_to_spine reports progress in.
+
+    Args:
+        resource_fields (list(ResourceFields)): fields of each resource
+        row_counts (dict): resource name => number of rows
+    """
+    return sum(
+        1 + len(x.parameters) + row_counts[x.name] * (1 + len(x.parameters))
+        + (1 + row_counts[x.name] if x.foreign_keys else 0)
+        for x in resource_fields)
+
+
+def stream_datapackage_to_spine(db_map, resources, object_name, chunk_size=10000, progress_callback=None,
+                                skip_unresolved=False):
+    """Imports datapackage resources into a Spine database.
+    Rows are read as they are needed, and objects, parameter values and relationships
+    are added chunk_size rows at a time.
+
+    Args:
+        db_map (DiffDatabaseMapping): database to import to
+        resources (list): datapackage resources
+        object_name (function): returns the object name of a row given its ResourceFields, row number and row
+        chunk_size (int): number of rows to add at a time
+        progress_callback (function): if given, called with the number of steps done so far and a message,
+            before each resource and after each chunk, see number_of_steps
+        skip_unresolved (bool): if True, rows with a foreign key that matches no row in the reference resource
+            get no relationship, otherwise a KeyError is raised
+
+    Returns:
+        (int): number of steps done
+    """
+    resource_fields = [get_resource_fields(x) for x in resources]
+    step = 0
+
+    def progressed(steps, msg=""):
+        nonlocal step
+        step += steps
+        if progress_callback is not None:
+            progress_callback(step, msg)
+
+    object_classes, pre_relationship_classes, pre_parameters = new_classes_and_parameters(db_map, resource_fields)
+    progressed(0, "Adding object classes...")
     db_map.add_object_classes(*object_classes)
     object_class_name_id = {x.name: x.id for x in db_map.object_class_list()}
     relationship_classes = [
@@ -316,6 +234,7 @@ def datapackage_to_spine(db_map, datapackage_file_path):
             name=r['name']
         ) for r in pre_relationship_classes
     ]
+    progressed(len(resource_fields), "Adding relationship classes...")
     db_map.add_wide_relationship_classes(*relationship_classes)
     parameters = [
         dict(
@@ -323,111 +242,143 @@ def datapackage_to_spine(db_map, datapackage_file_path):
             name=p['name']
         ) for p in pre_parameters
     ]
+    progressed(len(relationship_classes), "Adding parameters...")
     db_map.add_parameters(*parameters)
+    progressed(sum(len(x.parameters) for x in resource_fields))
     relationship_class_name_id = {x.name: x.id for x in db_map.wide_relationship_class_list()}
     parameter_name_id = {x.name: x.id for x in db_map.parameter_list()}
-    object_names = [x.name for x in db_map.object_list()]
-    # Create list of object and preliminary parameter value dicts.
-    objects = list()
-    pre_parameter_values = list()
-    for resource in datapackage.resources:
-        object_class_id = object_class_name_id[resource.name]
-        primary_key = resource.schema.primary_key
-        foreign_keys = resource.schema.foreign_keys
-        foreign_keys_fields = [x for fk in foreign_keys for x in fk["fields"]]
-        for i, row in enumerate(resource.read(cast=False)):  # TODO: try and get row_dict directly from read method
-            row_dict = dict(zip(resource.schema.field_names, row))
-            if primary_key:
-                object_name = "_".join(row_dict[field] for field in primary_key)
-            else:
-                object_name = resource.name + str(i)
-            if not object_name in object_names:
-                objects.append(dict(class_id=object_class_id, name=object_name))
-                object_names.append(object_name)
-            for field_name, value in row_dict.items():
-                if field_name in primary_key:
-                    continue
-                if field_name in foreign_keys_fields:
-                    continue
-                parameter_name = resource.name + "_" + field_name
-                parameter_id = parameter_name_id[parameter_name]
-                pre_parameter_values.append(dict(
-                    object_name=object_name,
-                    parameter_id=parameter_id,
-                    value=value
-                ))
-    db_map.add_objects(*objects)
-    object_name_id = {x.name: x.id for x in db_map.object_list()}
-    parameter_values = [
-        dict(
-            object_id=object_name_id[p['object_name']],
-            parameter_id=p['parameter_id'],
-            value=p['value']
-        ) for p in pre_parameter_values
-    ]
-    db_map.add_parameter_values(*parameter_values)
-    # Create dictionary of reference resource names => list of reference fields names
-    reference_resource_dict = dict()
-    for resource in datapackage.resources:
-        foreign_keys = resource.schema.foreign_keys
-        for foreign_key in foreign_keys:
-            reference_resource_name = foreign_key["reference"]["resource"]
-            reference_fields_names = foreign_key["reference"]["fields"]
-            reference_resource_dict.setdefault(reference_resource_name, list()).\
-                append(reference_fields_names)
-    # Create dictionary of reference resource name => reference fields names
-    # => reference key => object id
-    reference_object_id_dict = dict()
-    for reference_resource_name, reference_fields_names_list in reference_resource_dict.items():
-        reference_resource = datapackage.get_resource(reference_resource_name)
-        reference_primary_key = reference_resource.schema.primary_key
-        reference_object_id_dict[reference_resource_name] = d1 = dict()
-        for reference_fields_names in reference_fields_names_list:
-            d1[",".join(reference_fields_names)] = d2 = dict()
-            for i, row in enumerate(reference_resource.read(cast=False)):
-                row_dict = dict(zip(reference_resource.schema.field_names, row))
-                # Find object id
-                if reference_primary_key:
-                    reference_object_name = "_".join(row_dict[field] for field in reference_primary_key)
-                else:
-                    reference_object_name = reference_resource_name + str(i)
-                reference_object_id = object_name_id[reference_object_name]
-                key = ",".join([row_dict[x] for x in reference_fields_names])
-                d2[key] = (reference_object_id, reference_object_name)
-    # Create list of relationships
-    relationships = list()
-    for resource in datapackage.resources:
-        primary_key = resource.schema.primary_key
-        foreign_keys = resource.schema.foreign_keys
-        reference_resource_names = [fk['reference']['resource'] for fk in foreign_keys]
-        if not reference_resource_names:
-            continue
-        object_class_name_list = [resource.name] + reference_resource_names
-        relationship_class_name = "__".join(object_class_name_list)
-        relationship_class_id = relationship_class_name_id[relationship_class_name]
-        for i, row in enumerate(resource.read(cast=False)):
-            row_dict = dict(zip(resource.schema.field_names, row))
-            if primary_key:
-                object_name = "_".join(row_dict[field] for field in primary_key)
-            else:
-                object_name = resource.name + str(i)
-            object_id = object_name_id[object_name]
-            object_id_list = [object_id]
-            object_name_list = [object_name]
-            for fk in foreign_keys:
-                fields_names = fk['fields']
-                reference_resource_name = fk['reference']['resource']
-                reference_fields_names = fk['reference']['fields']
-                key = ",".join([row_dict[x] for x in fields_names])
-                d1 = reference_object_id_dict[reference_resource_name]
-                d2 = d1[",".join(reference_fields_names)]
-                reference_object_id, reference_object_name = d2[key]
-                object_id_list.append(reference_object_id)
-                object_name_list.append(reference_object_name)
-            relationship_name = relationship_class_name + "_" + "__".join(object_name_list)
-            relationships.append(dict(
-                class_id=relationship_class_id,
-                object_id_list=object_id_list,
-                name=relationship_name
-            ))
-    db_map.add_wide_relationships(*relationships)
+    references = {(fk[1], fk[2]) for fields in resource_fields for fk in fields.foreign_keys}
+    index = ObjectIndex()
+    try:
+        index.add_objects((x.name, x.id) for x in db_map.object_list())
+        # Add objects and parameter values, and index the reference keys of each resource
+        for resource, fields in zip(resources, resource_fields):
+            progressed(0, "Adding objects and parameter values of {}...".format(fields.name))
+            object_class_id = object_class_name_id[fields.name]
+            parameter_ids = [(k, parameter_name_id[name]) for k, name in fields.parameters]
+            field_index = {name: i for i, name in enumerate(fields.field_names)}
+            key_indexes = [
+                (reference, [field_index[x] for x in reference[1]])
+                for reference in references if reference[0] == fields.name
+            ]
+            for first_row, rows in iter_chunks(resource.iter(cast=False), chunk_size):
+                object_names = [object_name(fields, first_row + i, row) for i, row in enumerate(rows)]
+                object_ids = index.object_ids(set(object_names))
+                objects = [
+                    dict(class_id=object_class_id, name=name)
+                    for name in dict.fromkeys(object_names) if name not in object_ids
+                ]
+                if objects:
+                    new_object_ids = {x.name: x.id for x in db_map.add_objects(*objects)}
+                    index.add_objects(new_object_ids.items())
+                    object_ids.update(new_object_ids)
+                parameter_values = [
+                    dict(object_id=object_ids[name], parameter_id=parameter_id, value=row[k])
+                    for name, row in zip(object_names, rows)
+                    for k, parameter_id in parameter_ids if k < len(row)
+                ]
+                if parameter_values:
+                    db_map.add_parameter_values(*parameter_values)
+                for reference, indexes in key_indexes:
+                    index.add_references(
+                        reference, ((tuple(row[k] for k in indexes), name) for name, row in zip(object_names, rows)))
+                progressed(len(rows) * (1 + len(parameter_ids)))
+        # Add relationships, resolving the foreign keys in the index
+        for resource, fields in zip(resources, resource_fields):
+            if not fields.foreign_keys:
+                continue
+            progressed(0, "Adding relationships of {}...".format(fields.name))
+            relationship_class_id = relationship_class_name_id[fields.relationship_class_name]
+            for first_row, rows in iter_chunks(resource.iter(cast=False), chunk_size):
+                object_names = [object_name(fields, first_row + i, row) for i, row in enumerate(rows)]
+                object_ids = index.object_ids(set(object_names))
+                foreign_keys = [
+                    (field_indexes, index.references(
+                        (reference_resource_name, reference_fields_names),
+                        {tuple(row[k] for k in field_indexes) for row in rows}))
+                    for field_indexes, reference_resource_name, reference_fields_names in fields.foreign_keys
+                ]
+                relationships = list()
+                for name, row in zip(object_names, rows):
+                    object_id_list = [object_ids[name]]
+                    object_name_list = [name]
+                    for field_indexes, d in foreign_keys:
+                        try:
+                            reference_object_id, reference_object_name = d[tuple(row[k] for k in field_indexes)]
+                        except KeyError:
+                            if skip_unresolved:
+                                break
+                            raise
+                        object_id_list.append(reference_object_id)
+                        object_name_list.append(reference_object_name)
+                    else:
+                        relationship_name = fields.relationship_class_name + "_" + "__".join(object_name_list)
+                        relationships.append(dict(
+                            class_id=relationship_class_id,
+                            object_id_list=object_id_list,
+                            name=relationship_name
+                        ))
+                if relationships:
+                    db_map.add_wide_relationships(*relationships)
+                progressed(len(rows))
+    finally:
+        index.close()
+    return step
+
+
+class DatapackageToSpineConverter(QRunnable):
+
+    def __init__(self, db_url, datapackage_descriptor, datapackage_base_path, chunk_size=10000):
+        super().__init__()
+        self.db_url = db_url
+        create_new_spine_database(self.db_url)
+        self.db_map = DiffDatabaseMapping(db_url, getpass.getuser())
+        self.datapackage = Package(datapackage_descriptor, datapackage_base_path)
+        self.chunk_size = chunk_size
+        self.signaler = Signaler()
+
+    def number_of_steps(self):
+        """Returns the number of steps in progress signals. The rows of every resource are counted,
+        but not kept in memory."""
+        resource_fields = [get_resource_fields(x) for x in self.datapackage.resources]
+        row_counts = {x.name: sum(1 for _ in x.iter(cast=False)) for x in self.datapackage.resources}
+        return number_of_steps(resource_fields, row_counts)
+
+    def run(self):
+        try:
+            self._run()
+            self.signaler.finished.emit()
+        except (SpineDBAPIError, SpineIntegrityError) as e:
+            self.signaler.failed.emit(e.msg)
+
+    @staticmethod
+    def object_name(fields, i, row):
+        """Returns the name of the object for row number i of a resource."""
+        if fields.primary_key:
+            object_name_suffix = "_".join(row[k] for k in fields.primary_key)
+        else:
+            object_name_suffix = str(i)
+        return fields.name + "_" + object_name_suffix
+
+    def _run(self):
+        self.signaler.progressed.emit(0, "")
+        step = stream_datapackage_to_spine(
+            self.db_map, self.datapackage.resources, self.object_name, self.chunk_size,
+            self.signaler.progressed.emit, skip_unresolved=True)
+        self.db_map.commit_session("Automatically generated by Spine Toolbox.")
+        self.db_map.close()
+        self.signaler.progressed.emit(step, "")
+
+
+def _object_name(fields, i, row):
+    """Returns the name of the object for row number i of a resource, as named by datapackage_to_spine."""
+    if fields.primary_key:
+        return "_".join(row[k] for k in fields.primary_key)
+    return fields.name + str(i)
+
+
+@busy_effect
+def datapackage_to_spine(db_map, datapackage_file_path, chunk_size=10000):
+    """Convert datapackage from `datapackage_file_path` into Spine `db_map`."""
+    datapackage = Package(datapackage_file_path)
+    stream_datapackage_to_spine(db_map, datapackage.resources, _object_name, chunk_size)
@@ -18,20 +18,26 @@ Functions to import and export from excel to spine database.
 
 # TODO: PEP8: Do not use bare except. Too broad exception clause
 
-from collections import namedtuple
-from itertools import groupby
+from collections import namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, islice
 import json
+import os
 from openpyxl import Workbook, load_workbook
 from openpyxl.utils import get_column_letter
 from spinedatabase_api import SpineDBAPIError, import_data
 import logging
-from operator import itemgetter
+from operator import itemgetter, attrgetter
+import reshape
 
 
 SheetData = namedtuple("SheetData", ["sheet_name", "class_name", "object_classes",
                                      "parameters", "parameter_values", "objects",
                                      "class_type"])
 
+SheetHeader = namedtuple("SheetHeader", ["sheet_name", "sheet_type", "data_type", "class_name",
+                                         "object_classes", "parameters"])
+
 
 def import_xlsx_to_db(db, filepath):
     """reads excel file in 'filepath' and insert into database in mapping 'db'.
@@ -46,9 +52,26 @@ def import_xlsx_to_db(db, filepath):
         (Int, List) Returns number of inserted items and a list of
         error information on all failed writes
     """
-
     obj_data, rel_data, error_log = read_spine_xlsx(filepath)
-    
+    num_imported, errors = import_sheet_data(db, obj_data, rel_data)
+    error_log.extend(errors)
+    return num_imported, error_log
+
+
+def import_sheet_data(db, obj_data, rel_data, import_classes=True):
+    """Imports objects, relationships and parameter values in SheetData into the database in mapping 'db'.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database to write to
+        obj_data (List[SheetData]): data for object classes
+        rel_data (List[SheetData]): data for relationship classes
+        import_classes (bool): if False, classes and parameters are not imported, only
+            the items in them
+
+    Returns:
+        (Int, List) Returns number of inserted items and a list of
+        error information on all failed writes
+    """
     object_classes = []
     objects = []
     object_parameters = []
@@ -73,11 +96,334 @@ def import_xlsx_to_db(db, filepath):
         rel_parameters.extend([(o, sheet.class_name) for o in sheet.parameters])
         rel_values.extend([(sheet.class_name, rel_getter(d)) + d_getter(d) for d in sheet.parameter_values])
 
-    num_imported, errors = import_data(db, object_classes, rel_classes, object_parameters, rel_parameters, objects, rels, object_values, rel_values)
-    error_log.extend(errors)
+    if not import_classes:
+        object_classes, object_parameters, rel_classes, rel_parameters = [], [], [], []
+    return import_data(db, object_classes, rel_classes, object_parameters, rel_parameters, objects, rels, object_values, rel_values)
+
+
+def import_xlsx_to_db_in_chunks(db, filepath, chunk_size=10000, progress_callback=None, max_workers=1):
+    """Streams the excel file in 'filepath' into the database in mapping 'db'.
+    The workbook is opened in read-only mode and each sheet is read row by row, so
+    only one chunk of rows is held in memory at a time. Classes and parameters
+    from all sheets are imported first, then objects, relationships and
+    parameter values are imported sheet by sheet, in chunks of 'chunk_size' rows.
+    With several workers, sheets are read in a pool of processes while earlier sheets
+    are imported, and a few whole sheets are held in memory instead of one chunk.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database to write to
+        filepath (str): str with filepath to excel file to read from
+        chunk_size (int): number of sheet rows to import at a time
+        progress_callback (function): if given, called after each chunk with the
+            sheet name and the number of rows imported so far from that sheet
+        max_workers (int): number of processes reading sheets, None for one per core.
+            With 1, sheets are read in this process.
+
+    Returns:
+        (Int, List) Returns number of inserted items and a list of
+        error information on all failed writes
+    """
+    wb = load_workbook(filepath, read_only=True)
+    num_imported = 0
+    error_log = []
+    try:
+        headers = []
+        for ws in wb.worksheets:
+            header = read_sheet_header(ws)
+            if header is not None:
+                headers.append((ws, header))
+
+        # dicts keep the first occurrence of classes and parameters found in several sheets
+        object_classes = {}
+        rel_classes = {}
+        object_parameters = {}
+        rel_parameters = {}
+        for ws, header in headers:
+            if header.sheet_type == "relationship":
+                rel_classes.setdefault(header.class_name, header.object_classes)
+                rel_parameters.update({(p, header.class_name): None for p in header.parameters})
+            else:
+                object_classes[header.class_name] = None
+                object_parameters.update({(p, header.class_name): None for p in header.parameters})
+        num, errors = import_data(db, list(object_classes), list(rel_classes.items()), list(object_parameters),
+                                  list(rel_parameters), [], [], [], [])
+        num_imported += num
+        error_log.extend(errors)
+
+        if max_workers == 1:
+            sheets = ((header, read_sheet_in_chunks(ws, header, chunk_size)) for ws, header in headers)
+        else:
+            sheets = read_sheets_in_parallel(filepath, [header for _, header in headers], chunk_size, max_workers)
+        for header, chunks in sheets:
+            try:
+                for objects, rels, object_values, rel_values, row_count in chunks:
+                    num, errors = import_data(db, [], [], [], [], objects, rels, object_values, rel_values)
+                    num_imported += num
+                    error_log.extend(errors)
+                    if progress_callback is not None:
+                        progress_callback(header.sheet_name, row_count)
+            except Exception as e:
+                error_log.append(["sheet", header.sheet_name,
+                                  "Error reading sheet {}: {}".format(header.sheet_name, e)])
+    finally:
+        wb.close()
     return num_imported, error_log
 
 
+def read_sheet_header(ws):
+    """Reads the rows describing a sheet in spine format, without reading its data.
+    Works with read-only worksheets.
+
+    Args:
+        ws (openpyxl.workbook.worksheet): worksheet to read from
+
+    Returns:
+        (SheetHeader): header of the sheet, or None if it's not a valid import sheet for spine
+    """
+    rows = [list(row) for row in ws.iter_rows(min_row=1, max_row=4, values_only=True)]
+    rows.extend([] for _ in range(4 - len(rows)))
+    for row in rows:
+        row.extend([None] * (4 - len(row)))
+    sheet_type, data_type = rows[1][0], rows[1][1]
+    if not isinstance(sheet_type, str) or not isinstance(data_type, str):
+        return None
+    sheet_type = sheet_type.lower()
+    data_type = data_type.lower()
+    if sheet_type not in ["relationship", "object"] or data_type not in ["parameter", "json array"]:
+        return None
+    class_name = rows[1][2]
+    if not isinstance(class_name, str) or not class_name:
+        return None
+    if sheet_type == "relationship":
+        dim = rows[1][3]
+        if not isinstance(dim, int) or not dim > 1:
+            return None
+    else:
+        dim = 1
+    if data_type == "parameter":
+        object_classes = rows[3][:dim]
+        object_classes.extend([None] * (dim - len(object_classes)))
+        parameters = []
+        for c, value in enumerate(rows[3]):
+            if value is None:
+                break
+            elif c >= dim:
+                parameters.append(value)
+    else:
+        # object path rows, the parameter row and the first row of values
+        json_rows = [list(row) for row in ws.iter_rows(min_row=4, max_row=5 + dim, values_only=True)]
+        json_rows.extend([] for _ in range(dim + 2 - len(json_rows)))
+        object_classes = [row[0] if row else None for row in json_rows[:dim]]
+        parameters = read_json_header_parameters(json_rows, dim)
+    if sheet_type == "relationship":
+        if None in object_classes or not all(isinstance(r, str) and r for r in object_classes):
+            return None
+    else:
+        object_classes = [class_name]
+    return SheetHeader(sheet_name=ws.title,
+                       sheet_type=sheet_type,
+                       data_type=data_type,
+                       class_name=class_name,
+                       object_classes=object_classes,
+                       parameters=parameters)
+
+
+def read_json_header_parameters(json_rows, dim):
+    """Returns the parameters of the columns in a json array sheet that have values,
+    like read_json_sheet does.
+
+    Args:
+        json_rows (List[List]): rows 4 to 5 + dim of the sheet
+        dim (int): number of object classes in the sheet
+
+    Returns:
+        (List[str]): parameter names, without duplicates
+    """
+    def cell(r, c):
+        row = json_rows[r]
+        return row[c] if c < len(row) else None
+
+    parameters = {}
+    # columns from the second one until first empty cell on row 4
+    for c in range(1, len(json_rows[0])):
+        if cell(0, c) is None:
+            break
+        if any(cell(r, c) is None for r in range(dim + 2)):
+            continue
+        parameters[cell(dim, c)] = None
+    return list(parameters)
+
+
+def read_sheet_in_chunks(ws, header, chunk_size):
+    """Reads the data of a sheet in spine format row by row, and yields it in chunks ready for import_data.
+    Works with read-only worksheets.
+
+    Args:
+        ws (openpyxl.workbook.worksheet): worksheet to read from
+        header (SheetHeader): header of the sheet, as returned by read_sheet_header
+        chunk_size (int): number of rows to read for each chunk
+
+    Returns:
+        (Generator): yields tuples of objects, relationships, object parameter values and
+        relationship parameter values, plus the number of rows read so far
+    """
+    if header.data_type == "json array":
+        yield from read_json_sheet_in_chunks(ws, header, chunk_size)
+        return
+    dim = len(header.object_classes)
+    is_relationship = header.sheet_type == "relationship"
+    class_name = header.class_name
+    parameters = header.parameters
+    seen_objects = set()
+    objects = []
+    object_values = []
+    row_count = 0
+    for row in ws.iter_rows(min_row=5, max_col=dim + len(parameters), values_only=True):
+        row_count += 1
+        key = tuple(row[:dim])
+        if len(key) == dim and None not in key:
+            if key not in seen_objects:
+                seen_objects.add(key)
+                objects.append((class_name, list(key)) if is_relationship else (key[0], class_name))
+            for parameter, value in zip(parameters, row[dim:]):
+                if value is None:
+                    continue
+                if is_relationship:
+                    object_values.append((class_name, key, parameter, "value", value))
+                else:
+                    object_values.append((key[0], parameter, "value", value))
+        if row_count % chunk_size == 0:
+            yield _chunk_for_import(objects, object_values, is_relationship) + (row_count,)
+            objects = []
+            object_values = []
+    if objects or object_values:
+        yield _chunk_for_import(objects, object_values, is_relationship) + (row_count,)
+
+
+def read_json_sheet_in_chunks(ws, header, chunk_size):
+    """Reads a sheet containing json array data row by row, packing each column into a json array.
+    Values are yielded in chunks of 'chunk_size' columns once the whole sheet has been read.
+
+    Args:
+        ws (openpyxl.workbook.worksheet): worksheet to read from
+        header (SheetHeader): header of the sheet, as returned by read_sheet_header
+        chunk_size (int): number of json values to yield for each chunk
+
+    Returns:
+        (Generator): same as read_sheet_in_chunks, counting json arrays instead of rows
+    """
+    dim = len(header.object_classes)
+    is_relationship = header.sheet_type == "relationship"
+    columns = None  # for each read column: [object path, parameter, values, done]
+    for r, row in enumerate(ws.iter_rows(min_row=4, values_only=True)):
+        if columns is None:
+            # read columns from the second one until first empty cell on row 4
+            columns = []
+            for value in row[1:]:
+                if value is None:
+                    break
+                columns.append([[], None, [], False])
+        for c, column in enumerate(columns):
+            if column[3]:
+                continue
+            value = row[c + 1] if c + 1 < len(row) else None
+            if r < dim:
+                column[0].append(value)
+                if value is None:
+                    # invalid column, skip
+                    column[3] = True
+            elif r == dim:
+                column[1] = value
+                if value is None:
+                    # invalid column, skip
+                    column[3] = True
+            elif value is None:
+                column[3] = True
+            else:
+                column[2].append(value)
+        if columns is not None and all(column[3] for column in columns) and r > dim:
+            break
+    object_values = []
+    row_count = 0
+    for object_path, parameter, values, _ in columns or []:
+        if not values or parameter is None or len(object_path) < dim or None in object_path:
+            continue
+        packed_json = json.dumps(values)
+        if is_relationship:
+            object_values.append((header.class_name, tuple(object_path), parameter, "json", packed_json))
+        else:
+            object_values.append((object_path[0], parameter, "json", packed_json))
+        row_count += 1
+        if len(object_values) == chunk_size:
+            yield _chunk_for_import([], object_values, is_relationship) + (row_count,)
+            object_values = []
+    if object_values:
+        yield _chunk_for_import([], object_values, is_relationship) + (row_count,)
+
+
+def read_sheets_in_parallel(filepath, headers, chunk_size, max_workers):
+    """Reads sheets of an excel file in a pool of processes, a few sheets ahead of the one being imported.
+    Yields the header and the chunks of each sheet in the order of the headers,
+    so the import doesn't depend on which sheet is read first.
+
+    Args:
+        filepath (str): str with filepath to excel file to read from
+        headers (List[SheetHeader]): headers of the sheets to read
+        chunk_size (int): number of sheet rows in a chunk
+        max_workers (int): number of processes, None for one per core
+    """
+    read_ahead = 2 * (max_workers or os.cpu_count() or 1)
+    headers = iter(headers)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = deque()
+        for header in islice(headers, read_ahead):
+            futures.append((header, executor.submit(read_sheet_in_process, filepath, header.sheet_name, chunk_size)))
+        while futures:
+            header, future = futures.popleft()
+            for next_header in islice(headers, 1):
+                futures.append((next_header, executor.submit(read_sheet_in_process, filepath,
+                                                             next_header.sheet_name, chunk_size)))
+            chunks, error = future.result()
+            yield header, replay_chunks(chunks, error)
+
+
+def read_sheet_in_process(filepath, sheet_name, chunk_size):
+    """Reads one sheet from an excel file in chunks, opening the workbook in read-only mode.
+    Meant to run in a worker process, so the chunks are returned in a list.
+
+    Returns:
+        (List, Exception): chunks as yielded by read_sheet_in_chunks, and the error that stopped
+        the reading, or None if the whole sheet was read
+    """
+    chunks = []
+    wb = load_workbook(filepath, read_only=True)
+    try:
+        ws = wb[sheet_name]
+        for chunk in read_sheet_in_chunks(ws, read_sheet_header(ws), chunk_size):
+            chunks.append(chunk)
+    except Exception as e:
+        return chunks, e
+    finally:
+        wb.close()
+    return chunks, None
+
+
+def replay_chunks(chunks, error):
+    """Yields chunks read in a worker process and then raises the error that stopped the reading, if any,
+    the same way as reading the sheet in this process would."""
+    yield from chunks
+    if error is not None:
+        raise error
+
+
+def _chunk_for_import(objects, values, is_relationship):
+    """Returns objects and values as the objects, relationships, object values and
+    relationship values arguments for import_data."""
+    if is_relationship:
+        return [], objects, [], values
+    return objects, [], values, []
+
+
 def get_objects_and_parameters(db):
     """Exports all object data from spine database into unstacked list of lists
 
@@ -314,7 +660,7 @@ def get_unstacked_relationships(db):
     data = sorted(data, key=keyfunc)
     for k, v in groupby(data, key=keyfunc):
         values = list(v)
-        rel, par_names = unstack_list_of_tuples(values, ["relationship_class", "relationship", "parameter", "value"], [0, 1], 2, 3)
+        rel, par_names = reshape.unstack_list_of_tuples(values, ["relationship_class", "relationship", "parameter", "value"], [0, 1], 2, 3)
         if len(rel) > 0:
             parameters = par_names[2:]
         else:
@@ -358,7 +704,7 @@ def get_unstacked_objects(db):
     data = sorted(data, key=keyfunc)
     for k, v in groupby(data, key=keyfunc):
         values = list(v)
-        obj, par_names = unstack_list_of_tuples(values, ["object_class", "object", "parameter", "value"], [0, 1], 2, 3)
+        obj, par_names = reshape.unstack_list_of_tuples(values, ["object_class", "object", "parameter", "value"], [0, 1], 2, 3)
         if len(obj) > 0:
             parameters = par_names[2:]
         else:
@@ -519,6 +865,224 @@ def export_spine_database_to_xlsx(db, filepath):
     wb.close()
 
 
+def stream_spine_database_to_xlsx(db, filepath, chunk_size=10000):
+    """Writes all data in a spine database into an excel file, in the same
+    format as export_spine_database_to_xlsx. Parameter values are queried
+    class by class and pivoted on the fly into write-only worksheets, so only
+    the json arrays of one class at the time are held in memory.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database.
+        filepath (str): str with filepath to save excel file to.
+        chunk_size (int): number of rows to fetch from the database at the time.
+    """
+    object_classes, relationship_classes, object_parameters, relationship_parameters = \
+        get_classes_and_parameters(db)
+    wb = Workbook(write_only=True)
+    for rc in relationship_classes:
+        stream_relationships_to_xlsx(wb, rc.name, rc.object_class_name_list.split(','),
+                                     relationship_parameters.get(rc.name, []),
+                                     relationship_value_rows(db, rc.id, chunk_size))
+    for i, oc in enumerate(object_classes):
+        stream_objects_to_xlsx(wb, oc.name, object_parameters.get(oc.name, []),
+                               object_value_rows(db, oc.id, chunk_size), i)
+    i = 0
+    for oc in object_classes:
+        if stream_json_array_to_xlsx(wb, oc.name, [oc.name], object_json_rows(db, oc.id, chunk_size),
+                                     "object", i):
+            i += 1
+    i = 0
+    for rc in relationship_classes:
+        if stream_json_array_to_xlsx(wb, rc.name, rc.object_class_name_list.split(','),
+                                     relationship_json_rows(db, rc.id, chunk_size), "relationship", i):
+            i += 1
+    wb.save(filepath)
+    wb.close()
+
+
+def get_classes_and_parameters(db):
+    """Gets object and relationship classes sorted by name, and their parameter names.
+
+    Args:
+        db (spinedatabase_api.DatabaseMapping): database mapping for database
+
+    Returns:
+        (List, List, Dict, Dict): object classes, relationship classes, and sorted parameter names
+        by object class name and by relationship class name
+    """
+    object_classes = sorted(db.object_class_list().all(), key=attrgetter("name"))
+    relationship_classes = sorted(db.wide_relationship_class_list().all(), key=attrgetter("name"))
+    object_parameters = {}
+    for p in db.object_parameter_list():
+        object_parameters.setdefault(p.object_class_name, set()).add(p.parameter_name)
+    relationship_parameters = {}
+    for p in db.relationship_parameter_list():
+        relationship_parameters.setdefault(p.relationship_class_name, set()).add(p.parameter_name)
+    object_parameters = {k: sorted(v) for k, v in object_parameters.items()}
+    relationship_parameters = {k: sorted(v) for k, v in relationship_parameters.items()}
+    return object_classes, relationship_classes, object_parameters, relationship_parameters
+
+
+def object_value_rows(db, class_id, chunk_size):
+    """Returns a query of (object id, object name, parameter name, value) for all objects
+    in a class, with the rows of each object next to each other.
+    Objects without values get one row with parameter name and value as None."""
+    objects = db.object_list(class_id=class_id).subquery()
+    values = db.object_parameter_value_list().subquery()
+    return db.session.query(objects.c.id, objects.c.name, values.c.parameter_name, values.c.value).\
+        outerjoin(values, values.c.object_id == objects.c.id).\
+        order_by(objects.c.name, objects.c.id).\
+        yield_per(chunk_size)
+
+
+def relationship_value_rows(db, class_id, chunk_size):
+    """Returns a query of (relationship id, object name list, parameter name, value) for all relationships
+    in a class, with the rows of each relationship next to each other.
+    Relationships without values get one row with parameter name and value as None."""
+    relationships = db.wide_relationship_list(class_id=class_id).subquery()
+    values = db.relationship_parameter_value_list().subquery()
+    return db.session.query(relationships.c.id, relationships.c.object_name_list,
+                            values.c.parameter_name, values.c.value).\
+        outerjoin(values, values.c.relationship_id == relationships.c.id).\
+        order_by(relationships.c.object_name_list, relationships.c.id).\
+        yield_per(chunk_size)
+
+
+def object_json_rows(db, class_id, chunk_size):
+    """Returns a query of (object name, parameter name, json) for all json values in a object class."""
+    values = db.object_parameter_value_list().subquery()
+    return db.session.query(values.c.object_name, values.c.parameter_name, values.c.json).\
+        filter(values.c.object_class_id == class_id, values.c.json.isnot(None)).\
+        order_by(values.c.object_name, values.c.parameter_name).\
+        yield_per(chunk_size)
+
+
+def relationship_json_rows(db, class_id, chunk_size):
+    """Returns a query of (object name list, parameter name, json) for all json values in a relationship class."""
+    values = db.relationship_parameter_value_list().subquery()
+    return db.session.query(values.c.object_name_list, values.c.parameter_name, values.c.json).\
+        filter(values.c.relationship_class_id == class_id, values.c.json.isnot(None)).\
+        order_by(values.c.object_name_list, values.c.parameter_name).\
+        yield_per(chunk_size)
+
+
+def pivot_rows(rows, parameters, split_names=False):
+    """Pivots stacked parameter values into one line per object or relationship.
+
+    Args:
+        rows (Iterable): tuples of (id, name, parameter, value), with the rows
+            of each id next to each other.
+        parameters (List[str]): parameter names, one column each.
+        split_names (bool): if True, names are comma separated object name lists
+            and get one column per object.
+
+    Returns:
+        (Generator[List]): names followed by one value per parameter
+    """
+    parameter_column = {p: i for i, p in enumerate(parameters)}
+    for _, item_rows in groupby(rows, key=itemgetter(0)):
+        line = None
+        for _, name, parameter, value in item_rows:
+            if line is None:
+                names = name.split(',') if split_names else [name]
+                offset = len(names)
+                line = names + [None] * len(parameters)
+            if parameter is not None and value is not None:
+                line[offset + parameter_column[parameter]] = value
+        yield line
+
+
+def stream_relationships_to_xlsx(wb, class_name, object_classes, parameters, rows):
+    """Writes parameter values for one relationship class into a new sheet.
+
+    Args:
+        wb (openpyxl.Workbook): write-only excel workbook to write to.
+        class_name (str): relationship class name
+        object_classes (List[str]): object class names of the relationship class
+        parameters (List[str]): parameter names of the relationship class
+        rows (Iterable): stacked parameter values, see pivot_rows
+    """
+    # sheet name can only be 31 chars log
+    title = "rel_" + class_name
+    ws = wb.create_sheet(title if len(title) < 32 else None)
+    ws.append(["Sheet type", "Data type", "relationship class name", "Number of relationship dimensions",
+               "Number of pivoted relationship dimensions"])
+    ws.append(["relationship", "Parameter", class_name, len(object_classes), 0])
+    ws.append([])
+    ws.append(object_classes + parameters)
+    for line in pivot_rows(rows, parameters, split_names=True):
+        ws.append(line)
+
+
+def stream_objects_to_xlsx(wb, class_name, parameters, rows, sheet_index):
+    """Writes parameter values for one object class into a new sheet.
+
+    Args:
+        wb (openpyxl.Workbook): write-only excel workbook to write to.
+        class_name (str): object class name
+        parameters (List[str]): parameter names of the object class
+        rows (Iterable): stacked parameter values, see pivot_rows
+        sheet_index (int): number for the sheet name if the class name is too long
+    """
+    # sheet name can only be 31 chars log
+    title = "obj_" + class_name
+    ws = wb.create_sheet(title if len(title) < 32 else "object_class{}".format(sheet_index))
+    ws.append(["Sheet type", "Data type", "object class name"])
+    ws.append(["object", "Parameter", class_name])
+    ws.append([])
+    ws.append([class_name] + parameters)
+    for line in pivot_rows(rows, parameters):
+        ws.append(line)
+
+
+def stream_json_array_to_xlsx(wb, class_name, object_classes, rows, sheet_type, sheet_index):
+    """Writes json array values for one object or relationship class into a new sheet,
+    one column per value. Nothing is written if the class has no valid json values.
+
+    Args:
+        wb (openpyxl.Workbook): write-only excel workbook to write to.
+        class_name (str): object or relationship class name
+        object_classes (List[str]): object class names of the class
+        rows (Iterable): tuples of (name, parameter, json), where name is a
+            comma separated object name list for relationships
+        sheet_type (str): str with value "relationship" or "object"
+        sheet_index (int): number for the sheet name if the class name is too long
+
+    Returns:
+        (bool): True if a sheet was written
+    """
+    if sheet_type not in ("relationship", "object"):
+        raise ValueError("sheet_type must be a str with value 'relationship' or 'object'")
+    json_vals = []
+    for name, parameter, json_value in rows:
+        try:
+            val = json.loads(json_value.replace("\n", ""))
+        except json.JSONDecodeError:
+            logging.error("error parsing json value for parameter: {} for {} {}".format(parameter, sheet_type, name))
+            continue
+        names = name.split(',') if sheet_type == "relationship" else [name]
+        json_vals.append([names + [parameter], val])
+    if not json_vals:
+        return False
+
+    # sheet name can only be 31 chars log
+    title = "json_" + class_name
+    ws = wb.create_sheet(title if len(title) < 32 else '{}_json{}'.format(sheet_type, sheet_index))
+    if sheet_type == "relationship":
+        ws.append(["Sheet type", "Data type", "relationship class name", "Number of relationship dimensions"])
+        ws.append([sheet_type, "json array", class_name, len(object_classes)])
+    else:
+        ws.append(["Sheet type", "Data type", "object class name"])
+        ws.append([sheet_type, "json array", class_name])
+    ws.append([])
+    title_rows = object_classes + ["json parameter"]
+    for r, title_row in enumerate(title_rows):
+        ws.append([title_row] + [keys[r] for keys, _ in json_vals])
+    for r in range(max(len(val) for _, val in json_vals)):
+        ws.append([None] + [val[r] if r < len(val) else None for _, val in json_vals])
+    return True
+
+
 def read_spine_xlsx(filepath):
     """reads all data from a excel file where the sheets are in valid spine data format
 
@@ -821,7 +1385,7 @@ def read_parameter_sheet(ws):
         key_cols = list(range(0, dim+1, 1))
         val_cols = list(range(dim+1, dim+len(parameters)+1))
         headers = ["parameter_type"] + ["object" + str(x) for x in range(dim)] + parameters
-        data_parameter = stack_list_of_tuples(data, headers, key_cols, val_cols)
+        data_parameter = reshape.stack_list_of_tuples(data, headers, key_cols, val_cols)
         data_parameter = [d for d in data_parameter if d.value is not None]
 
     # find unique relationships from data
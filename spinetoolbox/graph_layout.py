@@ -0,0 +1,393 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Layout engines for the graph view.
+
+The dense engine computes the full N x N shortest-path matrix and optimizes over all vertex pairs.
+The sparse engine never builds that matrix.
+Graph distances are obtained by breadth-first search from a few pivot vertices over a CSR adjacency matrix,
+the initial layout is given by pivot MDS, and then refined by stress majorization
+over the graph edges plus the vertex-pivot pairs (sparse stress).
+Memory is linear in the number of edges plus the number of vertices times the number of pivots.
+
+The arcs of the graph are built from the relationships in the database into parallel NumPy arrays,
+and parallel arcs can be grouped to be drawn as one.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import numpy as np
+from numpy import atleast_1d as arr
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path, dijkstra
+from PySide2.QtCore import QRunnable, QObject, Signal
+
+
+class GraphLayoutSignaler(QObject):
+    finished = Signal(int, object, object, name="finished")
+    failed = Signal(int, "QString", name="failed")
+
+
+class GraphLayoutWorker(QRunnable):
+    """Computes a graph layout in a worker thread.
+    Results are emitted together with the given build id, so the receiver can discard outdated ones.
+
+    Attributes:
+        build_id (int): An id for this layout computation
+        vertex_count (int): Number of vertices
+        src_ind_list (list): Source vertex index of each edge
+        dst_ind_list (list): Destination vertex index of each edge
+        spread (float): Ideal distance between two adjacent vertices
+        heavy_positions (dict): Maps vertex index to a fixed position (QPointF)
+        sparse (bool): Whether to use the sparse engine or the dense one
+    """
+    def __init__(self, build_id, vertex_count, src_ind_list, dst_ind_list, spread, heavy_positions, sparse=False):
+        super().__init__()
+        self.build_id = build_id
+        self.vertex_count = vertex_count
+        self.src_ind_list = src_ind_list
+        self.dst_ind_list = dst_ind_list
+        self.spread = spread
+        self.heavy_positions = heavy_positions
+        self.sparse = sparse
+        self.signaler = GraphLayoutSignaler()
+
+    def run(self):
+        layout = sparse_layout if self.sparse else dense_layout
+        try:
+            x, y = layout(
+                self.vertex_count, self.src_ind_list, self.dst_ind_list, self.spread, self.heavy_positions)
+            self.signaler.finished.emit(self.build_id, x, y)
+        except Exception as e:
+            # Anything left uncaught would die in the thread pool and leave the graph view busy
+            self.signaler.failed.emit(self.build_id, "{}: {}".format(type(e).__name__, e))
+
+
+def shortest_path_matrix(vertex_count, src_ind_list, dst_ind_list, spread):
+    """Return the shortest-path matrix."""
+    N = vertex_count
+    if not N:
+        return None
+    dist = np.zeros((N, N))
+    src_ind = arr(src_ind_list)
+    dst_ind = arr(dst_ind_list)
+    try:
+        dist[src_ind, dst_ind] = dist[dst_ind, src_ind] = spread
+    except IndexError:
+        pass
+    d = dijkstra(dist, directed=False)
+    # Remove infinites and zeros
+    d[d == np.inf] = spread * 3
+    d[d == 0] = spread * 1e-6
+    return d
+
+
+def sets(N):
+    """Return sets of vertex pairs indices."""
+    sets = []
+    for n in range(1, N):
+        pairs = np.zeros((N - n, 2), int)  # pairs on diagonal n
+        pairs[:, 0] = np.arange(N - n)
+        pairs[:, 1] = pairs[:, 0] + n
+        mask = np.mod(range(N - n), 2 * n) < n
+        s1 = pairs[mask]
+        s2 = pairs[~mask]
+        if len(s1) > 0:
+            sets.append(s1)
+        if len(s2) > 0:
+            sets.append(s2)
+    return sets
+
+
+def vertex_coordinates(matrix, heavy_positions={}, iterations=10, weight_exp=-2, initial_diameter=1000):
+    """Return x and y coordinates for each vertex in the graph, computed using VSGD-MS."""
+    N = len(matrix)
+    if N == 1:
+        return [0], [0]
+    mask = np.ones((N, N)) == 1 - np.tril(np.ones((N, N)))  # Upper triangular except diagonal
+    np.random.seed(0)
+    layout = np.random.rand(N, 2) * initial_diameter - initial_diameter / 2  # Random layout with initial diameter
+    heavy_ind_list = list()
+    heavy_pos_list = list()
+    for ind, pos in heavy_positions.items():
+        heavy_ind_list.append(ind)
+        heavy_pos_list.append([pos.x(), pos.y()])
+    heavy_ind = arr(heavy_ind_list)
+    heavy_pos = arr(heavy_pos_list)
+    if heavy_ind.any():
+        layout[heavy_ind, :] = heavy_pos
+    weights = matrix ** weight_exp  # bus-pair weights (lower for distant buses)
+    maxstep = 1 / np.min(weights[mask])
+    minstep = 1 / np.max(weights[mask])
+    lambda_ = np.log(minstep / maxstep) / (iterations - 1)  # exponential decay of allowed adjustment
+    sets_ = sets(N)  # construct sets of bus pairs
+    for iteration in range(iterations):
+        step = maxstep * np.exp(lambda_ * iteration)  # how big adjustments are allowed?
+        rand_order = np.random.permutation(N)  # we don't want to use the same pair order each iteration
+        for p in sets_:
+            v1, v2 = rand_order[p[:, 0]], rand_order[p[:, 1]]  # arrays of vertex1 and vertex2
+            # current distance (possibly accounting for system rescaling)
+            dist = ((layout[v1, 0] - layout[v2, 0]) ** 2 + (layout[v1, 1] - layout[v2, 1]) ** 2) ** 0.5
+            r = (matrix[v1, v2] - dist)[:, None] / 2 * (layout[v1] - layout[v2]) / dist[:, None]  # desired change
+            dx1 = r * np.minimum(1, weights[v1, v2] * step)[:, None]
+            dx2 = -dx1
+            layout[v1, :] += dx1  # update position
+            layout[v2, :] += dx2
+            if heavy_ind.any():
+                layout[heavy_ind, :] = heavy_pos
+    return layout[:, 0], layout[:, 1]
+
+
+def dense_layout(vertex_count, src_ind_list, dst_ind_list, spread, heavy_positions={}):
+    """Return x and y coordinates for each vertex in the graph,
+    computed using VSGD-MS over the full shortest-path matrix."""
+    matrix = shortest_path_matrix(vertex_count, src_ind_list, dst_ind_list, spread)
+    return vertex_coordinates(matrix, heavy_positions)
+
+
+def sparse_adjacency(vertex_count, src_ind_list, dst_ind_list):
+    """Return the symmetric adjacency matrix of the graph in CSR format.
+
+    Args:
+        vertex_count (int): Number of vertices
+        src_ind_list (list): Source vertex index of each edge
+        dst_ind_list (list): Destination vertex index of each edge
+
+    Returns:
+        csr_matrix
+    """
+    src = np.asarray(src_ind_list, dtype=int)
+    dst = np.asarray(dst_ind_list, dtype=int)
+    rows = np.concatenate([src, dst])
+    cols = np.concatenate([dst, src])
+    data = np.ones(len(rows))
+    adjacency = csr_matrix((data, (rows, cols)), shape=(vertex_count, vertex_count))
+    adjacency.sum_duplicates()
+    return adjacency
+
+
+def bfs_distances(adjacency, source):
+    """Return the number of hops from the given source vertex to every other vertex.
+    Unreachable vertices get infinity.
+    """
+    return shortest_path(adjacency, directed=False, unweighted=True, indices=[source])[0]
+
+
+def max_min_pivots(adjacency, pivot_count):
+    """Select pivots by the max-min strategy: each new pivot is the vertex farthest from
+    all the pivots selected so far. Vertices in other connected components are infinitely far,
+    so every component gets at least one pivot as long as there are enough of them.
+
+    Returns:
+        pivots (ndarray): Pivot vertex indices
+        distances (ndarray): Hop distance matrix of shape (len(pivots), vertex_count)
+    """
+    vertex_count = adjacency.shape[0]
+    pivot_count = min(pivot_count, vertex_count)
+    degrees = np.diff(adjacency.indptr)
+    pivots = [int(np.argmax(degrees))]
+    distances = [bfs_distances(adjacency, pivots[0])]
+    min_distance = distances[0].copy()
+    while len(pivots) < pivot_count:
+        min_distance[pivots] = -1
+        pivot = int(np.argmax(min_distance))
+        if min_distance[pivot] <= 0:
+            break
+        pivots.append(pivot)
+        distances.append(bfs_distances(adjacency, pivot))
+        min_distance = np.minimum(min_distance, distances[-1])
+    return np.array(pivots), np.vstack(distances)
+
+
+def pivot_mds(distances):
+    """Return an initial 2D layout by pivot MDS (Brandes & Pich, 2006).
+
+    Args:
+        distances (ndarray): Distance matrix from pivots to all vertices, no infinities
+
+    Returns:
+        ndarray: Coordinates of shape (vertex_count, 2)
+    """
+    squared = distances ** 2
+    centered = squared - squared.mean(axis=1, keepdims=True) - squared.mean(axis=0, keepdims=True) + squared.mean()
+    centered *= -0.5
+    vertex_count = distances.shape[1]
+    layout = np.zeros((vertex_count, 2))
+    if len(distances) < 2:
+        return layout
+    eigenvalues, eigenvectors = np.linalg.eigh(centered.dot(centered.T))
+    order = np.argsort(eigenvalues)[::-1][:2]
+    layout[:, :len(order)] = centered.T.dot(eigenvectors[:, order])
+    return layout
+
+
+def sparse_stress_terms(adjacency, pivots, distances, spread):
+    """Return the terms of the sparse stress function, as arrays.
+    Each term attracts vertex i towards the ideal distance d from vertex j with weight w.
+    Terms are given by the graph edges, plus each vertex and every pivot. Pivot terms are weighted
+    by the number of vertices the pivot stands for, i.e., those closer to it than to any other pivot.
+
+    Returns:
+        i, j, d, w (ndarray): Term vertices, ideal distance and weight
+        slot (ndarray): The position of the pivot in `pivots` for pivot terms, len(pivots) for edge terms
+    """
+    vertex_count = adjacency.shape[0]
+    coo = adjacency.tocoo()
+    edge_mask = coo.row != coo.col
+    edge_i = coo.row[edge_mask]
+    edge_j = coo.col[edge_mask]
+    edge_d = np.full(len(edge_i), float(spread))
+    edge_w = np.full(len(edge_i), 1.0 / spread ** 2)
+    edge_slot = np.full(len(edge_i), len(pivots))
+    region_sizes = np.bincount(np.argmin(distances, axis=0), minlength=len(pivots))
+    pivot_i = np.tile(np.arange(vertex_count), len(pivots))
+    pivot_j = np.repeat(pivots, vertex_count)
+    pivot_slot = np.repeat(np.arange(len(pivots)), vertex_count)
+    pivot_d = distances.ravel() * spread
+    pivot_w = np.repeat(region_sizes, vertex_count).astype(float)
+    pivot_mask = (pivot_i != pivot_j) & (pivot_d > spread)  # Neighbors are already covered by edge terms
+    pivot_i = pivot_i[pivot_mask]
+    pivot_j = pivot_j[pivot_mask]
+    pivot_slot = pivot_slot[pivot_mask]
+    pivot_d = pivot_d[pivot_mask]
+    pivot_w = pivot_w[pivot_mask] / pivot_d ** 2
+    i = np.concatenate([edge_i, pivot_i])
+    j = np.concatenate([edge_j, pivot_j])
+    d = np.concatenate([edge_d, pivot_d])
+    w = np.concatenate([edge_w, pivot_w])
+    slot = np.concatenate([edge_slot, pivot_slot])
+    return i, j, d, w, slot
+
+
+def sparse_layout(
+        vertex_count, src_ind_list, dst_ind_list, spread, heavy_positions={},
+        pivot_count=50, sample_size=10, iterations=30):
+    """Return x and y coordinates for each vertex in the graph,
+    computed using pivot MDS followed by sampled sparse stress majorization.
+
+    Args:
+        vertex_count (int): Number of vertices
+        src_ind_list (list): Source vertex index of each edge
+        dst_ind_list (list): Destination vertex index of each edge
+        spread (float): Ideal distance between two adjacent vertices
+        heavy_positions (dict): Maps vertex index to a fixed position (QPointF)
+        pivot_count (int): Number of pivot vertices
+        sample_size (int): Number of pivots whose terms are considered at each iteration
+        iterations (int): Number of stress majorization iterations
+
+    Returns:
+        x, y (ndarray)
+    """
+    if vertex_count == 1:
+        return np.zeros(1), np.zeros(1)
+    adjacency = sparse_adjacency(vertex_count, src_ind_list, dst_ind_list)
+    pivots, distances = max_min_pivots(adjacency, pivot_count)
+    distances[distances == np.inf] = 3  # Same as the dense engine, unconnected vertices are three hops away
+    layout = pivot_mds(distances * spread)
+    # Scale layout so it best fits the pivot distances
+    pivot_dist = np.linalg.norm(layout[None, :, :] - layout[pivots][:, None, :], axis=2)
+    norm = (pivot_dist ** 2).sum()
+    if norm > 0:
+        layout *= (distances * spread * pivot_dist).sum() / norm
+    # Break ties between vertices that landed on the same spot (e.g., leaves hanging from the same vertex)
+    np.random.seed(0)
+    layout += (np.random.rand(vertex_count, 2) - 0.5) * spread * 1e-2
+    heavy_ind = np.array(list(heavy_positions.keys()), dtype=int)
+    heavy_pos = np.array([[pos.x(), pos.y()] for pos in heavy_positions.values()]).reshape(-1, 2)
+    if heavy_ind.size:
+        layout += heavy_pos.mean(axis=0) - layout[heavy_ind].mean(axis=0)
+        layout[heavy_ind, :] = heavy_pos
+    all_i, all_j, all_d, all_w, slot = sparse_stress_terms(adjacency, pivots, distances, spread)
+    sample_size = min(sample_size, len(pivots))
+    is_sampled = np.ones(len(pivots) + 1, dtype=bool)  # Last position is for edge terms, always sampled
+    for iteration in range(iterations):
+        is_sampled[:-1] = False
+        is_sampled[np.random.choice(len(pivots), sample_size, replace=False)] = True
+        mask = is_sampled[slot]
+        i, j, d, w = all_i[mask], all_j[mask], all_d[mask], all_w[mask]
+        weight_sum = np.bincount(i, weights=w, minlength=vertex_count)
+        free = weight_sum > 0
+        diff = layout[i] - layout[j]
+        dist = np.sqrt((diff ** 2).sum(axis=1))
+        dist[dist == 0] = 1e-6 * spread
+        target = layout[j] + (d / dist)[:, None] * diff
+        x = np.bincount(i, weights=w * target[:, 0], minlength=vertex_count)
+        y = np.bincount(i, weights=w * target[:, 1], minlength=vertex_count)
+        layout[free, 0] = x[free] / weight_sum[free]
+        layout[free, 1] = y[free] / weight_sum[free]
+        if heavy_ind.size:
+            layout[heavy_ind, :] = heavy_pos
+    return layout[:, 0], layout[:, 1]
+
+
+def relationship_arcs(object_ind, object_id_lists):
+    """Return the arcs of the graph, as parallel arrays.
+    Each relationship gives one arc between consecutive objects in its object id list,
+    plus one arc from the last object back to the first one.
+    Arcs touching an object that is not a vertex of the graph are left out.
+
+    Args:
+        object_ind (dict): Maps object id to vertex index
+        object_id_lists (list): Comma separated object id list of each relationship
+
+    Returns:
+        src_inds (ndarray): Source vertex index of each arc
+        dst_inds (ndarray): Destination vertex index of each arc
+        relationship_inds (ndarray): Position in `object_id_lists` of the relationship each arc comes from
+    """
+    split_object_id_lists = [x.split(",") for x in object_id_lists]
+    dims = np.fromiter((len(x) for x in split_object_id_lists), dtype=int, count=len(split_object_id_lists))
+    if not object_ind or not dims.size:
+        empty = np.zeros(0, dtype=int)
+        return empty, empty.copy(), empty.copy()
+    object_ids = np.fromiter(
+        (int(id_) for ids in split_object_id_lists for id_ in ids), dtype=int, count=dims.sum())
+    # Translate object ids into vertex indexes by binary search over the sorted ids, -1 if not a vertex
+    sorted_ids = np.fromiter(object_ind.keys(), dtype=int, count=len(object_ind))
+    sorted_inds = np.fromiter(object_ind.values(), dtype=int, count=len(object_ind))
+    order = np.argsort(sorted_ids)
+    sorted_ids = sorted_ids[order]
+    sorted_inds = sorted_inds[order]
+    pos = np.minimum(np.searchsorted(sorted_ids, object_ids), len(sorted_ids) - 1)
+    vertex_inds = np.where(sorted_ids[pos] == object_ids, sorted_inds[pos], -1)
+    # The next object of the last one in each relationship is the first one
+    starts = np.cumsum(dims) - dims
+    next_pos = np.arange(1, len(object_ids) + 1)
+    next_pos[starts + dims - 1] = starts
+    src_inds = vertex_inds
+    dst_inds = vertex_inds[next_pos]
+    relationship_inds = np.repeat(np.arange(len(dims)), dims)
+    keep = (src_inds >= 0) & (dst_inds >= 0)
+    return src_inds[keep], dst_inds[keep], relationship_inds[keep]
+
+
+def parallel_arc_groups(src_inds, dst_inds):
+    """Group together arcs joining the same pair of vertices, in any direction.
+
+    Args:
+        src_inds (ndarray): Source vertex index of each arc
+        dst_inds (ndarray): Destination vertex index of each arc
+
+    Returns:
+        list: Arrays of arc indexes, one per distinct pair of vertices, in order of first appearance
+    """
+    src_inds = np.asarray(src_inds, dtype=int)
+    dst_inds = np.asarray(dst_inds, dtype=int)
+    if not src_inds.size:
+        return []
+    low = np.minimum(src_inds, dst_inds)
+    high = np.maximum(src_inds, dst_inds)
+    keys = low * (high.max() + 1) + high
+    _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    groups = np.split(np.argsort(inverse, kind="stable"), np.cumsum(counts)[:-1])
+    return [groups[k] for k in np.argsort(first)]
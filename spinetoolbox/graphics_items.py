@@ -1065,14 +1065,17 @@ class ObjectItem(QGraphicsPixmapItem):
         self._views_cursor = {}
         self.shade = QGraphicsRectItem()
         self._selected_color = graph_view_form.palette().highlight()
+        self._low_detail = False
         pixmap = self._graph_view_form.object_icon(object_class_name).pixmap(extent)
-        self.setPixmap(pixmap.scaled(extent, extent))
+        self._pixmap = pixmap.scaled(extent, extent)
+        self.setPixmap(self._pixmap)
         self.setPos(x, y)
         self.setOffset(-0.5 * extent, -0.5 * extent)
         self.setAcceptHoverEvents(True)
         self.setFlag(QGraphicsItem.ItemIsSelectable, enabled=True)
         self.setFlag(QGraphicsItem.ItemIsMovable, enabled=True)
         self.setFlag(QGraphicsItem.ItemIsFocusable, enabled=True)
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
         self.shade.setRect(self.boundingRect())
         self.shade.setBrush(self._selected_color)
         self.shade.setPen(Qt.NoPen)
@@ -1115,6 +1118,7 @@ class ObjectItem(QGraphicsPixmapItem):
             scene = value
             value.addItem(self.label_item)
             self.place_label_item()
+            self.set_low_detail(self._graph_view_form.ui.graphicsView.low_detail)
         return super().itemChange(change, value)
 
     def place_label_item(self):
@@ -1134,6 +1138,17 @@ class ObjectItem(QGraphicsPixmapItem):
         option.setAlignment(alignment)
         self.label_item.document().setDefaultTextOption(option)
 
+    def set_low_detail(self, on):
+        """Draw this item as a plain dot without label (when zooming out), or in full detail."""
+        if on == self._low_detail:
+            return
+        self._low_detail = on
+        if on:
+            self.setPixmap(self._graph_view_form.object_dot_pixmap(self.object_class_name))
+        else:
+            self.setPixmap(self._pixmap)
+        self.label_item.setVisible(not on and self.isVisible())
+
     def make_template(self):
         """Make this object par of a template for a relationship."""
         self.is_template = True
@@ -1362,7 +1377,7 @@ class ObjectItem(QGraphicsPixmapItem):
 
     def set_all_visible(self, on):
         """Set visible status for this item and all related ones."""
-        self.label_item.setVisible(on)
+        self.label_item.setVisible(on and not self._low_detail)
         for item in self.incoming_arc_items + self.outgoing_arc_items:
             item.setVisible(on)
         self.setVisible(on)
@@ -1411,6 +1426,7 @@ class ArcItem(QGraphicsLineItem):
         self.is_dst_hovered = False
         self.is_template = False
         self.template_id = None
+        self._low_detail = False
         src_x = src_item.x()
         src_y = src_item.y()
         dst_x = dst_item.x()
@@ -1439,6 +1455,7 @@ class ArcItem(QGraphicsLineItem):
         self.viewport_cursor = viewport.cursor()
         # Token item
         self.token_item = QGraphicsPixmapItem()
+        self.token_item.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
         if object_class_name_list:
             extent = 3 * width
             join_object_class_name_list = ",".join(object_class_name_list)
@@ -1479,8 +1496,18 @@ class ArcItem(QGraphicsLineItem):
             self.label_item.setZValue(2)  # Arc label over everything
             self.place_token_item()
             self.token_item.setZValue(-1)  # Arc pixmap only above arc
+            self.set_low_detail(self._graph_view_form.ui.graphicsView.low_detail)
         return super().itemChange(change, value)
 
+    def set_low_detail(self, on):
+        """Hide the token (when zooming out), or show it back."""
+        if on == self._low_detail:
+            return
+        self._low_detail = on
+        self.token_item.setVisible(not on)
+        if on:
+            self.label_item.hide()
+
     def make_template(self):
         """Make this arc part of a template for a relationship."""
         self.is_template = True
@@ -1559,6 +1586,70 @@ class ArcItem(QGraphicsLineItem):
         # viewport.setCursor(self.viewport_cursor)
 
 
+class AggregatedArcItem(ArcItem):
+    """Arc item standing for several relationships between the same pair of objects,
+    to use with GraphViewForm.
+    The arc gets thicker with the number of relationships, which are listed in the tooltip.
+    Double-clicking the arc expands it into one arc per relationship.
+
+    Attributes:
+        graph_view_form (GraphViewForm): 'owner'
+        relationships (list): relationships going through this arc
+        is_reversed (list): whether each relationship goes from `dst_item` to `src_item`
+        relationship_class_id (int): relationship class id if all relationships are of the same class, else None
+        object_class_name_list (list): object class names of that relationship class (for finding the pixmap)
+        src_item (ObjectItem): source item
+        dst_item (ObjectItem): destination item
+        width (int): Preferred line width
+        arc_color (QColor): arc color
+        token_color (QColor): bg color for the token
+    """
+    max_listed_relationships = 20
+
+    def __init__(self, graph_view_form, relationships, is_reversed, relationship_class_id, object_class_name_list,
+                 src_item, dst_item, width, arc_color, token_color=QColor()):
+        """Init class."""
+        super().__init__(
+            graph_view_form, None, relationship_class_id, object_class_name_list,
+            src_item, dst_item, width, arc_color, token_color=token_color)
+        self.relationships = relationships
+        self.is_reversed = is_reversed
+
+    def relationship_list_html(self):
+        """Return an html list of the relationships, to show as tooltip."""
+        class_name_dict = self._graph_view_form.relationship_class_name_dict
+        listed = self.relationships[:self.max_listed_relationships]
+        lines = ["<b>{0}</b>: {1}".format(class_name_dict.get(x.class_id, ""), x.object_name_list) for x in listed]
+        unlisted_count = len(self.relationships) - len(listed)
+        if unlisted_count:
+            lines.append("<i>...and {} more</i>".format(unlisted_count))
+        return "<html>{0} relationships (double-click to expand)<br>{1}</html>".format(
+            len(self.relationships), "<br>".join(lines))
+
+    def set_tool_tip(self):
+        """Set tooltip for this item and its token, the first time it's needed."""
+        if self.toolTip():
+            return
+        tool_tip = self.relationship_list_html()
+        self.setToolTip(tool_tip)
+        self.token_item.setToolTip(tool_tip)
+
+    def hoverEnterEvent(self, event):
+        """Set tooltip."""
+        self.set_tool_tip()
+        super().hoverEnterEvent(event)
+
+    def token_hover_enter_event(self, event):
+        """Set tooltip."""
+        self.set_tool_tip()
+        super().token_hover_enter_event(event)
+
+    def mouseDoubleClickEvent(self, event):
+        """Expand into one arc per relationship, once the event is done with."""
+        event.accept()
+        QTimer.singleShot(0, lambda: self._graph_view_form.expand_aggregated_arc_item(self))
+
+
 class ObjectLabelItem(QGraphicsTextItem):
     """Object label item to use with GraphViewForm.
 
@@ -1586,6 +1677,7 @@ class ObjectLabelItem(QGraphicsTextItem):
         self.bg.setFlag(QGraphicsItem.ItemStacksBehindParent)
         self.setFlag(QGraphicsItem.ItemIsSelectable, enabled=False)
         self.setAcceptHoverEvents(False)
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
         self._cursor = self.textCursor()
 
     def set_bg_color(self, bg_color):
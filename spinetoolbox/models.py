@@ -21,14 +21,18 @@ Note: These are Spine Toolbox internal data models.
 import logging
 import os
 import json
+import bisect
+from array import array
+import numpy as np
 from PySide2.QtCore import Qt, Signal, Slot, QModelIndex, QAbstractListModel, QAbstractTableModel, \
-    QSortFilterProxyModel, QAbstractItemModel
+    QSortFilterProxyModel, QAbstractItemModel, QObject, QRunnable, QThreadPool, QPersistentModelIndex
 from PySide2.QtGui import QStandardItem, QStandardItemModel, QBrush, QFont, QIcon, QPixmap, \
     QPainter, QGuiApplication
 from PySide2.QtWidgets import QMessageBox
 from config import INVALID_CHARS, TOOL_OUTPUT_DIR
 from helpers import rename_dir, fix_name_ambiguity, busy_effect
 from spinedatabase_api import SpineDBAPIError, SpineIntegrityError
+from sqlalchemy.exc import SQLAlchemyError
 
 
 class ProjectItemModel(QAbstractItemModel):
@@ -854,17 +858,237 @@ class ConnectionModel(QAbstractTableModel):
             return False
 
 
+class ColumnarRow:
+    """A row of a ColumnarData table. Reads and writes go through to the table's columns."""
+    __slots__ = ("_data", "_row")
+
+    def __init__(self, data, row):
+        self._data = data
+        self._row = row
+
+    def __getitem__(self, column):
+        if isinstance(column, slice):
+            return [values[self._row] for values in self._data.columns[column]]
+        return self._data.columns[column][self._row]
+
+    def __setitem__(self, column, value):
+        self._data.set_value(self._row, column, value)
+
+    def __len__(self):
+        return len(self._data.columns)
+
+    def __iter__(self):
+        row = self._row
+        return (values[row] for values in self._data.columns)
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class ColumnarData:
+    """A list of rows stored column by column, for table models holding many rows.
+    Columns of ints or floats are packed into typed arrays. Other columns are kept in lists,
+    where equal strings share a single object. Values are turned into Python objects
+    only when they are read.
+
+    Supports the parts of the list interface that table models use on `_main_data`.
+    Rows are returned as ColumnarRow objects, which write through to the columns.
+    """
+    _array_types = {'q': int, 'd': float}
+
+    def __init__(self, rows=()):
+        """Initialize class."""
+        self.columns = list()
+        self._row_count = 0
+        self._strings = dict()
+        self.extend(rows)
+
+    def __len__(self):
+        return self._row_count
+
+    def _row_index(self, row):
+        """Returns the given row as a non-negative index, or raises IndexError."""
+        if row < 0:
+            row += self._row_count
+        if not 0 <= row < self._row_count:
+            raise IndexError("row index out of range")
+        return row
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [ColumnarRow(self, i) for i in range(*row.indices(self._row_count))]
+        return ColumnarRow(self, self._row_index(row))
+
+    def __setitem__(self, row, values):
+        if not isinstance(row, slice):
+            row = self._row_index(row)
+            for column, value in enumerate(values):
+                self.set_value(row, column, value)
+            return
+        start, stop, step = row.indices(self._row_count)
+        if step != 1:
+            raise ValueError("extended slices are not supported")
+        rows = [list(values) for values in values]
+        stop = max(start, stop)
+        if len(rows) == stop - start:
+            for i, values in enumerate(rows):
+                self[start + i] = values
+            return
+        del self[start:stop]
+        for i, values in enumerate(rows):
+            self.insert(start + i, values)
+
+    def __delitem__(self, row):
+        if isinstance(row, slice):
+            start, stop, step = row.indices(self._row_count)
+            count = len(range(start, stop, step))
+        else:
+            row = self._row_index(row)
+            count = 1
+        for values in self.columns:
+            del values[row]
+        self._row_count -= count
+
+    def __iter__(self):
+        return (ColumnarRow(self, i) for i in range(self._row_count))
+
+    def __repr__(self):
+        return "ColumnarData({})".format([list(row) for row in self])
+
+    def _intern(self, value):
+        """Returns the shared copy of the given value if it is a string, or the value itself otherwise."""
+        if type(value) is str:
+            return self._strings.setdefault(value, value)
+        return value
+
+    def _new_column(self, values):
+        """Returns a new column holding the given values, packed into an array if possible."""
+        value_types = set(map(type, values))
+        if value_types == {int}:
+            try:
+                return array('q', values)
+            except OverflowError:
+                pass
+        elif value_types == {float}:
+            return array('d', values)
+        return [self._intern(value) for value in values]
+
+    def _unpack_column(self, column):
+        """Replaces an array column with a list, so it can hold values of any type."""
+        values = self.columns[column] = list(self.columns[column])
+        return values
+
+    def _fits(self, values, value):
+        """Returns True if the given value can be stored in the given column as it is."""
+        return not isinstance(values, array) or type(value) is self._array_types[values.typecode]
+
+    def value(self, row, column):
+        """Returns the value at the given row and column."""
+        return self.columns[column][row]
+
+    def set_value(self, row, column, value):
+        """Sets the value at the given row and column."""
+        values = self.columns[column]
+        if self._fits(values, value):
+            try:
+                values[row] = value
+                return
+            except OverflowError:
+                pass
+        if isinstance(values, array):
+            values = self._unpack_column(column)
+        values[row] = self._intern(value)
+
+    def column(self, column):
+        """Returns the values of the given column, as an array or a list. Not to be modified."""
+        return self.columns[column]
+
+    def insert(self, row, values):
+        """Inserts a row before the given row, like list.insert."""
+        values = list(values)
+        if not self._row_count:
+            self.columns = [self._new_column([value]) for value in values]
+            self._row_count = 1
+            return
+        if len(values) != len(self.columns):
+            raise ValueError("expected {} values, got {}".format(len(self.columns), len(values)))
+        row = min(max(row + self._row_count if row < 0 else row, 0), self._row_count)
+        for column, value in enumerate(values):
+            column_values = self.columns[column]
+            if not self._fits(column_values, value):
+                column_values = self._unpack_column(column)
+            try:
+                column_values.insert(row, self._intern(value))
+            except OverflowError:
+                self._unpack_column(column).insert(row, value)
+        self._row_count += 1
+
+    def append(self, values):
+        """Appends a row."""
+        self.insert(self._row_count, values)
+
+    def extend(self, rows):
+        """Appends the given rows, building each column in one pass."""
+        new_columns = [list(values) for values in zip(*rows)]
+        if not new_columns:
+            return
+        if not self._row_count:
+            self.columns = [self._new_column(values) for values in new_columns]
+            self._row_count = len(new_columns[0])
+            return
+        if len(new_columns) != len(self.columns):
+            raise ValueError("expected {} values per row, got {}".format(len(self.columns), len(new_columns)))
+        for column, values in enumerate(new_columns):
+            column_values = self.columns[column]
+            if isinstance(column_values, array):
+                packed = self._new_column(values)
+                if isinstance(packed, array) and packed.typecode == column_values.typecode:
+                    column_values.extend(packed)
+                    continue
+                column_values = self._unpack_column(column)
+            column_values.extend(self._intern(value) for value in values)
+        self._row_count += len(new_columns[0])
+
+    def pop(self, row=-1):
+        """Removes the given row and returns its values as a list."""
+        row = self._row_index(row)
+        values = [column_values.pop(row) for column_values in self.columns]
+        self._row_count -= 1
+        return values
+
+    def insert_column(self, column):
+        """Inserts a column of None values before the given column."""
+        self.columns.insert(column, [None] * self._row_count)
+
+    def pop_column(self, column):
+        """Removes the given column and returns its values as a list."""
+        return list(self.columns.pop(column))
+
+
 class MinimalTableModel(QAbstractTableModel):
     """Table model for outlining simple tabular data.
+    Subclasses holding many rows can set `columnar` to keep their data in a ColumnarData
+    instead of a list of lists.
 
     Attributes:
         parent (QMainWindow): the parent widget, usually an instance of TreeViewForm
     """
+
+    columnar = False
+
     def __init__(self, parent=None):
         """Initialize class"""
         super().__init__(parent)
         self._parent = parent
-        self._main_data = list()  # DisplayRole and EditRole
+        self._main_data = ColumnarData() if self.columnar else list()  # DisplayRole and EditRole
         self.default_flags = Qt.ItemIsEditable | Qt.ItemIsEnabled | Qt.ItemIsSelectable
         self.header = list()  # DisplayRole and EditRole
         self.aux_header = list()  # All the other roles, each entry in the list is a dict
@@ -872,7 +1096,7 @@ class MinimalTableModel(QAbstractTableModel):
     def clear(self):
         """Clear all data in model."""
         self.beginResetModel()
-        self._main_data = list()
+        self._main_data = ColumnarData() if self.columnar else list()
         self.endResetModel()
 
     def flags(self, index):
@@ -1005,6 +1229,8 @@ class MinimalTableModel(QAbstractTableModel):
             return None
         if role not in (Qt.DisplayRole, Qt.EditRole):
             return None
+        if self.columnar:
+            return list(self._main_data.column(column))
         return [self._main_data[row][column] for row in range(self.rowCount())]
 
     def model_data(self, role=Qt.DisplayRole):
@@ -1074,6 +1300,19 @@ class MinimalTableModel(QAbstractTableModel):
         self.endInsertRows()
         return True
 
+    def append_rows(self, rows):
+        """Appends the given rows to the model in one insertion.
+
+        Args:
+            rows (list): rows of data, one value per column
+        """
+        if not rows:
+            return
+        row_count = self.rowCount()
+        self.beginInsertRows(QModelIndex(), row_count, row_count + len(rows) - 1)
+        self._main_data.extend(rows)
+        self.endInsertRows()
+
     def insertColumns(self, column, count, parent=QModelIndex()):
         """Inserts count columns into the model before the given column.
         Items in the new column will be children of the item represented
@@ -1093,6 +1332,9 @@ class MinimalTableModel(QAbstractTableModel):
             return False
         self.beginInsertColumns(parent, column, column + count - 1)
         for j in range(count):
+            if self.columnar:
+                self._main_data.insert_column(column + j)
+                continue
             for i in range(self.rowCount()):
                 self._main_data[i].insert(column + j, None)
         self.endInsertColumns()
@@ -1138,18 +1380,21 @@ class MinimalTableModel(QAbstractTableModel):
         removing_last_column = False
         if self.columnCount() == 1:
             removing_last_column = True
-        for r in self._main_data:
-            r.pop(column)
+        if self.columnar:
+            self._main_data.pop_column(column)
+        else:
+            for r in self._main_data:
+                r.pop(column)
         if removing_last_column:
-            self._main_data = []
+            self._main_data = ColumnarData() if self.columnar else []
         # logging.debug("{0} removed from column:{1}".format(removed_column, column))
         self.endRemoveColumns()
         return True
 
     def reset_model(self, main_data=[], aux_data=None):
-        """Reset model."""
+        """Reset model. A columnar model accepts any iterable of rows as `main_data`."""
         self.beginResetModel()
-        self._main_data = main_data
+        self._main_data = ColumnarData(main_data) if self.columnar else main_data
         self.endResetModel()
 
 
@@ -1346,31 +1591,564 @@ class RelationshipClassListModel(QStandardItemModel):
         self.insertRow(self.rowCount() - 1, relationship_class_item)
 
 
-class ObjectTreeModel(QStandardItemModel):
-    """A class to hold Spine data structure in a treeview."""
+class FetchSignaler(QObject):
+    batch_fetched = Signal(int, list, name="batch_fetched")
+    finished = Signal(int, name="finished")
+    failed = Signal(int, "QString", name="failed")
+
+
+class FetchWorker(QRunnable):
+    """Runs a query in a worker thread, on a database connection of its own.
+    Rows are emitted as dictionaries in batches, together with the given fetch id,
+    so the receiver can discard results of canceled fetches.
+
+    Attributes:
+        fetch_id (int): An id for this fetch
+        engine (Engine): The engine to connect to the database
+        statement (Select): The statement to execute
+        batch_size (int): Number of rows per batch
+    """
+    def __init__(self, fetch_id, engine, statement, batch_size):
+        super().__init__()
+        self.fetch_id = fetch_id
+        self.engine = engine
+        self.statement = statement
+        self.batch_size = batch_size
+        self.canceled = False
+        self.signaler = FetchSignaler()
+
+    def cancel(self):
+        """Stops the fetch after the current batch."""
+        self.canceled = True
+
+    def run(self):
+        try:
+            connection = self.engine.connect()
+            try:
+                result = connection.execution_options(stream_results=True).execute(self.statement)
+                keys = list(result.keys())
+                while not self.canceled:
+                    rows = result.fetchmany(self.batch_size)
+                    if not rows:
+                        break
+                    self.signaler.batch_fetched.emit(self.fetch_id, [dict(zip(keys, row)) for row in rows])
+                result.close()
+            finally:
+                connection.close()
+        except SQLAlchemyError as e:
+            self.signaler.failed.emit(self.fetch_id, str(e))
+            return
+        self.signaler.finished.emit(self.fetch_id)
+
+
+class TextColumn:
+    """A column of strings packed into large shared chunks of text, where each value is located by offsets.
+    A value costs its characters plus three array entries, instead of a whole str object.
+    Replaced and removed values leave their characters behind in the chunks,
+    so the values are packed again into new chunks once such leftovers are more than half of all characters.
+    """
+    chunk_size = 4096
+    min_garbage = 1 << 16  # Number of unused characters below which chunks are never packed again
+
+    def __init__(self, values=()):
+        """Initialize class."""
+        self._reset()
+        self.insert(0, values)
+
+    def _reset(self):
+        self._chunks = list()
+        self._pending = list()  # Strings not yet joined into a chunk
+        self._pending_length = 0
+        self._chunk = array('l')  # Chunk of each value, -1 for None
+        self._start = array('l')
+        self._stop = array('l')
+        self._length = 0  # Characters of the values in the column
+        self._stored = 0  # Characters in chunks, including those of replaced and removed values
+
+    def __len__(self):
+        return len(self._chunk)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def _locate(self, value):
+        """Adds the value to the pending chunk and returns its location."""
+        if value is None:
+            return -1, 0, 0
+        chunk = len(self._chunks)
+        start = self._pending_length
+        self._pending.append(value)
+        self._pending_length += len(value)
+        self._stored += len(value)
+        if len(self._pending) >= self.chunk_size:
+            self._flush()
+        return chunk, start, start + len(value)
+
+    def _flush(self):
+        if self._pending:
+            self._chunks.append("".join(self._pending))
+            self._pending = list()
+            self._pending_length = 0
+
+    def __getitem__(self, i):
+        chunk = self._chunk[i]
+        if chunk < 0:
+            return None
+        if chunk == len(self._chunks):
+            self._flush()
+        return self._chunks[chunk][self._start[i]:self._stop[i]]
+
+    def __setitem__(self, i, value):
+        if value is not None and not isinstance(value, str):
+            raise TypeError("TextColumn only holds strings")
+        self._length -= self._stop[i] - self._start[i]
+        self._chunk[i], self._start[i], self._stop[i] = self._locate(value)
+        self._length += self._stop[i] - self._start[i]
+        self._collect_garbage()
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            self._length -= sum(self._stop[i]) - sum(self._start[i])
+        else:
+            self._length -= self._stop[i] - self._start[i]
+        del self._chunk[i]
+        del self._start[i]
+        del self._stop[i]
+        self._collect_garbage()
+
+    def _collect_garbage(self):
+        """Packs the values again into new chunks if most characters in the chunks are no longer used."""
+        garbage = self._stored - self._length
+        if garbage < self.min_garbage or garbage <= self._length:
+            return
+        values = list(self)
+        self._reset()
+        self.insert(0, values)
+
+    def insert(self, i, values):
+        """Inserts the given values at position i."""
+        if any(value is not None and not isinstance(value, str) for value in values):
+            raise TypeError("TextColumn only holds strings")
+        locations = [self._locate(value) for value in values]
+        self._length += sum(location[2] - location[1] for location in locations)
+        self._chunk[i:i] = array('l', (location[0] for location in locations))
+        self._start[i:i] = array('l', (location[1] for location in locations))
+        self._stop[i:i] = array('l', (location[2] for location in locations))
+
+
+class ItemTable:
+    """Columnar storage for the records of the children of an item in the object tree.
+    The record of a child lives at the child's row. Ids are packed into arrays and strings into TextColumns,
+    other fields are kept in lists.
+    """
+    def __init__(self):
+        """Initialize class."""
+        self.fields = None
+        self.field_index = None
+        self.columns = None
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    @staticmethod
+    def _new_column(field, value):
+        if isinstance(value, int) and not isinstance(value, bool) and (field == 'id' or field.endswith('_id')):
+            return array('q')
+        if isinstance(value, str):
+            return TextColumn()
+        return list()
+
+    @staticmethod
+    def _insert_values(column, row, values):
+        if isinstance(column, TextColumn):
+            column.insert(row, values)
+        elif isinstance(column, array):
+            column[row:row] = array(column.typecode, values)
+        else:
+            column[row:row] = values
+
+    def insert(self, row, records):
+        """Inserts records (dicts) at the given row."""
+        if not records:
+            return
+        if self.fields is None:
+            self.fields = list(records[0])
+            self.field_index = {field: i for i, field in enumerate(self.fields)}
+            self.columns = [self._new_column(field, records[0][field]) for field in self.fields]
+        for i, field in enumerate(self.fields):
+            values = [record.get(field) for record in records]
+            try:
+                self._insert_values(self.columns[i], row, values)
+            except (TypeError, OverflowError):
+                # Values that don't fit, e.g. None in an array of ids
+                self.columns[i] = column = list(self.columns[i])
+                column[row:row] = values
+
+    def remove(self, row, count):
+        """Removes count records starting at the given row."""
+        for column in self.columns or ():
+            del column[row:row + count]
+
+    def record(self, row):
+        """Returns the record at the given row as a new dict."""
+        return {field: column[row] for field, column in zip(self.fields, self.columns)}
+
+    def value(self, row, field):
+        """Returns the value of one field of the record at the given row."""
+        try:
+            return self.columns[self.field_index[field]][row]
+        except (KeyError, TypeError):
+            return None
+
+    def update(self, row, record):
+        """Updates the record at the given row with the given dict."""
+        for field, value in record.items():
+            try:
+                i = self.field_index[field]
+            except KeyError:
+                continue
+            try:
+                self.columns[i][row] = value
+            except (TypeError, OverflowError):
+                self.columns[i] = list(self.columns[i])
+                self.columns[i][row] = value
+
+
+class ObjectTreeItem:
+    """An item in the object tree. Its record lives in the child table of its parent, at its row.
+    Provides the parts of the QStandardItem interface the forms rely on.
+
+    Attributes:
+        model (ObjectTreeModel): The model this item belongs to
+        parent_item (ObjectTreeItem): The parent item
+        row (int): Row of this item in its parent
+        item_type (str): Type of item, one of 'root', 'object_class', 'object', 'relationship_class', 'relationship'
+    """
+    __slots__ = ("model", "parent_item", "row", "item_type", "children", "child_table")
+
+    def __init__(self, model, parent_item, row, item_type):
+        self.model = model
+        self.parent_item = parent_item
+        self.row = row
+        self.item_type = item_type
+        self.children = None
+        self.child_table = None
+
+    def child(self, row, column=0):
+        """Returns the child at the given row, or None."""
+        if column != 0 or not self.children or not 0 <= row < len(self.children):
+            return None
+        return self.children[row]
+
+    def rowCount(self):
+        return len(self.children) if self.children else 0
+
+    def hasChildren(self):
+        return bool(self.children)
+
+    def parent(self):
+        """Returns the parent item, or None for top level items."""
+        if self.parent_item is None or self.parent_item.parent_item is None:
+            return None
+        return self.parent_item
+
+    def data(self, role=Qt.UserRole + 1):
+        return self.model.item_data(self, role)
+
+    def text(self):
+        return self.data(Qt.DisplayRole)
+
+    def index(self):
+        return self.model.indexFromItem(self)
+
+
+class ObjectTreeModel(QAbstractItemModel):
+    """A class to hold Spine data structure in a treeview.
+
+    Items are compact ObjectTreeItem nodes, the data of the children of each item is kept in an ItemTable.
+    Icons, tooltips and fonts are resolved when the view asks for them.
+
+    When `async_fetch` is set, children are fetched in a worker thread and appended as they arrive,
+    and the children of the next few siblings are prefetched in the background.
+    The worker has a database connection of its own, which doesn't see what the mapping keeps on its connection,
+    so children are fetched in the current thread for in-memory databases and while the session has changes.
+    """
+
+    fetch_batch_size = 1000
+    prefetch_count = 2
+    child_type = {
+        "root": "object_class",
+        "object_class": "object",
+        "object": "relationship_class",
+        "relationship_class": "relationship"
+    }
 
     def __init__(self, tree_view_form):
         """Initialize class"""
         super().__init__(tree_view_form)
         self._tree_view_form = tree_view_form
         self.db_map = tree_view_form.db_map
-        self.root_item = QModelIndex()
+        self.root_item = None
         self.bold_font = QFont()
         self.bold_font.setBold(True)
+        self.gray_brush = QBrush(Qt.gray)
         self.is_flat = False
+        self.async_fetch = False
+        self._db_name = None
+        self._db_icon = None
+        self._invisible_root_item = ObjectTreeItem(self, None, 0, None)
+        self._invisible_root_item.children = list()
+        self._items_by_key = None  # (key type, id) -> dict of items, built on first edit
         self._fetched = {
             "object_class": set(),
             "object": set(),
             "relationship_class": set()
         }
+        self._fetch_count = 0
+        self._background_fetch_failed = False
+        self._fetch_keys = {}  # fetch id -> fetch key, for fetches in progress
+        self._workers = {}  # fetch key -> FetchWorker
+        self._requested = {}  # fetch key -> QPersistentModelIndex of the parent waiting for the rows
+        self._prefetched = {}  # fetch key -> rows fetched ahead of request
+
+    def columnCount(self, parent=QModelIndex()):
+        """Returns model column count."""
+        return 1
+
+    def rowCount(self, parent=QModelIndex()):
+        """Returns the number of children of the given index."""
+        return self._item(parent).rowCount()
+
+    def index(self, row, column, parent=QModelIndex()):
+        """Returns index of item with given row, column, and parent."""
+        child = self._item(parent).child(row, column)
+        if child is None:
+            return QModelIndex()
+        return self.createIndex(row, column, child)
+
+    def parent(self, index=QModelIndex()):
+        """Returns index of the parent of given index."""
+        if not index.isValid():
+            return QModelIndex()
+        return self.indexFromItem(index.internalPointer().parent_item)
+
+    def flags(self, index):
+        """Items are edited through dialogs, not in the view."""
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
 
     def data(self, index, role=Qt.DisplayRole):
         """Returns the data stored under the given role for the item referred to by the index."""
-        if role == Qt.ForegroundRole:
-            item_type = index.data(Qt.UserRole)
-            if item_type.endswith('class') and not self.hasChildren(index):
-                return QBrush(Qt.gray)
-        return super().data(index, role)
+        if not index.isValid():
+            return None
+        return self.item_data(index.internalPointer(), role)
+
+    def _item(self, index):
+        """Returns the item at the given index, or the invisible root item if the index is not valid."""
+        if not index.isValid():
+            return self._invisible_root_item
+        return index.internalPointer()
+
+    def itemFromIndex(self, index):
+        """Returns the item at the given index, or None if the index is not valid."""
+        if not index.isValid():
+            return None
+        return index.internalPointer()
+
+    def indexFromItem(self, item):
+        """Returns the index of the given item."""
+        if item is None or item is self._invisible_root_item:
+            return QModelIndex()
+        return self.createIndex(item.row, 0, item)
+
+    def item_data(self, item, role):
+        """Returns the data of the given item for the given role, resolving icons and tooltips on demand."""
+        item_type = item.item_type
+        if role == Qt.UserRole:
+            return item_type
+        if item_type == 'root':
+            if role in (Qt.DisplayRole, Qt.EditRole):
+                return self._db_name
+            if role == Qt.DecorationRole:
+                return self._db_icon
+            return None
+        table = item.parent_item.child_table
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return table.value(item.row, 'object_name_list' if item_type == 'relationship' else 'name')
+        if role == Qt.UserRole + 1:
+            return table.record(item.row)
+        if role == Qt.DecorationRole:
+            if item_type == 'object_class':
+                return self._tree_view_form.object_icon(table.value(item.row, 'name'))
+            if item_type == 'relationship_class':
+                return self._tree_view_form.relationship_icon(table.value(item.row, 'object_class_name_list'))
+            # Objects and relationships have the icon of their class
+            return item.parent_item.data(Qt.DecorationRole)
+        if role == Qt.ToolTipRole:
+            if item_type in ('object_class', 'object'):
+                return table.value(item.row, 'description')
+            if item_type == 'relationship_class':
+                return table.value(item.row, 'object_class_name_list')
+            return None
+        if item_type.endswith('class'):
+            if role == Qt.FontRole:
+                return self.bold_font
+            if role == Qt.ForegroundRole and not self.hasChildren(self.indexFromItem(item)):
+                return self.gray_brush
+        return None
+
+    def clear(self):
+        """Removes all items."""
+        self.beginResetModel()
+        self._invisible_root_item.children = list()
+        self._items_by_key = None
+        self.root_item = None
+        self.endResetModel()
+
+    def insert_rows(self, row, parent, records):
+        """Inserts items for the given records as children of the given index, starting at the given row.
+
+        Args:
+            row (int): row of the first new item
+            parent (QModelIndex): the parent index
+            records (list): dictionaries with the data of the new items
+        """
+        if not records:
+            return
+        parent_item = self._item(parent)
+        item_type = self.child_type[parent_item.item_type]
+        if parent_item.children is None:
+            parent_item.children = list()
+            parent_item.child_table = ItemTable()
+        children = parent_item.children
+        self.beginInsertRows(parent, row, row + len(records) - 1)
+        parent_item.child_table.insert(row, records)
+        new_items = [ObjectTreeItem(self, parent_item, row + i, item_type) for i in range(len(records))]
+        children[row:row] = new_items
+        for i in range(row + len(new_items), len(children)):
+            children[i].row = i
+        if self._items_by_key is not None:
+            self._index_items(new_items)
+        self.endInsertRows()
+
+    def append_rows(self, parent, records):
+        """Appends items for the given records as children of the given index."""
+        self.insert_rows(self.rowCount(parent), parent, records)
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        """Removes count rows starting with the given row under the given parent."""
+        return self._remove_rows(row, count, parent)
+
+    def _remove_rows(self, row, count, parent, renumber=True):
+        """Removes rows. If renumber is False, the rows of the items that follow are left for the caller
+        to update, which saves a pass over the siblings when removing many ranges from the bottom up."""
+        parent_item = self._item(parent)
+        children = parent_item.children
+        if count < 1 or not children or row < 0 or row + count > len(children):
+            return False
+        self.beginRemoveRows(parent, row, row + count - 1)
+        if self._items_by_key is not None:
+            for item in children[row:row + count]:
+                self._unindex_items(self.walk(root=item))
+        del children[row:row + count]
+        parent_item.child_table.remove(row, count)
+        if renumber:
+            self._renumber(parent_item, row)
+        self.endRemoveRows()
+        return True
+
+    @staticmethod
+    def _renumber(parent_item, first):
+        children = parent_item.children
+        for i in range(first, len(children)):
+            children[i].row = i
+
+    def remove_item_list(self, items):
+        """Removes the given items, in as few calls to removeRows as possible."""
+        removed = set(items)
+        rows_per_parent = {}
+        for item in items:
+            ancestor = item.parent_item
+            while ancestor is not None and ancestor not in removed:
+                ancestor = ancestor.parent_item
+            if ancestor is not None:
+                # Goes away with its ancestor
+                continue
+            rows_per_parent.setdefault(item.parent_item, list()).append(item.row)
+        for parent_item, rows in rows_per_parent.items():
+            parent = self.indexFromItem(parent_item)
+            rows.sort(reverse=True)
+            first = last = rows[0]
+            for row in rows[1:]:
+                if row == first - 1:
+                    first = row
+                    continue
+                self._remove_rows(first, last - first + 1, parent, renumber=False)
+                first = last = row
+            self._remove_rows(first, last - first + 1, parent, renumber=False)
+            self._renumber(parent_item, first)
+
+    def walk(self, item_type=None, root=None):
+        """Yields all items in the tree, or under and including the given root, depth-first,
+        optionally only those of the given type."""
+        stack = list(reversed(self._invisible_root_item.children)) if root is None else [root]
+        while stack:
+            item = stack.pop()
+            if item_type is None or item.item_type == item_type:
+                yield item
+            if item.children:
+                stack.extend(reversed(item.children))
+
+    def _index_keys(self, item):
+        """Returns the keys the given item is indexed by: its type and id, and for relationship classes and
+        relationships, the id of each object class or object they involve."""
+        item_type = item.item_type
+        if item_type == 'root':
+            return []
+        keys = [(item_type, self._value(item, 'id'))]
+        if item_type == 'relationship_class':
+            object_class_id_list = self._value(item, 'object_class_id_list')
+            keys.extend(('object_class_member', int(x)) for x in set(object_class_id_list.split(',')))
+        elif item_type == 'relationship':
+            object_id_list = self._value(item, 'object_id_list')
+            keys.extend(('object_member', int(x)) for x in set(object_id_list.split(',')))
+        return keys
+
+    def _index_items(self, items):
+        for item in items:
+            for key in self._index_keys(item):
+                # A dict keeps the items in insertion order and removes any of them in constant time
+                self._items_by_key.setdefault(key, dict())[item] = None
+
+    def _unindex_items(self, items):
+        for item in items:
+            for key in self._index_keys(item):
+                indexed = self._items_by_key.get(key)
+                if indexed is None:
+                    continue
+                indexed.pop(item, None)
+                if not indexed:
+                    del self._items_by_key[key]
+
+    def indexed_items(self, key_type, ids):
+        """Returns items indexed by the given key type and any of the given ids.
+        The index is built on first use, and kept up to date as items are inserted and removed.
+
+        Args:
+            key_type (str): an item type, or 'object_class_member' for relationship classes involving
+                the object classes, or 'object_member' for relationships involving the objects
+            ids (iterable): ids to look up
+        """
+        if self._items_by_key is None:
+            self._items_by_key = {}
+            self._index_items(self.walk())
+        items = list()
+        for id in ids:
+            items.extend(self._items_by_key.get((key_type, id), ()))
+        return items
+
+    def _item_changed(self, item):
+        index = self.indexFromItem(item)
+        self.dataChanged.emit(index, index)
 
     def backward_sweep(self, index, call=None):
         """Sweep the tree from the given index towards the root, and apply `call` on each."""
@@ -1420,417 +2198,402 @@ class ObjectTreeModel(QStandardItemModel):
     def hasChildren(self, parent):
         """Return True if not fetched, so the user can try and expand it."""
         if not parent.isValid():
-            return super().hasChildren(parent)
+            return self.rowCount(parent) > 0
         parent_type = parent.data(Qt.UserRole)
         if parent_type == 'root':
-            return super().hasChildren(parent)
-        if parent_type == 'object_class':
-            object_class_id = parent.data(Qt.UserRole + 1)['id']
-            if object_class_id in self._fetched['object_class']:
-                return super().hasChildren(parent)
-            return True
-        elif parent_type == 'object':
-            if self.is_flat:
-                # The flat model doesn't go beyond the 'object' level
-                return False
-            object_id = parent.data(Qt.UserRole + 1)['id']
-            object_class_id = parent.data(Qt.UserRole + 1)['class_id']
-            if object_id in self._fetched['object']:
-                return super().hasChildren(parent)
-            return True
-        elif parent_type == 'relationship_class':
-            if self.is_flat:
-                # The flat model doesn't go beyond the 'object' level
-                return False
-            object_id = parent.parent().data(Qt.UserRole + 1)['id']
-            relationship_class_id = parent.data(Qt.UserRole + 1)['id']
-            if (object_id, relationship_class_id) in self._fetched['relationship_class']:
-                return super().hasChildren(parent)
-            return True
-        elif parent_type == 'relationship':
+            return self.rowCount(parent) > 0
+        if parent_type == 'relationship':
+            return False
+        if self.is_flat and parent_type in ('object', 'relationship_class'):
+            # The flat model doesn't go beyond the 'object' level
             return False
-        return super().hasChildren(parent)
+        key = self.fetch_key(parent)
+        if key is None or key[1] in self._fetched[parent_type]:
+            return self.rowCount(parent) > 0
+        return True
 
     def canFetchMore(self, parent):
-        """Return True if not fetched."""
+        """Return True if not fetched, nor being fetched."""
         if not parent.isValid():
             return True
         parent_type = parent.data(Qt.UserRole)
         if parent_type == 'root':
             return True
+        if parent_type == 'relationship':
+            return False
+        key = self.fetch_key(parent)
+        return key[1] not in self._fetched[parent_type] and key not in self._requested
+
+    def fetch_key(self, parent):
+        """Returns a key identifying the children of the given index, as a tuple (parent type, id).
+        The id is the one stored in `_fetched`."""
+        parent_type = parent.data(Qt.UserRole)
         if parent_type in ('object_class', 'object'):
-            parent_id = parent.data(Qt.UserRole + 1)['id']
-            return parent_id not in self._fetched[parent_type]
+            return (parent_type, parent.data(Qt.UserRole + 1)['id'])
         if parent_type == 'relationship_class':
             object_id = parent.parent().data(Qt.UserRole + 1)['id']
             relationship_class_id = parent.data(Qt.UserRole + 1)['id']
-            return (object_id, relationship_class_id) not in self._fetched[parent_type]
-        if parent_type == 'relationship':
-            return False
+            return (parent_type, (object_id, relationship_class_id))
+        return None
 
-    @busy_effect
-    def fetchMore(self, parent):
-        """Build the deeper level of the tree"""
-        if not parent.isValid():
-            return False
-        parent_type = parent.data(Qt.UserRole)
-        if parent_type == 'root':
-            return False
+    def children_query(self, parent):
+        """Returns a query for the children of the given index."""
         parent_type = parent.data(Qt.UserRole)
         if parent_type == 'object_class':
-            object_class_item = self.itemFromIndex(parent)
             object_class = parent.data(Qt.UserRole + 1)
-            object_icon = parent.data(Qt.DecorationRole)
-            object_list = self.db_map.object_list(class_id=object_class['id'])
-            object_item_list = list()
-            for object_ in object_list:
-                object_item = QStandardItem(object_.name)
-                object_item.setData('object', Qt.UserRole)
-                object_item.setData(object_._asdict(), Qt.UserRole + 1)
-                object_item.setData(object_.description, Qt.ToolTipRole)
-                object_item.setData(object_icon, Qt.DecorationRole)
-                object_item_list.append(object_item)
-            object_class_item.appendRows(object_item_list)
-            self._fetched['object_class'].add(object_class['id'])
-        elif parent_type == 'object':
-            object_item = self.itemFromIndex(parent)
+            return self.db_map.object_list(class_id=object_class['id'])
+        if parent_type == 'object':
             object_ = parent.data(Qt.UserRole + 1)
-            relationship_class_list = self.db_map.wide_relationship_class_list(object_class_id=object_['class_id'])
-            relationship_class_item_list = list()
-            for relationship_class in relationship_class_list:
-                object_class_id_list = [int(x) for x in relationship_class.object_class_id_list.split(",")]
-                relationship_class_item = QStandardItem(relationship_class.name)
-                relationship_class_item.setData('relationship_class', Qt.UserRole)
-                relationship_class_item.setData(relationship_class._asdict(), Qt.UserRole + 1)
-                relationship_class_item.setData(relationship_class.object_class_name_list, Qt.ToolTipRole)
-                relationship_icon = self._tree_view_form.relationship_icon(relationship_class.object_class_name_list)
-                relationship_class_item.setData(relationship_icon, Qt.DecorationRole)
-                relationship_class_item.setData(self.bold_font, Qt.FontRole)
-                relationship_class_item_list.append(relationship_class_item)
-            object_item.appendRows(relationship_class_item_list)
-            self._fetched['object'].add(object_['id'])
-        elif parent_type == 'relationship_class':
-            relationship_class_item = self.itemFromIndex(parent)
+            return self.db_map.wide_relationship_class_list(object_class_id=object_['class_id'])
+        if parent_type == 'relationship_class':
             relationship_class = parent.data(Qt.UserRole + 1)
-            relationship_icon = parent.data(Qt.DecorationRole)
             object_ = parent.parent().data(Qt.UserRole + 1)
-            relationship_list = self.db_map.wide_relationship_list(
-                class_id=relationship_class['id'],
-                object_id=object_['id']
-                )
-            relationship_item_list = list()
-            for relationship in relationship_list:
-                relationship_item = QStandardItem(relationship.object_name_list)
-                relationship_item.setData('relationship', Qt.UserRole)
-                relationship_item.setData(relationship._asdict(), Qt.UserRole + 1)
-                relationship_item.setData(relationship_icon, Qt.DecorationRole)
-                relationship_item_list.append(relationship_item)
-            relationship_class_item.appendRows(relationship_item_list)
-            self._fetched['relationship_class'].add((object_['id'], relationship_class['id']))
+            return self.db_map.wide_relationship_list(class_id=relationship_class['id'], object_id=object_['id'])
+        return None
+
+    def fetchMore(self, parent):
+        """Build the deeper level of the tree.
+        In async mode, this only starts the fetch, and returns before the children are there."""
+        if not parent.isValid():
+            return False
+        parent_type = parent.data(Qt.UserRole)
+        if parent_type in ('root', 'relationship'):
+            return False
+        key = self.fetch_key(parent)
+        if not self.fetches_in_background():
+            self._fetch_now(parent, key)
+            return
+        self._request_fetch(parent, key)
+        self._prefetch_siblings(parent)
+
+    def fetches_in_background(self):
+        """Returns True if children are fetched in a worker thread.
+        In-memory databases can't be shared with another connection, and items added or edited in the session
+        are staged in diff tables only the mapping's connection can see, so those are fetched directly.
+        After a background fetch fails, all children are fetched directly."""
+        if not self.async_fetch or self._background_fetch_failed:
+            return False
+        if self.db_map.engine.url.database in (None, "", ":memory:"):
+            return False
+        return not self.db_map.has_pending_changes()
+
+    @busy_effect
+    def _fetch_now(self, parent, key):
+        """Fetches the children of the given index in the current thread."""
+        rows = [x._asdict() for x in self.children_query(parent)]
+        self.append_rows(parent, rows)
+        self._fetched[key[0]].add(key[1])
+        self.dataChanged.emit(parent, parent)
+
+    def _request_fetch(self, parent, key):
+        """Appends the children of the given index as soon as they are fetched,
+        starting with those already prefetched."""
+        rows = self._prefetched.pop(key, None)
+        if rows:
+            self.append_rows(parent, rows)
+        if key in self._workers:
+            self._requested[key] = QPersistentModelIndex(parent)
+        elif rows is not None:
+            self._fetched[key[0]].add(key[1])
+        else:
+            self._requested[key] = QPersistentModelIndex(parent)
+            self._start_fetch(parent, key)
         self.dataChanged.emit(parent, parent)
 
+    def _prefetch_siblings(self, parent):
+        """Fetches the children of the next siblings of the given index in the background.
+        Object classes are not prefetched, as they may have too many objects to keep aside."""
+        if parent.data(Qt.UserRole) == 'object_class':
+            return
+        for row in range(parent.row() + 1, parent.row() + 1 + self.prefetch_count):
+            sibling = parent.sibling(row, 0)
+            if not sibling.isValid():
+                break
+            key = self.fetch_key(sibling)
+            if not self.canFetchMore(sibling) or key in self._workers or key in self._prefetched:
+                continue
+            self._start_fetch(sibling, key)
+
+    def _start_fetch(self, parent, key):
+        """Starts a worker to fetch the children of the given index."""
+        self._fetch_count += 1
+        fetch_id = self._fetch_count
+        statement = self.children_query(parent).statement
+        worker = FetchWorker(fetch_id, self.db_map.engine, statement, self.fetch_batch_size)
+        worker.signaler.batch_fetched.connect(self._handle_batch_fetched)
+        worker.signaler.finished.connect(self._handle_fetch_finished)
+        worker.signaler.failed.connect(self._handle_fetch_failed)
+        self._fetch_keys[fetch_id] = key
+        self._workers[key] = worker
+        QThreadPool.globalInstance().start(worker)
+
+    def _cancel_fetch(self, key):
+        """Cancels the fetch with the given key and discards rows fetched so far."""
+        worker = self._workers.pop(key, None)
+        if worker is not None:
+            worker.cancel()
+            self._fetch_keys.pop(worker.fetch_id, None)
+        self._requested.pop(key, None)
+        self._prefetched.pop(key, None)
+
+    def cancel_fetches(self):
+        """Cancels all fetches in progress."""
+        for key in list(self._workers):
+            self._cancel_fetch(key)
+        self._prefetched.clear()
+
+    def _discard_prefetched(self):
+        """Discards rows fetched ahead of request, as they may be outdated after changes in the db."""
+        for key in [key for key in self._workers if key not in self._requested]:
+            self._cancel_fetch(key)
+        self._prefetched.clear()
+
+    def _refetch(self, parent):
+        """Restarts the fetch of the given index if one is in progress, so it picks up changes in the db.
+        Returns True if the fetch was restarted."""
+        key = self.fetch_key(parent)
+        if key not in self._requested:
+            return False
+        self._cancel_fetch(key)
+        self.removeRows(0, self.rowCount(parent), parent)
+        if self.fetches_in_background():
+            self._request_fetch(parent, key)
+        else:
+            self._fetch_now(parent, key)
+        return True
+
+    @Slot(int, list, name="_handle_batch_fetched")
+    def _handle_batch_fetched(self, fetch_id, rows):
+        """Appends fetched rows to their parent, or keeps them aside if the parent hasn't been expanded yet."""
+        key = self._fetch_keys.get(fetch_id)
+        if key is None:
+            return
+        persistent_parent = self._requested.get(key)
+        if persistent_parent is None:
+            self._prefetched.setdefault(key, list()).extend(rows)
+            return
+        if not persistent_parent.isValid():
+            self._cancel_fetch(key)
+            return
+        parent = self.index(persistent_parent.row(), 0, persistent_parent.parent())
+        self.append_rows(parent, rows)
+
+    @Slot(int, name="_handle_fetch_finished")
+    def _handle_fetch_finished(self, fetch_id):
+        """Marks the parent as fetched, or keeps the fetched rows aside if it hasn't been expanded yet."""
+        key = self._fetch_keys.pop(fetch_id, None)
+        if key is None:
+            return
+        del self._workers[key]
+        persistent_parent = self._requested.pop(key, None)
+        if persistent_parent is None:
+            self._prefetched.setdefault(key, list())
+            return
+        self._fetched[key[0]].add(key[1])
+        if persistent_parent.isValid():
+            parent = self.index(persistent_parent.row(), 0, persistent_parent.parent())
+            self.dataChanged.emit(parent, parent)
+
+    @Slot(int, "QString", name="_handle_fetch_failed")
+    def _handle_fetch_failed(self, fetch_id, msg):
+        """Drops the failed fetch and fetches the parent waiting for the rows in the current thread.
+        The worker's connection may not see tables the mapping keeps on its own connection,
+        so children are fetched in the current thread from now on."""
+        key = self._fetch_keys.get(fetch_id)
+        if key is None:
+            return
+        persistent_parent = self._requested.get(key)
+        self._cancel_fetch(key)
+        self._background_fetch_failed = True
+        if persistent_parent is None or not persistent_parent.isValid():
+            return
+        parent = self.index(persistent_parent.row(), 0, persistent_parent.parent())
+        self.removeRows(0, self.rowCount(parent), parent)
+        self._fetch_now(parent, key)
+
     def build_tree(self, db_name, flat=False):
         """Build the first level of the tree"""
+        self.cancel_fetches()
         self.clear()
         self._fetched = {
             "object_class": set(),
             "object": set(),
             "relationship_class": set()
         }
-        self.root_item = QStandardItem(db_name)
-        self.root_item.setData('root', Qt.UserRole)
-        icon = QIcon(":/icons/Spine_db_icon.png")
-        self.root_item.setData(icon, Qt.DecorationRole)
-        object_class_item_list = list()
-        for object_class in self.db_map.object_class_list():
-            object_icon = self._tree_view_form.object_icon(object_class.name)
-            object_class_item = QStandardItem(object_class.name)
-            object_class_item.setData('object_class', Qt.UserRole)
-            object_class_item.setData(object_class._asdict(), Qt.UserRole + 1)
-            object_class_item.setData(object_class.description, Qt.ToolTipRole)
-            object_class_item.setData(object_icon, Qt.DecorationRole)
-            object_class_item.setData(self.bold_font, Qt.FontRole)
-            object_class_item_list.append(object_class_item)
-        self.root_item.appendRows(object_class_item_list)
-        self.appendRow(self.root_item)
-
-    def new_object_class_item(self, object_class):
-        """Returns new object class item."""
-        object_class_item = QStandardItem(object_class.name)
-        object_class_item.setData('object_class', Qt.UserRole)
-        object_class_item.setData(object_class._asdict(), Qt.UserRole + 1)
-        object_class_item.setData(object_class.description, Qt.ToolTipRole)
-        object_class_item.setData(self.bold_font, Qt.FontRole)
-        return object_class_item
-
-    def new_object_item(self, object_):
-        """Returns new object item."""
-        object_item = QStandardItem(object_.name)
-        object_item.setData('object', Qt.UserRole)
-        object_item.setData(object_._asdict(), Qt.UserRole + 1)
-        object_item.setData(object_.description, Qt.ToolTipRole)
-        return object_item
-
-    def new_relationship_class_item(self, wide_relationship_class, object_):
-        """Returns new relationship class item."""
-        relationship_class_item = QStandardItem(wide_relationship_class.name)
-        relationship_class_item.setData(wide_relationship_class._asdict(), Qt.UserRole + 1)
-        relationship_class_item.setData('relationship_class', Qt.UserRole)
-        relationship_class_item.setData(wide_relationship_class.object_class_name_list, Qt.ToolTipRole)
-        relationship_class_item.setData(self.bold_font, Qt.FontRole)
-        return relationship_class_item
-
-    def new_relationship_item(self, wide_relationship):
-        """Returns new relationship item."""
-        relationship_item = QStandardItem(wide_relationship.object_name_list)
-        relationship_item.setData('relationship', Qt.UserRole)
-        relationship_item.setData(wide_relationship._asdict(), Qt.UserRole + 1)
-        return relationship_item
+        self._db_name = db_name
+        self._db_icon = QIcon(":/icons/Spine_db_icon.png")
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self.root_item = ObjectTreeItem(self, self._invisible_root_item, 0, 'root')
+        self._invisible_root_item.children.append(self.root_item)
+        self.endInsertRows()
+        self.append_rows(self.root_item.index(), [x._asdict() for x in self.db_map.object_class_list()])
+
+    def _value(self, item, field):
+        """Returns the value of one field of the given item, without building the whole record."""
+        return item.parent_item.child_table.value(item.row, field)
 
     def add_object_classes(self, object_classes):
         """Add object class items to the model."""
+        root_index = self.root_item.index()
         for object_class in object_classes:
-            object_class_item = self.new_object_class_item(object_class)
-            icon = self._tree_view_form.object_icon(object_class.name)
-            object_class_item.setData(icon, Qt.DecorationRole)
-            for i in range(self.root_item.rowCount()):
-                visited_object_class_item = self.root_item.child(i)
-                visited_object_class = visited_object_class_item.data(Qt.UserRole + 1)
-                if visited_object_class['display_order'] >= object_class.display_order:
-                    self.root_item.insertRow(i, QStandardItem())
-                    self.root_item.setChild(i, 0, object_class_item)
-                    return
-            self.root_item.appendRow(object_class_item)
+            row = self.root_item.rowCount()
+            for visited_item in self.root_item.children:
+                if self._value(visited_item, 'display_order') >= object_class.display_order:
+                    row = visited_item.row
+                    break
+            self.insert_rows(row, root_index, [object_class._asdict()])
 
     def add_objects(self, objects):
         """Add object items to the model."""
+        self._discard_prefetched()
         object_dict = {}
         for object_ in objects:
-            object_dict.setdefault(object_.class_id, list()).append(object_)
+            object_dict.setdefault(object_.class_id, list()).append(object_._asdict())
         # Sweep first level and check if there's something to append
-        for i in range(self.root_item.rowCount()):
-            object_class_item = self.root_item.child(i)
-            object_class_id = object_class_item.data(Qt.UserRole + 1)['id']
+        for object_class_item in list(self.root_item.children):
             try:
-                object_list = object_dict[object_class_id]
+                object_list = object_dict[self._value(object_class_item, 'id')]
             except KeyError:
                 continue
             # If not fetched, fetch it and continue
-            object_class_index = self.indexFromItem(object_class_item)
+            object_class_index = object_class_item.index()
+            if self._refetch(object_class_index):
+                continue
             if self.canFetchMore(object_class_index):
                 self.fetchMore(object_class_index)  # NOTE: this also adds the new items, which are now in the db
                 continue
             # Already fetched, add new items manually
-            object_item_list = list()
-            for object_ in object_list:
-                object_item = self.new_object_item(object_)
-                icon = object_class_item.data(Qt.DecorationRole)
-                object_item.setData(icon, Qt.DecorationRole)
-                object_item_list.append(object_item)
-            object_class_item.appendRows(object_item_list)
+            self.append_rows(object_class_index, object_list)
 
     def add_relationship_classes(self, relationship_classes):
         """Add relationship class items to model."""
+        self._discard_prefetched()
         relationship_class_dict = {}
         for relationship_class in relationship_classes:
-            relationship_class_dict.setdefault(
-                relationship_class.object_class_id_list,
-                list()
-            ).append(relationship_class)
-        items = self.findItems('*', Qt.MatchWildcard | Qt.MatchRecursive, column=0)
-        for visited_item in items:
-            visited_type = visited_item.data(Qt.UserRole)
-            if not visited_type == 'object':
-                continue
-            visited_object = visited_item.data(Qt.UserRole + 1)
-            visited_object_class_id = visited_object['class_id']
-            relationship_class_list = list()
-            for object_class_id_list, relationship_classes in relationship_class_dict.items():
-                if visited_object_class_id in [int(x) for x in object_class_id_list.split(',')]:
-                    relationship_class_list.extend(relationship_classes)
-            if not relationship_class_list:
-                continue
+            object_class_id_list = relationship_class.object_class_id_list
+            for object_class_id in {int(x) for x in object_class_id_list.split(',')}:
+                relationship_class_dict.setdefault(object_class_id, list()).append(relationship_class._asdict())
+        object_class_items = self.indexed_items('object_class', relationship_class_dict)
+        for visited_item in [item for class_item in object_class_items for item in class_item.children or ()]:
+            relationship_class_list = relationship_class_dict[self._value(visited_item, 'class_id')]
             # If not fetched, fetch it and continue
-            visited_index = self.indexFromItem(visited_item)
+            visited_index = visited_item.index()
+            if self._refetch(visited_index):
+                continue
             if self.canFetchMore(visited_index):
                 self.fetchMore(visited_index)  # NOTE: this also adds the new items, which are now in the db
                 continue
             # Already fetched, add new items manually
-            relationship_class_item_list = list()
-            for relationship_class in relationship_class_list:
-                relationship_class_item = self.new_relationship_class_item(relationship_class, visited_object)
-                icon = self._tree_view_form.relationship_icon(relationship_class.object_class_name_list)
-                relationship_class_item.setData(icon, Qt.DecorationRole)
-                relationship_class_item_list.append(relationship_class_item)
-            visited_item.appendRows(relationship_class_item_list)
+            self.append_rows(visited_index, relationship_class_list)
 
     def add_relationships(self, relationships):
         """Add relationship items to model."""
+        self._discard_prefetched()
         relationship_dict = {}
         for relationship in relationships:
             relationship_dict.setdefault(relationship.class_id, list()).append(relationship)
-        items = self.findItems('*', Qt.MatchWildcard | Qt.MatchRecursive, column=0)
-        for visited_item in items:
-            visited_type = visited_item.data(Qt.UserRole)
-            if not visited_type == 'relationship_class':
-                continue
-            visited_relationship_class_id = visited_item.data(Qt.UserRole + 1)['id']
-            try:
-                relationship_list = relationship_dict[visited_relationship_class_id]
-            except KeyError:
-                continue
+        for visited_item in self.indexed_items('relationship_class', relationship_dict):
+            relationship_list = relationship_dict[self._value(visited_item, 'id')]
             # If not fetched, fetch it and continue
-            visited_index = self.indexFromItem(visited_item)
+            visited_index = visited_item.index()
+            if self._refetch(visited_index):
+                continue
             if self.canFetchMore(visited_index):
                 self.fetchMore(visited_index)  # NOTE: this also adds the new items, which are now in the db
                 continue
             # Already fetched, add new items manually
-            relationship_item_list = list()
-            visited_object_id = visited_item.parent().data(Qt.UserRole + 1)['id']
-            for relationship in relationship_list:
-                object_id_list = relationship.object_id_list
-                if visited_object_id not in [int(x) for x in object_id_list.split(',')]:
-                    continue
-                relationship_item = self.new_relationship_item(relationship)
-                icon = visited_item.data(Qt.DecorationRole)
-                relationship_item.setData(icon, Qt.DecorationRole)
-                relationship_item_list.append(relationship_item)
-            visited_item.appendRows(relationship_item_list)
+            visited_object_id = self._value(visited_item.parent_item, 'id')
+            self.append_rows(visited_index, [
+                relationship._asdict() for relationship in relationship_list
+                if visited_object_id in [int(x) for x in relationship.object_id_list.split(',')]
+            ])
+
+    def _update_items(self, item_type, updated_items):
+        """Update items of the given type with the given records, matching by id."""
+        updated_items_dict = {x.id: x for x in updated_items}
+        for visited_item in self.indexed_items(item_type, updated_items_dict):
+            updated_item = updated_items_dict[self._value(visited_item, 'id')]
+            visited_item.parent_item.child_table.update(visited_item.row, updated_item._asdict())
+            self._item_changed(visited_item)
 
     def update_object_classes(self, updated_items):
         """Update object classes in the model."""
-        items = self.findItems("*", Qt.MatchWildcard | Qt.MatchRecursive, column=0)
-        updated_items_dict = {x.id: x for x in updated_items}
-        for visited_item in items:
-            visited_type = visited_item.data(Qt.UserRole)
-            if visited_type != 'object_class':
-                continue
-            visited_id = visited_item.data(Qt.UserRole + 1)['id']
-            try:
-                updated_item = updated_items_dict[visited_id]
-                visited_item.setData(updated_item._asdict(), Qt.UserRole + 1)
-                visited_item.setText(updated_item.name)
-            except KeyError:
-                continue
+        self._update_items('object_class', updated_items)
 
     def update_objects(self, updated_items):
         """Update object in the model.
         This of course means updating the object name in relationship items.
         """
-        items = self.findItems("*", Qt.MatchWildcard | Qt.MatchRecursive, column=0)
+        self._discard_prefetched()
+        self._update_items('object', updated_items)
         updated_items_dict = {x.id: x for x in updated_items}
-        for visited_item in items:
-            visited_type = visited_item.data(Qt.UserRole)
-            if visited_type == 'object':
-                visited_id = visited_item.data(Qt.UserRole + 1)['id']
+        for visited_item in set(self.indexed_items('object_member', updated_items_dict)):
+            object_id_list = [int(x) for x in self._value(visited_item, 'object_id_list').split(",")]
+            object_name_list = self._value(visited_item, 'object_name_list').split(",")
+            for i, id in enumerate(object_id_list):
                 try:
-                    updated_item = updated_items_dict[visited_id]
-                    visited_item.setData(updated_item._asdict(), Qt.UserRole + 1)
-                    visited_item.setText(updated_item.name)
+                    object_name_list[i] = updated_items_dict[id].name
                 except KeyError:
                     continue
-            elif visited_type == 'relationship':
-                relationship = visited_item.data(Qt.UserRole + 1)
-                object_id_list = [int(x) for x in relationship['object_id_list'].split(",")]
-                object_name_list = relationship['object_name_list'].split(",")
-                found = False
-                for i, id in enumerate(object_id_list):
-                    try:
-                        updated_item = updated_items_dict[id]
-                        object_name_list[i] = updated_item.name
-                        found = True
-                    except KeyError:
-                        continue
-                if found:
-                    str_object_name_list = ",".join(object_name_list)
-                    relationship['object_name_list'] = str_object_name_list
-                    visited_item.setText(str_object_name_list)
-                    visited_item.setData(relationship, Qt.UserRole + 1)
+            visited_item.parent_item.child_table.update(
+                visited_item.row, {'object_name_list': ",".join(object_name_list)})
+            self._item_changed(visited_item)
 
     def update_relationship_classes(self, updated_items):
         """Update relationship classes in the model."""
-        items = self.findItems("*", Qt.MatchWildcard | Qt.MatchRecursive, column=0)
-        updated_items_dict = {x.id: x for x in updated_items}
-        for visited_item in items:
-            visited_type = visited_item.data(Qt.UserRole)
-            if visited_type != 'relationship_class':
-                continue
-            visited_id = visited_item.data(Qt.UserRole + 1)['id']
-            try:
-                updated_item = updated_items_dict[visited_id]
-                visited_item.setData(updated_item._asdict(), Qt.UserRole + 1)
-                visited_item.setText(updated_item.name)
-            except KeyError:
-                continue
+        self._discard_prefetched()
+        self._update_items('relationship_class', updated_items)
 
     def update_relationships(self, updated_items):
         """Update relationships in the model.
         NOTE: This may require moving rows if the objects in the relationship have changed."""
-        items = self.findItems("*", Qt.MatchWildcard | Qt.MatchRecursive, column=0)
+        self._discard_prefetched()
         updated_items_dict = {x.id: x for x in updated_items}
         relationships_to_add = set()
-        for visited_item in reversed(items):
-            visited_type = visited_item.data(Qt.UserRole)
-            if visited_type != "relationship":
-                continue
-            visited_id = visited_item.data(Qt.UserRole + 1)['id']
-            try:
-                updated_item = updated_items_dict[visited_id]
-            except KeyError:
-                continue
+        items_to_remove = list()
+        for visited_item in self.indexed_items('relationship', updated_items_dict):
+            updated_item = updated_items_dict[self._value(visited_item, 'id')]
             # Handle changes in object path
-            visited_object_id_list = visited_item.data(Qt.UserRole + 1)['object_id_list']
-            updated_object_id_list = updated_item.object_id_list
-            if visited_object_id_list != updated_object_id_list:
-                visited_index = self.indexFromItem(visited_item)
-                self.removeRows(visited_index.row(), 1, visited_index.parent())
+            if self._value(visited_item, 'object_id_list') != updated_item.object_id_list:
+                items_to_remove.append(visited_item)
                 relationships_to_add.add(updated_item)
             else:
-                visited_item.setText(updated_item.object_name_list)
-                visited_item.setData(updated_item._asdict(), Qt.UserRole + 1)
+                visited_item.parent_item.child_table.update(visited_item.row, updated_item._asdict())
+                self._item_changed(visited_item)
+        self.remove_item_list(items_to_remove)
         self.add_relationships(relationships_to_add)
 
     def remove_items(self, removed_type, removed_ids):
         """Remove all matched items and their 'childs'."""
-        # TODO: try and remove all rows at once, if possible
         if not removed_ids:
             return
-        items = self.findItems('*', Qt.MatchWildcard | Qt.MatchRecursive, column=0)
-        for visited_item in reversed(items):
-            visited_type = visited_item.data(Qt.UserRole)
-            visited = visited_item.data(Qt.UserRole + 1)
-            if visited_type == 'root':
-                continue
-            # Get visited id
-            visited_id = visited['id']
-            visited_index = self.indexFromItem(visited_item)
-            if visited_type == removed_type and visited_id in removed_ids:
-                self.removeRows(visited_index.row(), 1, visited_index.parent())
-            # When removing an object class, also remove 'child' relationship classes
-            if removed_type == 'object_class' and visited_type == 'relationship_class':
-                object_class_id_list = visited['object_class_id_list']
-                if any([id in [int(x) for x in object_class_id_list.split(',')] for id in removed_ids]):
-                    self.removeRows(visited_index.row(), 1, visited_index.parent())
-            # When removing an object, also remove 'child' relationships
-            if removed_type == 'object' and visited_type == 'relationship':
-                object_id_list = visited['object_id_list']
-                if any([id in [int(x) for x in object_id_list.split(',')] for id in removed_ids]):
-                    self.removeRows(visited_index.row(), 1, visited_index.parent())
+        self._discard_prefetched()
+        items_to_remove = self.indexed_items(removed_type, removed_ids)
+        # When removing an object class, also remove 'child' relationship classes
+        if removed_type == 'object_class':
+            items_to_remove.extend(self.indexed_items('object_class_member', removed_ids))
+        # When removing an object, also remove 'child' relationships
+        elif removed_type == 'object':
+            items_to_remove.extend(self.indexed_items('object_member', removed_ids))
+        self.remove_item_list(list(set(items_to_remove)))
+
+    def _path(self, item):
+        """Returns the rows from the root to the given item, to sort items in tree order."""
+        path = list()
+        while item.parent_item is not None:
+            path.append(item.row)
+            item = item.parent_item
+        return path[::-1]
 
     def next_relationship_index(self, index):
         """Find and return next ocurrence of relationship item."""
         if index.data(Qt.UserRole) != 'relationship':
             return None
-        object_name_list = index.data(Qt.DisplayRole)
-        class_id = index.data(Qt.UserRole + 1)["class_id"]
-        items = [item for item in self.findItems(object_name_list, Qt.MatchExactly | Qt.MatchRecursive, column=0)
-                 if item.data(Qt.UserRole + 1)["class_id"] == class_id]
-        position = None
-        for i, item in enumerate(items):
-            if index == self.indexFromItem(item):
-                position = i
-                break
-        if position is None:
+        item = index.internalPointer()
+        items = sorted(self.indexed_items('relationship', [self._value(item, 'id')]), key=self._path)
+        try:
+            position = items.index(item)
+        except ValueError:
             return None
         position = (position + 1) % len(items)
         return self.indexFromItem(items[position])
@@ -1842,10 +2605,21 @@ class SubParameterModel(MinimalTableModel):
     Allows specifying set of columns that are non-editable (e.g., object_class_name)
     # TODO: how column insertion/removal impact fixed_columns?
     """
+
+    columnar = True
+    column_codes_invalidated = Signal("QVariant", name="column_codes_invalidated")
+
     def __init__(self, parent):
         """Initialize class."""
         super().__init__(parent)
         self.gray_brush = self._parent._tree_view_form.palette().button()
+        self._column_codes = dict()
+        self.rowsInserted.connect(self._handle_rows_changed)
+        self.rowsRemoved.connect(self._handle_rows_changed)
+        self.columnsInserted.connect(self._handle_rows_changed)
+        self.columnsRemoved.connect(self._handle_rows_changed)
+        self.modelReset.connect(self.invalidate_column_codes)
+        self.dataChanged.connect(self._handle_data_changed)
 
     def flags(self, index):
         """Make fixed indexes non-editable."""
@@ -1877,8 +2651,92 @@ class SubParameterModel(MinimalTableModel):
             return False
         for k, index in enumerate(indexes):
             self._main_data[index.row()][index.column()] = data[k]
+        self.update_column_codes([(index.row(), index.column()) for index in indexes])
         return True
 
+    def column_codes(self, column):
+        """Returns the given column encoded as integer codes, one per distinct value.
+        The encoding is computed on first use and kept until the column changes.
+
+        Returns:
+            codes (numpy.ndarray): the code of the value in each row
+            values (list): the distinct values, so that `values[code]` is the value with that code
+            code_of (dict): a mapping from each distinct value to its code
+        """
+        try:
+            return self._column_codes[column]
+        except KeyError:
+            pass
+        column_values = self._main_data.column(column)
+        if isinstance(column_values, array) and column_values:
+            # Numbers are encoded in one go, with codes renumbered by first appearance
+            distinct, first_rows, codes = np.unique(
+                np.frombuffer(column_values, dtype=column_values.typecode), return_index=True, return_inverse=True)
+            order = np.argsort(first_rows)
+            renumbered = np.empty_like(order)
+            renumbered[order] = np.arange(len(order))
+            codes = renumbered[codes.ravel()].astype(np.int64)
+            values = distinct[order].tolist()
+            code_of = {value: code for code, value in enumerate(values)}
+        else:
+            code_of = dict()
+            codes = np.fromiter(
+                (code_of.setdefault(value, len(code_of)) for value in column_values),
+                dtype=np.int64, count=len(column_values))
+            values = list(code_of)
+        self._column_codes[column] = encoding = (codes, values, code_of)
+        return encoding
+
+    def value_mask(self, column, values):
+        """Returns a boolean array which is True for rows whose value in the given column
+        is one of the given values."""
+        codes, _, code_of = self.column_codes(column)
+        value_set = np.zeros(len(code_of), dtype=bool)
+        value_set[[code_of[value] for value in values if value in code_of]] = True
+        return value_set[codes]
+
+    def update_column_codes(self, cells):
+        """Updates the encoding of the given (row, column) cells after their values changed."""
+        columns = set()
+        for row, column in cells:
+            try:
+                codes, values, code_of = self._column_codes[column]
+            except KeyError:
+                continue
+            value = self._main_data[row][column]
+            code = code_of.get(value)
+            if code is None:
+                code = code_of[value] = len(values)
+                values.append(value)
+            codes[row] = code
+            columns.add(column)
+        if columns:
+            self.column_codes_invalidated.emit(list(columns))
+
+    def invalidate_column_codes(self, columns=None):
+        """Discards the encoding of the given columns, or of all columns if None."""
+        if columns is None:
+            self._column_codes.clear()
+        else:
+            columns = list(columns)
+            for column in columns:
+                self._column_codes.pop(column, None)
+        self.column_codes_invalidated.emit(columns)
+
+    @Slot("QModelIndex", "int", "int", name="_handle_rows_changed")
+    def _handle_rows_changed(self, parent=None, first=None, last=None):
+        """Discards all column encodings, since rows or columns were inserted or removed."""
+        self.invalidate_column_codes()
+
+    @Slot("QModelIndex", "QModelIndex", "QVector", name="_handle_data_changed")
+    def _handle_data_changed(self, top_left, bottom_right, roles=None):
+        """Updates the encoding of the cells that changed."""
+        self.update_column_codes([
+            (row, column)
+            for row in range(top_left.row(), bottom_right.row() + 1)
+            for column in range(top_left.column(), bottom_right.column() + 1)
+        ])
+
     def items_to_update(self, indexes, data):
         """A list of items (dict) for updating in the database."""
         items_to_update = dict()
@@ -2371,9 +3229,12 @@ class EmptyRelationshipParameterDefinitonModel(EmptyParameterDefinitionModel):
         return items_to_add
 
 
-class ObjectParameterModel(MinimalTableModel):
-    """A model that concatenates several 'sub' object parameter models,
-    one per object class.
+class CompoundParameterModel(MinimalTableModel):
+    """A model that concatenates several 'sub' parameter models, one on top of the other,
+    followed by an empty row model.
+    Keeps an index of cumulative row offsets of the visible sub-models, so that any row
+    can be routed to its sub-model by bisection instead of walking all of them.
+    Subclasses need to implement `accepts_sub_model` and `selection_key`.
     """
     def __init__(self, tree_view_form=None):
         """Init class."""
@@ -2383,57 +3244,72 @@ class ObjectParameterModel(MinimalTableModel):
         self.sub_models = {}
         self.empty_row_model = None
         self.fixed_columns = list()
+        self._row_map_key = None  # The selection the row offset index was built for, None if outdated
+        self._visible_sub_models = list()
+        self._row_offsets = list()  # Number of rows above each visible sub-model
+        self._visible_row_count = 0
+
+    def accepts_sub_model(self, class_id):
+        """Return True if the sub-model for the given class id is visible under the current selection."""
+        raise NotImplementedError()
+
+    def selection_key(self):
+        """Return a tuple with the selection sets that determine which sub-models are visible."""
+        raise NotImplementedError()
+
+    def connect_sub_model(self, model):
+        """Connect signals from a new sub-model so the row offset index is rebuilt
+        whenever its row count changes."""
+        model.rowsInserted.connect(self.invalidate_row_map)
+        model.rowsRemoved.connect(self.invalidate_row_map)
+        model.modelReset.connect(self.invalidate_row_map)
+        model.layoutChanged.connect(self.invalidate_row_map)
+        self.invalidate_row_map()
+
+    def invalidate_row_map(self, *args):
+        """Mark the row offset index as outdated."""
+        self._row_map_key = None
+
+    def refresh_row_map(self):
+        """Rebuild the row offset index if outdated or if the selection has changed."""
+        key = self.selection_key()
+        if self._row_map_key is not None and all(x is y for x, y in zip(key, self._row_map_key)):
+            return
+        self._visible_sub_models = list()
+        self._row_offsets = list()
+        count = 0
+        for class_id, model in self.sub_models.items():
+            if not self.accepts_sub_model(class_id):
+                continue
+            row_count = model.rowCount()
+            if not row_count:
+                continue
+            self._visible_sub_models.append(model)
+            self._row_offsets.append(count)
+            count += row_count
+        self._visible_row_count = count
+        self._row_map_key = key
+
+    def map_to_sub_model(self, row):
+        """Return the sub-model (or the empty row model) where the given row lands,
+        together with the corresponding row in that model."""
+        self.refresh_row_map()
+        if row >= self._visible_row_count:
+            return self.empty_row_model, row - self._visible_row_count
+        k = max(bisect.bisect_right(self._row_offsets, row) - 1, 0)
+        return self._visible_sub_models[k], row - self._row_offsets[k]
 
     def flags(self, index):
         """Return flags for given index.
         Depending on the index's row we will land on a specific model.
-        Models whose object class id is not selected are skipped.
         """
-        row = index.row()
-        column = index.column()
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        for object_class_id, model in self.sub_models.items():
-            if selected_object_class_ids and object_class_id not in selected_object_class_ids:
-                continue
-            if row < model.rowCount():
-                return model.index(row, column).flags()
-            row -= model.rowCount()
-        return self.empty_row_model.index(row, column).flags()
-
-    def data(self, index, role=Qt.DisplayRole):
-        """Return data for given index and role.
-        Depending on the index's row we will land on a specific model.
-        Models whose object class id is not selected are skipped.
-        """
-        row = index.row()
-        column = index.column()
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        for object_class_id, model in self.sub_models.items():
-            if selected_object_class_ids and object_class_id not in selected_object_class_ids:
-                continue
-            if row < model.rowCount():
-                if role == Qt.DecorationRole and column == self.object_class_name_column:
-                     object_class_name = model.index(row, column).data(Qt.DisplayRole)
-                     return self._tree_view_form.object_icon(object_class_name)
-                return model.index(row, column).data(role)
-            row -= model.rowCount()
-        if role == Qt.DecorationRole and column == self.object_class_name_column:
-             object_class_name = self.empty_row_model.index(row, column).data(Qt.DisplayRole)
-             return self._tree_view_form.object_icon(object_class_name)
-        return self.empty_row_model.index(row, column).data(role)
+        model, row = self.map_to_sub_model(index.row())
+        return model.index(row, index.column()).flags()
 
     def rowCount(self, parent=QModelIndex()):
-        """Return the sum of rows in all models.
-        Skip models whose object class id is not selected.
-        """
-        count = 0
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        for object_class_id, model in self.sub_models.items():
-            if selected_object_class_ids and object_class_id not in selected_object_class_ids:
-                continue
-            count += model.rowCount()
-        count += self.empty_row_model.rowCount()
-        return count
+        """Return the sum of rows in all visible models plus the empty row model."""
+        self.refresh_row_map()
+        return self._visible_row_count + self.empty_row_model.rowCount()
 
     def batch_set_data(self, indexes, data):
         """Batch set data for indexes.
@@ -2445,24 +3321,12 @@ class ObjectParameterModel(MinimalTableModel):
             return False
         model_indexes = {}
         model_data = {}
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
         for k, index in enumerate(indexes):
             if not index.isValid():
                 continue
-            row = index.row()
-            column = index.column()
-            for object_class_id, model in self.sub_models.items():
-                if selected_object_class_ids and object_class_id not in selected_object_class_ids:
-                    continue
-                if row < model.rowCount():
-                    model_indexes.setdefault(model, list()).append(model.index(row, column))
-                    model_data.setdefault(model, list()).append(data[k])
-                    break
-                row -= model.rowCount()
-            else:
-                model = self.empty_row_model
-                model_indexes.setdefault(model, list()).append(model.index(row, column))
-                model_data.setdefault(model, list()).append(data[k])
+            model, row = self.map_to_sub_model(index.row())
+            model_indexes.setdefault(model, list()).append(model.index(row, index.column()))
+            model_data.setdefault(model, list()).append(data[k])
         for model in self.sub_models.values():
             model.batch_set_data(
                 model_indexes.get(model, list()),
@@ -2481,32 +3345,18 @@ class ObjectParameterModel(MinimalTableModel):
 
     def insertRows(self, row, count, parent=QModelIndex()):
         """Find the right sub-model (or the empty model) and call insertRows on it."""
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        for object_class_id, model in self.sub_models.items():
-            if selected_object_class_ids and object_class_id not in selected_object_class_ids:
-                continue
-            if row < model.rowCount():
-                return model.insertRows(row, count)
-            row -= model.rowCount()
-        return self.empty_row_model.insertRows(row, count)
+        model, row = self.map_to_sub_model(row)
+        return model.insertRows(row, count)
 
     def removeRows(self, row, count, parent=QModelIndex()):
         """Find the right sub-models (or empty model) and call removeRows on them."""
         if row < 0 or row + count - 1 >= self.rowCount():
             return False
         self.beginRemoveRows(parent, row, row + count - 1)
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
         model_row_sets = dict()
         for i in range(row, row + count):
-            for object_class_id, model in self.sub_models.items():
-                if selected_object_class_ids and object_class_id not in selected_object_class_ids:
-                    continue
-                if i < model.rowCount():
-                    model_row_sets.setdefault(model, set()).add(i)
-                    break
-                i -= model.rowCount()
-            else:
-                model_row_sets.setdefault(self.empty_row_model, set()).add(i)
+            model, sub_row = self.map_to_sub_model(i)
+            model_row_sets.setdefault(model, set()).add(sub_row)
         for model in self.sub_models.values():
             try:
                 row_set = model_row_sets[model]
@@ -2531,6 +3381,31 @@ class ObjectParameterModel(MinimalTableModel):
         self.rowsInserted.emit(QModelIndex(), offset + first, offset + last)
 
 
+class ObjectParameterModel(CompoundParameterModel):
+    """A model that concatenates several 'sub' object parameter models,
+    one per object class.
+    """
+    def accepts_sub_model(self, object_class_id):
+        """Models whose object class id is not selected are skipped."""
+        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
+        return not selected_object_class_ids or object_class_id in selected_object_class_ids
+
+    def selection_key(self):
+        """The visible models only depend on the selected object classes."""
+        return (self._tree_view_form.selected_object_class_ids,)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Return data for given index and role.
+        Depending on the index's row we will land on a specific model.
+        """
+        column = index.column()
+        model, row = self.map_to_sub_model(index.row())
+        if role == Qt.DecorationRole and column == self.object_class_name_column:
+            object_class_name = model.index(row, column).data(Qt.DisplayRole)
+            return self._tree_view_form.object_icon(object_class_name)
+        return model.index(row, column).data(role)
+
+
 class ObjectParameterValueModel(ObjectParameterModel):
     """A model that concatenates several 'sub' object parameter value models,
     one per object class.
@@ -2560,9 +3435,10 @@ class ObjectParameterValueModel(ObjectParameterModel):
             #value_dict.setdefault(object_class_id, set()).add(parameter_value.value)
         for object_class_id, data in data_dict.items():
             source_model = SubParameterValueModel(self)
-            source_model.reset_model([list(x) for x in data])
+            source_model.reset_model(data)
             model = self.sub_models[object_class_id] = ObjectFilterProxyModel(self, object_id_column)
             model.setSourceModel(source_model)
+            self.connect_sub_model(model)
         self.empty_row_model.set_horizontal_header_labels(header)
         self.empty_row_model.clear()
         self.empty_row_model.rowsInserted.connect(self._handle_empty_rows_inserted)
@@ -2575,6 +3451,7 @@ class ObjectParameterValueModel(ObjectParameterModel):
             model.update_filter(selected_object_ids.get(object_class_id, {}))
             model.clear_filtered_out_values()
         self.clear_filtered_out_values()
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     def invalidate_filter(self):
@@ -2582,6 +3459,7 @@ class ObjectParameterValueModel(ObjectParameterModel):
         self.layoutAboutToBeChanged.emit()
         for model in self.sub_models.values():
             model.invalidateFilter()
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     @busy_effect
@@ -2597,14 +3475,8 @@ class ObjectParameterValueModel(ObjectParameterModel):
         for object_class_id, model in self.sub_models.items():
             if selected_object_class_ids and object_class_id not in selected_object_class_ids:
                 continue
-            data = model.sourceModel()._main_data
-            row_count = model.sourceModel().rowCount()
-            for i in range(row_count):
-                if not model.main_filter_accepts_row(i, None):
-                    continue
-                if not model.auto_filter_accepts_row(i, None, ignored_columns=[column]):
-                    continue
-                values.setdefault(data[i][column], set()).add(object_class_id)
+            for value in model.accepted_values(column):
+                values.setdefault(value, set()).add(object_class_id)
         filtered_out = self.filtered_out.get(column, [])
         return [[val not in filtered_out, val, obj_cls_id_set] for val, obj_cls_id_set in values.items()]
 
@@ -2640,14 +3512,14 @@ class ObjectParameterValueModel(ObjectParameterModel):
             try:
                 model = self.sub_models[object_class_id]
                 source_model = model.sourceModel()
-                row_count = source_model.rowCount()
-                source_model.insertRows(row_count, len(data))
-                source_model._main_data[row_count:row_count + len(data)] = data
+                source_model.append_rows(data)
+                source_model.invalidate_column_codes()
             except KeyError:
                 source_model = SubParameterValueModel(self)
                 source_model.reset_model(data)
                 model = self.sub_models[object_class_id] = ObjectFilterProxyModel(self, object_id_column)
                 model.setSourceModel(source_model)
+                self.connect_sub_model(model)
         for row in reversed(rows):
             self.empty_row_model.removeRows(row, 1)
         self.invalidate_filter()
@@ -2663,6 +3535,7 @@ class ObjectParameterValueModel(ObjectParameterModel):
                 continue
             for row_data in model.sourceModel()._main_data:
                 row_data[object_class_name_column] = object_class_name
+            model.sourceModel().invalidate_column_codes([object_class_name_column])
 
     def rename_objects(self, objects):
         """Rename objects in model."""
@@ -2683,6 +3556,7 @@ class ObjectParameterValueModel(ObjectParameterModel):
                     row_data[object_name_column] = object_id_name[object_id]
                 except KeyError:
                     continue
+            source_model.invalidate_column_codes([object_name_column])
 
     def rename_parameter(self, parameter_id, object_class_id, new_name):
         """Rename single parameter in model."""
@@ -2695,12 +3569,14 @@ class ObjectParameterValueModel(ObjectParameterModel):
         for row_data in model.sourceModel()._main_data:
             if row_data[parameter_id_column] == parameter_id:
                 row_data[parameter_name_column] = new_name
+        model.sourceModel().invalidate_column_codes([parameter_name_column])
 
     def remove_object_classes(self, object_classes):
         """Remove object classes from model."""
         self.layoutAboutToBeChanged.emit()
         for object_class in object_classes:
             self.sub_models.pop(object_class['id'], None)
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     def remove_objects(self, objects):
@@ -2758,7 +3634,8 @@ class ObjectParameterDefinitionModel(ObjectParameterModel):
             data_dict.setdefault(object_class_id, list()).append(parameter_definition)
         for object_class_id, data in data_dict.items():
             model = self.sub_models[object_class_id] = SubParameterDefinitionModel(self)
-            model.reset_model([list(x) for x in data])
+            model.reset_model(data)
+            self.connect_sub_model(model)
         self.empty_row_model.set_horizontal_header_labels(header)
         self.empty_row_model.clear()
         self.empty_row_model.rowsInserted.connect(self._handle_empty_rows_inserted)
@@ -2766,6 +3643,7 @@ class ObjectParameterDefinitionModel(ObjectParameterModel):
     def update_filter(self):
         """Update filter."""
         self.layoutAboutToBeChanged.emit()
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     def move_rows_to_sub_models(self, rows):
@@ -2779,10 +3657,12 @@ class ObjectParameterDefinitionModel(ObjectParameterModel):
             object_class_id = row_data[object_class_id_column]
             model_data_dict.setdefault(object_class_id, list()).append(row_data)
         for object_class_id, data in model_data_dict.items():
-            model = self.sub_models.setdefault(object_class_id, SubParameterDefinitionModel(self))
-            row_count = model.rowCount()
-            model.insertRows(row_count, len(data))
-            model._main_data[row_count:row_count + len(data)] = data
+            try:
+                model = self.sub_models[object_class_id]
+            except KeyError:
+                model = self.sub_models[object_class_id] = SubParameterDefinitionModel(self)
+                self.connect_sub_model(model)
+            model.append_rows(data)
         for row in reversed(rows):
             self.empty_row_model.removeRows(row, 1)
         self.update_filter()
@@ -2804,19 +3684,17 @@ class ObjectParameterDefinitionModel(ObjectParameterModel):
         self.layoutAboutToBeChanged.emit()
         for object_class in object_classes:
             self.sub_models.pop(object_class['id'], None)
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
 
-class RelationshipParameterModel(MinimalTableModel):
+class RelationshipParameterModel(CompoundParameterModel):
     """A model that combines several relationship parameter models
     (one per relationship class), one on top of the other.
     """
     def __init__(self, tree_view_form=None):
         """Init class."""
         super().__init__(tree_view_form)
-        self._tree_view_form = tree_view_form
-        self.db_map = tree_view_form.db_map
-        self.sub_models = {}
         self.object_class_id_lists = {}
         self.empty_row_model = EmptyRowModel(self)
 
@@ -2827,192 +3705,37 @@ class RelationshipParameterModel(MinimalTableModel):
             for x in self.db_map.wide_relationship_class_list()
         }
 
-    def flags(self, index):
-        """Return flags for given index.
-        Depending on the index's row we will land on a specific model.
-        Models whose relationship class id is not selected are skipped.
+    def accepts_sub_model(self, relationship_class_id):
+        """Models whose relationship class id is not selected are skipped.
         Models whose object class id list doesn't intersect the selected ones are also skipped.
         """
-        row = index.row()
-        column = index.column()
         selected_object_class_ids = self._tree_view_form.selected_object_class_ids
         selected_relationship_class_ids = self._tree_view_form.selected_relationship_class_ids
-        for relationship_class_id, model in self.sub_models.items():
-            if selected_object_class_ids:
-                object_class_id_list = self.object_class_id_lists[relationship_class_id]
-                if not selected_object_class_ids.intersection(object_class_id_list):
-                    continue
-            if selected_relationship_class_ids:
-                if relationship_class_id not in selected_relationship_class_ids:
-                    continue
-            if row < model.rowCount():
-                return model.index(row, column).flags()
-            row -= model.rowCount()
-        return self.empty_row_model.index(row, column).flags()
+        if selected_object_class_ids:
+            object_class_id_list = self.object_class_id_lists[relationship_class_id]
+            if not selected_object_class_ids.intersection(object_class_id_list):
+                return False
+        if selected_relationship_class_ids:
+            if relationship_class_id not in selected_relationship_class_ids:
+                return False
+        return True
+
+    def selection_key(self):
+        """The visible models depend on the selected object and relationship classes."""
+        return (
+            self._tree_view_form.selected_object_class_ids,
+            self._tree_view_form.selected_relationship_class_ids)
 
     def data(self, index, role=Qt.DisplayRole):
         """Return data for given index and role.
         Depending on the index's row we will land on a specific model.
-        Models whose relationship class id is not selected are skipped.
-        Models whose object class id list doesn't intersect the selected ones are also skipped.
         """
-        row = index.row()
         column = index.column()
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        selected_relationship_class_ids = self._tree_view_form.selected_relationship_class_ids
-        for relationship_class_id, model in self.sub_models.items():
-            if selected_object_class_ids:
-                object_class_id_list = self.object_class_id_lists[relationship_class_id]
-                if not selected_object_class_ids.intersection(object_class_id_list):
-                    continue
-            if selected_relationship_class_ids:
-                if relationship_class_id not in selected_relationship_class_ids:
-                    continue
-            if row < model.rowCount():
-                if role == Qt.DecorationRole and column == self.relationship_class_name_column:
-                     object_class_name_list = model.index(row, self.object_class_name_list_column).\
-                        data(Qt.DisplayRole)
-                     return self._tree_view_form.relationship_icon(object_class_name_list)
-                return model.index(row, column).data(role)
-            row -= model.rowCount()
+        model, row = self.map_to_sub_model(index.row())
         if role == Qt.DecorationRole and column == self.relationship_class_name_column:
-             object_class_name_list = self.empty_row_model.index(row, self.object_class_name_list_column).\
-                data(Qt.DisplayRole)
-             return self._tree_view_form.relationship_icon(object_class_name_list)
-        return self.empty_row_model.index(row, column).data(role)
-
-    def rowCount(self, parent=QModelIndex()):
-        """Return the sum of rows in all models.
-        Models whose relationship class id is not selected are skipped.
-        Models whose object class id list doesn't intersect the selected ones are also skipped.
-        """
-        count = 0
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        selected_relationship_class_ids = self._tree_view_form.selected_relationship_class_ids
-        for relationship_class_id, model in self.sub_models.items():
-            if selected_object_class_ids:
-                object_class_id_list = self.object_class_id_lists[relationship_class_id]
-                if not selected_object_class_ids.intersection(object_class_id_list):
-                    continue
-            if selected_relationship_class_ids:
-                if relationship_class_id not in selected_relationship_class_ids:
-                    continue
-            count += model.rowCount()
-        count += self.empty_row_model.rowCount()
-        return count
-
-    def batch_set_data(self, indexes, data):
-        """Batch set data for indexes.
-        Distribute indexes and data among the different submodels
-        and call batch_set_data on each of them."""
-        if not indexes:
-            return False
-        if len(indexes) != len(data):
-            return False
-        model_indexes = {}
-        model_data = {}
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        selected_relationship_class_ids = self._tree_view_form.selected_relationship_class_ids
-        for k, index in enumerate(indexes):
-            if not index.isValid():
-                continue
-            row = index.row()
-            column = index.column()
-            for relationship_class_id, model in self.sub_models.items():
-                if selected_object_class_ids:
-                    object_class_id_list = self.object_class_id_lists[relationship_class_id]
-                    if not selected_object_class_ids.intersection(object_class_id_list):
-                        continue
-                if selected_relationship_class_ids:
-                    if relationship_class_id not in selected_relationship_class_ids:
-                        continue
-                if row < model.rowCount():
-                    model_indexes.setdefault(model, list()).append(model.index(row, column))
-                    model_data.setdefault(model, list()).append(data[k])
-                    break
-                row -= model.rowCount()
-            else:
-                model = self.empty_row_model
-                model_indexes.setdefault(model, list()).append(model.index(row, column))
-                model_data.setdefault(model, list()).append(data[k])
-        for model in self.sub_models.values():
-            model.batch_set_data(
-                model_indexes.get(model, list()),
-                model_data.get(model, list()))
-        model = self.empty_row_model
-        model.batch_set_data(
-            model_indexes.get(model, list()),
-            model_data.get(model, list()))
-        # Find square envelope of indexes to emit dataChanged
-        top = min(ind.row() for ind in indexes)
-        bottom = max(ind.row() for ind in indexes)
-        left = min(ind.column() for ind in indexes)
-        right = max(ind.column() for ind in indexes)
-        self.dataChanged.emit(self.index(top, left), self.index(bottom, right))
-        return True
-
-    def insertRows(self, row, count, parent=QModelIndex()):
-        """Find the right sub-model (or the empty model) and call insertRows on it."""
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        selected_relationship_class_ids = self._tree_view_form.selected_relationship_class_ids
-        for relationship_class_id, model in self.sub_models.items():
-            if selected_object_class_ids:
-                object_class_id_list = self.object_class_id_lists[relationship_class_id]
-                if not selected_object_class_ids.intersection(object_class_id_list):
-                    continue
-            if selected_relationship_class_ids:
-                if relationship_class_id not in selected_relationship_class_ids:
-                    continue
-            if row < model.rowCount():
-                return model.insertRows(row, count)
-            row -= model.rowCount()
-        return self.empty_row_model.insertRows(row, count)
-
-    def removeRows(self, row, count, parent=QModelIndex()):
-        """Find the right sub-models (or empty model) and call removeRows on them."""
-        if row < 0 or row + count - 1 >= self.rowCount():
-            return False
-        self.beginRemoveRows(parent, row, row + count - 1)
-        selected_object_class_ids = self._tree_view_form.selected_object_class_ids
-        selected_relationship_class_ids = self._tree_view_form.selected_relationship_class_ids
-        model_row_sets = {}
-        for i in range(row, row + count):
-            for relationship_class_id, model in self.sub_models.items():
-                if selected_object_class_ids:
-                    object_class_id_list = self.object_class_id_lists[relationship_class_id]
-                    if not selected_object_class_ids.intersection(object_class_id_list):
-                        continue
-                if selected_relationship_class_ids:
-                    if relationship_class_id not in selected_relationship_class_ids:
-                        continue
-                if i < model.rowCount():
-                    model_row_sets.setdefault(model, set()).add(i)
-                    break
-                i -= model.rowCount()
-            else:
-                model_row_sets.setdefault(self.empty_row_model, set()).add(i)
-        for model in self.sub_models.values():
-            try:
-                row_set = model_row_sets[model]
-                min_row = min(row_set)
-                max_row = max(row_set)
-                model.removeRows(min_row, max_row - min_row + 1)
-            except KeyError:
-                pass
-        try:
-            row_set = model_row_sets[self.empty_row_model]
-            min_row = min(row_set)
-            max_row = max(row_set)
-            self.empty_row_model.removeRows(min_row, max_row - min_row + 1)
-        except KeyError:
-            pass
-        self.endRemoveRows()
-        return True
-
-    @Slot("QModelIndex", "int", "int", name="_handle_empty_rows_inserted")
-    def _handle_empty_rows_inserted(self, parent, first, last):
-        offset = self.rowCount() - 1
-        self.rowsInserted.emit(QModelIndex(), offset + first, offset + last)
+            object_class_name_list = model.index(row, self.object_class_name_list_column).data(Qt.DisplayRole)
+            return self._tree_view_form.relationship_icon(object_class_name_list)
+        return model.index(row, column).data(role)
 
 
 class RelationshipParameterValueModel(RelationshipParameterModel):
@@ -3045,9 +3768,10 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
             data_dict.setdefault(relationship_class_id, list()).append(parameter_value)
         for relationship_class_id, data in data_dict.items():
             source_model = SubParameterValueModel(self)
-            source_model.reset_model([list(x) for x in data])
+            source_model.reset_model(data)
             model = self.sub_models[relationship_class_id] = RelationshipFilterProxyModel(self, object_id_list_column)
             model.setSourceModel(source_model)
+            self.connect_sub_model(model)
         self.empty_row_model.set_horizontal_header_labels(header)
         self.empty_row_model.clear()
         self.empty_row_model.rowsInserted.connect(self._handle_empty_rows_inserted)
@@ -3064,6 +3788,7 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
             model.update_filter(object_ids, object_id_lists)
             model.clear_filtered_out_values()
         self.clear_filtered_out_values()
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     def invalidate_filter(self):
@@ -3071,6 +3796,7 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
         self.layoutAboutToBeChanged.emit()
         for model in self.sub_models.values():
             model.invalidateFilter()
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     @busy_effect
@@ -3092,14 +3818,8 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
             if selected_relationship_class_ids:
                 if relationship_class_id not in selected_relationship_class_ids:
                     continue
-            data = model.sourceModel()._main_data
-            row_count = model.sourceModel().rowCount()
-            for i in range(row_count):
-                if not model.main_filter_accepts_row(i, None):
-                    continue
-                if not model.auto_filter_accepts_row(i, None, ignored_columns=[column]):
-                    continue
-                values.setdefault(data[i][column], set()).add(relationship_class_id)
+            for value in model.accepted_values(column):
+                values.setdefault(value, set()).add(relationship_class_id)
         filtered_out = self.filtered_out.get(column, [])
         return [[val not in filtered_out, val, rel_cls_id_set] for val, rel_cls_id_set in values.items()]
 
@@ -3135,15 +3855,15 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
             try:
                 model = self.sub_models[relationship_class_id]
                 source_model = model.sourceModel()
-                row_count = source_model.rowCount()
-                source_model.insertRows(row_count, len(data))
-                source_model._main_data[row_count:row_count + len(data)] = data
+                source_model.append_rows(data)
+                source_model.invalidate_column_codes()
             except KeyError:
                 source_model = SubParameterValueModel(self)
                 source_model.reset_model(data)
                 model = RelationshipFilterProxyModel(self, object_id_list_column)
                 model.setSourceModel(source_model)
                 self.sub_models[relationship_class_id] = model
+                self.connect_sub_model(model)
         for row in reversed(rows):
             self.empty_row_model.removeRows(row, 1)
         self.invalidate_filter()
@@ -3170,6 +3890,7 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
                 new_object_class_name_list = ",".\
                     join([object_class_name_dict[i] for i in range(len(object_class_name_dict))])
                 row_data[object_class_name_list_column] = new_object_class_name_list
+            model.sourceModel().invalidate_column_codes([object_class_name_list_column])
 
     def rename_objects(self, objects):
         """Rename objects in model."""
@@ -3186,6 +3907,7 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
                     except KeyError:
                         continue
                 row_data[object_name_list_column] = ",".join(object_name_list)
+            model.sourceModel().invalidate_column_codes([object_name_list_column])
 
     def rename_relationship_classes(self, relationship_classes):
         """Rename relationship classes in model."""
@@ -3198,6 +3920,7 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
                 continue
             for row_data in model.sourceModel()._main_data:
                 row_data[relationship_class_name_column] = relationship_class_name
+            model.sourceModel().invalidate_column_codes([relationship_class_name_column])
 
     def rename_parameter(self, parameter_id, relationship_class_id, new_name):
         """Rename single parameter in model."""
@@ -3210,6 +3933,7 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
         for row_data in model.sourceModel()._main_data:
             if row_data[parameter_id_column] == parameter_id:
                 row_data[parameter_name_column] = new_name
+        model.sourceModel().invalidate_column_codes([parameter_name_column])
 
     def remove_object_classes(self, object_classes):
         """Remove object classes from model."""
@@ -3218,6 +3942,7 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
         for relationship_class_id, object_class_id_list in self.object_class_id_lists.items():
             if object_class_ids.intersection(object_class_id_list):
                 self.sub_models.pop(relationship_class_id, None)
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     def remove_objects(self, objects):
@@ -3236,6 +3961,7 @@ class RelationshipParameterValueModel(RelationshipParameterModel):
         self.layoutAboutToBeChanged.emit()
         for relationship_class in relationship_classes:
             self.sub_models.pop(relationship_class['id'], None)
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     def remove_relationships(self, relationships):
@@ -3295,7 +4021,8 @@ class RelationshipParameterDefinitionModel(RelationshipParameterModel):
             data_dict.setdefault(relationship_class_id, list()).append(parameter_definition)
         for relationship_class_id, data in data_dict.items():
             model = self.sub_models[relationship_class_id] = SubParameterDefinitionModel(self)
-            model.reset_model([list(x) for x in data])
+            model.reset_model(data)
+            self.connect_sub_model(model)
         self.empty_row_model.set_horizontal_header_labels(header)
         self.empty_row_model.clear()
         self.empty_row_model.rowsInserted.connect(self._handle_empty_rows_inserted)
@@ -3303,6 +4030,7 @@ class RelationshipParameterDefinitionModel(RelationshipParameterModel):
     def update_filter(self):
         """Update filter."""
         self.layoutAboutToBeChanged.emit()
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     def move_rows_to_sub_models(self, rows):
@@ -3316,10 +4044,12 @@ class RelationshipParameterDefinitionModel(RelationshipParameterModel):
             relationship_class_id = row_data[relationship_class_id_column]
             model_data_dict.setdefault(relationship_class_id, list()).append(row_data)
         for relationship_class_id, data in model_data_dict.items():
-            model = self.sub_models.setdefault(relationship_class_id, SubParameterDefinitionModel(self))
-            row_count = model.rowCount()
-            model.insertRows(row_count, len(data))
-            model._main_data[row_count:row_count + len(data)] = data
+            try:
+                model = self.sub_models[relationship_class_id]
+            except KeyError:
+                model = self.sub_models[relationship_class_id] = SubParameterDefinitionModel(self)
+                self.connect_sub_model(model)
+            model.append_rows(data)
         for row in reversed(rows):
             self.empty_row_model.removeRows(row, 1)
 
@@ -3365,6 +4095,7 @@ class RelationshipParameterDefinitionModel(RelationshipParameterModel):
         for relationship_class_id, object_class_id_list in self.object_class_id_lists.items():
             if object_class_ids.intersection(object_class_id_list):
                 self.sub_models.pop(relationship_class_id, None)
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
     def remove_relationship_classes(self, relationship_classes):
@@ -3372,23 +4103,50 @@ class RelationshipParameterDefinitionModel(RelationshipParameterModel):
         self.layoutAboutToBeChanged.emit()
         for relationship_class in relationship_classes:
             self.sub_models.pop(relationship_class['id'], None)
+        self.invalidate_row_map()
         self.layoutChanged.emit()
 
 
-class ObjectFilterProxyModel(QSortFilterProxyModel):
-    """A filter proxy model for object parameter models."""
-    def __init__(self, parent, object_id_column):
+class ParameterFilterProxyModel(QSortFilterProxyModel):
+    """A filter proxy model for parameter value sub-models.
+    Rows are filtered by the selected items in the object tree (main filter)
+    and by the values filtered out in each column (auto filter).
+
+    Accepted rows are computed for all source rows at once, so `filterAcceptsRow` only looks up a list.
+    The mask combines the main filter mask and one mask per auto filtered column,
+    and each of these is only recomputed when its filter or its column in the source model changes.
+    """
+    def __init__(self, parent, main_filter_column):
         """Init class."""
         super().__init__(parent)
-        self.selected_object_ids = set()
-        self.object_id_column = object_id_column
+        self.main_filter_column = main_filter_column
         self.filtered_out = dict()
-
-    def update_filter(self, selected_object_ids):
-        """Update filter."""
-        if selected_object_ids == self.selected_object_ids:
-            return
-        self.selected_object_ids = selected_object_ids
+        self._main_mask = None
+        self._auto_masks = dict()  # column -> rows whose value in the column is not filtered out
+        self._accepted_rows = None
+
+    def setSourceModel(self, source_model):
+        """Listen to changes in the source model columns, to keep the masks up to date."""
+        super().setSourceModel(source_model)
+        source_model.column_codes_invalidated.connect(self._handle_column_codes_invalidated)
+
+    @Slot("QVariant", name="_handle_column_codes_invalidated")
+    def _handle_column_codes_invalidated(self, columns):
+        """Discards the masks that depend on the given columns, or all of them if None."""
+        if columns is None:
+            self._main_mask = None
+            self._auto_masks.clear()
+        else:
+            if self.main_filter_column in columns:
+                self._main_mask = None
+            for column in columns:
+                self._auto_masks.pop(column, None)
+        self._accepted_rows = None
+
+    def invalidate_main_filter(self):
+        """Discards the main filter mask and refilters."""
+        self._main_mask = None
+        self._accepted_rows = None
         self.invalidateFilter()
 
     def set_filtered_out_values(self, column, values):
@@ -3396,6 +4154,8 @@ class ObjectFilterProxyModel(QSortFilterProxyModel):
         if values == self.filtered_out.get(column, {}):
             return
         self.filtered_out[column] = values
+        self._auto_masks.pop(column, None)
+        self._accepted_rows = None
         self.invalidateFilter()
 
     def clear_filtered_out_values(self):
@@ -3403,6 +4163,8 @@ class ObjectFilterProxyModel(QSortFilterProxyModel):
         if not self.filtered_out:
             return
         self.filtered_out = dict()
+        self._auto_masks.clear()
+        self._accepted_rows = None
         self.invalidateFilter()
 
     def auto_filter_accepts_row(self, source_row, source_parent, ignored_columns=[]):
@@ -3415,33 +4177,93 @@ class ObjectFilterProxyModel(QSortFilterProxyModel):
         return True
 
     def main_filter_accepts_row(self, source_row, source_parent):
-        """Accept or reject row."""
-        if self.selected_object_ids:
-            return self.sourceModel()._main_data[source_row][self.object_id_column] in self.selected_object_ids
-        return True
+        """Accept or reject row. Subclasses need to implement this."""
+        raise NotImplementedError()
+
+    def compute_main_filter_mask(self):
+        """Returns a boolean array which is True for source rows accepted by the main filter.
+        Subclasses need to implement this."""
+        raise NotImplementedError()
+
+    def main_filter_mask(self):
+        """Returns a boolean array which is True for source rows accepted by the main filter."""
+        if self._main_mask is None:
+            self._main_mask = self.compute_main_filter_mask()
+        return self._main_mask
+
+    def auto_filter_mask(self, ignored_columns=()):
+        """Returns a boolean array which is True for source rows accepted by the auto filter."""
+        mask = np.ones(self.sourceModel().rowCount(), dtype=bool)
+        for column, values in self.filtered_out.items():
+            if column in ignored_columns or not values:
+                continue
+            try:
+                column_mask = self._auto_masks[column]
+            except KeyError:
+                column_mask = self._auto_masks[column] = ~self.sourceModel().value_mask(column, values)
+            mask &= column_mask
+        return mask
+
+
+    def accepted_values(self, column):
+        """Returns the distinct values of the given column in source rows accepted by the main filter
+        and by the auto filter of every other column, in order of first appearance in the source model."""
+        codes, values, _ = self.sourceModel().column_codes(column)
+        mask = self.main_filter_mask() & self.auto_filter_mask(ignored_columns=[column])
+        counts = np.bincount(codes[mask], minlength=len(values))
+        return [values[code] for code in np.flatnonzero(counts)]
 
     def filterAcceptsRow(self, source_row, source_parent):
-        """Accept or reject row."""
-        if not self.main_filter_accepts_row(source_row, source_parent):
-            return False
-        if not self.auto_filter_accepts_row(source_row, source_parent):
-            return False
-        return True
+        """Accept or reject row, by looking it up in the accepted rows,
+        which are computed for all rows the first time after a change."""
+        try:
+            return self._accepted_rows[source_row]
+        except (TypeError, IndexError):
+            self._accepted_rows = (self.main_filter_mask() & self.auto_filter_mask()).tolist()
+            return self._accepted_rows[source_row]
 
     def batch_set_data(self, indexes, data):
         source_indexes = [self.mapToSource(x) for x in indexes]
         return self.sourceModel().batch_set_data(source_indexes, data)
 
 
-class RelationshipFilterProxyModel(QSortFilterProxyModel):
+class ObjectFilterProxyModel(ParameterFilterProxyModel):
+    """A filter proxy model for object parameter models."""
+    def __init__(self, parent, object_id_column):
+        """Init class."""
+        super().__init__(parent, object_id_column)
+        self.selected_object_ids = set()
+        self.object_id_column = object_id_column
+
+    def update_filter(self, selected_object_ids):
+        """Update filter."""
+        if selected_object_ids == self.selected_object_ids:
+            return
+        self.selected_object_ids = selected_object_ids
+        self.invalidate_main_filter()
+
+    def main_filter_accepts_row(self, source_row, source_parent):
+        """Accept or reject row."""
+        if self.selected_object_ids:
+            return self.sourceModel()._main_data[source_row][self.object_id_column] in self.selected_object_ids
+        return True
+
+    def compute_main_filter_mask(self):
+        """Returns a boolean array which is True for source rows of the selected objects."""
+        source_model = self.sourceModel()
+        if self.selected_object_ids:
+            return source_model.value_mask(self.object_id_column, self.selected_object_ids)
+        return np.ones(source_model.rowCount(), dtype=bool)
+
+
+class RelationshipFilterProxyModel(ParameterFilterProxyModel):
     """A filter proxy model for relationship parameter models."""
     def __init__(self, parent, object_id_list_column):
         """Init class."""
-        super().__init__(parent)
+        super().__init__(parent, object_id_list_column)
         self.selected_object_ids = dict()
         self.selected_object_id_lists = set()
         self.object_id_list_column = object_id_list_column
-        self.filtered_out = dict()
 
     def update_filter(self, selected_object_ids, selected_object_id_lists):
         """Update filter."""
@@ -3450,30 +4272,7 @@ class RelationshipFilterProxyModel(QSortFilterProxyModel):
             return
         self.selected_object_ids = selected_object_ids
         self.selected_object_id_lists = selected_object_id_lists
-        self.invalidateFilter()
-
-    def set_filtered_out_values(self, column, values):
-        """Set values that need to be filtered out."""
-        if values == self.filtered_out.get(column, {}):
-            return
-        self.filtered_out[column] = values
-        self.invalidateFilter()
-
-    def clear_filtered_out_values(self):
-        """Clear the set of values that need to be filtered out."""
-        if not self.filtered_out:
-            return
-        self.filtered_out = dict()
-        self.invalidateFilter()
-
-    def auto_filter_accepts_row(self, source_row, source_parent, ignored_columns=[]):
-        """Accept or reject row."""
-        for column, values in self.filtered_out.items():
-            if column in ignored_columns:
-                continue
-            if self.sourceModel()._main_data[source_row][column] in values:
-                return False
-        return True
+        self.invalidate_main_filter()
 
     def main_filter_accepts_row(self, source_row, source_parent):
         """Accept or reject row."""
@@ -3484,17 +4283,21 @@ class RelationshipFilterProxyModel(QSortFilterProxyModel):
             return len(self.selected_object_ids.intersection(int(x) for x in object_id_list.split(","))) > 0
         return True
 
-    def filterAcceptsRow(self, source_row, source_parent):
-        """Accept or reject row."""
-        if not self.main_filter_accepts_row(source_row, source_parent):
-            return False
-        if not self.auto_filter_accepts_row(source_row, source_parent):
-            return False
-        return True
-
-    def batch_set_data(self, indexes, data):
-        source_indexes = [self.mapToSource(x) for x in indexes]
-        return self.sourceModel().batch_set_data(source_indexes, data)
+    def compute_main_filter_mask(self):
+        """Returns a boolean array which is True for source rows of the selected relationships,
+        or of relationships between selected objects.
+        Selected objects are matched once per distinct object id list, rather than once per row."""
+        source_model = self.sourceModel()
+        if self.selected_object_id_lists:
+            return source_model.value_mask(self.object_id_list_column, self.selected_object_id_lists)
+        if self.selected_object_ids:
+            _, object_id_lists, _ = source_model.column_codes(self.object_id_list_column)
+            accepted = [
+                object_id_list for object_id_list in object_id_lists
+                if self.selected_object_ids.intersection(int(x) for x in object_id_list.split(","))
+            ]
+            return source_model.value_mask(self.object_id_list_column, accepted)
+        return np.ones(source_model.rowCount(), dtype=bool)
 
 
 class JSONArrayModel(EmptyRowModel):
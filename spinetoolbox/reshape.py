@@ -0,0 +1,217 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Columnar versions of the reshape functions in excel_import_export.
+
+Key columns are coded as the rank of each value among the distinct values of the column,
+so rows can be sorted with a stable NumPy lexsort and grouped where the codes change,
+instead of sorting and grouping lists of keys in Python.
+The functions take the same arguments and return the same output as the ones in excel_import_export.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import json
+from collections import namedtuple
+from itertools import repeat
+from operator import itemgetter, is_not
+import numpy as np
+
+
+def rank_codes(values):
+    """Codes values by their rank among the distinct values, None as -1.
+
+    Args:
+        values (List): hashable values
+
+    Returns:
+        (numpy.ndarray, List): rank of each value and the distinct values in sorted order, without None
+    """
+    distinct = dict.fromkeys(values)
+    distinct.pop(None, None)
+    sorted_values = sorted(distinct)
+    rank = {value: i for i, value in enumerate(sorted_values)}
+    rank[None] = -1
+    return np.fromiter(map(rank.__getitem__, values), dtype=np.int64, count=len(values)), sorted_values
+
+
+def group_sorted(codes, sort_codes=()):
+    """Sorts rows by key codes, then by sort codes, and finds where the key codes change.
+
+    Args:
+        codes (List[numpy.ndarray]): codes of the key columns, most significant first
+        sort_codes (List[numpy.ndarray]): codes to sort by within each group
+
+    Returns:
+        (numpy.ndarray, numpy.ndarray): rows in sorted order and the position in that order
+        where each group starts
+    """
+    keys = list(codes) + list(sort_codes)
+    # lexsort is stable and uses the last key as the primary one
+    order = np.lexsort(keys[::-1])
+    change = np.zeros(len(order), dtype=bool)
+    change[:1] = True
+    for c in codes:
+        sorted_codes = c[order]
+        change[1:] |= sorted_codes[1:] != sorted_codes[:-1]
+    return order, np.flatnonzero(change)
+
+
+def object_array(values):
+    """Returns a one dimensional object array of values, also when the values are sequences."""
+    try:
+        return np.fromiter(values, dtype=object, count=len(values))
+    except (TypeError, ValueError):
+        # numpy < 1.23
+        array = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            array[i] = value
+        return array
+
+
+def _key_codes(data, key_cols):
+    """Returns rank codes and sorted distinct values of the key columns.
+    The first column has the same code for all rows, so rows with an empty key make one group."""
+    codes = [np.zeros(len(data), dtype=np.int64)]
+    sorted_values = [[None]]
+    for k in key_cols:
+        column_codes, column_values = rank_codes(list(map(itemgetter(k), data)))
+        codes.append(column_codes)
+        sorted_values.append(column_values)
+    return codes, sorted_values
+
+
+def _group_table(codes, sorted_values, order, starts, width):
+    """Returns a table with one row per group, the keys in the first columns and None elsewhere."""
+    table = np.full((len(starts), len(codes) + width), None, dtype=object)
+    for j, (c, values) in enumerate(zip(codes, sorted_values)):
+        table[:, j] = object_array(values)[c[order[starts]]]
+    return table
+
+
+def unstack_list_of_tuples(data, headers, key_cols, value_name_col, value_col):
+    """Unstacks list of lists or list of tuples and creates a list of namedtuples
+    whit unstacked data (pivoted data)
+
+    Args:
+        data (List[List]): List of lists with data to unstack
+        headers (List[str]): List of header names for data
+        key_cols (List[Int]): List of index for column that are keys, columns to not unstack
+        value_name_col (Int): index to column containing name of data to unstack
+        value_col (Int): index to column containg value to value_name_col
+
+    Returns:
+        (List[List]): List of list with headers in headers list
+        (List): List of header names for each item in inner list
+    """
+    if isinstance(value_name_col, list) and len(value_name_col) > 1:
+        names = list(map(itemgetter(*value_name_col), data))
+        value_names = sorted(set(n for n in names if not any(i is None for i in n)))
+    else:
+        if isinstance(value_name_col, list):
+            value_name_col = value_name_col[0]
+        names = list(map(itemgetter(value_name_col), data))
+        value_names = sorted(set(n for n in names if n is not None))
+    headers = [headers[n] for n in key_cols] + value_names
+    if not data:
+        return [], headers
+    codes, sorted_values = _key_codes(data, key_cols)
+
+    # remove data with invalid key cols
+    valid = np.flatnonzero(np.all([c >= 0 for c in codes], axis=0))
+    codes = [c[valid] for c in codes]
+    order, starts = group_sorted(codes)
+    rows = valid[order]
+    width = len(value_names)
+    table = _group_table(codes[1:], sorted_values[1:], order, starts, width)
+
+    # unstack data, the last value for each name in a group wins
+    name_index = {name: i for i, name in enumerate(value_names)}
+    name_codes = np.fromiter(map(name_index.get, names, repeat(-1)), dtype=np.int64, count=len(data))
+    has_value = np.fromiter(map(is_not, map(itemgetter(value_col), data), repeat(None)), dtype=bool, count=len(data))
+    is_start = np.zeros(len(rows), dtype=bool)
+    is_start[starts] = True
+    group = np.cumsum(is_start) - 1
+    selected = np.flatnonzero((name_codes[rows] >= 0) & has_value[rows])
+    cells = group[selected] * (len(key_cols) + width) + len(key_cols) + name_codes[rows[selected]]
+    _, last = np.unique(cells[::-1], return_index=True)
+    last = len(cells) - 1 - last
+    table.reshape(-1)[cells[last]] = object_array([data[row][value_col] for row in rows[selected[last]].tolist()])
+    return table.tolist(), headers
+
+
+def stack_list_of_tuples(data, headers, key_cols, value_cols):
+    """Stacks list of lists or list of tuples and creates a list of namedtuples
+    with stacked data (unpivoted data)
+
+    Args:
+        data (List[List]): List of lists with data to unstack
+        headers (List[str]): List of header names for data
+        key_cols (List[Int]): List of index for columns that are keys
+        value_cols (List[Int]): List of index for columns containing values to stack
+
+    Returns:
+        (List[namedtuple]): List of namedtuples whit fields given by headers
+        and 'parameter' and 'value' which contains stacked values
+    """
+    value_names = [headers[n] for n in value_cols]
+    key_names = [headers[n] for n in key_cols]
+    NewDataTuple = namedtuple("Data", key_names + ["parameter", "value"])
+    # one column per field, each row repeated once per value column
+    key_columns = [[row[k] for row in data for _ in value_cols] for k in key_cols]
+    values = [row[v] for row in data for v in value_cols]
+    return list(map(NewDataTuple, *key_columns, value_names * len(data), values))
+
+
+def unpack_json_parameters(data, json_index):
+    """Unpacks json arrays into one row per element, with the index of the element before its value.
+
+    Args:
+        data (List[List]): List of lists where the json_index column has a json array
+        json_index (Int): index of the column with json
+
+    Returns:
+        (List[List]): List of lists with the other columns, the index and the element
+    """
+    out_data = []
+    for data_row in data:
+        json_data = json.loads(data_row[json_index].replace("\n", ""))
+        key_cols = list(data_row[:json_index]) + list(data_row[json_index + 1:])
+        out_data.extend([key_cols + [i, value] for i, value in enumerate(json_data)])
+    return out_data
+
+
+def pack_json_parameters(data, key_cols, value_col, index_col=None):
+    """Packs the values of rows with the same keys into a json array.
+
+    Args:
+        data (List[List]): List of lists with data to pack
+        key_cols (List[Int]): List of index for columns that are keys
+        value_col (Int): index to column with the values to pack
+        index_col (Int): index to column to sort values by, if given
+
+    Returns:
+        (List[List]): List of lists with the keys and a json array
+    """
+    if not data:
+        return []
+    codes, sorted_values = _key_codes(data, key_cols)
+    sort_codes = []
+    if index_col is not None:
+        sort_codes.append(rank_codes(list(map(itemgetter(index_col), data)))[0])
+    order, starts = group_sorted(codes, sort_codes)
+    keys = _group_table(codes[1:], sorted_values[1:], order, starts, 0).tolist()
+    values = list(map(itemgetter(value_col), data))
+    sorted_values = [values[i] for i in order.tolist()]
+    ends = list(starts[1:]) + [len(order)]
+    return [key + [json.dumps(sorted_values[start:end])] for key, start, end in zip(keys, list(starts), ends)]
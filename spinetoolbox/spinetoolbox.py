@@ -17,6 +17,7 @@ Spine Toolbox application main file.
 """
 
 import sys
+import multiprocessing
 import logging
 from PySide2.QtWidgets import QApplication
 from ui_main import ToolboxUI
@@ -46,4 +47,6 @@ def main(argv):
 
 
 if __name__ == '__main__':
+    # Lets the frozen application start the processes that read Excel sheets
+    multiprocessing.freeze_support()
     sys.exit(main(sys.argv))
@@ -29,6 +29,272 @@ from PySide2.QtGui import QColor, QFont
 from helpers import tuple_itemgetter
 import operator
 import bisect
+from collections import OrderedDict
+import numpy as np
+
+
+class ColumnarPivotData():
+    """Columnar copy of the data in a PivotModel, to pivot large datasets with vectorised operations.
+
+    Each index column is stored as integer codes into a list of unique index values,
+    and values are stored in an array with one element per key.
+    Keys can be located by their mixed radix code, kept sorted for binary search.
+    The radixes leave room for new index values, so new keys are merged into the sorted codes
+    instead of sorting all of them again.
+    Changes in PivotModel._data must be reported by calling `mark_dirty(key)`, and are
+    applied the next time the data is read.
+    """
+    def __init__(self, data, index_count):
+        """Init class.
+
+        Args:
+            data (dict): PivotModel data, keys are tuples of length `index_count`
+            index_count (int): number of indexes
+
+        Raises:
+            ValueError: if the data can't be stored in columnar form
+        """
+        keys = list(data.keys())
+        self._index_count = index_count
+        self._unique_values = []  # list of unique values for each index
+        self._lookup = []  # dict from value to code for each index
+        codes = np.zeros((len(keys), index_count), dtype=np.int64)
+        for i in range(index_count):
+            unique_values, codes[:, i] = self._encode_column([key[i] for key in keys])
+            self._unique_values.append(unique_values)
+            self._lookup.append({value: code for code, value in enumerate(unique_values)})
+        self._codes = codes
+        self._values = np.empty(len(keys), dtype=object)
+        self._values[:] = list(data.values())
+        self._alive = np.ones(len(keys), dtype=bool)
+        self._dirty = set()
+        self._ranks = [None] * index_count
+        self._update_ranks()
+        self._update_key_codes()
+
+    @staticmethod
+    def _encode_column(column):
+        """Returns sorted unique values and codes for a column of index values."""
+        types = set(map(type, column))
+        if types == {str} or types == {int}:
+            # Let numpy sort, it orders strings and integers the same way as python
+            unique_values, codes = np.unique(np.array(column), return_inverse=True)
+            return unique_values.tolist(), codes.reshape(-1)
+        unique_values = sorted(set(column))
+        lookup = {value: code for code, value in enumerate(unique_values)}
+        return unique_values, np.fromiter((lookup[value] for value in column), dtype=np.int64, count=len(column))
+
+    def _update_ranks(self):
+        """Computes the sort rank of each code, for each index that got new values since the last time."""
+        for i, unique_values in enumerate(self._unique_values):
+            if self._ranks[i] is not None:
+                continue
+            order = sorted(range(len(unique_values)), key=unique_values.__getitem__)
+            ranks = np.empty(len(unique_values), dtype=np.int64)
+            ranks[order] = np.arange(len(unique_values))
+            self._ranks[i] = ranks
+
+    def _update_key_codes(self):
+        """Computes the mixed radix code of each key, and sorts them for binary search.
+
+        Each index gets a radix of twice its number of values if the codes still fit in 64 bits,
+        so that adding index values later doesn't change the codes of existing keys.
+
+        Raises:
+            ValueError: if key codes don't fit in 64 bits
+        """
+        radixes = [max(len(x), 1) for x in self._unique_values]
+        if np.prod([2.0 * x for x in radixes]) < 2 ** 62:
+            radixes = [2 * x for x in radixes]
+        elif np.prod([float(x) for x in radixes]) >= 2 ** 62:
+            raise ValueError("too many index values to store in columnar form")
+        self._radixes = radixes
+        self._multipliers = np.cumprod([1] + radixes[:-1]).astype(np.int64)
+        key_codes = self._key_codes(self._codes)
+        self._key_order = np.argsort(key_codes, kind="stable")
+        self._sorted_key_codes = key_codes[self._key_order]
+        self._frozen_groups = {}  # keys grouped by frozen value, for each tuple of frozen positions
+
+    def _key_codes(self, codes):
+        """Returns the mixed radix codes of keys with given index codes."""
+        if not self._index_count:
+            return np.zeros(codes.shape[:-1], np.int64)
+        return codes @ self._multipliers
+
+    def _merge_key_codes(self, codes, first_position):
+        """Merges new keys into the sorted key codes without sorting the existing ones again.
+
+        Args:
+            codes (numpy.ndarray): index codes of new keys
+            first_position (int): position of the first new key
+        """
+        key_codes = self._key_codes(codes)
+        order = np.argsort(key_codes, kind="stable")
+        key_codes = key_codes[order]
+        insert_at = np.searchsorted(self._sorted_key_codes, key_codes, side="right")
+        self._sorted_key_codes = np.insert(self._sorted_key_codes, insert_at, key_codes)
+        self._key_order = np.insert(self._key_order, insert_at, order + first_position)
+        self._frozen_groups = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def index_values(self, index):
+        """Returns the unique values of given index position."""
+        return self._unique_values[index]
+
+    def mark_dirty(self, key):
+        """Marks a key that was added, edited or deleted in the PivotModel data."""
+        self._dirty.add(key)
+
+    def sync(self, data):
+        """Applies changes in keys marked as dirty.
+
+        Args:
+            data (dict): PivotModel data
+
+        Raises:
+            ValueError: if the data can no longer be stored in columnar form
+        """
+        if not self._dirty:
+            return
+        dirty = list(self._dirty)
+        self._dirty = set()
+        # Add new index values, their ranks are updated the next time keys are sorted
+        for i in range(self._index_count):
+            lookup = self._lookup[i]
+            unique_values = self._unique_values[i]
+            for key in dirty:
+                if key[i] not in lookup:
+                    lookup[key[i]] = len(unique_values)
+                    unique_values.append(key[i])
+                    self._ranks[i] = None
+        if any(len(values) > radix for values, radix in zip(self._unique_values, self._radixes)):
+            self._update_key_codes()
+        positions = self._find(self._encode_keys(dirty))
+        # Update existing keys
+        for key, position in zip(dirty, positions):
+            if position < 0:
+                continue
+            self._alive[position] = key in data
+            self._values[position] = data.get(key)
+        # Append new keys that have data
+        new_keys = [key for key, position in zip(dirty, positions) if position < 0 and key in data]
+        if not new_keys:
+            return
+        new_values = np.empty(len(new_keys), dtype=object)
+        new_values[:] = [data[key] for key in new_keys]
+        new_codes = self._encode_keys(new_keys)
+        first_position = len(self._codes)
+        self._codes = np.concatenate([self._codes, new_codes])
+        self._values = np.concatenate([self._values, new_values])
+        self._alive = np.concatenate([self._alive, np.ones(len(new_keys), dtype=bool)])
+        self._merge_key_codes(new_codes, first_position)
+
+    def _encode_keys(self, keys):
+        """Returns array of codes for given keys, with -1 for unknown index values."""
+        codes = np.empty((len(keys), self._index_count), dtype=np.int64)
+        for i, lookup in enumerate(self._lookup):
+            codes[:, i] = [lookup.get(key[i], -1) for key in keys]
+        return codes
+
+    def _find(self, codes):
+        """Returns positions of keys with given codes, -1 if not found."""
+        valid = np.all(codes >= 0, axis=-1)
+        key_codes = self._key_codes(codes)
+        if not len(self._sorted_key_codes):
+            return np.full(key_codes.shape, -1, dtype=np.int64)
+        sorted_positions = np.searchsorted(self._sorted_key_codes, key_codes)
+        sorted_positions = np.minimum(sorted_positions, len(self._sorted_key_codes) - 1)
+        found = valid & (self._sorted_key_codes[sorted_positions] == key_codes)
+        return np.where(found, self._key_order[sorted_positions], -1)
+
+    def _frozen_rows(self, frozen_positions, frozen_value):
+        """Returns positions of keys with data and given value at frozen positions.
+
+        Keys are grouped by their code at frozen positions the first time
+        given frozen positions are used, so each lookup is a binary search.
+        """
+        frozen_codes = []
+        for i, value in zip(frozen_positions, frozen_value):
+            code = self._lookup[i].get(value)
+            if code is None:
+                return np.zeros(0, dtype=np.int64)
+            frozen_codes.append(code)
+        group = self._frozen_groups.get(frozen_positions)
+        if group is None:
+            radixes = [max(len(self._unique_values[i]), 1) for i in frozen_positions]
+            multipliers = np.cumprod([1] + radixes[:-1]).astype(np.int64)
+            group_codes = self._codes[:, list(frozen_positions)] @ multipliers
+            order = np.argsort(group_codes, kind="stable")
+            group = (multipliers, group_codes[order], order)
+            self._frozen_groups[frozen_positions] = group
+        multipliers, sorted_codes, order = group
+        code = int(np.dot(frozen_codes, multipliers))
+        start, end = np.searchsorted(sorted_codes, [code, code + 1])
+        rows = order[start:end]
+        return rows[self._alive[rows]]
+
+    def unique_keys(self, positions, frozen_positions, frozen_value):
+        """Returns sorted list of unique tuples of index values at given positions,
+        for keys with data and given value at frozen positions.
+        """
+        if not positions:
+            return []
+        if frozen_positions:
+            codes = self._codes[self._frozen_rows(frozen_positions, frozen_value)][:, positions]
+        else:
+            codes = self._codes[:, positions]
+            if not self._alive.all():
+                codes = codes[self._alive]
+        if not len(codes):
+            return []
+        radixes = [max(len(self._unique_values[i]), 1) for i in positions]
+        multipliers = np.cumprod([1] + radixes[:-1]).astype(np.int64)
+        key_codes = codes @ multipliers
+        code_count = int(np.prod([float(x) for x in radixes]))
+        if code_count <= max(4 * len(key_codes), 1 << 16):
+            # flag the codes that are present, cheaper than sorting
+            present = np.zeros(code_count, dtype=bool)
+            present[key_codes] = True
+            unique_codes = np.flatnonzero(present)
+        else:
+            unique_codes = np.unique(key_codes)
+        # Decode and sort by index values
+        codes = (unique_codes[:, None] // multipliers) % np.array(radixes)
+        self._update_ranks()
+        ranks = [self._ranks[i][codes[:, j]] for j, i in enumerate(positions)]
+        codes = codes[np.lexsort(ranks[::-1])]
+        columns = [[self._unique_values[i][c] for c in codes[:, j]] for j, i in enumerate(positions)]
+        return list(zip(*columns))
+
+    def get_block(self, row_keys, column_keys, row_positions, column_positions, frozen_positions, frozen_value):
+        """Returns a list of lists with the values for each combination of row and column key.
+
+        Args:
+            row_keys (list): tuples of index values for rows
+            column_keys (list): tuples of index values for columns
+            row_positions (tuple): index positions of values in row keys
+            column_positions (tuple): index positions of values in column keys
+            frozen_positions (tuple): index positions of values in frozen value
+            frozen_value (tuple): index values for frozen indexes
+        """
+        codes = np.zeros((len(row_keys), len(column_keys), self._index_count), dtype=np.int64)
+        for j, i in enumerate(row_positions):
+            lookup = self._lookup[i]
+            codes[:, :, i] = np.array([lookup.get(key[j], -1) for key in row_keys], dtype=np.int64)[:, None]
+        for j, i in enumerate(column_positions):
+            lookup = self._lookup[i]
+            codes[:, :, i] = np.array([lookup.get(key[j], -1) for key in column_keys], dtype=np.int64)[None, :]
+        for i, value in zip(frozen_positions, frozen_value):
+            codes[:, :, i] = self._lookup[i].get(value, -1)
+        positions = self._find(codes)
+        found = positions >= 0
+        found[found] = self._alive[positions[found]]
+        block = np.full(positions.shape, None, dtype=object)
+        block[found] = self._values[positions[found]]
+        return block.tolist()
+
 
 class PivotModel():
     _model_is_updating = False # flag if model is being reset/updated
@@ -58,6 +324,13 @@ class PivotModel():
     _deleted_index_entries = {} # deleted index_entries
     _used_index_values = {}
     _unique_name_2_name = {}
+    _columnar = None # ColumnarPivotData copy of _data, None if not used
+    columnar_threshold = 100000 # minimum number of data items to use the columnar copy of _data
+    _frozen_index = None # dictionary of sets of keys in _data grouped by value of _frozen_index_names
+    _frozen_index_names = () # index names _frozen_index is built for
+    _frozen_index_getter = None # itemgetter for the value of _frozen_index_names in a key
+    _pivot_cache = None # OrderedDict of headers computed by set_pivot, key is pivot + frozen_value
+    pivot_cache_size = 128 # max number of pivot + frozen_value headers to keep in _pivot_cache
 
     # dict with index name as key and set/range of valid values for that index
     # if set/range is empty or index doesn't exist in valid_index_values
@@ -123,6 +396,14 @@ class PivotModel():
         self._index_type = {self._unique_name_2_name[index_names[i]]: it for i, it in enumerate(index_type)}
         # create data dict with keys as long as index_names
         self._data = {tuple(d[:len(index_names)]):d[len(index_names)] for d in data}
+        self._frozen_index = None
+        self._pivot_cache = OrderedDict()
+        self._columnar = None
+        if self._data and len(self._data) >= self.columnar_threshold:
+            try:
+                self._columnar = ColumnarPivotData(self._data, len(index_names))
+            except ValueError:
+                pass
         # item getter so that you can call _key_getter(row_header + column_header + frozen_value)
         # and get a key to use on _data
         key = tuple(self.index_names.index(i) for i in index_names)
@@ -140,10 +421,14 @@ class PivotModel():
         # get all index values from data
         for i, c in enumerate(self.index_names):
             name = self._unique_name_2_name[c]
+            if self._columnar is not None:
+                values = set(self._columnar.index_values(i))
+            else:
+                values = set(d[i] for d in self._data.keys())
             if name in self.index_entries:
-                self.index_entries[name].update(set(d[i] for d in self._data.keys()))
+                self.index_entries[name].update(values)
             else:
-                self.index_entries[name] = set(d[i] for d in self._data.keys())
+                self.index_entries[name] = values
             self._added_index_entries[name] = set()
             self._deleted_index_entries[name] = set()
         for k, v in index_entries.items():
@@ -191,14 +476,56 @@ class PivotModel():
         keys = tuple(self.index_names.index(i) for i in names_of_index if i in self.index_names)
         return tuple_itemgetter(operator.itemgetter(*keys), len(keys))
     
+    def _sync_columnar(self):
+        """Applies pending changes to the columnar copy of data, or stops using it if no longer possible."""
+        if self._columnar is None:
+            return False
+        try:
+            self._columnar.sync(self._data)
+        except ValueError:
+            self._columnar = None
+            return False
+        return True
+
+    def _keys_with_frozen_value(self, filter_index, filter_value):
+        """Returns keys in _data with values filter_value for index names in filter_index,
+        builds the index of keys grouped by frozen value if not already built for filter_index"""
+        if self._frozen_index is None or self._frozen_index_names != filter_index:
+            getter = self._index_key_getter(filter_index)
+            frozen_index = {}
+            for k in self._data.keys():
+                frozen_value = getter(k)
+                if frozen_value in frozen_index:
+                    frozen_index[frozen_value].add(k)
+                else:
+                    frozen_index[frozen_value] = {k}
+            self._frozen_index = frozen_index
+            self._frozen_index_names = filter_index
+            self._frozen_index_getter = getter
+        return self._frozen_index.get(filter_value, ())
+
+    def _data_keys_changed(self, key, added):
+        """Updates frozen value index and drops cached headers when a key is added or removed from _data"""
+        if self._frozen_index is not None:
+            frozen_value = self._frozen_index_getter(key)
+            if added:
+                self._frozen_index.setdefault(frozen_value, set()).add(key)
+            elif frozen_value in self._frozen_index:
+                self._frozen_index[frozen_value].discard(key)
+        self._clear_pivot_cache()
+
+    def _clear_pivot_cache(self):
+        """Drops headers cached by set_pivot"""
+        if self._pivot_cache:
+            self._pivot_cache.clear()
+
     def _get_unique_index_values(self, index, filter_index, filter_value):
         """Finds unique index values for index names in index 
         filtered by index names in filter_index with values in filter_value"""
         if len(index) > 0:
             index_getter = self._index_key_getter(index)
             if filter_index:
-                frozen_getter = self._index_key_getter(filter_index)
-                index_header_values = set(index_getter(k) for k in self._data.keys() if frozen_getter(k) == filter_value)
+                index_header_values = set(index_getter(k) for k in self._keys_with_frozen_value(filter_index, filter_value))
             else:
                 index_header_values = set(index_getter(k) for k in self._data.keys())
         else:
@@ -226,12 +553,42 @@ class PivotModel():
         order = tuple(self.index_names.index(i) for i in self.pivot_rows + self.pivot_columns + self.pivot_frozen)
         order = tuple(sorted(range(len(order)),key=order.__getitem__))
         self._key_getter = tuple_itemgetter(operator.itemgetter(*order), len(order))
-        
+        self._invalid_data = {}
+
+        if self._pivot_cache is None:
+            self._pivot_cache = OrderedDict()
+        pivot_key = (self.pivot_rows, self.pivot_columns, self.pivot_frozen, self.frozen_value)
+        if pivot_key in self._pivot_cache:
+            # headers computed before, copy since they are edited in place by edit_index
+            self._pivot_cache.move_to_end(pivot_key)
+            cached = self._pivot_cache[pivot_key]
+            self._row_data_header = list(cached[0])
+            self._column_data_header = list(cached[1])
+            self._row_data_header_set = set(cached[2])
+            self._column_data_header_set = set(cached[3])
+            self._invalid_row = set(cached[4])
+            self._invalid_column = set(cached[5])
+            return
+
         # find unique set of tuples for row and column headers from data with given pivot
-        # row indexes
-        self._row_data_header_set = self._get_unique_index_values(self.pivot_rows, self.pivot_frozen, self.frozen_value)
-        # column indexes
-        self._column_data_header_set = self._get_unique_index_values(self.pivot_columns, self.pivot_frozen, self.frozen_value)
+        if self._sync_columnar():
+            # sorted headers from columnar data
+            frozen_pos = tuple(self.index_names.index(i) for i in self.pivot_frozen)
+            row_header = self._columnar.unique_keys(
+                tuple(self.index_names.index(i) for i in self.pivot_rows), frozen_pos, self.frozen_value)
+            column_header = self._columnar.unique_keys(
+                tuple(self.index_names.index(i) for i in self.pivot_columns), frozen_pos, self.frozen_value)
+            self._row_data_header_set = set(row_header)
+            self._column_data_header_set = set(column_header)
+        else:
+            row_header = None
+            column_header = None
+            # row indexes
+            self._row_data_header_set = self._get_unique_index_values(
+                self.pivot_rows, self.pivot_frozen, self.frozen_value)
+            # column indexes
+            self._column_data_header_set = self._get_unique_index_values(
+                self.pivot_columns, self.pivot_frozen, self.frozen_value)
         
         # add tuple index entries to rows and column
         # rows
@@ -252,8 +609,15 @@ class PivotModel():
         # add values
         self._row_data_header_set.update(new_row_keys)
         self._column_data_header_set.update(new_column_keys)
-        self._row_data_header = sorted(self._row_data_header_set)
-        self._column_data_header = sorted(self._column_data_header_set)
+        if row_header is not None and len(row_header) == len(self._row_data_header_set):
+            # no new keys, columnar header is already sorted
+            self._row_data_header = row_header
+        else:
+            self._row_data_header = sorted(self._row_data_header_set)
+        if column_header is not None and len(column_header) == len(self._column_data_header_set):
+            self._column_data_header = column_header
+        else:
+            self._column_data_header = sorted(self._column_data_header_set)
         len_valid_rows = len(self._row_data_header)
         len_valid_columns = len(self._column_data_header)
 
@@ -270,7 +634,13 @@ class PivotModel():
         # set invalid data to indexes with none in them.
         self._invalid_row = set(i + len_valid_rows for i, key in enumerate(none_rows))
         self._invalid_column = set(i + len_valid_columns for i, key in enumerate(none_columns))
-        self._invalid_data = {}
+
+        # cache headers for switching back to this pivot and frozen value
+        self._pivot_cache[pivot_key] = (list(self._row_data_header), list(self._column_data_header),
+                                        set(self._row_data_header_set), set(self._column_data_header_set),
+                                        set(self._invalid_row), set(self._invalid_column))
+        while len(self._pivot_cache) > self.pivot_cache_size:
+            self._pivot_cache.popitem(last=False)
     
     def set_frozen_value(self, value):
         """Sets the value of the frozen indexes"""
@@ -337,6 +707,8 @@ class PivotModel():
             raise ValueError("row_mask contains invalid indexes to current row pivot")
         if self.pivot_columns and any(c >= len(self._column_data_header) or c < 0 for c in col_mask):
             raise ValueError("col_mask contains invalid indexes to current row pivot")
+        if self._sync_columnar():
+            return self._get_pivoted_data_columnar(row_mask, col_mask)
         data = []
         for row in row_mask:
             data_row = []
@@ -354,6 +726,25 @@ class PivotModel():
             data.append(data_row)
         return data
 
+    def _get_pivoted_data_columnar(self, row_mask, col_mask):
+        """gets data from current pivot with indexes in row_mask and col_mask, from columnar data in one go"""
+        row_keys = [self.row(row) for row in row_mask]
+        col_keys = [self.column(col) for col in col_mask]
+        data = self._columnar.get_block(
+            row_keys, col_keys,
+            tuple(self.index_names.index(i) for i in self.pivot_rows),
+            tuple(self.index_names.index(i) for i in self.pivot_columns),
+            tuple(self.index_names.index(i) for i in self.pivot_frozen),
+            self.frozen_value)
+        if self._invalid_row or self._invalid_column:
+            # get invalid data
+            for r, row in enumerate(row_mask):
+                invalid_row = row in self._invalid_row
+                for c, col in enumerate(col_mask):
+                    if invalid_row or col in self._invalid_column:
+                        data[r][c] = self._invalid_data.get((row, col), None)
+        return data
+
     def set_pivoted_data(self, data, row_mask, col_mask):
         """paste list of lists into current pivot, no change of indexes,
         row_mask list of indexes where to paste data rows in current pivot
@@ -411,6 +802,14 @@ class PivotModel():
                         # update data
                         self._add_data(key, paste_value)
     
+    def _load_used_index_values(self, values, name):
+        """Lets used index values that are looked up in a database, like UsedNames, look up values all at once."""
+        name = self._unique_name_2_name[name]
+        values = values - self.index_entries[name]
+        for k, v in self._used_index_values.items():
+            if name in k and hasattr(v, "load"):
+                v.load(values)
+
     def _add_index_value(self, value, name):
         name = self._unique_name_2_name[name]
         if value in self.index_entries[name]:
@@ -443,6 +842,8 @@ class PivotModel():
 
     def _delete_data(self, key):
         # value is None or whitspace remove any existing data
+        if key in self._data:
+            self._data_keys_changed(key, False)
         if key in self._edit_data:
             # data was edited, track original value
             if self._edit_data[key] and key not in self._deleted_data:
@@ -454,6 +855,8 @@ class PivotModel():
                 self._deleted_data[key] = self._data.pop(key)
         self._edit_data.pop(key, None)
         self._data.pop(key, None)
+        if self._columnar is not None:
+            self._columnar.mark_dirty(key)
         
 
     def _add_data(self, key, value):
@@ -475,7 +878,11 @@ class PivotModel():
                 if value != self._data.get(key, None):
                     # new value is not same as previous
                     self._edit_data[key] = self._data.get(key, None)
+        if key not in self._data:
+            self._data_keys_changed(key, True)
         self._data[key] = value
+        if self._columnar is not None:
+            self._columnar.mark_dirty(key)
     
     def _restore_data(self, key):
         if key in self._deleted_data:
@@ -549,6 +956,7 @@ class PivotModel():
 
     def delete_tuple_index_values(self, delete_tuples):
         """deletes values from keys with combination of indexes given that match tuple_index_entries"""
+        self._clear_pivot_cache()
         # delete from tuple indexes
         delete_values = set()
         delete_values_row = set()
@@ -624,6 +1032,7 @@ class PivotModel():
     
     def delete_index_values(self, delete_indexes):
         """delete one ore more index value from data"""
+        self._clear_pivot_cache()
         delete_values = {}
         delete_values_row = {}
         delete_values_column = {}
@@ -771,6 +1180,7 @@ class PivotModel():
         if len(new_index) != len(index_mask):
             raise ValueError('index_mask must be same length as new_index')
         """Edits the index of either row or column"""
+        self._clear_pivot_cache()
         if direction == "row":
             index_name = self.pivot_rows
             other_index_name = self.pivot_columns
@@ -802,6 +1212,7 @@ class PivotModel():
         # insert new index entites
         new_indexes = {}
         for i, name in enumerate(index_name):
+            self._load_used_index_values(set(r[i] for r in new_index), name)
             for r in new_index:
                 self._add_index_value(r[i], name)
         
@@ -922,36 +1333,120 @@ class PivotModel():
 
 class PivotTableModel(QAbstractTableModel):
     index_entries_changed = Signal(dict, dict)
+    tile_size = 64 # rows and columns in each cached block of pivoted data
+    max_cached_pivots = 8 # number of pivot and frozen value combinations to keep tiles for
     def __init__(self, parent = None):
         super(PivotTableModel, self).__init__(parent)
         self.model = PivotModel()
         self._data_header = [[]]
         self._num_headers_row = 0
         self._num_headers_column = 0
+        # cached tiles of pivoted data, {pivot key: {(tile row, tile column): [values, keys]}}
+        self._tile_cache = OrderedDict()
+        self._tiles = {}
     
     def set_data(self, data, index_names, index_type, rows=(), columns=(), frozen=(), frozen_value=(), index_entries={} , valid_index_values={}, tuple_index_entries={}, used_index_values={}, index_real_names=[]):
         self.beginResetModel()
         self.model.set_new_data(data, index_names, index_type, rows, columns, frozen, frozen_value, index_entries, valid_index_values, tuple_index_entries, used_index_values, index_real_names)
+        self._tile_cache.clear()
+        self._select_tiles()
         self._update_header_data()
         self.endResetModel()
     
     def set_pivot(self, rows, columns, frozen, frozen_value):
         self.beginResetModel()
         self.model.set_pivot(rows, columns, frozen, frozen_value)
+        self._select_tiles()
         self._update_header_data()
         self.endResetModel()
     
     def set_frozen_value(self, frozen_value):
         self.beginResetModel()
         self.model.set_frozen_value(frozen_value)
+        self._select_tiles()
         self._update_header_data()
         self.endResetModel()
 
+    def _select_tiles(self):
+        """Makes the tiles cached for current pivot and frozen value the active ones"""
+        pivot_key = (self.model.pivot_rows, self.model.pivot_columns,
+                     self.model.pivot_frozen, self.model.frozen_value)
+        tiles = self._tile_cache.pop(pivot_key, {})
+        self._tile_cache[pivot_key] = tiles
+        while len(self._tile_cache) > self.max_cached_pivots:
+            self._tile_cache.popitem(last=False)
+        self._tiles = tiles
+
+    def _invalidate_tiles(self, tile_keys=None):
+        """Drops given tiles of current pivot, or all of them if tile_keys is None.
+        Tiles of other pivots are always dropped since edited data can show up anywhere in them."""
+        if tile_keys is None:
+            self._tiles.clear()
+        else:
+            for tile_key in tile_keys:
+                self._tiles.pop(tile_key, None)
+        for pivot_key in [k for k, v in self._tile_cache.items() if v is not self._tiles]:
+            del self._tile_cache[pivot_key]
+
+    def _invalidate_cells(self, indexes):
+        """Drops tiles containing pivot indexes (row, column)"""
+        size = self.tile_size
+        self._invalidate_tiles(set((r // size, c // size) for r, c in indexes))
+
+    def _tile(self, row, column):
+        """Returns cached tile containing pivot index (row, column), fetches it if not cached"""
+        tile_key = (row // self.tile_size, column // self.tile_size)
+        tile = self._tiles.get(tile_key)
+        if tile is None:
+            tile = self._fetch_tile(*tile_key)
+            self._tiles[tile_key] = tile
+        return tile
+
+    def _tile_masks(self, tile_row, tile_column):
+        """Returns row and column masks of pivot indexes in given tile"""
+        size = self.tile_size
+        num_rows = len(self.model.rows) if self.model.pivot_rows else 1
+        num_columns = len(self.model.columns) if self.model.pivot_columns else 1
+        row_mask = list(range(tile_row * size, min((tile_row + 1) * size, num_rows)))
+        col_mask = list(range(tile_column * size, min((tile_column + 1) * size, num_columns)))
+        return row_mask, col_mask
+
+    def _fetch_tile(self, tile_row, tile_column):
+        """Gets display values of a tile in one call to get_pivoted_data,
+        keys are filled in by _tile_key when needed"""
+        row_mask, col_mask = self._tile_masks(tile_row, tile_column)
+        data = self.model.get_pivoted_data(row_mask, col_mask)
+        if not data:
+            values = [['' for _ in col_mask] for _ in row_mask]
+        else:
+            values = [['' if d is None else str(d) for d in data_row] for data_row in data]
+        return [values, None]
+
+    def _tile_value(self, row, column):
+        """Returns display value for pivot index (row, column)"""
+        size = self.tile_size
+        return self._tile(row, column)[0][row % size][column % size]
+
+    def _tile_key(self, row, column):
+        """Returns data key for pivot index (row, column)"""
+        size = self.tile_size
+        tile = self._tile(row, column)
+        if tile[1] is None:
+            row_mask, col_mask = self._tile_masks(row // size, column // size)
+            row_keys = [self.model.row(r) for r in row_mask]
+            col_keys = [self.model.column(c) for c in col_mask]
+            frozen_value = self.model.frozen_value
+            key_getter = self.model._key_getter
+            tile[1] = [[key_getter(row_key + col_key + frozen_value) for col_key in col_keys]
+                       for row_key in row_keys]
+        return tile[1][row % size][column % size]
+
     def delete_values(self, indexes):
         # transform to PivotModel index
         indexes = self._indexes_to_pivot_index(indexes)
         self.beginResetModel()
         self.model.delete_pivoted_values(indexes)
+        self._invalidate_cells(indexes)
         self.endResetModel()
     
     def delete_index_values(self, keys_dict):
@@ -960,6 +1455,7 @@ class PivotTableModel(QAbstractTableModel):
         
         self.beginResetModel()
         self.model.delete_index_values(keys_dict)
+        self._invalidate_tiles()
         self.endResetModel()
         
         new_indexes = {}
@@ -976,12 +1472,14 @@ class PivotTableModel(QAbstractTableModel):
     def delete_tuple_index_values(self, tuple_key_dict):
         self.beginResetModel()
         self.model.delete_tuple_index_values(tuple_key_dict)
+        self._invalidate_tiles()
         self.endResetModel()
     
     def restore_values(self, indexes):
         indexes = self._indexes_to_pivot_index(indexes)
         self.beginResetModel()
         self.model.restore_pivoted_values(indexes)
+        self._invalidate_cells(indexes)
         self.endResetModel()
     
     def get_key(self, index):
@@ -1025,6 +1523,14 @@ class PivotTableModel(QAbstractTableModel):
         del_index = {k: len(v) for k, v in self.model._deleted_index_entries.items()}
         self.beginResetModel()
         self.model.paste_data(index.column(), row_header_data, index.row(), col_header_data, value_data, row_mask, col_mask)
+        if row_header_data or col_header_data[0]:
+            # headers changed, all tiles are stale
+            self._invalidate_tiles()
+        else:
+            size = self.tile_size
+            tile_rows = set(r // size for r in row_mask)
+            tile_columns = set(c // size for c in col_mask)
+            self._invalidate_tiles([(r, c) for r in tile_rows for c in tile_columns])
         self.endResetModel()
         new_indexes = {}
         deleted_indexes = {}
@@ -1157,6 +1663,7 @@ class PivotTableModel(QAbstractTableModel):
         add_index = {k: len(v) for k, v in self.model._added_index_entries.items()}
         del_index = {k: len(v) for k, v in self.model._deleted_index_entries.items()}
         self.model.edit_index([new_key], [index_ind], direction)
+        self._invalidate_tiles()
         self.endResetModel()
         self.dataChanged.emit(index, index)
         #self.update_index_entries(new_key_entries)
@@ -1178,9 +1685,10 @@ class PivotTableModel(QAbstractTableModel):
         if role == Qt.EditRole:
             if self.index_in_data(index):
                 #edit existing data
-                self.model.set_pivoted_data([[value]],
-                                            [index.row() - self._num_headers_row],
-                                            [index.column() - self._num_headers_column])
+                row = index.row() - self._num_headers_row
+                column = index.column() - self._num_headers_column
+                self.model.set_pivoted_data([[value]], [row], [column])
+                self._invalidate_cells([(row, column)])
                 return True
             elif index.row() == self.rowCount() - 1 and index.column() < self._num_headers_column:
                 # add new row if there are any indexes on the row
@@ -1204,12 +1712,12 @@ class PivotTableModel(QAbstractTableModel):
         if role == Qt.DisplayRole:
             if self.index_in_data(index):
                 # get values
-                data = self.model.get_pivoted_data([index.row() - self._num_headers_row],[index.column() - self._num_headers_column])
-                if not data:
-                    return ''
-                else:
-                    data = data[0][0]
-                return '' if data is None else str(data)
+                row = index.row() - self._num_headers_row
+                column = index.column() - self._num_headers_column
+                if row in self.model._invalid_row or column in self.model._invalid_column:
+                    data = self.model._invalid_data.get((row, column), None)
+                    return '' if data is None else str(data)
+                return self._tile_value(row, column)
             elif self.index_in_column_headers(index):
                 # draw column header values
                 if not self.model.pivot_rows:
@@ -1235,8 +1743,12 @@ class PivotTableModel(QAbstractTableModel):
             return self.data_color(index)
         elif role == Qt.ToolTipRole:
             # display tooltip for edited data
-            if self.index_in_data(index):
-                key = self.get_key(index)
+            if self.index_in_data(index) and (self.model._edit_data or self.model._deleted_data):
+                row = index.row() - self._num_headers_row
+                column = index.column() - self._num_headers_column
+                if row in self.model._invalid_row or column in self.model._invalid_column:
+                    return None
+                key = self._tile_key(row, column)
                 if key in self.model._edit_data:
                     value = self.model._edit_data[key]
                     if value:
@@ -1262,9 +1774,9 @@ class PivotTableModel(QAbstractTableModel):
             if r in self.model._invalid_row or c in self.model._invalid_column:
                 # invalid data, color grey
                 return QColor(Qt.lightGray)
-            row = self.model.row(index.row() - self._num_headers_row)
-            col = self.model.column(index.column() - self._num_headers_column)
-            key = self.model._key_getter(row + col + self.model.frozen_value)
+            if not self.model._edit_data and not self.model._deleted_data:
+                return None
+            key = self._tile_key(r, c)
             if key in self.model._deleted_data:
                 # deleted data, color red
                 return QColor(Qt.red)
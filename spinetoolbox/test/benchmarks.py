@@ -0,0 +1,29 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Opt-in gate for unit tests that measure time or memory on large data.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import os
+import unittest
+
+BENCHMARKS_VARIABLE = "SPINETOOLBOX_BENCHMARKS"
+
+
+def benchmark(test_item):
+    """Decorator for tests that measure time or memory on large data.
+    They are skipped unless the SPINETOOLBOX_BENCHMARKS environment variable is set."""
+    message = "set {} to run benchmarks".format(BENCHMARKS_VARIABLE)
+    return unittest.skipUnless(os.environ.get(BENCHMARKS_VARIABLE), message)(test_item)
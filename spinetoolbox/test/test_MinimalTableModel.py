@@ -0,0 +1,160 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for MinimalTableModel and its columnar backing store.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import unittest
+import tracemalloc
+from array import array
+from PySide2.QtWidgets import QApplication
+from models import MinimalTableModel, ColumnarData
+from .benchmarks import benchmark
+
+
+class ColumnarTableModel(MinimalTableModel):
+    columnar = True
+
+
+def generated_rows(row_count):
+    """Yields parameter value rows like the ones from the database, each with its own copy of each string."""
+    for i in range(row_count):
+        yield (i, i % 1000, "object_class_{}".format(i % 10), "object_{}".format(i % 1000), i % 50,
+               "parameter_{}".format(i % 50), 1000000 + i, str(i % 7))
+
+
+class TestColumnarData(unittest.TestCase):
+
+    def setUp(self):
+        self.data = ColumnarData([(1, "nemo", 1.5, None), (2, "dory", 2.5, "[1]"), (3, "nemo", 3.5, "2")])
+
+    def test_columns_are_packed(self):
+        self.assertIsInstance(self.data.column(0), array)
+        self.assertIsInstance(self.data.column(2), array)
+        self.assertIsInstance(self.data.column(1), list)
+        self.assertIs(self.data.column(1)[0], self.data.column(1)[2])
+        self.assertEqual(len(self.data), 3)
+        self.assertEqual(len(self.data[0]), 4)
+
+    def test_rows_behave_like_lists(self):
+        self.assertEqual(self.data[1], [2, "dory", 2.5, "[1]"])
+        self.assertEqual(self.data[-1][1:3], ["nemo", 3.5])
+        self.assertEqual([row[0] for row in self.data], [1, 2, 3])
+        object_id, name, weight, value = self.data[0]
+        self.assertEqual((object_id, name, weight, value), (1, "nemo", 1.5, None))
+        with self.assertRaises(IndexError):
+            self.data[3]
+
+    def test_write_through_rows(self):
+        for row in self.data:
+            row[1] = row[1].upper()
+        self.assertEqual(self.data.column(1), ["NEMO", "DORY", "NEMO"])
+        # A value that doesn't fit in the array turns the column into a list
+        self.data[0][0] = "one"
+        self.data[1][2] = 7
+        self.assertEqual(self.data.column(0), ["one", 2, 3])
+        self.assertEqual(self.data.column(2), [1.5, 7, 3.5])
+        self.assertIs(type(self.data[1][2]), int)
+
+    def test_insert_and_remove_rows(self):
+        self.data.insert(1, [None, None, None, None])
+        self.data.append([5, "marlin", 0.5, None])
+        self.assertEqual([row[1] for row in self.data], ["nemo", None, "dory", "nemo", "marlin"])
+        self.data[1:2] = [[4, "bruce", 9.5, "3"]]
+        self.assertEqual(self.data[1], [4, "bruce", 9.5, "3"])
+        self.assertIsInstance(self.data.column(0), list)
+        self.assertEqual(self.data.pop(0), [1, "nemo", 1.5, None])
+        del self.data[0:2]
+        self.assertEqual([list(row) for row in self.data], [[3, "nemo", 3.5, "2"], [5, "marlin", 0.5, None]])
+        self.data.extend([(6, "squirt", 1.0, None)])
+        self.assertEqual(len(self.data), 3)
+
+    def test_generated_rows_are_packed(self):
+        rows = list(generated_rows(2000))
+        data = ColumnarData(iter(rows))
+        self.assertEqual([list(row) for row in data], [list(row) for row in rows])
+        self.assertEqual([type(data.column(i)).__name__ for i in range(8)],
+                         ["array", "array", "list", "list", "array", "list", "array", "list"])
+        # Equal strings from different rows are stored once
+        self.assertIs(data.column(3)[0], data.column(3)[1000])
+
+    @benchmark
+    def test_memory_benchmark(self):
+        row_count = 200000
+        tracemalloc.start()
+        start, _ = tracemalloc.get_traced_memory()
+        list_data = [list(row) for row in generated_rows(row_count)]
+        list_size = tracemalloc.get_traced_memory()[0] - start
+        del list_data
+        start, _ = tracemalloc.get_traced_memory()
+        columnar_data = ColumnarData(generated_rows(row_count))
+        columnar_size = tracemalloc.get_traced_memory()[0] - start
+        tracemalloc.stop()
+        self.assertEqual(len(columnar_data), row_count)
+        self.assertLess(columnar_size * 4, list_size)
+
+
+class TestColumnarTableModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Overridden method. Runs once before all tests in this class."""
+        try:
+            cls.app = QApplication().processEvents()
+        except RuntimeError:
+            pass
+
+    def setUp(self):
+        self.model = ColumnarTableModel()
+        self.model.set_horizontal_header_labels(["id", "name", "value"])
+        self.model.reset_model(iter([(1, "nemo", 1.0), (2, "dory", 2.0)]))
+
+    def test_reading(self):
+        self.assertIsInstance(self.model._main_data, ColumnarData)
+        self.assertEqual(self.model.rowCount(), 2)
+        self.assertEqual(self.model.columnCount(), 3)
+        self.assertEqual(self.model.index(1, 1).data(), "dory")
+        self.assertEqual(self.model.row_data(0), [1, "nemo", 1.0])
+        self.assertEqual(self.model.column_data(2), [1.0, 2.0])
+
+    def test_writing(self):
+        self.model.batch_set_data([self.model.index(0, 1), self.model.index(1, 2)], ["marlin", None])
+        self.assertEqual(self.model.column_data(1), ["marlin", "dory"])
+        self.assertEqual(self.model.column_data(2), [1.0, None])
+        self.assertTrue(self.model.insertRows(1, 2))
+        self.assertEqual(self.model.column_data(0), [1, None, None, 2])
+        self.model.setData(self.model.index(1, 0), 3)
+        self.assertEqual(self.model.row_data(1), [3, None, None])
+        self.assertTrue(self.model.removeRows(2, 1))
+        self.assertTrue(self.model.insertColumns(1, 1))
+        self.assertEqual(self.model.row_data(2), [2, None, "dory", None])
+        self.assertTrue(self.model.removeColumns(3, 1))
+        self.assertEqual(self.model.model_data()[0], [1, None, "marlin"])
+        self.model.clear()
+        self.assertEqual(self.model.rowCount(), 0)
+        self.assertTrue(self.model.insertRows(0, 1))
+        self.assertEqual(self.model.row_data(0), [None, None, None])
+
+    def test_append_rows_keeps_columns_packed(self):
+        inserted = []
+        self.model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        self.model.append_rows([[3, "marlin", 3.0], [4, "bruce", 4.5]])
+        self.assertEqual(inserted, [(2, 3)])
+        self.assertEqual(self.model.row_data(3), [4, "bruce", 4.5])
+        self.assertEqual([type(x).__name__ for x in self.model._main_data.columns], ["array", "list", "array"])
+
+
+if __name__ == '__main__':
+    unittest.main()
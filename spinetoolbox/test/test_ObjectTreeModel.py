@@ -0,0 +1,421 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for ObjectTreeModel class, its compact items, and fetching children in the background.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import unittest
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from unittest import mock
+from PySide2.QtCore import Qt, QObject, QThreadPool
+from PySide2.QtGui import QIcon
+from PySide2.QtWidgets import QApplication
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, select
+from spinedatabase_api import DiffDatabaseMapping, create_new_spine_database
+from models import ObjectTreeModel, FetchWorker, ItemTable, TextColumn
+from .benchmarks import benchmark
+
+ObjectClass = namedtuple("ObjectClass", ["id", "name", "description", "display_order"])
+Object = namedtuple("Object", ["id", "class_id", "name", "description"])
+RelationshipClass = namedtuple("RelationshipClass", ["id", "name", "object_class_id_list", "object_class_name_list"])
+Relationship = namedtuple("Relationship", ["id", "class_id", "name", "object_id_list", "object_name_list"])
+
+
+class FakeQuery:
+    """A query-like object that runs a statement on the given engine."""
+    def __init__(self, engine, statement):
+        self.engine = engine
+        self.statement = statement
+
+    def __iter__(self):
+        with self.engine.connect() as connection:
+            return iter(connection.execute(self.statement).fetchall())
+
+
+class TestObjectTreeModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Overridden method. Runs once before all tests in this class."""
+        try:
+            cls.app = QApplication().processEvents()
+        except RuntimeError:
+            pass
+
+    def setUp(self):
+        """Makes a file database with two object classes, 'fish' with many objects and 'dog' with one."""
+        handle, self.db_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        self.engine = create_engine('sqlite:///{}'.format(self.db_path))
+        metadata = MetaData()
+        self.object_table = Table(
+            "object", metadata, Column("id", Integer, primary_key=True), Column("class_id", Integer),
+            Column("name", String), Column("description", String))
+        metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(self.object_table.insert(), [
+                {"id": i, "class_id": 1, "name": "fish_{}".format(i), "description": ""} for i in range(1, 2501)])
+            connection.execute(
+                self.object_table.insert(), {"id": 2501, "class_id": 2, "name": "pluto", "description": ""})
+        db_map = mock.MagicMock()
+        db_map.engine = self.engine
+        db_map.has_pending_changes.return_value = False
+        db_map.object_class_list.return_value = [ObjectClass(1, "fish", "", 1), ObjectClass(2, "dog", "", 2)]
+        db_map.object_list.side_effect = lambda class_id: FakeQuery(
+            self.engine, select([self.object_table]).where(self.object_table.c.class_id == class_id))
+        self.tree_view_form = QObject()
+        self.tree_view_form.db_map = db_map
+        self.tree_view_form.object_icon = mock.MagicMock(return_value=QIcon())
+        self.tree_view_form.relationship_icon = mock.MagicMock(return_value=QIcon())
+        self.tree_view_form.msg_error = mock.MagicMock()
+        self.model = ObjectTreeModel(self.tree_view_form)
+        self.model.build_tree("test_db")
+
+    def tearDown(self):
+        self.model.cancel_fetches()
+        QThreadPool.globalInstance().waitForDone()
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def class_index(self, row):
+        return self.model.index(row, 0, self.model.index(0, 0))
+
+    def wait_for_fetches(self):
+        QThreadPool.globalInstance().waitForDone()
+        QApplication.processEvents()
+
+    def test_fetch_in_current_thread(self):
+        fish_index = self.class_index(0)
+        self.model.fetchMore(fish_index)
+        self.assertEqual(self.model.rowCount(fish_index), 2500)
+        self.assertFalse(self.model.canFetchMore(fish_index))
+
+    def test_fetch_in_background(self):
+        self.model.async_fetch = True
+        fish_index = self.class_index(0)
+        self.model.fetchMore(fish_index)
+        self.assertFalse(self.model.canFetchMore(fish_index))
+        self.assertTrue(self.model.hasChildren(fish_index))
+        self.wait_for_fetches()
+        self.assertEqual(self.model.rowCount(fish_index), 2500)
+        self.assertEqual(self.model.index(2499, 0, fish_index).data(Qt.UserRole + 1)["name"], "fish_2500")
+        self.assertFalse(self.model.canFetchMore(fish_index))
+        self.assertFalse(self.model._workers)
+
+    def test_in_memory_database_is_fetched_in_current_thread(self):
+        self.model.async_fetch = True
+        self.tree_view_form.db_map.engine = create_engine('sqlite://')
+        self.assertFalse(self.model.fetches_in_background())
+
+    def test_pending_changes_are_fetched_in_current_thread(self):
+        self.model.async_fetch = True
+        self.assertTrue(self.model.fetches_in_background())
+        self.tree_view_form.db_map.has_pending_changes.return_value = True
+        self.assertFalse(self.model.fetches_in_background())
+        fish_index = self.class_index(0)
+        self.model.fetchMore(fish_index)
+        self.assertEqual(self.model.rowCount(fish_index), 2500)
+        self.assertFalse(self.model._workers)
+
+    def test_failed_fetch_is_done_in_current_thread(self):
+        self.model.async_fetch = True
+        fish_index = self.class_index(0)
+        with mock.patch("models.FetchWorker.run", lambda worker: worker.signaler.failed.emit(worker.fetch_id, "")):
+            self.model.fetchMore(fish_index)
+            self.wait_for_fetches()
+        self.assertEqual(self.model.rowCount(fish_index), 2500)
+        self.assertFalse(self.model.canFetchMore(fish_index))
+        self.assertFalse(self.model.fetches_in_background())
+        self.tree_view_form.msg_error.emit.assert_not_called()
+
+    def test_prefetched_rows_are_appended_on_request(self):
+        self.model.async_fetch = True
+        dog_index = self.class_index(1)
+        self.model._start_fetch(dog_index, self.model.fetch_key(dog_index))
+        self.wait_for_fetches()
+        self.assertEqual(self.model.rowCount(dog_index), 0)
+        self.model.fetchMore(dog_index)
+        self.assertEqual(self.model.rowCount(dog_index), 1)
+        self.assertFalse(self.model.canFetchMore(dog_index))
+        self.tree_view_form.db_map.object_list.assert_called_once_with(class_id=2)
+
+    def test_canceled_fetch_is_discarded(self):
+        self.model.async_fetch = True
+        fish_index = self.class_index(0)
+        self.model.fetchMore(fish_index)
+        self.model.cancel_fetches()
+        self.wait_for_fetches()
+        self.assertTrue(self.model.canFetchMore(fish_index))
+
+    def test_worker_emits_batches(self):
+        statement = select([self.object_table]).where(self.object_table.c.class_id == 1)
+        worker = FetchWorker(7, self.engine, statement, 1000)
+        batches = list()
+        finished = mock.MagicMock()
+        worker.signaler.batch_fetched.connect(lambda fetch_id, rows: batches.append((fetch_id, len(rows))))
+        worker.signaler.finished.connect(finished)
+        worker.run()
+        self.assertEqual(batches, [(7, 1000), (7, 1000), (7, 500)])
+        finished.assert_called_once_with(7)
+
+
+class TestObjectTreeModelWithDiffDatabaseMapping(unittest.TestCase):
+    """Fetches from a file database through a DiffDatabaseMapping,
+    which stages the items added in the session in diff tables on its own connection."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Overridden method. Runs once before all tests in this class."""
+        try:
+            cls.app = QApplication().processEvents()
+        except RuntimeError:
+            pass
+
+    def setUp(self):
+        """Makes a file database with a committed 'fish' object class and object."""
+        handle, self.db_path = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        os.remove(self.db_path)
+        db_url = 'sqlite:///{}'.format(self.db_path)
+        create_new_spine_database(db_url)
+        self.db_map = DiffDatabaseMapping(db_url, username='UnitTest')
+        self.fish_class_id = self.db_map.add_object_class(name='fish', description='A fish.', display_order=1).id
+        self.db_map.add_objects(dict(class_id=self.fish_class_id, name='nemo', description='The lost one.'))
+        self.db_map.commit_session("Add fish")
+        self.tree_view_form = QObject()
+        self.tree_view_form.db_map = self.db_map
+        self.tree_view_form.object_icon = mock.MagicMock(return_value=QIcon())
+        self.tree_view_form.relationship_icon = mock.MagicMock(return_value=QIcon())
+        self.tree_view_form.msg_error = mock.MagicMock()
+        self.model = ObjectTreeModel(self.tree_view_form)
+        self.model.async_fetch = True
+        self.model.build_tree("test_db")
+
+    def tearDown(self):
+        self.model.cancel_fetches()
+        QThreadPool.globalInstance().waitForDone()
+        self.db_map.close()
+        os.remove(self.db_path)
+
+    def fetch_fish_names(self):
+        fish_index = self.model.index(0, 0, self.model.index(0, 0))
+        self.model.fetchMore(fish_index)
+        QThreadPool.globalInstance().waitForDone()
+        QApplication.processEvents()
+        self.assertFalse(self.model.canFetchMore(fish_index))
+        return [self.model.index(row, 0, fish_index).data() for row in range(self.model.rowCount(fish_index))]
+
+    def test_committed_objects_are_fetched(self):
+        self.assertEqual(self.fetch_fish_names(), ['nemo'])
+        self.tree_view_form.msg_error.emit.assert_not_called()
+
+    def test_uncommitted_objects_are_fetched(self):
+        self.db_map.add_objects(dict(class_id=self.fish_class_id, name='dory', description="Nemo's girl."))
+        self.assertEqual(self.fetch_fish_names(), ['nemo', 'dory'])
+        self.tree_view_form.msg_error.emit.assert_not_called()
+
+
+class TestObjectTreeItems(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Overridden method. Runs once before all tests in this class."""
+        try:
+            cls.app = QApplication().processEvents()
+        except RuntimeError:
+            pass
+
+    def setUp(self):
+        """Makes a model with fish and dog classes, and a fish__dog relationship class."""
+        self.objects = {
+            1: [Object(1, 1, "nemo", "a fish"), Object(2, 1, "dory", None)],
+            2: [Object(3, 2, "pluto", None)]
+        }
+        self.relationship_class = RelationshipClass(1, "fish__dog", "1,2", "fish,dog")
+        self.relationships = [Relationship(1, 1, "nemo__pluto", "1,3", "nemo,pluto"),
+                              Relationship(2, 1, "dory__pluto", "2,3", "dory,pluto")]
+        db_map = mock.MagicMock()
+        db_map.object_class_list.return_value = [ObjectClass(1, "fish", "", 1), ObjectClass(2, "dog", "", 2)]
+        db_map.object_list.side_effect = lambda class_id: self.objects[class_id]
+        db_map.wide_relationship_class_list.side_effect = lambda object_class_id: [self.relationship_class]
+        db_map.wide_relationship_list.side_effect = lambda class_id, object_id: [
+            x for x in self.relationships if str(object_id) in x.object_id_list.split(",")]
+        self.tree_view_form = QObject()
+        self.tree_view_form.db_map = db_map
+        self.tree_view_form.object_icon = mock.MagicMock(side_effect=lambda name: QIcon())
+        self.tree_view_form.relationship_icon = mock.MagicMock(return_value=QIcon())
+        self.model = ObjectTreeModel(self.tree_view_form)
+        self.model.build_tree("test_db")
+
+    def fetch_all(self):
+        for item_type in ("object_class", "object", "relationship_class"):
+            for item in list(self.model.walk(item_type)):
+                self.model.fetchMore(item.index())
+
+    def test_item_interface(self):
+        root_item = self.model.root_item
+        self.assertEqual(root_item.data(Qt.UserRole), "root")
+        self.assertEqual(root_item.text(), "test_db")
+        self.assertIsNone(root_item.parent())
+        fish_item = root_item.child(0)
+        self.assertEqual(fish_item.data(Qt.UserRole + 1),
+                         {"id": 1, "name": "fish", "description": "", "display_order": 1})
+        self.assertIs(fish_item.parent(), root_item)
+        self.assertIs(self.model.itemFromIndex(fish_item.index()), fish_item)
+        self.model.fetchMore(fish_item.index())
+        self.assertEqual(fish_item.rowCount(), 2)
+        nemo_index = self.model.index(0, 0, fish_item.index())
+        self.assertEqual(nemo_index.data(), "nemo")
+        self.assertEqual(nemo_index.data(Qt.ToolTipRole), "a fish")
+        self.assertEqual(nemo_index.parent(), fish_item.index())
+        self.tree_view_form.object_icon.reset_mock()
+        nemo_index.data(Qt.DecorationRole)
+        self.tree_view_form.object_icon.assert_called_once_with("fish")
+
+    def test_relationship_items(self):
+        self.fetch_all()
+        pluto_item = self.model.root_item.child(1).child(0)
+        relationship_class_item = pluto_item.child(0)
+        self.assertEqual(relationship_class_item.text(), "fish__dog")
+        self.assertEqual(relationship_class_item.data(Qt.ToolTipRole), "fish,dog")
+        self.assertEqual([relationship_class_item.child(i).text() for i in range(2)], ["nemo,pluto", "dory,pluto"])
+        next_index = self.model.next_relationship_index(relationship_class_item.child(0).index())
+        self.assertEqual(next_index.parent().parent().data(), "nemo")
+
+    def test_add_update_and_remove_items(self):
+        self.fetch_all()
+        fish_item = self.model.root_item.child(0)
+        self.model.add_objects([Object(4, 1, "marlin", None)])
+        self.assertEqual([fish_item.child(i).text() for i in range(3)], ["nemo", "dory", "marlin"])
+        self.model.update_objects([Object(3, 2, "scooby", None)])
+        self.assertEqual(self.model.root_item.child(1).child(0).text(), "scooby")
+        self.assertEqual(fish_item.child(0).child(0).child(0).text(), "nemo,scooby")
+        self.model.remove_items("object", {1})
+        self.assertEqual([fish_item.child(i).text() for i in range(2)], ["dory", "marlin"])
+        self.assertEqual(fish_item.child(1).row, 1)
+        self.assertEqual(self.model.root_item.child(1).child(0).child(0).rowCount(), 1)
+        self.model.remove_items("object_class", {1})
+        self.assertEqual(self.model.root_item.rowCount(), 1)
+        self.assertEqual(self.model.root_item.child(0).child(0).rowCount(), 0)
+
+    def test_item_index_is_kept_up_to_date(self):
+        self.fetch_all()
+        self.assertEqual([item.text() for item in self.model.indexed_items('object_member', [3])],
+                         ["nemo,pluto", "dory,pluto", "nemo,pluto", "dory,pluto"])
+        self.model.add_objects([Object(4, 1, "marlin", None)])
+        self.assertEqual([item.text() for item in self.model.indexed_items('object', [4])], ["marlin"])
+        self.model.remove_items("relationship", {1})
+        self.assertEqual(self.model.indexed_items('relationship', [1]), [])
+        self.assertEqual(len(self.model.indexed_items('object_member', [3])), 2)
+        self.model.remove_items("object_class", {2})
+        self.assertEqual(self.model.indexed_items('object', [3]), [])
+        self.assertEqual(self.model.indexed_items('relationship_class', [1]), [])
+
+    def test_item_index_keeps_order_when_removing_many_items(self):
+        self.fetch_all()
+        self.model.add_objects([Object(i, 1, "fish_{}".format(i), None) for i in range(4, 54)])
+        self.model.remove_items("object", set(range(4, 54, 2)))
+        self.assertEqual([item.text() for item in self.model.indexed_items('object', range(1, 54))],
+                         ["nemo", "dory", "pluto"] + ["fish_{}".format(i) for i in range(5, 54, 2)])
+        self.assertEqual(self.model.indexed_items('object', [4, 6]), [])
+
+    def update_and_remove_objects(self, object_count, step):
+        """Adds objects to the first object class, then renames and removes every step-th,
+        and returns the time the updates and removals took."""
+        fish_index = self.model.root_item.child(0).index()
+        self.model.fetchMore(fish_index)
+        self.model.append_rows(fish_index, [
+            {"id": i, "class_id": 1, "name": "object_{}".format(i), "description": None}
+            for i in range(10, object_count)])
+        updated = [Object(i, 1, "renamed_{}".format(i), None) for i in range(10, object_count, step)]
+        tic = time.perf_counter()
+        self.model.update_objects(updated)
+        self.model.remove_items("object", [x.id for x in updated])
+        elapsed = time.perf_counter() - tic
+        self.assertEqual(self.model.rowCount(fish_index), object_count - 10 + 2 - len(updated))
+        self.assertEqual(self.model.index(2, 0, fish_index).data(), "object_11")
+        return elapsed
+
+    def test_update_and_remove_objects(self):
+        self.update_and_remove_objects(100, 10)
+
+    @benchmark
+    def test_bulk_update_and_remove_benchmark(self):
+        self.assertLess(self.update_and_remove_objects(100000, 100), 2.0)
+
+    def test_add_object_class_in_display_order(self):
+        self.model.add_object_classes([ObjectClass(3, "cat", "", 2)])
+        self.assertEqual([self.model.root_item.child(i).text() for i in range(3)], ["fish", "cat", "dog"])
+
+    def test_item_table_and_text_column(self):
+        table = ItemTable()
+        table.insert(0, [{"id": 1, "name": "a", "description": None}, {"id": 2, "name": "b", "description": "x"}])
+        table.insert(1, [{"id": 3, "name": None, "description": 5}])
+        self.assertEqual([table.record(i)["id"] for i in range(3)], [1, 3, 2])
+        self.assertEqual(table.value(1, "description"), 5)
+        table.update(0, {"name": "c"})
+        table.remove(1, 1)
+        self.assertEqual([table.record(i) for i in range(2)],
+                         [{"id": 1, "name": "c", "description": None}, {"id": 2, "name": "b", "description": "x"}])
+        column = TextColumn(["x{}".format(i) for i in range(10000)])
+        self.assertEqual(column[9999], "x9999")
+        self.assertRaises(TypeError, column.insert, 0, [1])
+
+    def test_text_column_reclaims_replaced_text(self):
+        column = TextColumn(["object_{}".format(i) for i in range(100)])
+        with mock.patch.object(TextColumn, "min_garbage", 1000):
+            for n in range(50):
+                for i in range(0, 100, 10):
+                    column[i] = "renamed_{}_{}".format(i, n)
+                del column[95:]
+                column.insert(95, ["object_{}".format(i) for i in range(95, 100)])
+        self.assertEqual(column[10], "renamed_10_49")
+        self.assertEqual(column[11], "object_11")
+        self.assertEqual(len(column), 100)
+        self.assertEqual(column._length, sum(len(value) for value in column))
+        self.assertLess(column._stored, 2 * column._length + 1000)
+
+    def append_objects_in_batches(self, item_count, batch_size):
+        """Appends objects to the first object class in batches."""
+        fish_index = self.model.root_item.child(0).index()
+        for start in range(0, item_count, batch_size):
+            self.model.append_rows(fish_index, [
+                {"id": i, "class_id": 1, "name": "object_{}".format(i), "description": None}
+                for i in range(start, start + batch_size)])
+        self.assertEqual(self.model.rowCount(fish_index), item_count)
+        self.assertEqual(self.model.index(item_count - 1, 0, fish_index).data(), "object_{}".format(item_count - 1))
+
+    def test_append_objects_in_batches(self):
+        self.append_objects_in_batches(300, 100)
+
+    @benchmark
+    def test_memory_per_item_benchmark(self):
+        item_count = 200000
+        tracemalloc.start()
+        tic = time.perf_counter()
+        self.append_objects_in_batches(item_count, 10000)
+        elapsed = time.perf_counter() - tic
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # 1M items should take less than 200 MB
+        self.assertLess(size / item_count, 200)
+        self.assertLess(elapsed, 10.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,8 +17,10 @@ Unit tests for PivotModel class.
 """
 
 import unittest
+import time
 from unittest import mock
 from tabularview_models import PivotModel
+from .benchmarks import benchmark
 
 
 class TestPivotModel(unittest.TestCase):
@@ -794,6 +796,16 @@ class TestPivotModel(unittest.TestCase):
         self.assertEqual(model._added_index_entries['test1'], set(['new_index']))
         self.assertEqual(model._used_index_values[('test1',)], set(['new_index']))
     
+    def test_edit_index_loads_used_index_values_at_once(self):
+        """test that used index values with a load method get all new values of an index in one call"""
+        used_values = mock.MagicMock()
+        used_values.__contains__.return_value = False
+        model = PivotModel()
+        model.set_new_data(self.data, self.index_names, self.index_types, used_index_values={('test1',): used_values})
+        model.edit_index([('new1', 'aa', 1), ('new2', 'bb', 2), ('a', 'cc', 3)], [0, 1, 2], 'row')
+        used_values.load.assert_called_once_with({'new1', 'new2'})
+        self.assertEqual(model._added_index_entries['test1'], {'new1', 'new2'})
+
     def test_add_index_value2(self):
         """test that adding an existing doesn't do anything"""
         model = PivotModel()
@@ -927,6 +939,133 @@ class TestPivotModel(unittest.TestCase):
         model.delete_index_values({'test': set(['a'])})
         self.assertEqual(model._used_index_values[('test',)], set(['b','c','d']))
 
+    def test_set_frozen_value_after_edits(self):
+        """Headers for a frozen value are recomputed after keys are added or removed"""
+        model = PivotModel()
+        model.set_new_data(self.data, self.index_names, self.index_types,
+                           rows=('test1',), columns=('test2',), frozen=('test3',), frozen_value=(5,))
+        self.assertEqual(model.rows, [('d',), ('e',)])
+        model.set_frozen_value((4,))
+        model.set_frozen_value((5,))
+        model._add_data(('f', 'ff', 5), 'value_f_ff_5')
+        model._delete_data(('d', 'dd', 5))
+        model.set_frozen_value((4,))
+        model.set_frozen_value((5,))
+        self.assertEqual(model.rows, [('e',), ('f',)])
+        self.assertEqual(model.columns, [('ee',), ('ff',)])
+
+    def test_set_frozen_value_uses_cached_headers(self):
+        model = PivotModel()
+        model.set_new_data(self.data, self.index_names, self.index_types,
+                           rows=('test1',), columns=('test2',), frozen=('test3',), frozen_value=(5,))
+        model.set_frozen_value((4,))
+        with mock.patch.object(model, '_get_unique_index_values') as get_unique_index_values:
+            model.set_frozen_value((5,))
+        get_unique_index_values.assert_not_called()
+        self.assertEqual(model.rows, [('d',), ('e',)])
+        self.assertEqual(model.columns, [('dd',), ('ee',)])
+
+    def set_frozen_values_with_data(self, a_count, b_count, c_count):
+        """Sets each frozen value twice on generated data and returns the time it took."""
+        data = [['a{}'.format(a), 'b{}'.format(b), c, 'value']
+                for a in range(a_count) for b in range(b_count) for c in range(c_count)]
+        model = PivotModel()
+        model.set_new_data(data, self.index_names, self.index_types,
+                           rows=('test1',), columns=('test2',), frozen=('test3',), frozen_value=(0,))
+        tic = time.perf_counter()
+        for _ in range(2):
+            for c in range(c_count):
+                model.set_frozen_value((c,))
+        elapsed = time.perf_counter() - tic
+        self.assertEqual(len(model.rows), a_count)
+        self.assertEqual(len(model.columns), b_count)
+        return elapsed
+
+    def test_set_frozen_values_with_generated_data(self):
+        self.set_frozen_values_with_data(5, 4, 10)
+
+    @benchmark
+    def test_set_frozen_value_benchmark(self):
+        self.assertLess(self.set_frozen_values_with_data(50, 20, 200), 2.0)
+
+
+class TestPivotModelColumnar(TestPivotModel):
+    """Runs all PivotModel tests again, using the columnar copy of data even for small datasets."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._columnar_threshold = PivotModel.columnar_threshold
+        PivotModel.columnar_threshold = 0
+
+    @classmethod
+    def tearDownClass(cls):
+        PivotModel.columnar_threshold = cls._columnar_threshold
+
+    def test_columnar_data_is_used(self):
+        model = PivotModel()
+        model.set_new_data(self.data, self.index_names, self.index_types)
+        self.assertIsNotNone(model._columnar)
+
+    def test_get_pivoted_data_after_edits(self):
+        model = PivotModel()
+        model.set_new_data(self.data, self.index_names, self.index_types,
+                           rows=('test1',), columns=('test2',), frozen=('test3',), frozen_value=(5,))
+        model.set_pivoted_data([['new_value'], [None]], [0, 1], [0])
+        model.set_pivoted_data([['other_value']], [1], [1])
+        self.assertEqual(model.get_pivoted_data([0, 1], [0, 1]), [['new_value', None], [None, 'other_value']])
+        model.set_frozen_value((4,))
+        self.assertEqual(model.get_pivoted_data([0], [0]), [['value_c_cc_4']])
+
+    def test_get_pivoted_data_with_new_index_values(self):
+        model = PivotModel()
+        model.set_new_data(self.data, self.index_names, self.index_types)
+        model._add_data(('f', 'ff', 7), 'value_f_ff_7')
+        model.set_pivot(('test1', 'test2'), ('test3',), (), ())
+        self.assertEqual(model.rows[-1], ('f', 'ff'))
+        self.assertEqual(model.columns[-1], (7,))
+        self.assertEqual(model.get_pivoted_data([len(model.rows) - 1], [len(model.columns) - 1]), [['value_f_ff_7']])
+
+    def test_new_keys_are_merged_into_sorted_keys(self):
+        model = PivotModel()
+        model.set_new_data(self.data, self.index_names, self.index_types)
+        columnar = model._columnar
+        model._add_data(('f', 'ff', 7), 'value_f_ff_7')
+        model._add_data(('a', 'ff', 5), 'value_a_ff_5')
+        with mock.patch.object(columnar, "_update_key_codes") as update_key_codes:
+            columnar.sync(model._data)
+        update_key_codes.assert_not_called()
+        key_codes = columnar._sorted_key_codes.tolist()
+        self.assertEqual(key_codes, sorted(set(key_codes)))
+        self.assertEqual(columnar.get_block([('f', 'ff'), ('a', 'ff')], [(7,), (5,)], (0, 1), (2,), (), ()),
+                         [['value_f_ff_7', None], [None, 'value_a_ff_5']])
+        self.assertEqual(columnar.unique_keys((0,), (), ())[-1], ('f',))
+        model.set_pivot(('test1', 'test2'), ('test3',), (), ())
+        self.assertEqual(model.rows[-1], ('f', 'ff'))
+
+    def set_pivot_with_data(self, a_count, b_count, c_count):
+        """Pivots generated data twice and returns the model and the time it took."""
+        data = [['a{}'.format(a), 'b{}'.format(b), c, 'value']
+                for a in range(a_count) for b in range(b_count) for c in range(c_count)]
+        model = PivotModel()
+        model.set_new_data(data, self.index_names, self.index_types)
+        tic = time.perf_counter()
+        model.set_pivot(('test1', 'test2'), ('test3',), (), ())
+        model.set_pivot(('test2',), ('test1',), ('test3',), (c_count // 2,))
+        model.get_pivoted_data(list(range(min(64, b_count))), list(range(a_count)))
+        elapsed = time.perf_counter() - tic
+        self.assertEqual(len(model.rows), b_count)
+        self.assertEqual(len(model.columns), a_count)
+        return model, elapsed
+
+    def test_set_pivot_with_generated_data(self):
+        model, _ = self.set_pivot_with_data(4, 5, 6)
+        self.assertEqual(model.get_pivoted_data([1], [2]), [['value']])
+
+    @benchmark
+    def test_set_pivot_benchmark(self):
+        _, elapsed = self.set_pivot_with_data(20, 100, 100)
+        self.assertLess(elapsed, 1.0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,113 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for PivotTableModel class, mainly the tile cache of pivoted data.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import unittest
+from unittest import mock
+from PySide2.QtCore import Qt
+from PySide2.QtGui import QColor
+from tabularview_models import PivotTableModel
+
+
+class TestPivotTableModel(unittest.TestCase):
+
+    def setUp(self):
+        data = [['a{}'.format(a), 'b{}'.format(b), c, 'value_{}_{}_{}'.format(a, b, c)]
+                for a in range(5) for b in range(5) for c in range(2)]
+        self.model = PivotTableModel()
+        self.model.tile_size = 2
+        self.model.set_data(data, ['test1', 'test2', 'test3'], [str, str, int],
+                            rows=('test1',), columns=('test2',), frozen=('test3',), frozen_value=(0,))
+
+    def cell(self, row, column):
+        """returns model index of pivot index (row, column)"""
+        return self.model.index(row + self.model._num_headers_row, column + self.model._num_headers_column)
+
+    def count_fetches(self):
+        return mock.patch.object(self.model.model, 'get_pivoted_data', wraps=self.model.model.get_pivoted_data)
+
+    def test_data_from_tiles(self):
+        for r in range(5):
+            for c in range(5):
+                self.assertEqual(self.model.data(self.cell(r, c)), 'value_{}_{}_0'.format(r, c))
+
+    def test_tiles_are_fetched_once(self):
+        with self.count_fetches() as get_pivoted_data:
+            for _ in range(2):
+                for r in range(5):
+                    for c in range(5):
+                        self.model.data(self.cell(r, c))
+        # 5x5 cells in tiles of 2x2
+        self.assertEqual(get_pivoted_data.call_count, 9)
+        get_pivoted_data.assert_any_call([4], [2, 3])
+
+    def test_set_data_invalidates_only_edited_tile(self):
+        for r in range(5):
+            for c in range(5):
+                self.model.data(self.cell(r, c))
+        self.assertTrue(self.model.setData(self.cell(2, 3), 'edited'))
+        self.assertEqual(len(self.model._tiles), 8)
+        with self.count_fetches() as get_pivoted_data:
+            self.assertEqual(self.model.data(self.cell(2, 3)), 'edited')
+            self.assertEqual(self.model.data(self.cell(3, 2)), 'value_3_2_0')
+        get_pivoted_data.assert_called_once_with([2, 3], [2, 3])
+        self.assertEqual(self.model.data_color(self.cell(2, 3)), QColor(Qt.yellow))
+        self.assertEqual(self.model.data(self.cell(2, 3), Qt.ToolTipRole), 'Original data: value_2_3_0')
+        self.assertIsNone(self.model.data_color(self.cell(3, 2)))
+
+    def test_delete_and_restore_values(self):
+        self.model.data(self.cell(0, 0))
+        self.model.delete_values([self.cell(0, 0)])
+        self.assertEqual(self.model.data(self.cell(0, 0)), '')
+        self.assertEqual(self.model.data_color(self.cell(0, 0)), QColor(Qt.red))
+        self.model.restore_values([self.cell(0, 0)])
+        self.assertEqual(self.model.data(self.cell(0, 0)), 'value_0_0_0')
+
+    def test_paste_data_invalidates_pasted_tiles(self):
+        for r in range(5):
+            for c in range(5):
+                self.model.data(self.cell(r, c))
+        self.model.paste_data(self.cell(1, 1), [['x', 'y'], ['z', 'w']],
+                              [r + self.model._num_headers_row for r in (1, 2)],
+                              [c + self.model._num_headers_column for c in (1, 2)])
+        self.assertEqual(len(self.model._tiles), 5)
+        self.assertEqual([[self.model.data(self.cell(r, c)) for c in (1, 2)] for r in (1, 2)],
+                         [['x', 'y'], ['z', 'w']])
+
+    def test_tiles_are_kept_per_frozen_value(self):
+        self.model.data(self.cell(0, 0))
+        self.model.set_frozen_value((1,))
+        self.assertEqual(self.model.data(self.cell(0, 0)), 'value_0_0_1')
+        self.model.set_frozen_value((0,))
+        with self.count_fetches() as get_pivoted_data:
+            self.assertEqual(self.model.data(self.cell(0, 0)), 'value_0_0_0')
+        get_pivoted_data.assert_not_called()
+        # edits drop tiles of other frozen values
+        self.model.setData(self.cell(4, 4), 'edited')
+        self.assertEqual(len(self.model._tile_cache), 1)
+        self.model.set_frozen_value((1,))
+        self.assertEqual(self.model.data(self.cell(0, 0)), 'value_0_0_1')
+
+    def test_tiles_are_cleared_on_new_data(self):
+        self.model.data(self.cell(0, 0))
+        self.model.set_data([['a0', 'b0', 0, 'new']], ['test1', 'test2', 'test3'], [str, str, int],
+                            rows=('test1',), columns=('test2',), frozen=('test3',), frozen_value=(0,))
+        self.assertEqual(self.model.data(self.cell(0, 0)), 'new')
+
+
+if __name__ == '__main__':
+    unittest.main()
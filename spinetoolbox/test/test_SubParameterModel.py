@@ -0,0 +1,228 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for parameter value sub-models and their filter proxy models.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import unittest
+import time
+from unittest import mock
+from PySide2.QtCore import QObject
+from PySide2.QtWidgets import QApplication
+from models import SubParameterValueModel, ObjectFilterProxyModel, RelationshipFilterProxyModel
+from .benchmarks import benchmark
+
+# object_id, object_name, parameter_name, value
+OBJECT_HEADER = ["object_id", "object_name", "parameter_name", "value"]
+# object_id_list, object_name_list, parameter_name, value
+RELATIONSHIP_HEADER = ["object_id_list", "object_name_list", "parameter_name", "value"]
+
+
+class FakeParent(QObject):
+    """Stands in for a compound parameter model."""
+    def __init__(self, header):
+        super().__init__()
+        self.fixed_columns = []
+        self.header = header
+        self._tree_view_form = mock.MagicMock()
+        self.db_map = mock.MagicMock()
+
+    def horizontal_header_labels(self):
+        return self.header
+
+
+def accepted_values(model, column):
+    """Distinct values of column in rows accepted by the filters, computed row by row."""
+    data = model.sourceModel()._main_data
+    values = list()
+    for row in range(len(data)):
+        if not model.main_filter_accepts_row(row, None):
+            continue
+        if not model.auto_filter_accepts_row(row, None, ignored_columns=[column]):
+            continue
+        if data[row][column] not in values:
+            values.append(data[row][column])
+    return values
+
+
+class TestFilterProxyModels(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Overridden method. Runs once before all tests in this class."""
+        try:
+            cls.app = QApplication().processEvents()
+        except RuntimeError:
+            pass
+
+    def setUp(self):
+        self.parent = FakeParent(OBJECT_HEADER)
+        self.source_model = SubParameterValueModel(self.parent)
+        self.source_model.reset_model([
+            [1, "nemo", "weight", 1.0],
+            [1, "nemo", "speed", 3.0],
+            [2, "dory", "weight", 2.0],
+            [2, "dory", "speed", 3.0],
+            [3, "marlin", "weight", None],
+        ])
+        self.source_model.items_to_update = lambda indexes, data: [{}]
+        self.source_model.update_items_in_db = lambda items: True
+        self.model = ObjectFilterProxyModel(self.parent, 0)
+        self.model.setSourceModel(self.source_model)
+
+    def test_column_codes(self):
+        codes, values, code_of = self.source_model.column_codes(1)
+        self.assertEqual(list(codes), [0, 0, 1, 1, 2])
+        self.assertEqual(values, ["nemo", "dory", "marlin"])
+        self.assertEqual(code_of, {"nemo": 0, "dory": 1, "marlin": 2})
+        self.assertIs(self.source_model.column_codes(1)[0], codes)
+        # Numeric columns are encoded by numpy, with the same numbering
+        codes, values, code_of = self.source_model.column_codes(0)
+        self.assertEqual(list(codes), [0, 0, 1, 1, 2])
+        self.assertEqual(values, [1, 2, 3])
+        self.assertEqual(code_of, {1: 0, 2: 1, 3: 2})
+        self.assertEqual(list(self.source_model.value_mask(3, {3.0, None, 42})), [False, True, False, True, True])
+
+    def test_accepted_values(self):
+        self.assertEqual(self.model.accepted_values(3), [1.0, 3.0, 2.0, None])
+        self.model.update_filter({2, 3})
+        self.assertEqual(self.model.accepted_values(3), [3.0, 2.0, None])
+        self.model.set_filtered_out_values(2, {"speed"})
+        self.assertEqual(self.model.accepted_values(3), [2.0, None])
+        # The filter on the column itself is ignored
+        self.model.set_filtered_out_values(3, {2.0})
+        self.assertEqual(self.model.accepted_values(3), [2.0, None])
+        for column in range(4):
+            self.assertCountEqual(self.model.accepted_values(column), accepted_values(self.model, column))
+
+    def test_codes_follow_changes(self):
+        self.assertEqual(self.model.accepted_values(1), ["nemo", "dory", "marlin"])
+        self.source_model.setData(self.source_model.index(4, 1), "marlin the fish")
+        self.assertEqual(self.model.accepted_values(1), ["nemo", "dory", "marlin the fish"])
+        self.source_model.insertRows(5, 1)
+        self.source_model._main_data[5] = [4, "squirt", "weight", 0.5]
+        self.source_model.invalidate_column_codes()
+        self.assertEqual(self.model.accepted_values(1), ["nemo", "dory", "marlin the fish", "squirt"])
+        self.source_model.removeRows(0, 2)
+        self.assertEqual(self.model.accepted_values(1), ["dory", "marlin the fish", "squirt"])
+        self.source_model.batch_set_data([self.source_model.index(0, 1)], ["bruce"])
+        self.assertCountEqual(self.model.accepted_values(1), ["bruce", "dory", "marlin the fish", "squirt"])
+
+    def test_filter_accepts_rows(self):
+        self.assertEqual(self.model.rowCount(), 5)
+        self.model.update_filter({1, 3})
+        self.assertEqual(self.model.rowCount(), 3)
+        self.model.set_filtered_out_values(2, {"speed"})
+        self.assertEqual(self.model.rowCount(), 2)
+        self.model.set_filtered_out_values(3, {None})
+        self.assertEqual(self.model.rowCount(), 1)
+        self.assertEqual(self.model.index(0, 1).data(), "nemo")
+        self.model.clear_filtered_out_values()
+        self.model.update_filter(set())
+        self.assertEqual(self.model.rowCount(), 5)
+
+    def test_only_changed_masks_are_recomputed(self):
+        self.model.update_filter({1, 2})
+        self.model.set_filtered_out_values(2, {"speed"})
+        self.model.set_filtered_out_values(3, {2.0})
+        self.assertEqual(self.model.rowCount(), 1)
+        main_mask = self.model.main_filter_mask()
+        parameter_mask = self.model._auto_masks[2]
+        self.model.set_filtered_out_values(3, {1.0})
+        self.assertEqual(self.model.rowCount(), 1)
+        self.assertIs(self.model.main_filter_mask(), main_mask)
+        self.assertIs(self.model._auto_masks[2], parameter_mask)
+        self.model.update_filter({2})
+        self.assertIs(self.model._auto_masks[2], parameter_mask)
+        self.assertIsNot(self.model.main_filter_mask(), main_mask)
+        # Editing a value updates the masks of its column
+        self.source_model.batch_set_data([self.source_model.index(3, 2)], ["weight"])
+        self.assertIsNot(self.model._auto_masks.get(2), parameter_mask)
+        self.model.invalidateFilter()
+        self.assertEqual(self.model.rowCount(), 2)
+
+    def test_relationship_main_filter(self):
+        parent = FakeParent(RELATIONSHIP_HEADER)
+        source_model = SubParameterValueModel(parent)
+        source_model.reset_model([
+            ["1,2", "nemo,dory", "distance", 1],
+            ["1,3", "nemo,marlin", "distance", 2],
+            ["2,3", "dory,marlin", "distance", 3],
+            ["1,2", "nemo,dory", "time", 4],
+        ])
+        model = RelationshipFilterProxyModel(parent, 0)
+        model.setSourceModel(source_model)
+        self.assertEqual(model.accepted_values(3), [1, 2, 3, 4])
+        model.update_filter({1}, set())
+        self.assertEqual(model.accepted_values(3), [1, 2, 4])
+        model.update_filter({1}, {"2,3", "1,3"})
+        self.assertEqual(model.accepted_values(3), [2, 3])
+        model.set_filtered_out_values(2, {"time"})
+        model.update_filter({3}, set())
+        self.assertEqual(model.accepted_values(1), ["nemo,marlin", "dory,marlin"])
+        for column in range(4):
+            self.assertCountEqual(model.accepted_values(column), accepted_values(model, column))
+
+    def reset_with_generated_rows(self, row_count):
+        """Resets the source model with row_count rows of 1000 objects, 7 parameters and 100 values."""
+        self.source_model.reset_model([
+            [i % 1000, "object_{}".format(i % 1000), "parameter_{}".format(i % 7), i % 100] for i in range(row_count)
+        ])
+
+    def filter_generated_rows(self, row_count):
+        """Filters generated rows by object and parameter, checks the rows accepted
+        and returns the time the filtering took."""
+        self.reset_with_generated_rows(row_count)
+        self.source_model.column_codes(0)
+        self.source_model.column_codes(2)
+        tic = time.perf_counter()
+        self.model.update_filter(set(range(500)))
+        self.model.set_filtered_out_values(2, {"parameter_0"})
+        filtered_row_count = self.model.rowCount()
+        elapsed = time.perf_counter() - tic
+        self.assertEqual(filtered_row_count, sum(1 for i in range(row_count) if i % 1000 < 500 and i % 7 != 0))
+        return elapsed
+
+    def accepted_values_of_generated_rows(self, row_count):
+        """Filters generated rows by object and parameter, checks the values accepted in the value column
+        and returns the time it took to find them once the columns are encoded."""
+        self.reset_with_generated_rows(row_count)
+        self.model.update_filter(set(range(500)))
+        self.model.set_filtered_out_values(2, {"parameter_0"})
+        # The first time, the columns are encoded
+        self.assertCountEqual(self.model.accepted_values(3), accepted_values(self.model, 3))
+        tic = time.perf_counter()
+        values = self.model.accepted_values(3)
+        elapsed = time.perf_counter() - tic
+        self.assertEqual(values, list(range(100)))
+        return elapsed
+
+    def test_filter_generated_rows(self):
+        self.filter_generated_rows(7000)
+
+    def test_accepted_values_of_generated_rows(self):
+        self.accepted_values_of_generated_rows(7000)
+
+    @benchmark
+    def test_filter_benchmark(self):
+        self.assertLess(self.filter_generated_rows(2000000), 15.0)
+
+    @benchmark
+    def test_accepted_values_benchmark(self):
+        self.assertLess(self.accepted_values_of_generated_rows(2000000), 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for csv import and export.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from collections import namedtuple
+from unittest import mock
+from csv_import_export import export_spine_database_to_csv, import_csv_to_db, read_manifest, read_csv_in_chunks, \
+    column_type
+from .benchmarks import benchmark
+
+ObjectClass = namedtuple("ObjectClass", ["id", "name"])
+RelationshipClass = namedtuple("RelationshipClass", ["id", "name", "object_class_name_list"])
+
+
+class TestCsvImportExport(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+        self.object_classes = [ObjectClass(1, "dog"), ObjectClass(2, "fish"), ObjectClass(3, "whale/shark")]
+        self.relationship_classes = [RelationshipClass(1, "fish__dog", "fish,dog")]
+        self.object_parameters = {"fish": ["length", "name", "weight"]}
+        self.relationship_parameters = {"fish__dog": ["distance"]}
+        self.object_values = {
+            1: [(1, "pluto", None, None)],
+            2: [(2, "dory", "length", 2), (2, "dory", "weight", 1.5),
+                (3, "nemo", "length", 1), (3, "nemo", "name", "Nemo, the fish"), (3, "nemo", "weight", 2)],
+            3: []
+        }
+        self.relationship_values = {1: [(1, "dory,pluto", None, None), (2, "nemo,pluto", "distance", 3.5)]}
+        self.object_json = {2: [("nemo", "path", "[1, 2]")]}
+        self.relationship_json = {1: [("dory,pluto", "path", "[3, 4]")]}
+
+    def tearDown(self):
+        """Overridden method. Runs after each test.
+        Use this to free resources after a test if needed.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def export(self, chunk_size=10000):
+        """Exports the test data, with the database queries patched."""
+        classes = (self.object_classes, self.relationship_classes, self.object_parameters,
+                   self.relationship_parameters)
+        with mock.patch("csv_import_export.get_classes_and_parameters", return_value=classes), \
+                mock.patch("csv_import_export.object_value_rows", lambda db, id_, n: iter(self.object_values[id_])), \
+                mock.patch("csv_import_export.relationship_value_rows",
+                           lambda db, id_, n: iter(self.relationship_values[id_])), \
+                mock.patch("csv_import_export.object_json_rows", lambda db, id_, n: self.object_json.get(id_, [])), \
+                mock.patch("csv_import_export.relationship_json_rows",
+                           lambda db, id_, n: self.relationship_json.get(id_, [])):
+            export_spine_database_to_csv("db", self.manifest_path, chunk_size)
+
+    @staticmethod
+    def imported_items(import_data_mock):
+        """Returns the items passed in all calls to the import_data mock, as sets."""
+        items = [set() for _ in range(8)]
+        for args, _ in import_data_mock.call_args_list:
+            for item_set, item_list in zip(items, args[1:]):
+                item_set.update((x[0], tuple(x[1])) if isinstance(x, tuple) and isinstance(x[1], list)
+                                else x for x in item_list)
+        return items
+
+    def test_column_type(self):
+        self.assertEqual(column_type({"int"}), "int")
+        self.assertEqual(column_type({"int", "float"}), "float")
+        self.assertEqual(column_type({"float", "str"}), "str")
+        self.assertEqual(column_type(set()), "str")
+
+    def test_export(self):
+        self.export()
+        files = read_manifest(self.manifest_path)
+        self.assertEqual([f["file"] for f in files],
+                         ["manifest/obj_dog.csv", "manifest/obj_fish.csv", "manifest/obj_whale_shark.csv",
+                          "manifest/rel_fish__dog.csv", "manifest/json_fish.csv", "manifest/json_fish__dog.csv"])
+        fish = files[1]
+        self.assertEqual(fish["parameters"], ["length", "name", "weight"])
+        self.assertEqual(fish["types"], ["int", "str", "float"])
+        self.assertEqual(fish["row_count"], 2)
+        for f in files:
+            self.assertTrue(os.path.isfile(os.path.join(self.directory, f["file"])))
+
+    def test_export_keeps_other_files(self):
+        """Test that files next to the manifest are not replaced."""
+        file_path = os.path.join(self.directory, "obj_fish.csv")
+        with open(file_path, "w") as f:
+            f.write("not exported")
+        self.export()
+        with open(file_path) as f:
+            self.assertEqual(f.read(), "not exported")
+        self.assertEqual(sorted(os.listdir(self.directory)), ["manifest", "manifest.json", "obj_fish.csv"])
+
+    def test_read_in_chunks(self):
+        self.export()
+        fish = read_manifest(self.manifest_path)[1]
+        chunks = list(read_csv_in_chunks(os.path.join(self.directory, fish["file"]), fish, 1))
+        self.assertEqual([row_count for _, row_count in chunks], [1, 2])
+        self.assertEqual(chunks[0][0].objects, ["dory"])
+        self.assertEqual(chunks[0][0].parameter_values, [("value", "dory", "length", 2),
+                                                         ("value", "dory", "weight", 1.5)])
+        self.assertEqual(chunks[1][0].parameter_values, [("value", "nemo", "length", 1),
+                                                         ("value", "nemo", "name", "Nemo, the fish"),
+                                                         ("value", "nemo", "weight", 2.0)])
+
+    def test_export_import(self):
+        """Test that exported data is imported with the right classes, parameters and values."""
+        self.export()
+        progress = []
+        with mock.patch("excel_import_export.import_data") as mock_import_data:
+            mock_import_data.return_value = (1, [])
+            num_imported, error_log = import_csv_to_db(
+                "db", self.manifest_path, chunk_size=1,
+                progress_callback=lambda file_name, rows: progress.append((file_name, rows)))
+        self.assertEqual(error_log, [])
+        self.assertEqual(progress, [("manifest/obj_dog.csv", 1), ("manifest/obj_fish.csv", 1),
+                                    ("manifest/obj_fish.csv", 2), ("manifest/rel_fish__dog.csv", 1),
+                                    ("manifest/rel_fish__dog.csv", 2), ("manifest/json_fish.csv", 1),
+                                    ("manifest/json_fish__dog.csv", 1)])
+        # classes and parameters first, then one call per chunk
+        self.assertEqual(num_imported, 8)
+        items = self.imported_items(mock_import_data)
+        self.assertEqual(items[0], {"dog", "fish", "whale/shark"})
+        self.assertEqual(items[1], {("fish__dog", ("fish", "dog"))})
+        self.assertEqual(items[2], {("length", "fish"), ("name", "fish"), ("weight", "fish")})
+        self.assertEqual(items[3], {("distance", "fish__dog")})
+        self.assertEqual(items[4], {("pluto", "dog"), ("dory", "fish"), ("nemo", "fish")})
+        self.assertEqual(items[5], {("fish__dog", ("dory", "pluto")), ("fish__dog", ("nemo", "pluto"))})
+        self.assertEqual(items[6], {("dory", "length", "value", 2), ("dory", "weight", "value", 1.5),
+                                    ("nemo", "length", "value", 1), ("nemo", "name", "value", "Nemo, the fish"),
+                                    ("nemo", "weight", "value", 2), ("nemo", "path", "json", "[1, 2]")})
+        self.assertEqual(items[7], {("fish__dog", ("nemo", "pluto"), "distance", "value", 3.5),
+                                    ("fish__dog", ("dory", "pluto"), "path", "json", "[3, 4]")})
+
+    def test_import_bad_manifest(self):
+        with open(self.manifest_path, "w") as f:
+            f.write('{"resources": []}')
+        with self.assertRaises(ValueError):
+            import_csv_to_db("db", self.manifest_path)
+
+    def round_trip(self, object_count):
+        """Exports object_count objects with five parameters to csv and imports them,
+        checks the number of values imported and returns the import_data mock and the time it took."""
+        parameters = ["parameter_{}".format(p) for p in range(5)]
+        self.object_classes = [ObjectClass(2, "fish")]
+        self.relationship_classes = []
+        self.object_parameters = {"fish": parameters}
+        self.object_json = {}
+        self.object_values = {2: ((i, "fish_{}".format(i), p, i * 0.5) for i in range(object_count)
+                                  for p in parameters)}
+        tic = time.perf_counter()
+        self.export()
+        with mock.patch("excel_import_export.import_data") as mock_import_data:
+            mock_import_data.return_value = (0, [])
+            import_csv_to_db("db", self.manifest_path)
+        elapsed = time.perf_counter() - tic
+        value_count = sum(len(args[7]) for args, _ in mock_import_data.call_args_list)
+        self.assertEqual(value_count, object_count * len(parameters))
+        return mock_import_data, elapsed
+
+    def test_round_trip(self):
+        mock_import_data, _ = self.round_trip(20)
+        items = self.imported_items(mock_import_data)
+        self.assertEqual(items[4], {("fish_{}".format(i), "fish") for i in range(20)})
+        self.assertEqual(items[6], {("fish_{}".format(i), "parameter_{}".format(p), "value", i * 0.5)
+                                    for i in range(20) for p in range(5)})
+
+    @benchmark
+    def test_round_trip_benchmark(self):
+        """Test that a million values go through csv files in seconds."""
+        _, elapsed = self.round_trip(200000)
+        self.assertLess(elapsed, 30.0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,298 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for datapackage to Spine conversion.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import unittest
+import time
+import tracemalloc
+from collections import namedtuple
+from types import SimpleNamespace
+from unittest import mock
+from PySide2.QtWidgets import QApplication
+from datapackage_import_export import DatapackageToSpineConverter, datapackage_to_spine, get_resource_fields, \
+    ObjectIndex
+from .benchmarks import benchmark
+
+Item = namedtuple("Item", ["id", "name", "object_class_name_list"])
+
+
+class Rows:
+    """Rows made by a function of the row number as they are iterated, so they don't take memory."""
+    def __init__(self, count, make_row):
+        self.count = count
+        self.make_row = make_row
+
+    def __iter__(self):
+        return map(self.make_row, range(self.count))
+
+
+class FakeResource:
+    """Stands in for a datapackage resource with rows of strings."""
+    def __init__(self, name, field_names, rows, primary_key=(), foreign_keys=()):
+        self.name = name
+        self.schema = SimpleNamespace(
+            field_names=list(field_names),
+            fields=[SimpleNamespace(name=x) for x in field_names],
+            primary_key=list(primary_key),
+            foreign_keys=[
+                {"fields": fields, "reference": {"resource": resource, "fields": reference_fields}}
+                for fields, resource, reference_fields in foreign_keys
+            ]
+        )
+        self.rows = rows
+
+    def iter(self, cast=True):
+        return iter(self.rows)
+
+
+class FakeDBMap:
+    """Stands in for a database mapping, keeps the added items in lists."""
+    def __init__(self):
+        self.add_calls = 0
+        self.object_classes = []
+        self.relationship_classes = []
+        self.parameters = []
+        self.objects = []
+        self.parameter_values = []
+        self.relationships = []
+
+    def _add(self, items, new_items):
+        self.add_calls += 1
+        added = []
+        for item in new_items:
+            items.append(dict(item, id=len(items) + 1))
+            added.append(Item(len(items), item.get("name"), None))
+        return added
+
+    def add_object_classes(self, *items):
+        return self._add(self.object_classes, items)
+
+    def add_wide_relationship_classes(self, *items):
+        return self._add(self.relationship_classes, items)
+
+    def add_parameters(self, *items):
+        return self._add(self.parameters, items)
+
+    def add_objects(self, *items):
+        return self._add(self.objects, items)
+
+    def add_parameter_values(self, *items):
+        return self._add(self.parameter_values, items)
+
+    def add_wide_relationships(self, *items):
+        return self._add(self.relationships, items)
+
+    def object_class_list(self):
+        return [Item(x["id"], x["name"], None) for x in self.object_classes]
+
+    def wide_relationship_class_list(self):
+        names = {x["id"]: x["name"] for x in self.object_classes}
+        return [Item(x["id"], x["name"], ",".join(names[i] for i in x["object_class_id_list"]))
+                for x in self.relationship_classes]
+
+    def parameter_list(self):
+        return [Item(x["id"], x["name"], None) for x in self.parameters]
+
+    def object_list(self):
+        return [Item(x["id"], x["name"], None) for x in self.objects]
+
+    def commit_session(self, comment):
+        pass
+
+    def close(self):
+        pass
+
+
+class CountingDBMap(FakeDBMap):
+    """A fake database mapping that only counts the objects, parameter values and relationships added."""
+    def __init__(self):
+        super().__init__()
+        self.counts = dict(objects=0, parameter_values=0, relationships=0)
+
+    def _count(self, key, items):
+        self.counts[key] += len(items)
+        return [Item(self.counts[key], x.get("name"), None) for x in items]
+
+    def add_objects(self, *items):
+        return self._count("objects", items)
+
+    def add_parameter_values(self, *items):
+        return self._count("parameter_values", items)
+
+    def add_wide_relationships(self, *items):
+        return self._count("relationships", items)
+
+
+def nodes_and_units(node_count, unit_count):
+    """Returns a node resource and a unit resource with a foreign key to nodes."""
+    node = FakeResource("node", ["name", "capacity"],
+                        Rows(node_count, lambda i: ["node_{}".format(i), str(i)]), primary_key=["name"])
+    unit = FakeResource("unit", ["name", "node", "efficiency"],
+                        Rows(unit_count, lambda i: ["unit_{}".format(i), "node_{}".format(i % node_count), "0.5"]),
+                        primary_key=["name"], foreign_keys=[(["node"], "node", ["name"])])
+    return [node, unit]
+
+
+class TestDatapackageToSpine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Overridden method. Runs once before all tests in this class."""
+        try:
+            cls.app = QApplication().processEvents()
+        except RuntimeError:
+            pass
+
+    def setUp(self):
+        self.db_map = FakeDBMap()
+
+    def convert(self, resources, chunk_size=10000):
+        """Runs a DatapackageToSpineConverter on resources and returns it and the progress signals."""
+        progress = []
+        with mock.patch("datapackage_import_export.create_new_spine_database"), \
+                mock.patch("datapackage_import_export.DiffDatabaseMapping", return_value=self.db_map), \
+                mock.patch("datapackage_import_export.Package", return_value=SimpleNamespace(resources=resources)):
+            converter = DatapackageToSpineConverter("sqlite://", {}, "", chunk_size)
+        converter.signaler.progressed.connect(lambda step, msg: progress.append((step, msg)))
+        converter.run()
+        return converter, progress
+
+    def test_get_resource_fields(self):
+        fields = get_resource_fields(nodes_and_units(1, 1)[1])
+        self.assertEqual(fields.primary_key, [0])
+        self.assertEqual(fields.parameters, [(2, "unit_efficiency")])
+        self.assertEqual(fields.foreign_keys, [([1], "node", ("name",))])
+        self.assertEqual(fields.relationship_class_name, "unit__node")
+
+    def test_datapackage_to_spine(self):
+        with mock.patch("datapackage_import_export.Package",
+                        return_value=SimpleNamespace(resources=nodes_and_units(2, 3))):
+            datapackage_to_spine(self.db_map, "datapackage.json")
+        self.assertEqual([x["name"] for x in self.db_map.object_classes], ["node", "unit"])
+        self.assertEqual([x["name"] for x in self.db_map.relationship_classes], ["unit__node"])
+        self.assertEqual([x["name"] for x in self.db_map.parameters], ["node_capacity", "unit_efficiency"])
+        self.assertEqual([x["name"] for x in self.db_map.objects],
+                         ["node_0", "node_1", "unit_0", "unit_1", "unit_2"])
+        self.assertEqual([(x["object_id"], x["parameter_id"], x["value"]) for x in self.db_map.parameter_values],
+                         [(1, 1, "0"), (2, 1, "1"), (3, 2, "0.5"), (4, 2, "0.5"), (5, 2, "0.5")])
+        self.assertEqual([(x["name"], x["object_id_list"]) for x in self.db_map.relationships],
+                         [("unit__node_unit_0__node_0", [3, 1]),
+                          ("unit__node_unit_1__node_1", [4, 2]),
+                          ("unit__node_unit_2__node_0", [5, 1])])
+
+    def test_converter(self):
+        resources = nodes_and_units(2, 3)
+        # a unit referring to a node that doesn't exist gets no relationship
+        resources[1].rows = list(resources[1].rows) + [["unit_3", "node_9", "0.5"]]
+        converter, progress = self.convert(resources)
+        self.assertEqual([x["name"] for x in self.db_map.objects],
+                         ["node_node_0", "node_node_1", "unit_unit_0", "unit_unit_1", "unit_unit_2", "unit_unit_3"])
+        self.assertEqual(len(self.db_map.parameter_values), 6)
+        self.assertEqual([(x["name"], x["object_id_list"]) for x in self.db_map.relationships],
+                         [("unit__node_unit_unit_0__node_node_0", [3, 1]),
+                          ("unit__node_unit_unit_1__node_node_1", [4, 2]),
+                          ("unit__node_unit_unit_2__node_node_0", [5, 1])])
+        self.assertEqual(progress[-1], (converter.number_of_steps(), ""))
+
+    def test_converter_in_chunks(self):
+        converter, progress = self.convert(nodes_and_units(3, 5), chunk_size=2)
+        self.assertEqual([x["name"] for x in self.db_map.objects],
+                         ["node_node_{}".format(i) for i in range(3)] + ["unit_unit_{}".format(i) for i in range(5)])
+        self.assertEqual([x["object_id_list"] for x in self.db_map.relationships],
+                         [[4, 1], [5, 2], [6, 3], [7, 1], [8, 2]])
+        # classes, parameters, and objects with values for 2 + 3 chunks and relationships for 3 chunks
+        self.assertEqual(self.db_map.add_calls, 3 + 2 * 5 + 3)
+        steps = [step for step, _ in progress]
+        self.assertEqual(steps, sorted(steps))
+        self.assertEqual(steps[-1], converter.number_of_steps())
+        self.assertIn((11, "Adding objects and parameter values of unit..."), progress)
+        self.assertIn((21, "Adding relationships of unit..."), progress)
+
+    def test_object_index(self):
+        index = ObjectIndex()
+        index.batch_size = 2
+        index.add_objects([("a", 1), ("b", 2), ("c", 3)])
+        index.add_objects([("a", 4)])
+        self.assertEqual(index.object_ids(["a", "c", "d"]), {"a": 1, "c": 3})
+        index.add_references(("node", ("name",)), [(("x",), "a"), (("y",), "b"), (("y",), "c")])
+        self.assertEqual(index.references(("node", ("name",)), {("x",), ("y",), ("z",)}),
+                         {("x",): (1, "a"), ("y",): (3, "c")})
+        self.assertEqual(index.references(("unit", ("name",)), {("x",)}), {})
+        index.close()
+
+    def test_chunked_conversion_matches(self):
+        """Test that converting in chunks adds the same items as converting all at once."""
+        added = []
+        for chunk_size in (10000, 3):
+            self.db_map = FakeDBMap()
+            self.convert(nodes_and_units(4, 11), chunk_size)
+            added.append([[x["name"] for x in self.db_map.objects],
+                          [(x["object_id"], x["parameter_id"], x["value"]) for x in self.db_map.parameter_values],
+                          [(x["name"], x["object_id_list"]) for x in self.db_map.relationships]])
+        self.assertEqual(added[1], added[0])
+        self.assertEqual(len(added[0][2]), 11)
+
+    def convert_generated_units(self, unit_count):
+        """Converts 1000 nodes and unit_count units with datapackage_to_spine,
+        checks the relationships added and returns the time it took."""
+        self.db_map = FakeDBMap()
+        resources = nodes_and_units(1000, unit_count)
+        tic = time.perf_counter()
+        with mock.patch("datapackage_import_export.Package",
+                        return_value=SimpleNamespace(resources=resources)):
+            datapackage_to_spine(self.db_map, "datapackage.json")
+        elapsed = time.perf_counter() - tic
+        self.assertEqual(len(self.db_map.relationships), unit_count)
+        self.assertEqual(self.db_map.relationships[-1]["object_id_list"], [1000 + unit_count, (unit_count - 1) % 1000 + 1])
+        return elapsed
+
+    def test_convert_generated_units(self):
+        self.convert_generated_units(2000)
+
+    @benchmark
+    def test_benchmark(self):
+        """Test that conversion time grows linearly with the number of rows, up to a million units."""
+        times = [self.convert_generated_units(unit_count) for unit_count in (100000, 1000000)]
+        # ten times the rows, ten times the time, with a lot of room for noise
+        self.assertLess(times[1], 30 * times[0])
+        self.assertLess(times[1], 120.0)
+
+    def count_converted_units(self, unit_count, chunk_size=10000):
+        """Converts 1000 nodes and unit_count units into a counting database mapping,
+        checks the number of items added and returns the peak memory use if it's traced."""
+        self.db_map = CountingDBMap()
+        self.convert(nodes_and_units(1000, unit_count), chunk_size)
+        peak = tracemalloc.get_traced_memory()[1]
+        self.assertEqual(self.db_map.counts, dict(objects=1000 + unit_count, parameter_values=1000 + unit_count,
+                                                  relationships=unit_count))
+        return peak
+
+    def test_count_converted_units(self):
+        self.count_converted_units(2500, chunk_size=1000)
+
+    @benchmark
+    def test_memory_benchmark(self):
+        """Test that peak memory use doesn't grow with the number of rows."""
+        peaks = []
+        for unit_count in (20000, 200000):
+            tracemalloc.start()
+            peaks.append(self.count_converted_units(unit_count))
+            tracemalloc.stop()
+        self.assertLess(peaks[1], 2 * peaks[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,14 +7,20 @@ Created on Mon Nov 12 13:40:52 2018
 
 import os
 import uuid
+import tracemalloc
 import unittest
 from unittest import mock
 from unittest.mock import MagicMock
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy.orm import Session
 
 from spinedatabase_api import DatabaseMapping, DiffDatabaseMapping, create_new_spine_database
-from excel_import_export import stack_list_of_tuples, unstack_list_of_tuples, validate_sheet, SheetData, read_parameter_sheet, read_json_sheet, merge_spine_xlsx_data, read_spine_xlsx, export_spine_database_to_xlsx, get_unstacked_objects, import_xlsx_to_db
+from excel_import_export import stack_list_of_tuples, unstack_list_of_tuples, validate_sheet, SheetData, read_parameter_sheet, read_json_sheet, merge_spine_xlsx_data, read_spine_xlsx, export_spine_database_to_xlsx, get_unstacked_objects, import_xlsx_to_db, \
+    import_xlsx_to_db_in_chunks, read_sheet_header, stream_spine_database_to_xlsx, \
+    pivot_rows, stream_objects_to_xlsx, stream_relationships_to_xlsx, stream_json_array_to_xlsx, write_objects_to_xlsx
+from openpyxl import Workbook, load_workbook
+from .benchmarks import benchmark
 
 
 class TestExcelIntegration(unittest.TestCase):
@@ -201,6 +207,20 @@ class TestExcelIntegration(unittest.TestCase):
         # compare dbs
         self.compare_dbs(self.empty_db_map, self.db_map)
 
+    def test_export_import_in_chunks(self):
+        """Integration test exporting an excel and then importing it in chunks to a new database."""
+        export_spine_database_to_xlsx(self.db_map, self.temp_excel_filename)
+        import_xlsx_to_db_in_chunks(self.empty_db_map, self.temp_excel_filename, chunk_size=1)
+        self.empty_db_map.commit_session('Excel import')
+        self.compare_dbs(self.empty_db_map, self.db_map)
+
+    def test_stream_export_import(self):
+        """Integration test streaming an excel and then importing it to a new database."""
+        stream_spine_database_to_xlsx(self.db_map, self.temp_excel_filename, chunk_size=1)
+        import_xlsx_to_db(self.empty_db_map, self.temp_excel_filename)
+        self.empty_db_map.commit_session('Excel import')
+        self.compare_dbs(self.empty_db_map, self.db_map)
+
     def test_import_to_existing_data(self):
         """Integration test importing data to a database with existing items"""
         # export to excel
@@ -629,6 +649,264 @@ class TestExcelImport(unittest.TestCase):
         self.assertFalse(validate_sheet(ws_mock))
 
 
+class TestExcelImportInChunks(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        """
+        self.temp_excel_filename = str(uuid.uuid4()) + '.xlsx'
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'obj_fish'
+        ws.append(["Sheet type", "Data type", "object class name"])
+        ws.append(["object", "parameter", "fish"])
+        ws.append([])
+        ws.append(["fish", "weight", "speed"])
+        for i in range(25):
+            ws.append(["fish_{}".format(i), i, None if i % 2 else 2 * i])
+        ws.append([None, 100, 200])
+        ws = wb.create_sheet('rel_fish_dog')
+        ws.append(["Sheet type", "Data type", "relationship class name", "Number of relationship dimensions"])
+        ws.append(["relationship", "parameter", "fish__dog", 2])
+        ws.append([])
+        ws.append(["fish", "dog", "distance"])
+        ws.append(["fish_1", "pluto", 3])
+        ws.append(["fish_2", "scooby", None])
+        ws.append(["fish_3", None, 4])
+        ws = wb.create_sheet('json_fish')
+        ws.append(["Sheet type", "Data type", "object class name"])
+        ws.append(["object", "json array", "fish"])
+        ws.append([])
+        ws.append(["fish", "fish_1", "fish_2", "fish_3"])
+        ws.append(["json parameter", "weight", "weight", None])
+        ws.append([None, 1, 4, 7])
+        ws.append([None, 2, None, 8])
+        ws.append([None, 3, 6, 9])
+        ws = wb.create_sheet('notes')
+        ws['A1'] = "not a spine sheet"
+        wb.save(self.temp_excel_filename)
+        wb.close()
+
+    def tearDown(self):
+        """Overridden method. Runs after each test.
+        Use this to free resources after a test if needed.
+        """
+        try:
+            os.remove(self.temp_excel_filename)
+        except OSError:
+            pass
+
+    @staticmethod
+    def imported_items(import_data_mock):
+        """Returns the items passed in all calls to the import_data mock, as sets."""
+        items = [set() for _ in range(8)]
+        for args, _ in import_data_mock.call_args_list:
+            for item_set, item_list in zip(items, args[1:]):
+                item_set.update((x[0], tuple(x[1])) if isinstance(x, tuple) and isinstance(x[1], list)
+                                else x for x in item_list)
+        return items
+
+    def test_read_sheet_header(self):
+        wb = load_workbook(self.temp_excel_filename, read_only=True)
+        headers = [read_sheet_header(ws) for ws in wb.worksheets]
+        wb.close()
+        self.assertEqual(headers[0].class_name, 'fish')
+        self.assertEqual(headers[0].parameters, ['weight', 'speed'])
+        self.assertEqual(headers[1].object_classes, ['fish', 'dog'])
+        self.assertEqual(headers[1].parameters, ['distance'])
+        self.assertEqual(headers[2].data_type, 'json array')
+        self.assertEqual(headers[2].parameters, ['weight'])
+        self.assertIsNone(headers[3])
+
+    def test_import_json_sheets_only(self):
+        """Test that parameters only found in json sheets are imported before their values."""
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'json_fish'
+        ws.append(["Sheet type", "Data type", "object class name"])
+        ws.append(["object", "json array", "fish"])
+        ws.append([])
+        ws.append(["fish", "nemo", "nemo", "dory", "marlin"])
+        ws.append(["json parameter", "length", "speed", None, "fins"])
+        ws.append([None, 1, 3, 5, None])
+        ws.append([None, 2, 4, 6, None])
+        ws = wb.create_sheet('json_fish_dog')
+        ws.append(["Sheet type", "Data type", "relationship class name", "Number of relationship dimensions"])
+        ws.append(["relationship", "json array", "fish__dog", 2])
+        ws.append([])
+        ws.append(["fish", "nemo"])
+        ws.append(["dog", "pluto"])
+        ws.append(["json parameter", "distance"])
+        ws.append([None, 7])
+        wb.save(self.temp_excel_filename)
+        wb.close()
+        with mock.patch('excel_import_export.import_data') as mock_import_data:
+            mock_import_data.return_value = (1, [])
+            import_xlsx_to_db_in_chunks('db', self.temp_excel_filename)
+        chunked_items = self.imported_items(mock_import_data)
+        self.assertEqual(chunked_items[2], {('length', 'fish'), ('speed', 'fish')})
+        self.assertEqual(chunked_items[3], {('distance', 'fish__dog')})
+        # parameters are imported in the first call, before any values
+        self.assertEqual(mock_import_data.call_args_list[0][0][7:], ([], []))
+        with mock.patch('excel_import_export.import_data') as mock_import_data:
+            mock_import_data.return_value = (1, [])
+            import_xlsx_to_db('db', self.temp_excel_filename)
+        self.assertEqual(chunked_items, self.imported_items(mock_import_data))
+
+    def test_import_in_chunks(self):
+        """Test that importing in chunks imports the same items as importing the whole workbook."""
+        progress = []
+        with mock.patch('excel_import_export.import_data') as mock_import_data:
+            mock_import_data.return_value = (1, [])
+            num_imported, error_log = import_xlsx_to_db_in_chunks(
+                'db', self.temp_excel_filename, chunk_size=10,
+                progress_callback=lambda sheet, rows: progress.append((sheet, rows)))
+        self.assertEqual(error_log, [])
+        # classes and parameters, three chunks of object rows, one of relationships and one of json
+        self.assertEqual(num_imported, 6)
+        self.assertEqual(progress, [('obj_fish', 10), ('obj_fish', 20), ('obj_fish', 26),
+                                    ('rel_fish_dog', 3), ('json_fish', 2)])
+        chunked_items = self.imported_items(mock_import_data)
+        with mock.patch('excel_import_export.import_data') as mock_import_data:
+            mock_import_data.return_value = (1, [])
+            import_xlsx_to_db('db', self.temp_excel_filename)
+        items = self.imported_items(mock_import_data)
+        self.assertEqual(chunked_items, items)
+        self.assertIn(('fish_2', 'weight', 'json', '[4]'), chunked_items[6])
+        self.assertIn(('fish__dog', ('fish_1', 'pluto'), 'distance', 'value', 3), chunked_items[7])
+        self.assertEqual(len(chunked_items[4]), 25)
+
+    def test_import_in_parallel(self):
+        """Test that reading sheets in worker processes imports the same chunks in the same order."""
+        progress = []
+        with mock.patch('excel_import_export.import_data') as mock_import_data:
+            mock_import_data.return_value = (1, [])
+            import_xlsx_to_db_in_chunks('db', self.temp_excel_filename, chunk_size=10,
+                                        progress_callback=lambda sheet, rows: progress.append((sheet, rows)),
+                                        max_workers=2)
+        parallel_calls = mock_import_data.call_args_list
+        with mock.patch('excel_import_export.import_data') as mock_import_data:
+            mock_import_data.return_value = (1, [])
+            import_xlsx_to_db_in_chunks('db', self.temp_excel_filename, chunk_size=10)
+        self.assertEqual(parallel_calls, mock_import_data.call_args_list)
+        self.assertEqual(progress, [('obj_fish', 10), ('obj_fish', 20), ('obj_fish', 26),
+                                    ('rel_fish_dog', 3), ('json_fish', 2)])
+
+    def test_import_in_parallel_logs_sheet_errors(self):
+        """Test that an error reading a sheet in a worker process is logged after the chunks read before it."""
+        with mock.patch('excel_import_export.import_data') as mock_import_data:
+            mock_import_data.return_value = (1, [])
+            with mock.patch('excel_import_export.ProcessPoolExecutor', ThreadPoolExecutor), \
+                    mock.patch('excel_import_export.read_sheet_in_chunks', side_effect=ValueError("bad row")):
+                num_imported, error_log = import_xlsx_to_db_in_chunks('db', self.temp_excel_filename, max_workers=2)
+        self.assertEqual(num_imported, 1)
+        self.assertEqual(error_log, [["sheet", "obj_fish", "Error reading sheet obj_fish: bad row"],
+                                     ["sheet", "rel_fish_dog", "Error reading sheet rel_fish_dog: bad row"],
+                                     ["sheet", "json_fish", "Error reading sheet json_fish: bad row"]])
+
+
+class TestExcelStreamExport(unittest.TestCase):
+
+    def setUp(self):
+        """Overridden method. Runs before each test.
+        """
+        self.temp_excel_filename = str(uuid.uuid4()) + '.xlsx'
+
+    def tearDown(self):
+        """Overridden method. Runs after each test.
+        Use this to free resources after a test if needed.
+        """
+        try:
+            os.remove(self.temp_excel_filename)
+        except OSError:
+            pass
+
+    def test_pivot_rows(self):
+        rows = [(2, 'nemo', 'weight', 1), (2, 'nemo', 'speed', None), (2, 'nemo', 'length', 3),
+                (1, 'dory', None, None),
+                (5, 'nemo,pluto', 'weight', 4)]
+        lines = list(pivot_rows(rows[:4], ['length', 'speed', 'weight']))
+        self.assertEqual(lines, [['nemo', 3, None, 1], ['dory', None, None, None]])
+        lines = list(pivot_rows(rows[4:], ['weight'], split_names=True))
+        self.assertEqual(lines, [['nemo', 'pluto', 4]])
+
+    def test_stream_export_read(self):
+        """Test that streamed sheets read back into the same data."""
+        wb = Workbook(write_only=True)
+        stream_relationships_to_xlsx(wb, 'fish__dog', ['fish', 'dog'], ['distance'],
+                                     [(1, 'nemo,pluto', 'distance', 3), (2, 'dory,pluto', None, None)])
+        stream_objects_to_xlsx(wb, 'fish', ['speed', 'weight'],
+                               [(1, 'dory', 'weight', 2), (2, 'nemo', 'speed', 1), (2, 'nemo', 'weight', 4)], 0)
+        stream_objects_to_xlsx(wb, 'a_very_long_object_class_name_for_a_sheet', [], [], 1)
+        self.assertTrue(stream_json_array_to_xlsx(wb, 'fish', ['fish'],
+                                                  [('dory', 'length', '[1, 2]'), ('nemo', 'length', '[3]')],
+                                                  'object', 0))
+        self.assertFalse(stream_json_array_to_xlsx(wb, 'dog', ['dog'], [('pluto', 'length', 'nan]')], 'object', 1))
+        self.assertTrue(stream_json_array_to_xlsx(wb, 'fish__dog', ['fish', 'dog'],
+                                                  [('nemo,pluto', 'path', '[5, 6, 7]')], 'relationship', 0))
+        wb.save(self.temp_excel_filename)
+        wb.close()
+        self.assertEqual(load_workbook(self.temp_excel_filename, read_only=True).sheetnames,
+                         ['rel_fish__dog', 'obj_fish', 'object_class1', 'json_fish', 'json_fish__dog'])
+
+        obj_data, rel_data, error_log = read_spine_xlsx(self.temp_excel_filename)
+        self.assertEqual(error_log, [])
+        self.assertEqual([d.class_name for d in obj_data], ['a_very_long_object_class_name_for_a_sheet', 'fish'])
+        fish = obj_data[1]
+        self.assertCountEqual(fish.objects, ['dory', 'nemo'])
+        self.assertCountEqual(fish.parameter_values, [('value', 'dory', 'weight', 2), ('value', 'nemo', 'speed', 1),
+                                                      ('value', 'nemo', 'weight', 4), ('json', 'dory', 'length', '[1, 2]'),
+                                                      ('json', 'nemo', 'length', '[3]')])
+        fish_dog = rel_data[0]
+        self.assertCountEqual(fish_dog.objects, [['dory', 'pluto'], ['nemo', 'pluto']])
+        self.assertCountEqual(fish_dog.parameter_values, [('value', 'nemo', 'pluto', 'distance', 3),
+                                                          ('json', 'nemo', 'pluto', 'path', '[5, 6, 7]')])
+
+    def export_objects(self, object_count, stream):
+        """Exports object_count objects with ten parameters to the temp file, streaming them or
+        writing them cell by cell, and returns the peak memory use if it's traced."""
+        parameters = ['parameter_{}'.format(p) for p in range(10)]
+        if stream:
+            rows = ((i, 'object_{}'.format(i), p, float(i)) for i in range(object_count) for p in parameters)
+            wb = Workbook(write_only=True)
+            stream_objects_to_xlsx(wb, 'fish', parameters, rows, 0)
+        else:
+            object_data = [['fish', [['object_{}'.format(i)] + [float(i)] * len(parameters)
+                                     for i in range(object_count)], ['fish'], parameters]]
+            wb = Workbook()
+            write_objects_to_xlsx(wb, object_data)
+        wb.save(self.temp_excel_filename)
+        wb.close()
+        return tracemalloc.get_traced_memory()[1]
+
+    def read_sheet_values(self, sheet_name):
+        """Returns the values of the named sheet in the temp file, without trailing empty cells."""
+        wb = load_workbook(self.temp_excel_filename, read_only=True)
+        values = [list(row) for row in wb[sheet_name].values]
+        wb.close()
+        for row in values:
+            while row and row[-1] is None:
+                row.pop()
+        return values
+
+    def test_stream_export_matches_cell_export(self):
+        self.export_objects(20, stream=True)
+        streamed = self.read_sheet_values('obj_fish')
+        self.export_objects(20, stream=False)
+        self.assertEqual(streamed, self.read_sheet_values('obj_fish'))
+        self.assertEqual(streamed[-1], ['object_19'] + [19.0] * 10)
+
+    @benchmark
+    def test_stream_export_benchmark(self):
+        """Test that streaming a sheet uses a fraction of the memory of writing it cell by cell."""
+        tracemalloc.start()
+        stream_peak = self.export_objects(5000, stream=True)
+        tracemalloc.stop()
+        tracemalloc.start()
+        cell_peak = self.export_objects(5000, stream=False)
+        tracemalloc.stop()
+        self.assertLess(stream_peak * 10, cell_peak)
+
 class TestStackUnstack(unittest.TestCase):
 
     def test_stack_list_of_tuples(self):
@@ -0,0 +1,147 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for the graph layout engines and graph data construction.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import unittest
+import time
+from unittest import mock
+import numpy as np
+from graph_layout import sparse_adjacency, max_min_pivots, sparse_layout, dense_layout, relationship_arcs, \
+    parallel_arc_groups, GraphLayoutWorker
+from .benchmarks import benchmark
+
+
+class TestGraphLayout(unittest.TestCase):
+
+    def test_sparse_adjacency_is_symmetric(self):
+        adjacency = sparse_adjacency(3, [0, 1], [1, 2])
+        self.assertEqual((adjacency != adjacency.T).nnz, 0)
+        self.assertEqual(adjacency.nnz, 4)
+
+    def test_max_min_pivots_cover_all_components(self):
+        adjacency = sparse_adjacency(6, [0, 1, 3, 4], [1, 2, 4, 5])
+        pivots, distances = max_min_pivots(adjacency, 2)
+        self.assertEqual(len(pivots), 2)
+        self.assertEqual({p // 3 for p in pivots}, {0, 1})
+        self.assertEqual(distances.shape, (2, 6))
+
+    def test_path_graph_edges_have_spread_length(self):
+        x, y = sparse_layout(5, [0, 1, 2, 3], [1, 2, 3, 4], 100)
+        lengths = np.hypot(np.diff(x), np.diff(y))
+        np.testing.assert_allclose(lengths, 100, rtol=0.05)
+
+    def test_heavy_positions_are_pinned(self):
+        pos = mock.Mock()
+        pos.x.return_value = 10.0
+        pos.y.return_value = -20.0
+        heavy_positions = {0: pos}
+        x, y = sparse_layout(3, [0, 1], [1, 2], 100, heavy_positions)
+        self.assertEqual((x[0], y[0]), (10.0, -20.0))
+
+    def test_dense_and_sparse_layouts_agree_on_edge_lengths(self):
+        src_ind_list = [0, 1, 2, 3, 0]
+        dst_ind_list = [1, 2, 3, 4, 5]
+        for layout in (dense_layout, sparse_layout):
+            x, y = layout(6, src_ind_list, dst_ind_list, 100)
+            lengths = np.hypot(x[src_ind_list] - x[dst_ind_list], y[src_ind_list] - y[dst_ind_list])
+            np.testing.assert_allclose(lengths, 100, rtol=0.1)
+
+    def test_single_vertex(self):
+        x, y = sparse_layout(1, [], [], 100)
+        self.assertEqual((list(x), list(y)), ([0], [0]))
+
+    def test_large_graph(self):
+        vertex_count = 20000
+        random = np.random.RandomState(0)
+        src = random.randint(0, vertex_count, 2 * vertex_count)
+        dst = random.randint(0, vertex_count, 2 * vertex_count)
+        x, y = sparse_layout(vertex_count, src, dst, 100)
+        self.assertEqual(len(x), vertex_count)
+        self.assertTrue(np.all(np.isfinite(x)) and np.all(np.isfinite(y)))
+
+    def test_relationship_arcs(self):
+        object_ind = {10: 0, 20: 1, 30: 2}
+        src, dst, rel = relationship_arcs(object_ind, ["10,20,30", "20,40", "30"])
+        self.assertEqual(list(zip(src, dst, rel)), [(0, 1, 0), (1, 2, 0), (2, 0, 0), (2, 2, 2)])
+
+    def test_relationship_arcs_without_vertices(self):
+        src, dst, rel = relationship_arcs({}, ["10,20"])
+        self.assertEqual((len(src), len(dst), len(rel)), (0, 0, 0))
+
+    @staticmethod
+    def random_relationships(object_count, relationship_count):
+        """Returns an index for half of object_count objects and random object id lists."""
+        random = np.random.RandomState(0)
+        object_ids = random.permutation(object_count) + 1
+        object_ind = {int(id_): ind for ind, id_ in enumerate(object_ids[:object_count // 2])}
+        object_id_lists = [
+            ",".join(str(x) for x in random.randint(1, object_count + 1, random.randint(1, 4)))
+            for _ in range(relationship_count)
+        ]
+        return object_ind, object_id_lists
+
+    @staticmethod
+    def expected_arcs(object_ind, object_id_lists, sample):
+        """Returns the arcs of the relationships in sample, computed one by one."""
+        expected = list()
+        for k in sorted(sample):
+            ids = [int(x) for x in object_id_lists[k].split(",")]
+            for a, b in zip(ids, ids[1:] + ids[:1]):
+                if a in object_ind and b in object_ind:
+                    expected.append((object_ind[a], object_ind[b], k))
+        return expected
+
+    def test_relationship_arcs_random(self):
+        object_ind, object_id_lists = self.random_relationships(200, 1000)
+        src, dst, rel = relationship_arcs(object_ind, object_id_lists)
+        expected = self.expected_arcs(object_ind, object_id_lists, range(len(object_id_lists)))
+        self.assertEqual(list(zip(src, dst, rel)), expected)
+
+    @benchmark
+    def test_relationship_arcs_benchmark(self):
+        relationship_count = 100000
+        object_ind, object_id_lists = self.random_relationships(20000, relationship_count)
+        tic = time.perf_counter()
+        src, dst, rel = relationship_arcs(object_ind, object_id_lists)
+        elapsed = time.perf_counter() - tic
+        # Check against a straightforward implementation on a sample of relationships
+        sample = set(np.random.RandomState(1).randint(0, relationship_count, 100))
+        actual = [(s, d, r) for s, d, r in zip(src, dst, rel) if r in sample]
+        self.assertEqual(actual, self.expected_arcs(object_ind, object_id_lists, sample))
+        self.assertLess(elapsed, 2.0)
+
+    def test_parallel_arc_groups(self):
+        groups = parallel_arc_groups([0, 1, 2, 1, 0], [1, 2, 0, 0, 1])
+        self.assertEqual([list(g) for g in groups], [[0, 3, 4], [1], [2]])
+
+    def test_parallel_arc_groups_empty(self):
+        self.assertEqual(parallel_arc_groups([], []), [])
+
+    def test_worker_reports_any_error(self):
+        worker = GraphLayoutWorker(3, 2, [0], [1], 100, {})
+        finished = mock.MagicMock()
+        failed = mock.MagicMock()
+        worker.signaler.finished.connect(finished)
+        worker.signaler.failed.connect(failed)
+        with mock.patch("graph_layout.dense_layout", side_effect=RuntimeError("boom")):
+            worker.run()
+        finished.assert_not_called()
+        failed.assert_called_once_with(3, "RuntimeError: boom")
+
+
+if __name__ == '__main__':
+    unittest.main()
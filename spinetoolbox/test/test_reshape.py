@@ -0,0 +1,137 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for the columnar reshape functions, compared with the ones in excel_import_export.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import unittest
+import json
+import random
+import time
+import excel_import_export
+import reshape
+from .benchmarks import benchmark
+
+HEADERS = ["object_class", "object", "parameter", "value"]
+
+
+def random_rows(row_count, with_none=True):
+    """Returns stacked rows with repeated keys, and None in keys and names if with_none is True."""
+    none = [None] if with_none else []
+    return [[random.choice(["fish", "dog", "cat"] + none), random.randint(0, 5),
+             random.choice(["weight", "speed", "length"] + none), random.choice([1, 2.5, "x", None])]
+            for _ in range(row_count)]
+
+
+def timed(function, *args):
+    """Returns the output of function and the time it took."""
+    tic = time.perf_counter()
+    output = function(*args)
+    return output, time.perf_counter() - tic
+
+
+class TestReshape(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+
+    def test_rank_codes(self):
+        codes, values = reshape.rank_codes(["b", None, "a", "b", "c"])
+        self.assertEqual(list(codes), [1, -1, 0, 1, 2])
+        self.assertEqual(values, ["a", "b", "c"])
+
+    def test_unstack_list_of_tuples(self):
+        for _ in range(200):
+            data = random_rows(random.randint(0, 30))
+            for key_cols, value_name_col in (([0, 1], 2), ([0], [1, 2]), ([1], [2]), ([], 2)):
+                try:
+                    expected = excel_import_export.unstack_list_of_tuples(data, HEADERS, key_cols, value_name_col, 3)
+                except TypeError:
+                    # None mixed with names that can't be sorted
+                    continue
+                output = reshape.unstack_list_of_tuples(data, HEADERS, key_cols, value_name_col, 3)
+                self.assertEqual(output, expected)
+
+    def test_unstack_list_of_tuples_last_value_wins(self):
+        data = [["fish", "nemo", "weight", 1], ["fish", "nemo", "weight", 2], ["fish", "nemo", "weight", None]]
+        output, headers = reshape.unstack_list_of_tuples(data, HEADERS, [0, 1], 2, 3)
+        self.assertEqual(output, [["fish", "nemo", 2]])
+        self.assertEqual(headers, ["object_class", "object", "weight"])
+
+    def test_stack_list_of_tuples(self):
+        data = [["fish", "nemo", 1, None], ["dog", "pluto", 3, 4]]
+        headers = ["object_class", "object", "weight", "speed"]
+        expected = excel_import_export.stack_list_of_tuples(data, headers, [0, 1], [2, 3])
+        output = reshape.stack_list_of_tuples(data, headers, [0, 1], [2, 3])
+        self.assertEqual(output, expected)
+        self.assertEqual(output[1]._fields, ("object_class", "object", "parameter", "value"))
+        self.assertEqual(reshape.stack_list_of_tuples([], headers, [0, 1], [2, 3]), [])
+
+    def test_pack_and_unpack_json_parameters(self):
+        for _ in range(200):
+            data = random_rows(random.randint(0, 30), with_none=False)
+            for key_cols, index_col in (([0, 1], None), ([0], 1), ([0, 2], 1), ([], 1)):
+                expected = excel_import_export.pack_json_parameters(data, key_cols, 3, index_col)
+                self.assertEqual(reshape.pack_json_parameters(data, key_cols, 3, index_col), expected)
+            packed = [[row[0], json.dumps(row[1:]), row[2]] for row in data]
+            for json_index in (0, 1):
+                packed_data = [row[1 - json_index:] for row in packed]
+                expected = excel_import_export.unpack_json_parameters(packed_data, json_index)
+                self.assertEqual(reshape.unpack_json_parameters(packed_data, json_index), expected)
+
+    def compare_implementations(self, row_count):
+        """Checks that old and new implementations give the same output on row_count rows of objects
+        with 10 parameters each, and returns the old and new times of unstack, pack, unpack and stack."""
+        stacked = [("class_{}".format(i // 10 % 10), "object_{}".format(i // 10), "parameter_{}".format(i % 10), i)
+                   for i in range(row_count)]
+        times = []
+        expected, old_time = timed(excel_import_export.unstack_list_of_tuples, stacked, HEADERS, [0, 1], 2, 3)
+        output, new_time = timed(reshape.unstack_list_of_tuples, stacked, HEADERS, [0, 1], 2, 3)
+        self.assertEqual(output, expected)
+        times.append((old_time, new_time))
+
+        expected, old_time = timed(excel_import_export.pack_json_parameters, stacked, [0, 1], 3, 2)
+        output, new_time = timed(reshape.pack_json_parameters, stacked, [0, 1], 3, 2)
+        self.assertEqual(output, expected)
+        times.append((old_time, new_time))
+
+        packed = expected
+        expected, old_time = timed(excel_import_export.unpack_json_parameters, packed, 2)
+        output, new_time = timed(reshape.unpack_json_parameters, packed, 2)
+        self.assertEqual(output, expected)
+        times.append((old_time, new_time))
+
+        unstacked, headers = reshape.unstack_list_of_tuples(stacked, HEADERS, [0, 1], 2, 3)
+        value_cols = list(range(2, len(headers)))
+        expected, old_time = timed(excel_import_export.stack_list_of_tuples, unstacked, headers, [0, 1], value_cols)
+        output, new_time = timed(reshape.stack_list_of_tuples, unstacked, headers, [0, 1], value_cols)
+        self.assertEqual(output, expected)
+        times.append((old_time, new_time))
+        return times
+
+    def test_implementations_agree(self):
+        self.compare_implementations(10000)
+
+    @benchmark
+    def test_benchmark(self):
+        """Compare old and new implementations on 1M rows: 100000 objects with 10 parameters each."""
+        unstack, pack, unpack, stack = self.compare_implementations(1000000)
+        self.assertLess(unstack[1], unstack[0])
+        self.assertLess(pack[1], pack[0])
+        self.assertLess(unpack[1], unpack[0] * 1.25)
+        self.assertLess(stack[1], stack[0] * 1.25)
+
+if __name__ == '__main__':
+    unittest.main()
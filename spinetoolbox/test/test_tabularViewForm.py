@@ -0,0 +1,209 @@
+######################################################################################################################
+# Copyright (C) 2017 - 2018 Spine project consortium
+# This file is part of Spine Toolbox.
+# Spine Toolbox is free software: you can redistribute it and/or modify it under the terms of the GNU Lesser General
+# Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option)
+# any later version. This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+# without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General
+# Public License for more details. You should have received a copy of the GNU Lesser General Public License along with
+# this program. If not, see <http://www.gnu.org/licenses/>.
+######################################################################################################################
+
+"""
+Unit tests for TabularViewForm class.
+
+:author: Spine Toolbox contributors
+:date:   18.10.2026
+"""
+
+import unittest
+import json
+import time
+from collections import namedtuple
+from unittest import mock
+from PySide2.QtWidgets import QApplication
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String
+from sqlalchemy.orm import Session
+from widgets.tabular_view_widget import TabularViewForm, UsedNames, OBJECT_CLASS, DATA_VALUE, unpack_json, \
+    pack_json, chunks
+from .benchmarks import benchmark
+
+ObjectClass = namedtuple("ObjectClass", ["id", "name"])
+Object = namedtuple("Object", ["id", "class_id", "name"])
+Parameter = namedtuple("Parameter", ["id", "name", "object_class_id", "relationship_class_id"])
+Value = namedtuple("Value", ["id", "object_id", "object_name", "parameter_id", "parameter_name", "index", "value", "json"])
+
+
+def query(items):
+    """mock query that returns items"""
+    q = mock.MagicMock()
+    q.all.return_value = list(items)
+    q.yield_per.return_value = iter(items)
+    q.filter.return_value = q
+    q.filter_by.return_value = q
+    q.first.return_value = items[0] if items else None
+    return q
+
+
+class TestTabularViewForm(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Overridden method. Runs once before all tests in this class."""
+        try:
+            cls.app = QApplication().processEvents()
+        except RuntimeError:
+            pass
+
+    def setUp(self):
+        """Makes a TabularViewForm with a mock database with two object classes"""
+        self.object_classes = [ObjectClass(1, "fish"), ObjectClass(2, "dog")]
+        self.objects = {1: [Object(1, 1, "nemo"), Object(2, 1, "dory")], 2: [Object(3, 2, "pluto")]}
+        self.db_map = mock.MagicMock()
+        self.db_map.object_class_list.side_effect = lambda: query(self.object_classes)
+        self.db_map.wide_relationship_class_list.side_effect = lambda: query([])
+        self.db_map.object_list.side_effect = lambda class_id=None: query(self.objects.get(class_id, []))
+        self.db_map.parameter_list.side_effect = lambda: query([Parameter(1, "weight", 1, None)])
+        self.values = [Value(1, 1, "nemo", 1, "weight", 1, "1", None), Value(2, 2, "dory", 1, "weight", 1, "2", "[2]")]
+        self.db_map.object_parameter_value_list.side_effect = lambda: query(self.values)
+        self.db_map.add_objects.side_effect = lambda *items: [
+            Object(10 + i, item["class_id"], item["name"]) for i, item in enumerate(items)]
+        self.db_map.add_parameter_values.side_effect = lambda *items: [
+            Value(10 + i, item["object_id"], None, item["parameter_id"], None, item["index"], item["value"], None)
+            for i, item in enumerate(items)]
+        self.form = TabularViewForm(mock.MagicMock(), self.db_map, "mock_db")
+
+    def tearDown(self):
+        self.form.deleteLater()
+        self.form = None
+
+    def select_class(self, class_name):
+        self.form.current_class_type = OBJECT_CLASS
+        self.form.current_class_name = class_name
+        self.form.current_value_type = DATA_VALUE
+        self.form.load_objects()
+        self.form.load_parameters()
+
+    def test_open_loads_only_classes(self):
+        self.assertEqual(self.form.ui.list_select_class.count(), 2)
+        self.db_map.object_list.assert_not_called()
+        self.db_map.parameter_list.assert_not_called()
+        self.db_map.object_parameter_value_list.assert_not_called()
+
+    def test_select_class_loads_its_objects(self):
+        self.select_class("fish")
+        self.db_map.object_list.assert_called_once_with(class_id=1)
+        self.assertEqual(set(self.form.objects), {"nemo", "dory"})
+        self.assertEqual(set(self.form.parameters), {"weight"})
+
+    def test_class_items_are_cached_until_db_changes(self):
+        self.select_class("fish")
+        self.select_class("dog")
+        self.select_class("fish")
+        self.assertEqual(self.db_map.object_list.call_count, 2)
+        self.objects[1].append(Object(4, 1, "marlin"))
+        self.form.db_changed()
+        self.select_class("fish")
+        self.assertEqual(self.db_map.object_list.call_count, 3)
+        self.assertEqual(set(self.form.objects), {"nemo", "dory", "marlin"})
+
+    def test_save_model(self):
+        self.form.ui.list_select_class.setCurrentRow(1)
+        self.form.select_data()
+        self.assertEqual(self.form.current_class_name, "fish")
+        model = self.form.model.model
+        model._add_data(("nemo", "weight", 1), "3")
+        model._add_data(("dory", "weight", 2), "4")
+        model._delete_data(("dory", "weight", 1))
+        self.assertTrue(model._add_index_value("marlin", "fish"))
+        model._add_data(("marlin", "weight", 1), "5")
+        object_list_calls = self.db_map.object_list.call_count
+        self.form.save_model()
+        self.assertEqual(self.db_map.update_parameter_values.call_args_list,
+                         [mock.call({"id": 2, "value": None}), mock.call({"id": 1, "value": "3"})])
+        self.db_map.add_objects.assert_called_once_with({"name": "marlin", "class_id": 1})
+        self.assertEqual(sorted(self.db_map.add_parameter_values.call_args[0], key=lambda x: x["object_id"]),
+                         [{"object_id": 2, "parameter_id": 1, "index": 2, "value": "4"},
+                          {"object_id": 10, "parameter_id": 1, "index": 1, "value": "5"}])
+        # local data is updated without loading it again
+        self.assertIn("marlin", self.form.class_objects("fish"))
+        self.assertEqual(self.db_map.object_list.call_count, object_list_calls)
+        self.assertEqual(set(self.form.parameter_values), {(1, 1, 1), (2, 1, 1), (2, 1, 2), (10, 1, 1)})
+        self.assertFalse(self.form.parameter_values[(2, 1, 1)].has_value)
+        # added values are updated on next save
+        model._add_data(("marlin", "weight", 1), "6")
+        self.form.save_model()
+        self.db_map.update_parameter_values.assert_called_with({"id": self.form.parameter_values[(10, 1, 1)].id,
+                                                                "value": "6"})
+
+    def test_select_json_loads_data(self):
+        self.form.ui.list_select_class.setCurrentRow(1)
+        self.form.ui.comboBox_value_type.setCurrentText("json")
+        self.assertEqual(self.form.current_value_type, "json")
+        model = self.form.model.model
+        self.assertEqual(model._data, {("dory", "weight", 1, 1): 2})
+
+    def test_chunks(self):
+        self.assertEqual(list(chunks(list(range(5)), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_used_names(self):
+        engine = create_engine("sqlite://")
+        metadata = MetaData()
+        table = Table("object", metadata, Column("id", Integer, primary_key=True), Column("name", String))
+        metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(table.insert(), [{"id": 1, "name": "dory"}, {"id": 2, "name": "pluto"}])
+        session = Session(engine)
+        names = UsedNames(session.query(table))
+        with mock.patch("widgets.tabular_view_widget.IN_QUERY_CHUNK_SIZE", 2), \
+                mock.patch.object(session, "query", wraps=session.query) as session_query:
+            names.load(["nemo", "dory", "marlin", "bruce"])
+            self.assertEqual(session_query.call_count, 2)
+            self.assertNotIn("nemo", names)
+            self.assertIn("dory", names)
+            self.assertEqual(session_query.call_count, 2)
+            self.assertIn("pluto", names)
+            self.assertEqual(session_query.call_count, 3)
+        names.add("nemo")
+        self.assertIn("nemo", names)
+        names.difference_update({"dory", "nemo"})
+        self.assertNotIn("dory", names)
+        self.assertNotIn("nemo", names)
+        session.close()
+
+class TestJsonPacking(unittest.TestCase):
+
+    def test_unpack_json(self):
+        data = [['nemo', 'weight', 1, '[1, 2.5]'], ['dory', 'weight', 1, '[]'], ['dory', 'speed', 1, '[3]']]
+        self.assertEqual(list(unpack_json(data)), [('nemo', 'weight', 1, 1, 1),
+                                                   ('nemo', 'weight', 1, 2, 2.5),
+                                                   ('dory', 'speed', 1, 1, 3)])
+
+    def test_pack_json(self):
+        data = {('nemo', 'weight', 1, 3): 3, ('nemo', 'weight', 1, 1): 1, ('dory', 'speed', 1, 1): 2}
+        packed, empty_keys = pack_json(data, {('nemo', 'weight', 1), ('dory', 'weight', 1)})
+        self.assertEqual(packed, {('nemo', 'weight', 1): '[1, 0, 3]'})
+        self.assertEqual(empty_keys, {('dory', 'weight', 1)})
+
+    def unpack_and_pack_time_series(self, object_count, length):
+        """Unpacks and packs again a time series for each object and returns the time it took."""
+        series = json.dumps(list(range(length)))
+        data = [['object_{}'.format(i), 'demand', 1, series] for i in range(object_count)]
+        tic = time.perf_counter()
+        unpacked = {row[:-1]: row[-1] for row in unpack_json(data)}
+        packed, empty_keys = pack_json(unpacked, set(tuple(d[:3]) for d in data))
+        elapsed = time.perf_counter() - tic
+        self.assertEqual(len(unpacked), object_count * length)
+        self.assertEqual(packed[('object_7', 'demand', 1)], series)
+        self.assertFalse(empty_keys)
+        return elapsed
+
+    def test_unpack_and_pack_time_series(self):
+        self.unpack_and_pack_time_series(10, 24)
+
+    @benchmark
+    def test_unpack_and_pack_time_series_benchmark(self):
+        self.assertLess(self.unpack_and_pack_time_series(200, 8760), 10.0)
+
+if __name__ == '__main__':
+    unittest.main()
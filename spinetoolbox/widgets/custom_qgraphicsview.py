@@ -20,7 +20,7 @@ import logging
 from PySide2.QtWidgets import QGraphicsView, QGraphicsScene
 from PySide2.QtCore import Signal, Slot, Qt, QRectF, QPointF, QTimeLine
 from PySide2.QtGui import QColor, QPen, QBrush
-from graphics_items import LinkDrawer, Link, ItemImage
+from graphics_items import LinkDrawer, Link, ItemImage, ObjectItem, ArcItem
 from widgets.toolbars import DraggableWidget
 from widgets.custom_qlistview import DragListView
 
@@ -307,6 +307,8 @@ class GraphViewGraphicsView(QGraphicsView):
         self.default_zoom_factor = None
         self.max_rel_zoom_factor = 10.0
         self.min_rel_zoom_factor = 0.1
+        self.low_detail_scale = None  # Items are drawn in low detail below this scale, None to always use full detail
+        self.low_detail = False
 
     def mouseMoveEvent(self, event):
         """Register mouse position to recenter the scene after zoom."""
@@ -378,6 +380,7 @@ class GraphViewGraphicsView(QGraphicsView):
         self.resetTransform()
         self.scale(self.default_zoom_factor, self.default_zoom_factor)
         self.rel_zoom_factor = 1.0
+        self.update_level_of_detail()
 
     def gentle_zoom(self, factor):
         """Perform a zoom by a given factor."""
@@ -390,6 +393,22 @@ class GraphViewGraphicsView(QGraphicsView):
         delta_viewport_pos = self.target_viewport_pos - self.viewport().geometry().center()
         viewport_center = self.mapFromScene(self.target_scene_pos) - delta_viewport_pos
         self.centerOn(self.mapToScene(viewport_center))
+        self.update_level_of_detail()
+
+    def update_level_of_detail(self):
+        """Switch object and arc items between full and low detail if the scale crossed `low_detail_scale`.
+        In low detail, objects are drawn as dots and labels and arc tokens are hidden.
+        """
+        low_detail = self.low_detail_scale is not None and self.transform().m11() < self.low_detail_scale
+        if low_detail == self.low_detail:
+            return
+        self.low_detail = low_detail
+        scene = self.scene()
+        if not scene:
+            return
+        for item in scene.items():
+            if isinstance(item, (ObjectItem, ArcItem)) and item.topLevelItem() == item:
+                item.set_low_detail(low_detail)
 
     def scale_to_fit_scene(self):
         """Scale view so the scene fits best in it."""
@@ -21,13 +21,11 @@ import time  # just to measure loading time and sqlalchemy ORM performance
 import logging
 import json
 import numpy as np
-from numpy import atleast_1d as arr
-from scipy.sparse.csgraph import dijkstra
 from PySide2.QtWidgets import QMainWindow, QHeaderView, QDialog, QToolButton, QMessageBox, QCheckBox, \
     QFileDialog, QApplication, QErrorMessage, QLabel, QGraphicsScene, QGraphicsRectItem, QAction, \
-    QButtonGroup, QSizePolicy, QHBoxLayout, QWidget, QWidgetAction
-from PySide2.QtCore import Qt, Signal, Slot, QSettings, QPointF, QRectF, QSize
-from PySide2.QtGui import QFont, QFontMetrics, QGuiApplication, QIcon, QPixmap, QPalette
+    QButtonGroup, QSizePolicy, QHBoxLayout, QWidget, QWidgetAction, QProgressBar
+from PySide2.QtCore import Qt, Signal, Slot, QSettings, QPointF, QRectF, QSize, QThreadPool, QTimer
+from PySide2.QtGui import QFont, QFontMetrics, QGuiApplication, QIcon, QPixmap, QPalette, QPainter
 from ui.tree_view_form import Ui_MainWindow as tree_view_form_ui
 from ui.graph_view_form import Ui_MainWindow as graph_view_form_ui
 from config import MAINWINDOW_SS, STATUSBAR_SS
@@ -46,8 +44,11 @@ from models import ObjectTreeModel, ObjectClassListModel, RelationshipClassListM
     ObjectParameterDefinitionModel, ObjectParameterValueModel, \
     RelationshipParameterDefinitionModel, RelationshipParameterValueModel, \
     JSONArrayModel
-from graphics_items import ObjectItem, ArcItem, CustomTextItem
-from excel_import_export import import_xlsx_to_db, export_spine_database_to_xlsx
+from graphics_items import ObjectItem, ArcItem, AggregatedArcItem, CustomTextItem
+from graph_layout import GraphLayoutWorker, shortest_path_matrix, vertex_coordinates, relationship_arcs, \
+    parallel_arc_groups
+from excel_import_export import import_xlsx_to_db_in_chunks, stream_spine_database_to_xlsx
+from csv_import_export import import_csv_to_db, export_spine_database_to_csv
 from spinedatabase_api import copy_database
 from datapackage_import_export import datapackage_to_spine
 from helpers import busy_effect, relationship_pixmap, object_pixmap, fix_name_ambiguity
@@ -618,6 +619,7 @@ class DataStoreForm(QMainWindow):
             self.qsettings.setValue("{}/windowMaximized".format(self.settings_key), True)
         else:
             self.qsettings.setValue("{}/windowMaximized".format(self.settings_key), False)
+        self.object_tree_model.cancel_fetches()
         if self.db_map.has_pending_changes():
             self.show_commit_session_prompt()
         self.db_map.close()
@@ -639,6 +641,8 @@ class TreeViewForm(DataStoreForm):
         super().__init__(data_store, db_map, database, tree_view_form_ui())
         # Object tree selected indexes
         self.selected_tree_indexes = {}
+        # Fetch object tree children in the background, so large classes don't freeze the form
+        self.object_tree_model.async_fetch = True
         # JSON models
         self.object_parameter_json_model = JSONArrayModel(self)
         self.relationship_parameter_json_model = JSONArrayModel(self)
@@ -1094,10 +1098,13 @@ class TreeViewForm(DataStoreForm):
                 self.init_models()
             except (SpineDBAPIError, SpineIntegrityError) as e:
                 self.msg_error.emit(e.msg)
+        elif file_path.lower().endswith('.json'):
+            self.import_csv(file_path)
         elif file_path.lower().endswith('xlsx'):
             error_log = []
             try:
-                insert_log, error_log = import_xlsx_to_db(self.db_map, file_path)
+                insert_log, error_log = import_xlsx_to_db_in_chunks(
+                    self.db_map, file_path, progress_callback=self.show_import_progress, max_workers=None)
                 self.msg.emit("Excel file successfully imported.")
                 self.set_commit_rollback_actions_enabled(True)
                 # logging.debug(insert_log)
@@ -1114,13 +1121,41 @@ class TreeViewForm(DataStoreForm):
                     self.msg_error.emit(msg)
                     # logging.debug(error_log)
 
+    def import_csv(self, file_path):
+        """Import csv files listed in a manifest into current database."""
+        error_log = []
+        try:
+            insert_log, error_log = import_csv_to_db(
+                self.db_map, file_path, progress_callback=self.show_import_progress)
+            self.msg.emit("CSV files successfully imported.")
+            self.set_commit_rollback_actions_enabled(True)
+            self.init_models()
+        except (OSError, ValueError, KeyError) as e:
+            self.msg_error.emit("Unable to read manifest <b>{0}</b>: {1}".format(os.path.split(file_path)[1], e))
+        except SpineIntegrityError as e:
+            self.msg_error.emit(e.msg)
+        except SpineDBAPIError as e:
+            self.msg_error.emit("Unable to import CSV files: {}".format(e.msg))
+        finally:
+            if not len(error_log) == 0:
+                msg = "Something went wrong in importing CSV files " \
+                      "into the current session. Here is the error log:\n\n{0}".format(error_log)
+                # noinspection PyTypeChecker, PyArgumentList, PyCallByClass
+                self.msg_error.emit(msg)
+
+    def show_import_progress(self, sheet_name, row_count):
+        """Show how many rows have been imported from the given sheet in the status bar."""
+        self.ui.statusbar.showMessage("Importing sheet {0}: {1} rows imported".format(sheet_name, row_count))
+        self.ui.statusbar.repaint()
+
     @Slot("bool", name="show_export_file_dialog")
     def show_export_file_dialog(self, checked=False):
         """Show dialog to allow user to select a file to export."""
         answer = QFileDialog.getSaveFileName(self,
                                              "Export to file",
                                              self._data_store.project().project_dir,
-                                             "Excel file (*.xlsx);;SQlite database (*.sqlite *.db)")
+                                             "Excel file (*.xlsx);;SQlite database (*.sqlite *.db);;"
+                                             "CSV files with manifest (*.json)")
         file_path = answer[0]
         if not file_path:  # Cancel button clicked
             return
@@ -1128,13 +1163,15 @@ class TreeViewForm(DataStoreForm):
             self.export_to_sqlite(file_path)
         elif answer[1].startswith("Excel"):
             self.export_to_excel(file_path)
+        elif answer[1].startswith("CSV"):
+            self.export_to_csv(file_path)
 
     @busy_effect
     def export_to_excel(self, file_path):
         """Export data from database into Excel file."""
         filename = os.path.split(file_path)[1]
         try:
-            export_spine_database_to_xlsx(self.db_map, file_path)
+            stream_spine_database_to_xlsx(self.db_map, file_path)
             self.msg.emit("Excel file successfully exported.")
         except PermissionError:
             self.msg_error.emit("Unable to export to file <b>{0}</b>.<br/>"
@@ -1142,6 +1179,21 @@ class TreeViewForm(DataStoreForm):
         except OSError:
             self.msg_error.emit("[OSError] Unable to export to file <b>{0}</b>".format(filename))
 
+    @busy_effect
+    def export_to_csv(self, file_path):
+        """Export data from database into CSV files, listed in a manifest in file_path.
+        The files go in a folder named after the manifest."""
+        filename = os.path.split(file_path)[1]
+        try:
+            export_spine_database_to_csv(self.db_map, file_path)
+            self.msg.emit("CSV files successfully exported into folder <b>{0}</b>.".format(
+                os.path.splitext(filename)[0]))
+        except PermissionError:
+            self.msg_error.emit("Unable to export to file <b>{0}</b>.<br/>"
+                                "Close the files and try again.".format(filename))
+        except OSError:
+            self.msg_error.emit("[OSError] Unable to export to file <b>{0}</b>".format(filename))
+
     @busy_effect
     def export_to_sqlite(self, file_path):
         """Export data from database into SQlite file."""
@@ -1937,6 +1989,9 @@ class GraphViewForm(DataStoreForm):
         self.font_metric = QFontMetrics(self.font)
         self.extent = 6 * self.font.pointSize()
         self._spread = 3 * self.extent
+        # Draw items in low detail when objects are less than 16 pixels wide on screen
+        self.ui.graphicsView.low_detail_scale = 16 / self.extent
+        self.object_dot_pixmap_dict = {}
         self.object_label_color = self.palette().color(QPalette.Normal, QPalette.Window)
         self.object_label_color.setAlphaF(.5)
         self.arc_label_color = self.palette().color(QPalette.Normal, QPalette.Window)
@@ -1950,14 +2005,15 @@ class GraphViewForm(DataStoreForm):
         self.object_names = list()
         self.object_class_ids = list()
         self.object_class_names = list()
-        # Data for ArcItems
-        self.arc_object_id_lists = list()
-        self.arc_relationship_class_ids = list()
-        self.arc_object_class_name_lists = list()
-        self.arc_label_object_name_lists = list()
-        self.arc_label_object_class_name_lists = list()
-        self.src_ind_list = list()
-        self.dst_ind_list = list()
+        # Data for ArcItems, as parallel arrays. Relationship index is -1 for template arcs
+        self.src_inds = np.zeros(0, dtype=int)
+        self.dst_inds = np.zeros(0, dtype=int)
+        self.arc_relationship_inds = np.zeros(0, dtype=int)
+        self.arc_relationship_class_ids = np.zeros(0, dtype=int)
+        # Data for relationships
+        self.relationships = list()
+        self.relationship_class_name_dict = {}
+        self.relationship_class_object_class_name_lists = {}
         # Data for template ObjectItems and ArcItems (these are persisted across graph builds)
         self.heavy_positions = {}
         self.is_template = {}
@@ -1981,6 +2037,18 @@ class GraphViewForm(DataStoreForm):
         # Zoom widget and action
         self.zoom_widget_action = None
         self.zoom_widget = None
+        # Layout engine and arc aggregation actions
+        self.sparse_layout_action = None
+        self.aggregate_arcs_action = None
+        # Graph build in progress
+        self._graph_build_id = 0
+        self._graph_build_tic = None
+        self._layout_worker = None
+        self._scene_populator = None  # A generator that adds items to the scene
+        self._populate_batch_time = 0.05  # Seconds spent adding items before returning to the event loop
+        self._populate_timer = QTimer(self)
+        self.progress_bar = QProgressBar()
+        self.cancel_graph_build_button = QToolButton()
         # Set up splitters
         area = self.dockWidgetArea(self.ui.dockWidget_parameter)
         self._handle_parameter_dock_location_changed(area)
@@ -1992,6 +2060,8 @@ class GraphViewForm(DataStoreForm):
         self.setup_delegates()
         self.create_add_more_actions()
         self.setup_zoom_action()
+        self.setup_layout_action()
+        self.setup_graph_build_widgets()
         self.connect_signals()
         self.settings_key = "graphViewWidget" if not self.read_only else "graphViewWidgetReadOnly"
         self.restore_ui()
@@ -2042,6 +2112,32 @@ class GraphViewForm(DataStoreForm):
         self.ui.menuView.addSeparator()
         self.ui.menuView.addAction(self.zoom_widget_action)
 
+    def setup_layout_action(self):
+        """Setup actions in graph menu to select the sparse layout engine and to aggregate arcs."""
+        self.sparse_layout_action = QAction("Sparse layout (for large graphs)", self)
+        self.sparse_layout_action.setCheckable(True)
+        self.sparse_layout_action.setToolTip(
+            "Compute the layout from a few pivot vertices rather than all vertex pairs. "
+            "Faster and leaner on large graphs, slightly less accurate.")
+        self.aggregate_arcs_action = QAction("Aggregate parallel arcs", self)
+        self.aggregate_arcs_action.setCheckable(True)
+        self.aggregate_arcs_action.setToolTip(
+            "Draw all relationships between the same pair of objects as a single arc. "
+            "Double-click the arc to expand it.")
+        self.ui.menuGraph.addSeparator()
+        self.ui.menuGraph.addAction(self.sparse_layout_action)
+        self.ui.menuGraph.addAction(self.aggregate_arcs_action)
+
+    def setup_graph_build_widgets(self):
+        """Setup progress bar and cancel button in the status bar, shown while building the graph."""
+        self.progress_bar.setFixedWidth(200)
+        self.progress_bar.setTextVisible(False)
+        self.cancel_graph_build_button.setText("Cancel")
+        self.cancel_graph_build_button.setToolTip("Stop building the graph")
+        self.ui.statusbar.addPermanentWidget(self.progress_bar)
+        self.ui.statusbar.addPermanentWidget(self.cancel_graph_build_button)
+        self.hide_graph_build_widgets()
+
     def create_add_more_actions(self):
         """Create and 'Add more' action and button for the Item Palette views."""
         # object class
@@ -2086,6 +2182,10 @@ class GraphViewForm(DataStoreForm):
         self.zoom_widget.minus_pressed.connect(self._handle_zoom_widget_minus_pressed)
         self.zoom_widget.plus_pressed.connect(self._handle_zoom_widget_plus_pressed)
         self.zoom_widget.reset_pressed.connect(self._handle_zoom_widget_reset_pressed)
+        self.sparse_layout_action.toggled.connect(self._handle_sparse_layout_toggled)
+        self.aggregate_arcs_action.toggled.connect(self._handle_aggregate_arcs_toggled)
+        self._populate_timer.timeout.connect(self._populate_scene_batch)
+        self.cancel_graph_build_button.clicked.connect(self.cancel_graph_build)
 
     @Slot(name="_handle_zoom_widget_minus_pressed")
     def _handle_zoom_widget_minus_pressed(self):
@@ -2099,6 +2199,18 @@ class GraphViewForm(DataStoreForm):
     def _handle_zoom_widget_reset_pressed(self):
         self.ui.graphicsView.reset_zoom()
 
+    @Slot("bool", name="_handle_sparse_layout_toggled")
+    def _handle_sparse_layout_toggled(self, checked):
+        """Rebuild graph with the selected layout engine."""
+        if self._has_graph:
+            self.build_graph()
+
+    @Slot("bool", name="_handle_aggregate_arcs_toggled")
+    def _handle_aggregate_arcs_toggled(self, checked):
+        """Rebuild graph with or without aggregated arcs."""
+        if self._has_graph:
+            self.build_graph()
+
     @Slot(name="_handle_zoom_widget_action_hovered")
     def _handle_zoom_widget_action_hovered(self):
         """Called when the zoom widget action is hovered. Hide the 'Dock widgets' submenu in case
@@ -2148,21 +2260,45 @@ class GraphViewForm(DataStoreForm):
             self.ui.menuSession.removeAction(self.ui.actionCommit)
             self.ui.menuSession.removeAction(self.ui.actionRollback)
 
-    @busy_effect
     @Slot("bool", name="build_graph")
     def build_graph(self, checked=True):
-        """Initialize graph data and build graph."""
-        tic = time.clock()
+        """Initialize graph data and start computing the layout in a worker thread.
+        Any graph build still in progress is cancelled.
+        """
+        self.cancel_graph_build()
+        self._graph_build_tic = time.clock()
         self.init_graph_data()
-        self._has_graph = self.make_graph()
-        if self._has_graph:
-            self.ui.graphicsView.scale_to_fit_scene()
-            self.extend_scene_bg()
-            toc = time.clock()
-            self.msg.emit("Graph built in {} seconds\t".format(toc - tic))
-        else:
-            self.show_usage_msg()
         self.hidden_items = list()
+        if not self.object_names:
+            self.show_usage_msg()
+            return
+        self._graph_build_id += 1
+        self._layout_worker = GraphLayoutWorker(
+            self._graph_build_id, len(self.object_names), self.src_inds, self.dst_inds, self._spread,
+            self.heavy_positions, sparse=self.sparse_layout_action.isChecked())
+        self._layout_worker.signaler.finished.connect(self._handle_graph_layout_finished)
+        self._layout_worker.signaler.failed.connect(self._handle_graph_layout_failed)
+        self.progress_bar.setRange(0, 0)  # Busy indicator until the layout is ready
+        self.progress_bar.show()
+        self.cancel_graph_build_button.show()
+        QThreadPool.globalInstance().start(self._layout_worker)
+
+    @Slot("bool", name="cancel_graph_build")
+    def cancel_graph_build(self, checked=False):
+        """Cancel the graph build in progress, if any.
+        A layout being computed is discarded when ready; items already in the scene are kept.
+        """
+        self._graph_build_id += 1
+        self._layout_worker = None
+        if self._scene_populator is not None:
+            self._populate_timer.stop()
+            self._scene_populator = None
+            self.ui.graphicsView.scene().setSceneRect(QRectF())
+        self.hide_graph_build_widgets()
+
+    def hide_graph_build_widgets(self):
+        self.progress_bar.hide()
+        self.cancel_graph_build_button.hide()
 
     @Slot("QItemSelection", "QItemSelection", name="_handle_object_tree_selection_changed")
     def _handle_object_tree_selection_changed(self, selected, deselected):
@@ -2172,105 +2308,75 @@ class GraphViewForm(DataStoreForm):
     def init_graph_data(self):
         """Initialize graph data.
         """
-        rejected_object_names = [x.object_name for x in self.rejected_items]
+        rejected_object_names = {x.object_name for x in self.rejected_items}
         self.object_ids = list()
         self.object_names = list()
         self.object_class_ids = list()
         self.object_class_names = list()
+        selection_model = self.ui.treeView_object.selectionModel()
+        selected = {"root": False, "object_class": set(), "object": set()}
+        for index in selection_model.selectedIndexes():
+            item_type = index.data(Qt.UserRole)
+            if item_type == 'root':
+                selected["root"] = True
+            elif item_type in ('object_class', 'object'):
+                selected[item_type].add(index.data(Qt.UserRole + 1)['id'])
         root_item = self.object_tree_model.root_item
-        index = self.object_tree_model.indexFromItem(root_item)
-        is_root_selected = self.ui.treeView_object.selectionModel().isSelected(index)
         for i in range(root_item.rowCount()):
             object_class_item = root_item.child(i, 0)
             object_class_id = object_class_item.data(Qt.UserRole + 1)['id']
             object_class_name = object_class_item.data(Qt.UserRole + 1)['name']
-            index = self.object_tree_model.indexFromItem(object_class_item)
-            is_object_class_selected = self.ui.treeView_object.selectionModel().isSelected(index)
+            is_object_class_selected = selected["root"] or object_class_id in selected["object_class"]
             # Fetch object class if needed
-            if is_root_selected or is_object_class_selected:
-                 if self.object_tree_model.canFetchMore(index):
-                     self.object_tree_model.fetchMore(index)
+            if is_object_class_selected:
+                index = self.object_tree_model.indexFromItem(object_class_item)
+                if self.object_tree_model.canFetchMore(index):
+                    self.object_tree_model.fetchMore(index)
+            elif not selected["object"]:
+                continue
             for j in range(object_class_item.rowCount()):
-                object_item = object_class_item.child(j, 0)
-                object_id = object_item.data(Qt.UserRole + 1)["id"]
-                object_name = object_item.data(Qt.UserRole + 1)["name"]
+                object_ = object_class_item.child(j, 0).data(Qt.UserRole + 1)
+                object_id = object_["id"]
+                object_name = object_["name"]
                 if object_name in rejected_object_names:
                     continue
-                index = self.object_tree_model.indexFromItem(object_item)
-                is_object_selected = self.ui.treeView_object.selectionModel().isSelected(index)
-                if is_root_selected or is_object_class_selected or is_object_selected:
+                if is_object_class_selected or object_id in selected["object"]:
                     self.object_ids.append(object_id)
                     self.object_names.append(object_name)
                     self.object_class_ids.append(object_class_id)
                     self.object_class_names.append(object_class_name)
-        self.arc_object_id_lists = list()
-        self.arc_relationship_class_ids = list()
-        self.arc_object_class_name_lists = list()
-        self.arc_label_object_name_lists = list()
-        self.arc_label_object_class_name_lists = list()
-        self.src_ind_list = list()
-        self.dst_ind_list = list()
-        relationship_class_dict = {
-            x.id: {
-                "name": x.name,
-                "object_class_name_list": x.object_class_name_list
-            } for x in self.db_map.wide_relationship_class_list()
+        object_ind = {id_: ind for ind, id_ in enumerate(self.object_ids)}
+        relationship_class_list = self.db_map.wide_relationship_class_list().all()
+        self.relationship_class_name_dict = {x.id: x.name for x in relationship_class_list}
+        self.relationship_class_object_class_name_lists = {
+            x.id: x.object_class_name_list for x in relationship_class_list
         }
-        for relationship in self.db_map.wide_relationship_list():
-            object_class_name_list = relationship_class_dict[relationship.class_id]["object_class_name_list"]
-            split_object_class_name_list = object_class_name_list.split(",")
-            object_id_list = relationship.object_id_list
-            split_object_id_list = [int(x) for x in object_id_list.split(",")]
-            split_object_name_list = relationship.object_name_list.split(",")
-            for i in range(len(split_object_id_list)):
-                src_object_id = split_object_id_list[i]
-                try:
-                    dst_object_id = split_object_id_list[i + 1]
-                except IndexError:
-                    dst_object_id = split_object_id_list[0]
-                try:
-                    src_ind = self.object_ids.index(src_object_id)
-                    dst_ind = self.object_ids.index(dst_object_id)
-                except ValueError:
-                    continue
-                self.src_ind_list.append(src_ind)
-                self.dst_ind_list.append(dst_ind)
-                src_object_name = self.object_names[src_ind]
-                dst_object_name = self.object_names[dst_ind]
-                self.arc_object_id_lists.append(object_id_list)
-                self.arc_relationship_class_ids.append(relationship.class_id)
-                self.arc_object_class_name_lists.append(object_class_name_list)
-                # Find out label items
-                arc_label_object_name_list = list()
-                arc_label_object_class_name_list = list()
-                for object_name, object_class_name in zip(split_object_name_list, split_object_class_name_list):
-                    if object_name in (src_object_name, dst_object_name):
-                        continue
-                    arc_label_object_name_list.append(object_name)
-                    arc_label_object_class_name_list.append(object_class_name)
-                self.arc_label_object_name_lists.append(arc_label_object_name_list)
-                self.arc_label_object_class_name_lists.append(arc_label_object_class_name_list)
+        self.relationships = self.db_map.wide_relationship_list().all()
+        self.src_inds, self.dst_inds, self.arc_relationship_inds = relationship_arcs(
+            object_ind, [x.object_id_list for x in self.relationships])
+        relationship_class_ids = np.fromiter(
+            (x.class_id for x in self.relationships), dtype=int, count=len(self.relationships))
+        self.arc_relationship_class_ids = relationship_class_ids[self.arc_relationship_inds]
         # Add template items hanging around
         scene = self.ui.graphicsView.scene()
         if not scene:
             return
         self.heavy_positions = {}
         template_object_items = [x for x in scene.items() if isinstance(x, ObjectItem) and x.template_id_dim]
-        object_ind = len(self.object_ids)
+        new_object_ind = len(self.object_ids)
         self.template_id_dims = {}
         self.is_template = {}
         object_ind_dict = {}  # Dict of object indexes added from this point
-        object_ids_copy = self.object_ids.copy()  # Object ids added until this point
         for item in template_object_items:
             object_id = item.object_id
             object_name = item.object_name
             try:
-                found_ind = object_ids_copy.index(object_id)
+                found_ind = object_ind[object_id]
                 # Object id is already in list; complete its template information and make it heavy
                 self.template_id_dims[found_ind] = item.template_id_dim
                 self.is_template[found_ind] = False
                 self.heavy_positions[found_ind] = item.pos()
-            except ValueError:
+            except KeyError:
                 # Object id is not in list; add it together with its template info, and make it heavy
                 object_class_id = item.object_class_id
                 object_class_name = item.object_class_name
@@ -2278,120 +2384,99 @@ class GraphViewForm(DataStoreForm):
                 self.object_names.append(object_name)
                 self.object_class_ids.append(object_class_id)
                 self.object_class_names.append(object_class_name)
-                self.template_id_dims[object_ind] = item.template_id_dim
-                self.is_template[object_ind] = item.is_template
-                self.heavy_positions[object_ind] = item.pos()
-                object_ind_dict[item] = object_ind
-                object_ind += 1
+                self.template_id_dims[new_object_ind] = item.template_id_dim
+                self.is_template[new_object_ind] = item.is_template
+                self.heavy_positions[new_object_ind] = item.pos()
+                object_ind_dict[item] = new_object_ind
+                new_object_ind += 1
         template_arc_items = [x for x in scene.items() if isinstance(x, ArcItem) and x.is_template]
-        arc_ind = len(self.arc_label_object_name_lists)
+        arc_ind = len(self.src_inds)
         self.arc_template_ids = {}
+        template_src_inds = list()
+        template_dst_inds = list()
+        template_relationship_class_ids = list()
         for item in template_arc_items:
             src_item = item.src_item
             dst_item = item.dst_item
             try:
                 src_ind = object_ind_dict[src_item]
             except KeyError:
-                src_object_id = src_item.object_id
-                src_ind = self.object_ids.index(src_object_id)
+                src_ind = object_ind[src_item.object_id]
             try:
                 dst_ind = object_ind_dict[dst_item]
             except KeyError:
-                dst_object_id = dst_item.object_id
-                dst_ind = self.object_ids.index(dst_object_id)
-            self.src_ind_list.append(src_ind)
-            self.dst_ind_list.append(dst_ind)
-            # NOTE: These arcs correspond to template arcs.
-            relationship_class_id = item.relationship_class_id
-            object_class_name_list = item.object_class_name_list
-            self.arc_object_id_lists.append("")  # TODO: is this one filled when creating the relationship?
-            self.arc_relationship_class_ids.append(relationship_class_id)
-            self.arc_object_class_name_lists.append(object_class_name_list)
-            # Label don't matter
-            self.arc_label_object_name_lists.append("")
-            self.arc_label_object_class_name_lists.append("")
+                dst_ind = object_ind[dst_item.object_id]
+            # NOTE: These arcs correspond to template arcs, so they don't come from any relationship
+            template_src_inds.append(src_ind)
+            template_dst_inds.append(dst_ind)
+            template_relationship_class_ids.append(item.relationship_class_id)
             self.arc_template_ids[arc_ind] = item.template_id
             arc_ind += 1
-
-    def shortest_path_matrix(self, object_name_list, src_ind_list, dst_ind_list, spread):
-        """Return the shortest-path matrix."""
-        N = len(object_name_list)
-        if not N:
-            return None
-        dist = np.zeros((N, N))
-        src_ind = arr(src_ind_list)
-        dst_ind = arr(dst_ind_list)
-        try:
-            dist[src_ind, dst_ind] = dist[dst_ind, src_ind] = spread
-        except IndexError:
-            pass
-        d = dijkstra(dist, directed=False)
-        # Remove infinites and zeros
-        d[d == np.inf] = spread * 3
-        d[d == 0] = spread * 1e-6
-        return d
-
-    def sets(self, N):
-        """Return sets of vertex pairs indices."""
-        sets = []
-        for n in range(1, N):
-            pairs = np.zeros((N - n, 2), int)  # pairs on diagonal n
-            pairs[:, 0] = np.arange(N - n)
-            pairs[:, 1] = pairs[:, 0] + n
-            mask = np.mod(range(N - n), 2 * n) < n
-            s1 = pairs[mask]
-            s2 = pairs[~mask]
-            if len(s1) > 0:
-                sets.append(s1)
-            if len(s2) > 0:
-                sets.append(s2)
-        return sets
-
-    def vertex_coordinates(self, matrix, heavy_positions={}, iterations=10, weight_exp=-2, initial_diameter=1000):
-        """Return x and y coordinates for each vertex in the graph, computed using VSGD-MS."""
-        N = len(matrix)
-        if N == 1:
-            return [0], [0]
-        mask = np.ones((N, N)) == 1 - np.tril(np.ones((N, N)))  # Upper triangular except diagonal
-        np.random.seed(0)
-        layout = np.random.rand(N, 2) * initial_diameter - initial_diameter / 2  # Random layout with initial diameter
-        heavy_ind_list = list()
-        heavy_pos_list = list()
-        for ind, pos in heavy_positions.items():
-            heavy_ind_list.append(ind)
-            heavy_pos_list.append([pos.x(), pos.y()])
-        heavy_ind = arr(heavy_ind_list)
-        heavy_pos = arr(heavy_pos_list)
-        if heavy_ind.any():
-            layout[heavy_ind, :] = heavy_pos
-        weights = matrix ** weight_exp  # bus-pair weights (lower for distant buses)
-        maxstep = 1 / np.min(weights[mask])
-        minstep = 1 / np.max(weights[mask])
-        lambda_ = np.log(minstep / maxstep) / (iterations - 1)  # exponential decay of allowed adjustment
-        sets = self.sets(N)  # construct sets of bus pairs
-        for iteration in range(iterations):
-            step = maxstep * np.exp(lambda_ * iteration)  # how big adjustments are allowed?
-            rand_order = np.random.permutation(N)  # we don't want to use the same pair order each iteration
-            for p in sets:
-                v1, v2 = rand_order[p[:, 0]], rand_order[p[:, 1]]  # arrays of vertex1 and vertex2
-                # current distance (possibly accounting for system rescaling)
-                dist = ((layout[v1, 0] - layout[v2, 0]) ** 2 + (layout[v1, 1] - layout[v2, 1]) ** 2) ** 0.5
-                r = (matrix[v1, v2] - dist)[:, None] / 2 * (layout[v1] - layout[v2]) / dist[:, None]  # desired change
-                dx1 = r * np.minimum(1, weights[v1, v2] * step)[:, None]
-                dx2 = -dx1
-                layout[v1, :] += dx1  # update position
-                layout[v2, :] += dx2
-                if heavy_ind.any():
-                    layout[heavy_ind, :] = heavy_pos
-        return layout[:, 0], layout[:, 1]
-
-    def make_graph(self):
-        """Make graph."""
-        d = self.shortest_path_matrix(self.object_names, self.src_ind_list, self.dst_ind_list, self._spread)
-        if d is None:
-            return False
+        if not template_arc_items:
+            return
+        self.src_inds = np.append(self.src_inds, template_src_inds)
+        self.dst_inds = np.append(self.dst_inds, template_dst_inds)
+        self.arc_relationship_inds = np.append(self.arc_relationship_inds, [-1] * len(template_arc_items))
+        self.arc_relationship_class_ids = np.append(
+            self.arc_relationship_class_ids, template_relationship_class_ids)
+
+    @Slot(int, object, object, name="_handle_graph_layout_finished")
+    def _handle_graph_layout_finished(self, build_id, x, y):
+        """Start populating a new scene with the items, in batches, using the layout computed by the worker."""
+        if build_id != self._graph_build_id:
+            return
+        self._layout_worker = None
         scene = self.new_scene()
-        x, y = self.vertex_coordinates(d, self.heavy_positions)
+        self._has_graph = True
+        # Fix the scene rect to the final extent, so the view doesn't jump around while items are being added
+        margin = self.extent
+        scene.setSceneRect(QRectF(
+            QPointF(min(x) - margin, min(y) - margin), QPointF(max(x) + margin, max(y) + margin)))
+        self.ui.graphicsView.scale_to_fit_scene()
+        self.extend_scene_bg()
+        self._scene_populator = self.populate_scene(scene, x, y)
+        self.progress_bar.setRange(0, len(self.object_ids) + len(self.src_inds))
+        self.progress_bar.setValue(0)
+        self._populate_scene_batch()
+        if self._scene_populator:
+            self._populate_timer.start(0)
+
+    @Slot(int, "QString", name="_handle_graph_layout_failed")
+    def _handle_graph_layout_failed(self, build_id, msg):
+        if build_id != self._graph_build_id:
+            return
+        self._layout_worker = None
+        self.hide_graph_build_widgets()
+        self.msg_error.emit("Unable to compute graph layout: {}".format(msg))
+
+    @Slot(name="_populate_scene_batch")
+    def _populate_scene_batch(self):
+        """Add items to the scene until the time budget for one batch is spent.
+        Leave the event loop free in between batches so the form stays responsive."""
+        deadline = time.perf_counter() + self._populate_batch_time
+        step = self.progress_bar.value()
+        try:
+            while time.perf_counter() < deadline:
+                step = next(self._scene_populator)
+        except StopIteration:
+            self._finish_scene_population()
+            return
+        self.progress_bar.setValue(step)
+
+    def _finish_scene_population(self):
+        """Let the scene rect follow the items again and report."""
+        self._populate_timer.stop()
+        self._scene_populator = None
+        self.hide_graph_build_widgets()
+        self.ui.graphicsView.scene().setSceneRect(QRectF())
+        self.ui.graphicsView.scale_to_fit_scene()
+        self.extend_scene_bg()
+        toc = time.clock()
+        self.msg.emit("Graph built in {} seconds\t".format(toc - self._graph_build_tic))
+
+    def populate_scene(self, scene, x, y):
+        """A generator that adds object and arc items to the scene, one at a time,
+        yielding the number of items added so far."""
         object_items = list()
         for i in range(len(self.object_names)):
             object_id = self.object_ids[i]
@@ -2410,30 +2495,128 @@ class GraphViewForm(DataStoreForm):
                 pass
             scene.addItem(object_item)
             object_items.append(object_item)
-        for k in range(len(self.src_ind_list)):
-            i = self.src_ind_list[k]
-            j = self.dst_ind_list[k]
-            object_id_list = self.arc_object_id_lists[k]
-            relationship_class_id = self.arc_relationship_class_ids[k]
-            object_class_names = self.arc_object_class_name_lists[k]
-            label_object_names = self.arc_label_object_name_lists[k]
-            label_object_class_names = self.arc_label_object_class_name_lists[k]
-            label_parts = self.relationship_graph(
-                label_object_names, label_object_class_names, self.extent, self._spread / 2,
-                label_font=self.font, label_color=Qt.transparent, # label_color=self.object_label_color
-                relationship_class_id=relationship_class_id)
-            arc_item = ArcItem(
-                self, object_id_list, relationship_class_id, label_object_class_names, # object_class_names,
-                object_items[i], object_items[j], .25 * self.extent, self.arc_color,
-                token_color=self.object_label_color, label_color=self.arc_label_color, label_parts=label_parts)
-            try:
-                template_id = self.arc_template_ids[k]
-                arc_item.template_id = template_id
-                arc_item.make_template()
-            except KeyError:
-                pass
+            yield len(object_items)
+        arc_count = 0
+        for arc_inds in self.arc_groups():
+            if len(arc_inds) == 1:
+                arc_item = self.new_arc_item(arc_inds[0], object_items)
+            else:
+                arc_item = self.new_aggregated_arc_item(arc_inds, object_items)
             scene.addItem(arc_item)
-        return True
+            arc_count += len(arc_inds)
+            yield len(object_items) + arc_count
+
+    def arc_groups(self):
+        """A generator of lists of arc indexes, each to be drawn as one item.
+        When aggregating arcs, relationship arcs joining the same pair of objects go together.
+        """
+        if not self.aggregate_arcs_action.isChecked():
+            for k in range(len(self.src_inds)):
+                yield [k]
+            return
+        is_template = self.arc_relationship_inds < 0
+        for k in np.flatnonzero(is_template):
+            yield [k]
+        arc_inds = np.flatnonzero(~is_template)
+        for group in parallel_arc_groups(self.src_inds[arc_inds], self.dst_inds[arc_inds]):
+            yield arc_inds[group]
+
+    def new_arc_item(self, k, object_items):
+        """Returns new arc item for the k-th arc."""
+        src_item = object_items[self.src_inds[k]]
+        dst_item = object_items[self.dst_inds[k]]
+        relationship_ind = self.arc_relationship_inds[k]
+        if relationship_ind >= 0:
+            return self.new_relationship_arc_item(src_item, dst_item, self.relationships[relationship_ind])
+        # Template arc, label doesn't matter
+        relationship_class_id = int(self.arc_relationship_class_ids[k])
+        label_parts = self.relationship_graph(
+            "", "", self.extent, self._spread / 2, label_font=self.font, label_color=Qt.transparent,
+            relationship_class_id=relationship_class_id)
+        arc_item = ArcItem(
+            self, "", relationship_class_id, "",  # TODO: is object_id_list filled when creating the relationship?
+            src_item, dst_item, .25 * self.extent, self.arc_color,
+            token_color=self.object_label_color, label_color=self.arc_label_color, label_parts=label_parts)
+        arc_item.template_id = self.arc_template_ids[k]
+        arc_item.make_template()
+        return arc_item
+
+    def new_relationship_arc_item(self, src_item, dst_item, relationship):
+        """Returns new arc item for given relationship, with a label showing the other objects in it."""
+        relationship_class_id = relationship.class_id
+        object_class_name_list = self.relationship_class_object_class_name_lists[relationship_class_id]
+        arc_object_names = (src_item.object_name, dst_item.object_name)
+        label_object_names = list()
+        label_object_class_names = list()
+        for object_name, object_class_name in zip(
+                relationship.object_name_list.split(","), object_class_name_list.split(",")):
+            if object_name in arc_object_names:
+                continue
+            label_object_names.append(object_name)
+            label_object_class_names.append(object_class_name)
+        label_parts = self.relationship_graph(
+            label_object_names, label_object_class_names, self.extent, self._spread / 2,
+            label_font=self.font, label_color=Qt.transparent, # label_color=self.object_label_color
+            relationship_class_id=relationship_class_id)
+        return ArcItem(
+            self, relationship.object_id_list, relationship_class_id, label_object_class_names,
+            src_item, dst_item, .25 * self.extent, self.arc_color,
+            token_color=self.object_label_color, label_color=self.arc_label_color, label_parts=label_parts)
+
+    def new_aggregated_arc_item(self, arc_inds, object_items):
+        """Returns new arc item standing for all the given arcs, which join the same pair of objects."""
+        src_ind = self.src_inds[arc_inds[0]]
+        relationships = [self.relationships[k] for k in self.arc_relationship_inds[arc_inds]]
+        is_reversed = list(self.src_inds[arc_inds] != src_ind)
+        relationship_class_ids = {x.class_id for x in relationships}
+        if len(relationship_class_ids) == 1:
+            relationship_class_id = relationship_class_ids.pop()
+            object_class_name_list = self.relationship_class_object_class_name_lists[relationship_class_id].split(",")
+        else:
+            relationship_class_id = None
+            object_class_name_list = None
+        width = .25 * self.extent * (1 + np.log10(len(arc_inds)))
+        return AggregatedArcItem(
+            self, relationships, is_reversed, relationship_class_id, object_class_name_list,
+            object_items[src_ind], object_items[self.dst_inds[arc_inds[0]]], width, self.arc_color,
+            token_color=self.object_label_color)
+
+    def expand_aggregated_arc_item(self, item):
+        """Replace an aggregated arc item by one arc item per relationship."""
+        scene = item.scene()
+        if not scene:
+            return
+        item.src_item.outgoing_arc_items.remove(item)
+        item.dst_item.incoming_arc_items.remove(item)
+        scene.removeItem(item.label_item)
+        scene.removeItem(item.token_item)
+        scene.removeItem(item)
+        for relationship, is_reversed in zip(item.relationships, item.is_reversed):
+            if is_reversed:
+                arc_item = self.new_relationship_arc_item(item.dst_item, item.src_item, relationship)
+            else:
+                arc_item = self.new_relationship_arc_item(item.src_item, item.dst_item, relationship)
+            scene.addItem(arc_item)
+
+    def object_dot_pixmap(self, object_class_name):
+        """A dot in the average color of the icon for `object_class_name`, to draw objects in low detail."""
+        try:
+            return self.object_dot_pixmap_dict[object_class_name]
+        except KeyError:
+            pass
+        image = self.object_icon(object_class_name).pixmap(self.extent).toImage()
+        color = image.scaled(1, 1, Qt.IgnoreAspectRatio, Qt.SmoothTransformation).pixelColor(0, 0)
+        color.setAlpha(255)
+        pixmap = QPixmap(self.extent, self.extent)
+        pixmap.fill(Qt.transparent)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(color)
+        painter.drawEllipse(pixmap.rect())
+        painter.end()
+        self.object_dot_pixmap_dict[object_class_name] = pixmap
+        return pixmap
 
     def new_scene(self):
         """A new scene with a background."""
@@ -2444,6 +2627,7 @@ class GraphViewForm(DataStoreForm):
         self._scene_bg.setPen(Qt.NoPen)
         self._scene_bg.setZValue(-100)
         scene = QGraphicsScene()
+        scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
         self.ui.graphicsView.setScene(scene)
         scene.addItem(self._scene_bg)
         scene.changed.connect(self._handle_scene_changed)
@@ -2473,6 +2657,11 @@ class GraphViewForm(DataStoreForm):
             if isinstance(item, ObjectItem):
                 self.selected_object_class_ids.add(item.object_class_id)
                 self.selected_object_ids.setdefault(item.object_class_id, set()).add(item.object_id)
+            elif isinstance(item, AggregatedArcItem):
+                for relationship in item.relationships:
+                    self.selected_relationship_class_ids.add(relationship.class_id)
+                    self.selected_object_id_lists.setdefault(
+                        relationship.class_id, set()).add(relationship.object_id_list)
             elif isinstance(item, ArcItem):
                 self.selected_relationship_class_ids.add(item.relationship_class_id)
                 self.selected_object_id_lists.setdefault(item.relationship_class_id, set()).add(item.object_id_list)
@@ -2666,10 +2855,10 @@ class GraphViewForm(DataStoreForm):
         arc_items = list()
         src_ind_list = list(range(len(object_name_list)))
         dst_ind_list = src_ind_list[1:] + src_ind_list[:1]
-        d = self.shortest_path_matrix(object_name_list, src_ind_list, dst_ind_list, spread)
+        d = shortest_path_matrix(len(object_name_list), src_ind_list, dst_ind_list, spread)
         if d is None:
             return [], []
-        x, y = self.vertex_coordinates(d)
+        x, y = vertex_coordinates(d)
         for i in range(len(object_name_list)):
             x_ = x[i]
             y_ = y[i]
@@ -2832,6 +3021,10 @@ class GraphViewForm(DataStoreForm):
         window_state = self.qsettings.value("{0}/windowState".format(self.settings_key))
         if window_state:
             self.restoreState(window_state, version=1)  # Toolbar and dockWidget positions
+        sparse_layout_ = self.qsettings.value("{0}/sparseLayout".format(self.settings_key), defaultValue='false')
+        self.sparse_layout_action.setChecked(sparse_layout_ == 'true')
+        aggregate_arcs = self.qsettings.value("{0}/aggregateArcs".format(self.settings_key), defaultValue='false')
+        self.aggregate_arcs_action.setChecked(aggregate_arcs == 'true')
 
     def closeEvent(self, event=None):
         """Handle close window.
@@ -2840,7 +3033,10 @@ class GraphViewForm(DataStoreForm):
             event (QEvent): Closing event if 'X' is clicked.
         """
         super().closeEvent(event)
+        self.cancel_graph_build()
         self.qsettings.setValue("{0}/windowState".format(self.settings_key), self.saveState(version=1))
+        self.qsettings.setValue("{0}/sparseLayout".format(self.settings_key), self.sparse_layout_action.isChecked())
+        self.qsettings.setValue("{0}/aggregateArcs".format(self.settings_key), self.aggregate_arcs_action.isChecked())
         scene = self.ui.graphicsView.scene()
         if scene:
             scene.deleteLater()
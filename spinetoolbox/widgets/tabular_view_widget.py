@@ -50,15 +50,95 @@ INDEX_NAME = "db index"
 JSON_TIME_NAME = "json time"
 PARAMETER_NAME = "db parameter"
 
+QUERY_PAGE_SIZE = 10000 # number of rows fetched at a time when iterating queries
+SAVE_CHUNK_SIZE = 10000 # number of items written to the database in one call
+IN_QUERY_CHUNK_SIZE = 500 # number of names looked up in the database in one query
+
 
 def unpack_json(data):
-    expanded_data = []
+    """Expands the json array in the last element of each row to one row per array element,
+    with the element's 1-based position before the value. Yields rows as tuples."""
     for d in data:
-        json_array = json.loads(d[-1])
-        json_index = list(range(1, len(json_array) + 1))
-        new_data = [a + [b, c] for a, b, c in zip([d[:-1]]*len(json_array), json_index, json_array)]
-        expanded_data = expanded_data + new_data
-    return expanded_data
+        prefix = tuple(d[:-1])
+        for i, value in enumerate(json.loads(d[-1]), 1):
+            yield prefix + (i, value)
+
+
+def chunks(items, size=SAVE_CHUNK_SIZE):
+    """Yields consecutive slices of list items with given size"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def pack_json(data, keys):
+    """Packs values in data dict, where the last element of each key is a 1-based json array position,
+    to json arrays for keys given without the position. Missing array elements are set to zero.
+
+    Returns:
+        packed (dict): json string for each key in keys that has values
+        empty_keys (set): keys without any values
+    """
+    arrays = {k: {} for k in keys}
+    for key, value in data.items():
+        array = arrays.get(key[:-1])
+        if array is not None:
+            array[key[-1]] = value
+    packed = {}
+    empty_keys = set()
+    for k, array in arrays.items():
+        if not array:
+            empty_keys.add(k)
+            continue
+        json_values = [0] * max(array)
+        for i, value in array.items():
+            json_values[i - 1] = value
+        packed[k] = json.dumps(json_values)
+    return packed, empty_keys
+
+
+class UsedNames():
+    """Set like collection of the names in a query, membership is checked
+    in the database so that all names don't need to be loaded.
+    Names are looked up in batches with `load`, and the result for each name is kept.
+
+    Attributes:
+        query (Query): query with a name column, for example db_map.object_list()
+    """
+    def __init__(self, query):
+        self._query = query
+        self._added = set()
+        self._removed = set()
+        self._in_db = {}  # name -> whether it's in the query
+
+    def __contains__(self, name):
+        if name in self._added:
+            return True
+        if name in self._removed:
+            return False
+        if name not in self._in_db:
+            self.load([name])
+        return self._in_db[name]
+
+    def load(self, names):
+        """Checks which of the given names are in the query, with one query per batch of names."""
+        names = [name for name in set(names) if name not in self._in_db]
+        if not names:
+            return
+        subquery = self._query.subquery()
+        # Keep the number of query parameters under the limit of SQLite
+        for batch in chunks(names, IN_QUERY_CHUNK_SIZE):
+            self._in_db.update((name, False) for name in batch)
+            found = self._query.session.query(subquery.c.name).filter(subquery.c.name.in_(batch))
+            self._in_db.update((row.name, True) for row in found)
+
+    def add(self, name):
+        self._added.add(name)
+        self._removed.discard(name)
+
+    def difference_update(self, names):
+        names = set(names)
+        self._added.difference_update(names)
+        self._removed.update(names)
 
 
 class TabularViewForm(QMainWindow):
@@ -95,6 +175,9 @@ class TabularViewForm(QMainWindow):
         self.db_map = db_map
         self.database = database
         self._data_store = data_store
+        # objects and parameters loaded per class, {(item type, class name): (db state, {name: item})}
+        self._class_item_cache = {}
+        self._db_state = 0 # increased when this form changes the database, outdates _class_item_cache
 
         # current state of ui
         self.current_class_type = ''
@@ -146,7 +229,6 @@ class TabularViewForm(QMainWindow):
 
         # load db data
         self.load_class_data()
-        self.load_objects()
         self.update_class_list()
 
         # Set window title
@@ -169,12 +251,57 @@ class TabularViewForm(QMainWindow):
             self.ui.actionRollback.setEnabled(True)
 
     def load_class_data(self):
+        """Loads object and relationship classes, objects and parameters are loaded when a class is selected"""
         self.object_classes = {oc.name: oc for oc in self.db_map.object_class_list().all()}
         self.relationship_classes = {rc.name: rc for rc in self.db_map.wide_relationship_class_list().all()}
-        self.parameters = {p.name: p for p in self.db_map.parameter_list().all()}
+
+    def db_changed(self):
+        """Marks objects and parameters loaded so far as outdated"""
+        self._db_state += 1
+
+    def _cached_class_items(self, key, query):
+        """Returns dict of items by name for key, runs query if not loaded since last db change"""
+        cached = self._class_item_cache.get(key)
+        if cached is not None and cached[0] == self._db_state:
+            return cached[1]
+        items = {item.name: item for item in query().yield_per(QUERY_PAGE_SIZE)}
+        self._class_item_cache[key] = (self._db_state, items)
+        return items
+
+    def class_objects(self, class_name):
+        """Returns dict of objects by name in object class"""
+        class_id = self.object_classes[class_name].id
+        return self._cached_class_items(
+            (OBJECT_CLASS, class_name), lambda: self.db_map.object_list(class_id=class_id))
+
+    def class_parameters(self, class_type, class_name):
+        """Returns dict of parameters by name in object or relationship class"""
+        if class_type == RELATIONSHIP_CLASS:
+            class_id = self.relationship_classes[class_name].id
+            query = lambda: self.db_map.parameter_list().filter_by(relationship_class_id=class_id)
+        else:
+            class_id = self.object_classes[class_name].id
+            query = lambda: self.db_map.parameter_list().filter_by(object_class_id=class_id)
+        return self._cached_class_items((PARAMETER_NAME, class_type, class_name), query)
 
     def load_objects(self):
-        self.objects = {o.name: o for o in self.db_map.object_list().all()}
+        """Loads objects in current object class or in the object classes of current relationship class"""
+        if self.current_class_type == RELATIONSHIP_CLASS:
+            class_names = self.current_object_class_list()
+        elif self.current_class_type == OBJECT_CLASS:
+            class_names = [self.current_class_name]
+        else:
+            class_names = []
+        self.objects = {}
+        for class_name in class_names:
+            self.objects.update(self.class_objects(class_name))
+
+    def load_parameters(self):
+        """Loads parameters of current class"""
+        if self.current_class_type in (OBJECT_CLASS, RELATIONSHIP_CLASS):
+            self.parameters = dict(self.class_parameters(self.current_class_type, self.current_class_name))
+        else:
+            self.parameters = {}
 
     def load_relationships(self):
         if self.current_class_type == RELATIONSHIP_CLASS:
@@ -187,25 +314,31 @@ class TabularViewForm(QMainWindow):
         if self.current_class_type == RELATIONSHIP_CLASS:
             query = self.db_map.relationship_parameter_value_list()
             query = query.filter(literal_column("relationship_class_name") == self.current_class_name)
-            data = query.all()
-            parameter_values = {(r.object_id_list, r.parameter_id, r.index): ParameterValue(r.id, r.value != None, r.json != None) for r in data}
-            data = [d.object_name_list.split(',') + [d.parameter_name, d.index, getattr(d, self.current_value_type)]
-                    for d in data if getattr(d, self.current_value_type) != None]
+            parameter_values = {}
+            data = []
+            for d in query.yield_per(QUERY_PAGE_SIZE):
+                parameter_values[(d.object_id_list, d.parameter_id, d.index)] = ParameterValue(d.id, d.value != None, d.json != None)
+                value = getattr(d, self.current_value_type)
+                if value != None:
+                    data.append(d.object_name_list.split(',') + [d.parameter_name, d.index, value])
             index_names = self.current_object_class_list()
             index_types = [str for _ in index_names]
         else:
             query = self.db_map.object_parameter_value_list()
             query = query.filter(literal_column("object_class_name") == self.current_class_name)
-            data = query.all()
-            parameter_values = {(r.object_id, r.parameter_id, r.index): ParameterValue(r.id, r.value != None, r.json != None) for r in data}
-            data = [[d.object_name, d.parameter_name, d.index, getattr(d, self.current_value_type)]
-                    for d in data if getattr(d, self.current_value_type) != None]
+            parameter_values = {}
+            data = []
+            for d in query.yield_per(QUERY_PAGE_SIZE):
+                parameter_values[(d.object_id, d.parameter_id, d.index)] = ParameterValue(d.id, d.value != None, d.json != None)
+                value = getattr(d, self.current_value_type)
+                if value != None:
+                    data.append([d.object_name, d.parameter_name, d.index, value])
             index_names = [self.current_class_name]
             index_types = [str]
         index_names.extend([PARAMETER_NAME, INDEX_NAME])
         index_types.extend([str, int])
         if self.current_value_type == DATA_JSON:
-            data = unpack_json(data)
+            data = list(unpack_json(data))
             index_names = index_names + [JSON_TIME_NAME]
             index_types = index_types + [int]
         return data, index_names, index_types, parameter_values
@@ -219,8 +352,7 @@ class TabularViewForm(QMainWindow):
             index_names = self.current_object_class_list()
             index_types = [str for _ in index_names]
         else:
-            data = [[o.name, 'x'] for o in self.objects.values()
-                    if o.class_id == self.object_classes[self.current_class_name].id]
+            data = [[name, 'x'] for name in self.class_objects(self.current_class_name)]
             index_names = [self.current_class_name]
             index_types = [str]
         return data, index_names, index_types
@@ -259,6 +391,7 @@ class TabularViewForm(QMainWindow):
         except SpineDBAPIError as e:
             #self.msg_error.emit(e.msg)
             return
+        self.db_changed()
         self.select_data()
 
     def model_has_changes(self):
@@ -292,73 +425,112 @@ class TabularViewForm(QMainWindow):
 
     def pack_dict_json(self):
         """Pack down values with json_index into a json_array"""
-        # TODO: can this be made a bit faster?
         # pack last index of dict to json
         if not self.model.model._edit_data and not self.model.model._deleted_data:
             return {}, set()
         # extract edited keys without time index
         edited_keys = set(k[:-1] for k in self.model.model._edit_data.keys())
         edited_keys.update(set(k[:-1] for k in self.model.model._deleted_data.keys()))
-        # find data for edited keys.
-        edited_data = {k:[] for k in edited_keys}
-        for k in self.model.model._data:
-            if k[:-1] in edited_data:
-                edited_data[k[:-1]].append([k[-1] ,self.model.model._data[k]])
-        # pack into json
-        keyfunc = operator.itemgetter(0)
-        packed_data = {}
-        empty_keys = set()
-        for k, v in edited_data.items():
-            if not v:
-                # no values found
-                empty_keys.add(k)
-                continue
-            v = sorted(v, key=keyfunc)
-            json_values = []
-            # create list of values from index 1 to end index.
-            # if value for index doesn't exist replace with zero.
-            v_ind = 0
-            for i in range(1,v[-1][0]+1):
-                if v[v_ind][0] == i:
-                    json_values.append(v[v_ind][1])
-                    v_ind = v_ind + 1
-                else:
-                    json_values.append(0)
-            packed_data[k] = json.dumps(json_values)
+        return pack_json(self.model.model._data, edited_keys)
 
-        return packed_data, empty_keys
+    def data_key_columns(self, keys):
+        """Translates data keys to columns of entity ids, parameter ids and indexes,
+        looking up each object and parameter name only once.
 
-    def delete_parameter_values(self, delete_values):
-        delete_ids = set()
-        update_data = []
-        # index to object classes
+        Args:
+            keys (list): data keys, object names followed by parameter name and index
+
+        Returns:
+            entity_ids (list): object ids, or tuples of object ids for relationships
+            parameter_ids (list): parameter ids
+            indexes (list): parameter value indexes
+        """
+        if not keys:
+            return [], [], []
+        if self.current_class_type == RELATIONSHIP_CLASS:
+            object_count = len(self.current_object_class_list())
+        else:
+            object_count = 1
+        columns = [list(map(operator.itemgetter(i), keys)) for i in range(object_count + 2)]
+        object_columns = []
+        for column in columns[:object_count]:
+            object_ids = {name: self.objects[name].id for name in set(column)}
+            object_columns.append([object_ids[name] for name in column])
         if self.current_class_type == RELATIONSHIP_CLASS:
-            obj_ind = range(len(self.current_object_class_list()))
+            entity_ids = list(zip(*object_columns))
         else:
-            obj_ind = [0]
-        par_ind = len(obj_ind)
-        index_ind = par_ind + 1
-        for k in delete_values.keys():
-            obj_id = tuple(self.objects[k[i]].id for i in obj_ind)
-            if self.current_class_type == OBJECT_CLASS:
-                obj_id = obj_id[0]
+            entity_ids = object_columns[0]
+        parameter_ids = {name: self.parameters[name].id for name in set(columns[object_count])}
+        parameter_ids = [parameter_ids[name] for name in columns[object_count]]
+        return entity_ids, parameter_ids, columns[object_count + 1]
+
+    def entity_keys(self, entity_ids):
+        """Returns entity part of keys to self.parameter_values for entity ids from data_key_columns"""
+        if self.current_class_type == RELATIONSHIP_CLASS:
+            return [",".join(map(str, entity_id)) for entity_id in entity_ids]
+        return entity_ids
+
+    def _add_cached_class_item(self, key, item):
+        """Adds item added to the database to loaded class items"""
+        if key in self._class_item_cache:
+            self._class_item_cache[key][1][item.name] = item
+
+    def _remove_cached_class_item(self, key, name):
+        """Removes item removed from the database from loaded class items"""
+        if key in self._class_item_cache:
+            self._class_item_cache[key][1].pop(name, None)
+
+    def add_objects_to_db(self, new_objects):
+        """Adds objects to the database in chunks and to loaded objects"""
+        class_names = {oc.id: oc.name for oc in self.object_classes.values()}
+        for chunk in chunks(new_objects):
+            for o in self.db_map.add_objects(*chunk):
+                self.objects[o.name] = o
+                self._add_cached_class_item((OBJECT_CLASS, class_names[o.class_id]), o)
+
+    def remove_objects_from_db(self, names):
+        """Removes objects with given names from the database in chunks and from loaded objects"""
+        class_names = {oc.id: oc.name for oc in self.object_classes.values()}
+        delete_ids = []
+        for name in names:
+            o = self.objects.pop(name, None)
+            if o is None:
+                continue
+            delete_ids.append(o.id)
+            self._remove_cached_class_item((OBJECT_CLASS, class_names[o.class_id]), name)
+        for chunk in chunks(delete_ids):
+            self.db_map.remove_items(object_ids=set(chunk))
+        return bool(delete_ids)
+
+    def add_relationships_to_db(self, new_relationships):
+        """Adds relationships to the database in chunks and to loaded relationships"""
+        for chunk in chunks(new_relationships):
+            for r in self.db_map.add_wide_relationships(*chunk):
+                self.relationships[tuple(int(i) for i in r.object_id_list.split(","))] = r
+
+    def delete_parameter_values(self, delete_values):
+        delete_ids = []
+        update_data = []
+        # flag of the current value field in ParameterValue
+        has_field = "has_" + self.current_value_type
+        entity_ids, parameter_ids, indexes = self.data_key_columns(list(delete_values.keys()))
+        for key in zip(self.entity_keys(entity_ids), parameter_ids, indexes):
+            parameter_value = self.parameter_values.get(key)
+            if parameter_value is None:
+                continue
+            if ((self.current_value_type == DATA_JSON and not parameter_value.has_value)
+                or (self.current_value_type == DATA_VALUE and not parameter_value.has_json)):
+                # only delete values where only one field is populated
+                delete_ids.append(parameter_value.id)
+                del self.parameter_values[key]
             else:
-                obj_id = ",".join(map(str,obj_id))
-            par_id = self.parameters[k[par_ind]].id
-            index = k[index_ind]
-            key = (obj_id, par_id, index)
-            if key in self.parameter_values:
-                if ((self.current_value_type == DATA_JSON and not self.parameter_values[key].has_value)
-                    or (self.current_value_type == DATA_VALUE and not self.parameter_values[key].has_json)):
-                    # only delete values where only one field is populated
-                    delete_ids.add(self.parameter_values[key].id)
-                else:
-                    # remove value from parameter_value field but not entire row
-                    update_data.append({"id": self.parameter_values[key].id, self.current_value_type: None})
-        if delete_ids:
-            self.db_map.remove_items(parameter_value_ids = delete_ids)
-        if update_data:
-            self.db_map.update_parameter_values(*update_data)
+                # remove value from parameter_value field but not entire row
+                update_data.append({"id": parameter_value.id, self.current_value_type: None})
+                self.parameter_values[key] = parameter_value._replace(**{has_field: False})
+        for chunk in chunks(delete_ids):
+            self.db_map.remove_items(parameter_value_ids=set(chunk))
+        for chunk in chunks(update_data):
+            self.db_map.update_parameter_values(*chunk)
 
     def delete_relationships(self, delete_relationships):
         delete_ids = set()
@@ -368,12 +540,12 @@ class TabularViewForm(QMainWindow):
                 if obj_ids in self.relationships:
                     delete_ids.add(self.relationships[obj_ids].id)
                     self.relationships.pop(obj_ids, None)
-        if delete_ids:
-            self.db_map.remove_items(relationship_ids = delete_ids)
+        for chunk in chunks(list(delete_ids)):
+            self.db_map.remove_items(relationship_ids=set(chunk))
 
     def delete_index_values_from_db(self, delete_indexes):
         if not delete_indexes:
-            return
+            return False
         object_names = []
         parameter_names = []
         #TODO: identify parameter and index and json time dimensions some other way.
@@ -382,22 +554,16 @@ class TabularViewForm(QMainWindow):
                 parameter_names += on
             elif k not in [INDEX_NAME, JSON_TIME_NAME]:
                 object_names += on
-        #find ids
-        delete_obj_ids = set()
-        for on in object_names:
-            if on in self.objects:
-                delete_obj_ids.add(self.objects[on].id)
-                self.objects.pop(on)
+        db_edited = self.remove_objects_from_db(object_names)
         delete_par_ids = set()
         for pn in parameter_names:
             if pn in self.parameters:
-                delete_par_ids.add(self.parameters[pn].id)
-                self.parameters.pop(pn)
-        if delete_obj_ids:
-            self.db_map.remove_items(object_ids=delete_obj_ids)
+                delete_par_ids.add(self.parameters.pop(pn).id)
+                self._remove_cached_class_item((PARAMETER_NAME, self.current_class_type, self.current_class_name), pn)
         if delete_par_ids:
             self.db_map.remove_items(parameter_ids=delete_par_ids)
-
+            db_edited = True
+        return db_edited
 
     def add_index_values_to_db(self, add_indexes):
         db_edited = False
@@ -416,10 +582,12 @@ class TabularViewForm(QMainWindow):
             elif k not in [INDEX_NAME, JSON_TIME_NAME]:
                 new_objects += [{"name": n, "class_id": self.object_classes[k].id} for n in on]
         if new_objects:
-            new_objects = self.db_map.add_objects(*new_objects)
+            self.add_objects_to_db(new_objects)
             db_edited = True
         if new_parameters:
-            new_parameters = self.db_map.add_parameters(*new_parameters)
+            for p in self.db_map.add_parameters(*new_parameters):
+                self.parameters[p.name] = p
+                self._add_cached_class_item((PARAMETER_NAME, self.current_class_type, self.current_class_name), p)
             db_edited = True
         return db_edited
 
@@ -430,7 +598,6 @@ class TabularViewForm(QMainWindow):
             rel_getter = operator.itemgetter(*range(len(self.current_object_class_list())))
             add_relationships = set(rel_getter(index) for index, value in self.model.model._edit_data.items() if value == None)
             delete_relationships = set(rel_getter(index) for index, value in self.model.model._deleted_data.items())
-            self.current_object_class_list()
             add_objects = []
             for i, name in enumerate(self.current_object_class_list()):
                 #only keep objects that has a relationship
@@ -439,40 +606,35 @@ class TabularViewForm(QMainWindow):
                 new = [n for n in new if n in new_data_set]
                 add_objects.extend([{'name': n, 'class_id': self.object_classes[name].id} for n in new])
             if add_objects:
-                self.db_map.add_objects(*add_objects)
-                self.load_objects()
+                self.add_objects_to_db(add_objects)
+                db_edited = True
             if delete_relationships:
-                ids = [tuple(self.objects[i].id for i in rel) for rel in delete_relationships]
-                delete_ids = set(self.relationships[r].id for r in ids if r in self.relationships)
-                for r in delete_ids:
-                    self.relationships.pop(r, None)
-                if delete_ids:
-                    self.db_map.remove_items(relationship_ids=delete_ids)
+                self.delete_relationships(delete_relationships)
+                db_edited = True
             if add_relationships:
                 ids = [(tuple(self.objects[i].id for i in rel),'_'.join(rel))
-                       for rel in delete_relationships]
+                       for rel in add_relationships]
                 c_id = self.relationship_classes[self.current_class_name].id
                 insert_rels = [{'object_id_list': r[0], 'name': r[1], 'class_id': c_id}
-                               for r in ids if r not in self.relationships]
+                               for r in ids if r[0] not in self.relationships]
                 if insert_rels:
-                    self.db_map.add_wide_relationships(*insert_rels)
+                    self.add_relationships_to_db(insert_rels)
                     db_edited = True
         elif self.current_class_type == OBJECT_CLASS:
             # find removed and new objects, only keep indexes in data
             delete_objects = set(index[0] for index in self.model.model._deleted_data.keys())
             add_objects = set(index[0] for index, value in self.model.model._edit_data.items() if value == None)
             if delete_objects:
-                delete_ids = set(self.objects[name].id for name in delete_objects)
-                self.db_map.remove_items(object_ids=delete_ids)
-                db_edited = True
+                db_edited = self.remove_objects_from_db(delete_objects)
             if add_objects:
                 class_id = self.object_classes[self.current_class_name].id
-                add_objects = [{"name": o, "class_id": class_id} for o in add_objects]
-                self.db_map.add_objects(*add_objects)
+                self.add_objects_to_db([{"name": o, "class_id": class_id} for o in add_objects])
                 db_edited = True
         return db_edited
 
     def save_model(self):
+        """Writes changes in the model to the database in chunks,
+        loaded objects, parameters, relationships and parameter values are updated as they are written."""
         db_edited = False
         if self.current_value_type == DATA_SET:
             db_edited = self.save_model_set()
@@ -482,10 +644,7 @@ class TabularViewForm(QMainWindow):
         elif self.current_value_type in [DATA_JSON, DATA_VALUE]:
             # save new objects and parameters
             add_indexes = self.model.model._added_index_entries
-            obj_edited = self.add_index_values_to_db(add_indexes)
-            if obj_edited:
-                self.parameters = {p.name: p for p in self.db_map.parameter_list().all()}
-                self.load_objects()
+            db_edited = self.add_index_values_to_db(add_indexes)
 
             if self.current_value_type == DATA_VALUE:
                 delete_values = self.model.model._deleted_data
@@ -503,57 +662,59 @@ class TabularViewForm(QMainWindow):
                 if self.relationship_tuple_key in self.model.model._deleted_tuple_index_entries:
                     delete_relationships = self.model.model._deleted_tuple_index_entries[self.relationship_tuple_key]
                     self.delete_relationships(delete_relationships)
-                rel_edited = self.save_relationships()
-                if rel_edited:
-                    self.load_relationships()
+                self.save_relationships()
             # save parameter values
             self.save_parameter_values(data, data_value)
             # delete objects and parameters
             delete_indexes = self.model.model._deleted_index_entries
-            db_edited = self.delete_index_values_from_db(delete_indexes)
+            db_edited = self.delete_index_values_from_db(delete_indexes) or db_edited
 
         # update model
         self.model.model.clear_track_data()
-        # reload classes, objects and parameters
-        if db_edited:
-            self.load_class_data()
-            self.load_objects()
+        return db_edited
 
     def save_parameter_values(self, data, data_value):
         new_data = []
         update_data = []
-        # index to object classes
+        # flag of the current value field in ParameterValue
+        has_field = "has_" + self.current_value_type
         if self.current_class_type == RELATIONSHIP_CLASS:
-            obj_ind = range(len(self.current_object_class_list()))
             id_field = "relationship_id"
+            relationship_ids = {k: r.id for k, r in self.relationships.items()}
         else:
-            obj_ind = [0]
             id_field = "object_id"
-        par_ind = len(obj_ind)
-        index_ind = par_ind + 1
-        for k in data.keys():
-            obj_id = tuple(self.objects[k[i]].id for i in obj_ind)
-            par_id = self.parameters[k[par_ind]].id
-            index = k[index_ind]
-            db_id = None
-            if self.current_class_type == RELATIONSHIP_CLASS:
-                if obj_id in self.relationships:
-                    db_id = self.relationships[obj_id].id
-                obj_id = ",".join(map(str,obj_id))
-            else:
-                obj_id = obj_id[0]
-                db_id = obj_id
-            key = (obj_id, par_id, index)
-            if key in self.parameter_values:
-                value_id = self.parameter_values[key].id
-                update_data.append({"id": value_id, self.current_value_type: data_value[k]})
+        keys = list(data.keys())
+        entity_ids, parameter_ids, indexes = self.data_key_columns(keys)
+        if self.current_class_type == RELATIONSHIP_CLASS:
+            db_ids = [relationship_ids.get(entity_id) for entity_id in entity_ids]
+        else:
+            db_ids = entity_ids
+        value_field = self.current_value_type
+        parameter_values = self.parameter_values
+        for k, key, db_id in zip(keys, zip(self.entity_keys(entity_ids), parameter_ids, indexes), db_ids):
+            parameter_value = parameter_values.get(key)
+            if parameter_value is not None:
+                update_data.append({"id": parameter_value.id, value_field: data_value[k]})
+                if not getattr(parameter_value, has_field):
+                    parameter_values[key] = parameter_value._replace(**{has_field: True})
             elif db_id:
-                new_data.append({id_field: db_id, "parameter_id": par_id,
-                                 self.current_value_type: data_value[k]})
-        if new_data:
-            self.db_map.add_parameter_values(*new_data)
-        if update_data:
-            self.db_map.update_parameter_values(*update_data)
+                new_data.append({id_field: db_id, "parameter_id": key[1], "index": key[2],
+                                 value_field: data_value[k]})
+        for chunk in chunks(update_data):
+            self.db_map.update_parameter_values(*chunk)
+        if not new_data:
+            return
+        # keep track of added values so that they are updated instead of added on next save
+        if self.current_class_type == RELATIONSHIP_CLASS:
+            entity_keys = {r.id: r.object_id_list for r in self.relationships.values()}
+        for chunk in chunks(new_data):
+            for v in self.db_map.add_parameter_values(*chunk):
+                if self.current_class_type == RELATIONSHIP_CLASS:
+                    entity_key = entity_keys.get(v.relationship_id)
+                else:
+                    entity_key = v.object_id
+                self.parameter_values[(entity_key, v.parameter_id, v.index)] = ParameterValue(
+                    v.id, v.value != None, v.json != None)
 
     def save_relationships(self):
         new_rels = []
@@ -561,14 +722,15 @@ class TabularViewForm(QMainWindow):
         if self.relationship_tuple_key in self.model.model._added_tuple_index_entries:
             # relationships added by tuple
             rels = self.model.model._added_tuple_index_entries[self.relationship_tuple_key]
+            c_id = self.relationship_classes[self.current_class_name].id
             for rel in rels:
                 if all(n in self.objects for n in rel):
                     obj_ids = tuple(self.objects[n].id for n in rel)
                     if obj_ids not in self.relationships:
-                        new_rels.append({'object_id_list': obj_ids, 'class_id': self.relationship_classes[self.current_class_name].id, 'name': '_'.join(rel)})
+                        new_rels.append({'object_id_list': obj_ids, 'class_id': c_id, 'name': '_'.join(rel)})
         # save relationships
         if new_rels:
-            self.db_map.add_wide_relationships(*new_rels)
+            self.add_relationships_to_db(new_rels)
             db_edited = True
         return db_edited
 
@@ -622,22 +784,23 @@ class TabularViewForm(QMainWindow):
         tuple_entries = {}
         used_index_entries = {}
         valid_index_values = {INDEX_NAME: range(1,9999999), JSON_TIME_NAME: range(1,9999999)}
-        used_index_entries[(PARAMETER_NAME,)] = set(p.name for p in self.parameters.values())
+        # names used by all parameters and objects are checked in the database when needed
+        used_index_entries[(PARAMETER_NAME,)] = UsedNames(self.db_map.parameter_list())
         index_entries = {}
         if self.current_class_type == RELATIONSHIP_CLASS:
             object_class_names = tuple(self.relationship_classes[self.current_class_name].object_class_name_list.split(','))
-            used_index_entries[object_class_names] = set(o.name for o in self.objects.values())
-            index_entries[PARAMETER_NAME] = set(p.name for p in self.parameters.values() if p.relationship_class_id == self.relationship_classes[self.current_class_name].id)
+            used_index_entries[object_class_names] = UsedNames(self.db_map.object_list())
+            index_entries[PARAMETER_NAME] = set(self.parameters)
             tuple_entries[(PARAMETER_NAME,)] = set((i,) for i in index_entries[PARAMETER_NAME])
             for oc in object_class_names:
-                index_entries[oc] = set(o.name for o in self.objects.values() if o.class_id == self.object_classes[oc].id)
+                index_entries[oc] = set(self.class_objects(oc))
             unique_class_names = list(object_class_names)
             fix_name_ambiguity(unique_class_names)
             tuple_entries[tuple(unique_class_names)] = set(tuple(r.object_name_list.split(',')) for r in self.relationships.values())
         else:
-            used_index_entries[(self.current_class_name,)] = set(o.name for o in self.objects.values())
-            index_entries[self.current_class_name] = set(o.name for o in self.objects.values() if o.class_id == self.object_classes[self.current_class_name].id)
-            index_entries[PARAMETER_NAME] = set(p.name for p in self.parameters.values() if p.object_class_id == self.object_classes[self.current_class_name].id)
+            used_index_entries[(self.current_class_name,)] = UsedNames(self.db_map.object_list())
+            index_entries[self.current_class_name] = set(self.objects)
+            index_entries[PARAMETER_NAME] = set(self.parameters)
             tuple_entries[(PARAMETER_NAME,)] = set((i,) for i in index_entries[PARAMETER_NAME])
             tuple_entries[(self.current_class_name,)] = set((i,) for i in index_entries[self.current_class_name])
 
@@ -648,6 +811,8 @@ class TabularViewForm(QMainWindow):
         self.current_class_type = class_type
         self.current_class_name = class_name
         self.current_value_type = self.ui.comboBox_value_type.currentText()
+        self.load_objects()
+        self.load_parameters()
         self.load_relationships()
         index_entries, tuple_entries, valid_index_values, used_index_entries = self.get_valid_entries_dicts()
         if self.current_value_type == DATA_SET: